@@ -0,0 +1,238 @@
+'''
+@author: Marco Bonvini
+
+This module contains the functions used by the benchmarks to measure the
+time spent by a function, to save the results as JSON and to compare them
+with the results of a previous run (the baseline).
+'''
+import datetime
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+import os
+
+from collections import OrderedDict
+
+import numpy
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Clock used to measure the time, perf_counter is available from Python 3.3
+clock = getattr(time, "perf_counter", time.time)
+
+# Version of the format of the JSON files
+FORMAT_VERSION = 1
+
+def measure(func, setup = None, repeat = 3, number = 1):
+    """
+    This function measures the time spent by a function. The function is executed
+    ``number`` times for each of the ``repeat`` repetitions, and the time of each repetition
+    is divided by ``number``. The time spent by the function ``setup`` is not measured.
+
+    :param function func: the function to measure
+    :param function setup: a function called before each repetition, it returns a tuple that
+      contains the arguments passed to ``func``. If None ``func`` is called without arguments.
+    :param int repeat: the number of repetitions
+    :param int number: the number of executions for each repetition
+
+    :return: a dictionary that contains the times of the repetitions, their minimum,
+      median, mean and standard deviation in seconds
+    :rtype: dict
+    """
+    times = []
+    for r in range(repeat):
+        args = setup() if setup is not None else ()
+        t0 = clock()
+        for n in range(number):
+            func(*args)
+        times.append((clock() - t0)/number)
+    return summarize(times)
+
+def summarize(times):
+    """
+    This function computes the statistics of a list of times.
+
+    :param list times: the times in seconds
+
+    :return: a dictionary with the times and their minimum, median, mean and standard deviation
+    :rtype: dict
+    """
+    times = numpy.array(times, dtype = float)
+    return {"times": times.tolist(), "min": float(numpy.min(times)), "median": float(numpy.median(times)), \
+            "mean": float(numpy.mean(times)), "std": float(numpy.std(times))}
+
+def environment():
+    """
+    This function describes the environment where the benchmarks are executed, i.e.,
+    the versions of python and numpy, the platform, the number of processors and the
+    git commit of the repository (if available).
+
+    :return: the description of the environment
+    :rtype: dict
+    """
+    env = OrderedDict()
+    env["date"] = datetime.datetime.utcnow().isoformat()
+    env["python"] = sys.version.split()[0]
+    env["numpy"] = numpy.__version__
+    env["platform"] = platform.platform()
+    env["machine"] = platform.machine()
+    env["processors"] = multiprocessing.cpu_count()
+    try:
+        root = os.path.dirname(os.path.abspath(__file__))
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd = root, stderr = subprocess.STDOUT)
+        env["commit"] = commit.decode("utf-8").strip()
+    except Exception:
+        env["commit"] = None
+    return env
+
+class BenchmarkSuite(object):
+    """
+    This class runs a set of benchmarks and collects their results. A benchmark
+    that raises an exception is recorded with its error, therefore the other
+    benchmarks are executed anyway.
+    """
+
+    def __init__(self, repeat = 3):
+        """
+        Constructor of the class.
+
+        :param int repeat: the default number of repetitions of each benchmark
+        """
+        self.repeat = repeat
+        self.results = OrderedDict()
+
+    def run(self, name, func, setup = None, repeat = None, number = 1, **info):
+        """
+        This method runs a benchmark and stores its results, see :func:`measure`.
+
+        :param string name: the unique name of the benchmark, e.g., ``first_order.simulate``
+        :param function func: the function to measure
+        :param function setup: the function that prepares the arguments of ``func``
+        :param int repeat: the number of repetitions, if None the default one is used
+        :param int number: the number of executions for each repetition
+        :param info: additional information stored with the results, e.g., the size of the problem
+
+        :return: the results of the benchmark
+        :rtype: dict
+        """
+        repeat = repeat if repeat is not None else self.repeat
+        print("[benchmark] {0} ...".format(name))
+        try:
+            result = measure(func, setup, repeat, number)
+        except Exception as e:
+            logger.exception("The benchmark {0} failed".format(name))
+            result = {"error": "{0}: {1}".format(e.__class__.__name__, str(e))}
+        result.update(info)
+        self.results[name] = result
+        if "error" in result:
+            print("[benchmark] {0} failed: {1}".format(name, result["error"]))
+        else:
+            print("[benchmark] {0} median {1:.6f} [s]".format(name, result["median"]))
+        return result
+
+    def skip(self, name, reason):
+        """
+        This method records a benchmark that can't be executed.
+
+        :param string name: the name of the benchmark
+        :param string reason: the reason why it is skipped
+
+        :rtype: None
+        """
+        print("[benchmark] {0} skipped: {1}".format(name, reason))
+        self.results[name] = {"skipped": reason}
+
+    def to_dict(self):
+        """
+        This method returns the results of the benchmarks and the description of
+        the environment.
+
+        :return: the results
+        :rtype: dict
+        """
+        return OrderedDict([("format", FORMAT_VERSION), ("environment", environment()), ("benchmarks", self.results)])
+
+    def save(self, path):
+        """
+        This method saves the results as a JSON file.
+
+        :param string path: the path of the file
+
+        :rtype: None
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent = 2)
+
+def load(path):
+    """
+    This function loads the results saved by :func:`BenchmarkSuite.save`.
+
+    :param string path: the path of the file
+
+    :return: the results
+    :rtype: dict
+    """
+    with open(path) as f:
+        return json.load(f)
+
+def compare(current, baseline, tolerance = 0.1, statistic = "median"):
+    """
+    This function compares the results of the benchmarks with a baseline. A benchmark
+    is a regression if its time is higher than the one of the baseline by more than
+    the relative ``tolerance``, and an improvement if it is lower by more than the tolerance.
+
+    :param dict current: the results to check
+    :param dict baseline: the results used as reference
+    :param float tolerance: the relative tolerance, e.g., 0.1 means 10%
+    :param string statistic: the statistic compared, one of ``min``, ``median`` and ``mean``
+
+    :return: a list of tuples ``(name, baseline time, current time, ratio, status)``, where the status
+      is one of ``ok``, ``regression``, ``improvement``, ``new``, ``missing`` and ``not measured``.
+    :rtype: list
+    """
+    cur = current["benchmarks"]
+    base = baseline["benchmarks"]
+
+    rows = []
+    for name in list(cur.keys()) + [n for n in base if n not in cur]:
+        t_cur = cur.get(name, {}).get(statistic)
+        t_base = base.get(name, {}).get(statistic)
+        if name not in base:
+            rows.append((name, None, t_cur, None, "new"))
+        elif name not in cur:
+            rows.append((name, t_base, None, None, "missing"))
+        elif t_cur is None or t_base is None or t_base <= 0.0:
+            rows.append((name, t_base, t_cur, None, "not measured"))
+        else:
+            ratio = t_cur/t_base
+            if ratio > 1.0 + tolerance:
+                status = "regression"
+            elif ratio < 1.0 - tolerance:
+                status = "improvement"
+            else:
+                status = "ok"
+            rows.append((name, t_base, t_cur, ratio, status))
+    return rows
+
+def format_comparison(rows):
+    """
+    This function formats the comparison computed by :func:`compare` as a table.
+
+    :param list rows: the comparison
+
+    :return: the table
+    :rtype: string
+    """
+    def fmt(value, spec):
+        return "-" if value is None else spec.format(value)
+
+    width = max([len(r[0]) for r in rows] + [9])
+    lines = ["{0:<{w}}  {1:>12}  {2:>12}  {3:>7}  {4}".format("benchmark", "baseline [s]", "current [s]", "ratio", "status", w = width)]
+    for name, t_base, t_cur, ratio, status in rows:
+        lines.append("{0:<{w}}  {1:>12}  {2:>12}  {3:>7}  {4}".format(name, fmt(t_base, "{0:.6f}"), fmt(t_cur, "{0:.6f}"), \
+                                                                    fmt(ratio, "{0:.3f}"), status, w = width))
+    return "\n".join(lines)
@@ -0,0 +1,103 @@
+'''
+@author: Marco Bonvini
+
+This module contains the benchmarks of the linear algebra kernels used by the
+UKF and the smoother. The kernels are executed on synthetic problems of increasing
+size, therefore they don't need an FMU.
+'''
+import numpy
+
+from estimationpy.ukf.ukf_fmu import UkfFmu
+from estimationpy.fmu_utils import covariance
+from estimationpy.fmu_utils.profiling import Profiler
+
+def make_filter(n_state_obs, n_pars, n_outputs):
+    """
+    This function creates a filter that is not associated to a model, it can be used
+    to execute the methods of :class:`estimationpy.ukf.ukf_fmu.UkfFmu` that don't
+    simulate the model. The constraints are not active.
+
+    :param int n_state_obs: the number of states estimated
+    :param int n_pars: the number of parameters estimated
+    :param int n_outputs: the number of measured outputs
+
+    :return: the filter
+    :rtype: estimationpy.ukf.ukf_fmu.UkfFmu
+    """
+    ukf = UkfFmu.__new__(UkfFmu)
+    ukf.model = None
+    ukf.pool = None
+    ukf.profiler = Profiler()
+    ukf.n_state = n_state_obs
+    ukf.n_state_obs = n_state_obs
+    ukf.n_pars = n_pars
+    ukf.n_outputs = n_outputs
+    ukf.n_outputsTot = n_outputs
+    ukf.N = n_state_obs + n_pars
+    ukf.n_points = 1 + 2*ukf.N
+    ukf.set_ukf_params()
+
+    ukf.constrStateHigh = numpy.zeros(n_state_obs, dtype = bool)
+    ukf.constrStateLow = numpy.zeros(n_state_obs, dtype = bool)
+    ukf.constrStateValueHigh = numpy.zeros(n_state_obs)
+    ukf.constrStateValueLow = numpy.zeros(n_state_obs)
+    ukf.constrParsHigh = numpy.zeros(n_pars, dtype = bool)
+    ukf.constrParsLow = numpy.zeros(n_pars, dtype = bool)
+    ukf.constrParsValueHigh = numpy.zeros(n_pars)
+    ukf.constrParsValueLow = numpy.zeros(n_pars)
+    return ukf
+
+def run(suite, sizes = (4, 16, 64), seed = 0):
+    """
+    This function runs the benchmarks of the linear algebra kernels.
+    For each size :math:`N` the problem has :math:`N/2` states, :math:`N - N/2` parameters and
+    :math:`max(1, N/4)` measured outputs. The random data is generated with a fixed seed.
+
+    :param benchmarks.harness.BenchmarkSuite suite: the suite that runs the benchmarks
+    :param tuple sizes: the sizes of the problems
+    :param int seed: the seed of the random number generator
+
+    :rtype: None
+    """
+    for N in sizes:
+        rng = numpy.random.RandomState(seed)
+        n_state_obs = N//2
+        n_pars = N - n_state_obs
+        n_outputs = max(1, N//4)
+        ukf = make_filter(n_state_obs, n_pars, n_outputs)
+        info = {"size": N, "outputs": n_outputs}
+        name = "kernels.N{0}.".format(N)
+
+        # Square root covariance matrices
+        A = rng.randn(N, N)
+        sqrtP = numpy.linalg.cholesky(numpy.dot(A, A.T) + N*numpy.eye(N))
+        sqrtQ_diag = covariance.DiagonalCovariance(0.1 + rng.rand(N))
+        sqrtQ_dense = covariance.DenseCovariance(sqrtQ_diag.to_dense())
+        sqrtR = covariance.DiagonalCovariance(0.1 + rng.rand(n_outputs))
+        x0 = rng.randn(N)
+
+        # Projected sigma points and outputs
+        X_proj = x0 + 0.1*rng.randn(ukf.n_points, N)
+        Z_proj = rng.randn(ukf.n_points, n_outputs)
+        x_ave = ukf.average_proj(X_proj)
+        z_ave = ukf.average_proj(Z_proj)
+        S = ukf.compute_S(X_proj, x_ave, sqrtQ_diag)
+        Sy = ukf.compute_S_y(Z_proj, z_ave, sqrtR)
+        CovXZ = ukf.compute_cov_x_y(X_proj, x_ave, Z_proj, z_ave)
+
+        def gain():
+            first = numpy.linalg.lstsq(Sy.T, CovXZ.T, rcond = None)[0]
+            return numpy.linalg.lstsq(Sy, first, rcond = None)[0].T
+        K = gain()
+        U = numpy.dot(K, Sy)
+
+        number = max(1, 256//N)
+        suite.run(name + "sigma_points", ukf.compute_sigma_points, lambda: (x0[:n_state_obs], x0[n_state_obs:], sqrtP), number = number, **info)
+        suite.run(name + "compute_S.diagonal_Q", ukf.compute_S, lambda: (X_proj, x_ave, sqrtQ_diag), number = number, **info)
+        suite.run(name + "compute_S.dense_Q", ukf.compute_S, lambda: (X_proj, x_ave, sqrtQ_dense), number = number, **info)
+        suite.run(name + "compute_S_y", ukf.compute_S_y, lambda: (Z_proj, z_ave, sqrtR), number = number, **info)
+        suite.run(name + "cross_covariance", ukf.compute_cov_x_y, lambda: (X_proj, x_ave, Z_proj, z_ave), number = number, **info)
+        suite.run(name + "gain", gain, number = number, **info)
+
+        # The update modifies the matrix U, a new copy is used for each repetition
+        suite.run(name + "chol_update", ukf.chol_update, lambda: (S, U.copy(), -1*numpy.ones(N)), repeat = 3*suite.repeat, **info)
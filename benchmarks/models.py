@@ -0,0 +1,212 @@
+'''
+@author: Marco Bonvini
+
+This module contains the benchmarks that use the FMUs and the data bundled with
+estimationpy. Each model is described by an object of type :class:`ModelCase`
+that contains the FMU, the data associated to the inputs and outputs, the variables
+to estimate and the period used by the benchmarks.
+'''
+import os
+import platform
+
+import pandas as pd
+
+from estimationpy.fmu_utils.model import Model
+from estimationpy.fmu_utils.fmu_pool import FmuPool
+from estimationpy.fmu_utils import affinity
+from estimationpy.ukf.ukf_fmu import UkfFmu
+
+# Folder that contains the FMUs and the data
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "estimationpy", "modelica", "FmuExamples", "Resources")
+
+def fmu_path(name):
+    return os.path.join(RESOURCES, "FMUs", name)
+
+def data_path(name):
+    return os.path.join(RESOURCES, "data", name)
+
+class ModelCase(object):
+    """
+    This class describes a model used by the benchmarks.
+    """
+
+    def __init__(self, name, fmu, data = None, inputs = (), outputs = (), variables = (), parameters = (), \
+                 values = (), start = 0.0, stop = None, atol = 1e-6, rtol = 1e-4):
+        """
+        Constructor of the class.
+
+        :param string name: the name of the case, used as prefix of the names of the benchmarks
+        :param string fmu: the path of the FMU
+        :param string data: the path of the CSV file that contains the data, if None only the
+          time needed to load the model is measured
+        :param list inputs: a list of tuples ``(input, column)`` that associates the inputs to the columns of the data
+        :param list outputs: a list of tuples ``(output, column, covariance)`` for the measured outputs
+        :param list variables: a list of tuples ``(name, initial value, covariance, min, max)`` for the states to estimate,
+          the constraints are active if the min and max values are not None
+        :param list parameters: a list of tuples ``(name, initial value, covariance, min, max)`` for the parameters to estimate
+        :param list values: a list of tuples ``(name, value)`` of the real variables to set before the simulations
+        :param float start: the initial time of the period in seconds
+        :param float stop: the final time of the period in seconds
+        :param float atol: the absolute tolerance of the solver
+        :param float rtol: the relative tolerance of the solver
+        """
+        self.name = name
+        self.fmu = fmu
+        self.data = data
+        self.inputs = inputs
+        self.outputs = outputs
+        self.variables = variables
+        self.parameters = parameters
+        self.values = values
+        self.start = pd.to_datetime(start, unit = "s", utc = True)
+        self.stop = pd.to_datetime(stop, unit = "s", utc = True) if stop is not None else None
+        self.atol = atol
+        self.rtol = rtol
+
+    def load(self):
+        """
+        This method loads the FMU.
+
+        :return: the model
+        :rtype: estimationpy.fmu_utils.model.Model
+        """
+        return Model(self.fmu, atol = self.atol, rtol = self.rtol)
+
+    def configure(self, m):
+        """
+        This method associates the data to the inputs and outputs of the model, and
+        selects the variables to estimate.
+
+        :param estimationpy.fmu_utils.model.Model m: the model
+
+        :return: the model
+        :rtype: estimationpy.fmu_utils.model.Model
+        """
+        for name, column in self.inputs:
+            inp = m.get_input_by_name(name)
+            inp.get_csv_reader().open_csv(self.data)
+            inp.get_csv_reader().set_selected_column(column)
+
+        for name, column, cov in self.outputs:
+            out = m.get_output_by_name(name)
+            out.get_csv_reader().open_csv(self.data)
+            out.get_csv_reader().set_selected_column(column)
+            out.set_measured_output()
+            out.set_covariance(cov)
+
+        for add, get, variables in [(m.add_variable, m.get_variables, self.variables), (m.add_parameter, m.get_parameters, self.parameters)]:
+            for name, init, cov, low, high in variables:
+                add(m.get_variable_object(name))
+                var = get()[-1]
+                var.set_initial_value(init)
+                var.set_covariance(cov)
+                if low is not None:
+                    var.set_min_value(low)
+                    var.set_constraint_low(True)
+                if high is not None:
+                    var.set_max_value(high)
+                    var.set_constraint_high(True)
+
+        for name, value in self.values:
+            m.set_real(m.get_variable_object(name), value)
+        return m
+
+    def build(self):
+        """
+        This method loads the FMU, configures it and initializes the simulator.
+
+        :return: the model ready to be simulated
+        :rtype: estimationpy.fmu_utils.model.Model
+        """
+        m = self.configure(self.load())
+        m.initialize_simulator()
+        return m
+
+def get_cases():
+    """
+    This function returns the models used by the benchmarks.
+
+    :return: the list of models
+    :rtype: list
+    """
+    is_32bit = platform.architecture()[0] == "32bit"
+    return [
+        ModelCase("first_order", fmu_path("FirstOrder.fmu" if is_32bit else "FirstOrder_64bit.fmu"), data_path("NoisySimulationData_FirstOrder.csv"),
+                  inputs = [("u", "system.u")], outputs = [("y", "system.y", 2.0)], variables = [("x", 1.5, 0.5, 0.0, None)],
+                  values = [("a", -0.90717055), ("b", 2.28096907), ("c", 3.01419707), ("d", 0.06112703)], stop = 30.0),
+        ModelCase("valve_stuck", fmu_path("ValveStuck.fmu"), data_path("NoisyData_ValveStuck.csv"),
+                  inputs = [("dp", "valveStuck.dp"), ("cmd", "valveStuck.cmd"), ("T_in", "valveStuck.T_in")],
+                  outputs = [("m_flow", "valveStuck.m_flow", 0.05)], variables = [("command.y", 1.0, 0.05, 0.0, 1.0)],
+                  parameters = [("lambda", 0.0, 0.0007, -0.005, 0.025)], values = [("use_cmd", 0.0), ("lambda", 0.0)],
+                  stop = 360.0, atol = 1e-5, rtol = 1e-6),
+        ModelCase("heat_exchanger", fmu_path("HeatExchanger.fmu"), data_path("NoisySimulationData_HeatExchanger.csv"),
+                  inputs = [("mFlow_cold", "heatExchanger.mFlow_COLD"), ("mFlow_hot", "heatExchanger.mFlow_HOT"),
+                            ("T_hot", "heatExchanger.Thot_IN"), ("T_cold", "heatExchanger.Tcold_IN")],
+                  outputs = [("Tcold_OUT", "heatExchanger.Tcold_OUT", 1.0), ("Thot_OUT", "heatExchanger.Thot_OUT", 1.0)],
+                  variables = [("metal.T", 310.15, 1.5, 273.15, None)],
+                  parameters = [("G_hot", 1000.0, 50.0, 50.0, None), ("G_cold", 1000.0, 50.0, 50.0, None)],
+                  stop = 200.0, atol = 1e-5, rtol = 1e-6),
+        ModelCase("pump", fmu_path("Pump_MBL3.fmu"), data_path("DataPumpShort.csv"),
+                  inputs = [("Nrpm", "Pump.Speed")], outputs = [("P_el", "Pump.kW", 0.15)],
+                  parameters = [("pump.power.P[{0}]".format(i + 1), v, 0.005, 0.0, 1.0) for i, v in enumerate([0.28538255, 0.50017618, 0.71668581, 1.0])],
+                  stop = 3600.0, atol = 1e-4, rtol = 1e-3),
+        # The data used by the examples of the chiller is not bundled, only the load is measured
+        ModelCase("chiller", fmu_path("ChillerFDD.fmu" if is_32bit else "ChillerFDD_cop_64bit.fmu")),
+    ]
+
+def run(suite, cases = None, processes = None, smoother = True):
+    """
+    This function runs the benchmarks of the models. For each model the benchmarks measure
+
+    * ``load``, loading the FMU,
+    * ``initialize_simulator``, initializing the simulator after the model has been configured,
+    * ``simulate``, a single simulation over the period,
+    * ``pool_run``, running :math:`2N+1` simulations over the period with an
+      :class:`estimationpy.fmu_utils.fmu_pool.FmuPool`, where :math:`N` is the number of
+      variables estimated,
+    * ``filter``, the UKF over the period,
+    * ``filter_and_smooth``, the UKF and the smoother over the period.
+
+    :param benchmarks.harness.BenchmarkSuite suite: the suite that runs the benchmarks
+    :param list cases: the names of the models to use, if None all of them are used
+    :param int processes: the number of processes used by the pool and by the UKF, if None the processors
+      available minus one, see :func:`estimationpy.fmu_utils.affinity.get_default_processes`
+    :param bool smoother: flag that indicates if the smoother is measured
+
+    :rtype: None
+    """
+    if processes is None:
+        processes = affinity.get_default_processes()
+
+    for case in get_cases():
+        if cases is not None and case.name not in cases:
+            continue
+
+        if not os.path.exists(case.fmu):
+            suite.skip(case.name + ".load", "The FMU {0} does not exist".format(case.fmu))
+            continue
+
+        suite.run(case.name + ".load", case.load)
+        if case.data is None:
+            suite.skip(case.name, "The data of the model is not available")
+            continue
+
+        info = {"processes": processes}
+        suite.run(case.name + ".initialize_simulator", lambda m: m.initialize_simulator(), lambda: (case.configure(case.load()),))
+        suite.run(case.name + ".simulate", lambda m: m.simulate(start_time = case.start, final_time = case.stop), lambda: (case.build(),))
+
+        def pool_values(m):
+            n = m.get_num_variables() + m.get_num_parameters()
+            v = {"state": m.get_state_observed_values(), "parameters": m.get_parameter_values()}
+            return [v]*(2*n + 1)
+
+        def pool_setup():
+            m = case.build()
+            return FmuPool(m, processes = processes), pool_values(m)
+
+        suite.run(case.name + ".pool_run", lambda pool, values: pool.run(values, start = case.start, stop = case.stop), pool_setup, **info)
+        suite.run(case.name + ".filter", lambda ukf: ukf.filter(start = case.start, stop = case.stop), \
+                  lambda: (UkfFmu(case.build(), n_proc = processes),), **info)
+        if smoother:
+            suite.run(case.name + ".filter_and_smooth", lambda ukf: ukf.filter_and_smooth(start = case.start, stop = case.stop), \
+                      lambda: (UkfFmu(case.build(), n_proc = processes),), **info)
@@ -0,0 +1,88 @@
+'''
+@author: Marco Bonvini
+
+Script that runs the benchmarks of estimationpy and saves the results as JSON.
+
+Run all the benchmarks and save the results::
+
+    python benchmarks/run_benchmarks.py -o results.json
+
+Run the benchmarks and compare them with a baseline, the script exits with an
+error if some of the benchmarks are slower than the baseline by more than the tolerance::
+
+    python benchmarks/run_benchmarks.py -o results.json --baseline baseline.json --tolerance 0.2
+
+Compare two files saved previously::
+
+    python benchmarks/run_benchmarks.py --compare baseline.json results.json
+
+'''
+import argparse
+import os
+import sys
+
+# The benchmarks use the estimationpy package contained in the repository
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import logging
+from estimationpy.fmu_utils import estimationpy_logging
+from estimationpy.fmu_utils import affinity
+
+import harness
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Run the benchmarks of estimationpy")
+    parser.add_argument("-o", "--output", default = None, help = "path of the JSON file where the results are saved")
+    parser.add_argument("--baseline", default = None, help = "path of the JSON file used as baseline")
+    parser.add_argument("--compare", nargs = 2, metavar = ("BASELINE", "CURRENT"), default = None,
+                        help = "compare two JSON files without running the benchmarks")
+    parser.add_argument("--tolerance", type = float, default = 0.1, help = "relative tolerance used by the comparison (default 0.1)")
+    parser.add_argument("--statistic", default = "median", choices = ["min", "median", "mean"], help = "statistic compared (default median)")
+    parser.add_argument("--repeat", type = int, default = 3, help = "number of repetitions of each benchmark (default 3)")
+    parser.add_argument("--cases", nargs = "+", default = None, help = "names of the models to use (default all)")
+    parser.add_argument("--kernels-only", action = "store_true", help = "run only the benchmarks of the linear algebra kernels")
+    parser.add_argument("--no-kernels", action = "store_true", help = "don't run the benchmarks of the linear algebra kernels")
+    parser.add_argument("--no-smoother", action = "store_true", help = "don't run the benchmarks of the smoother")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [4, 16, 64], help = "sizes of the linear algebra kernels")
+    parser.add_argument("--processes", type = int, default = affinity.get_default_processes(),
+                        help = "number of processes used by the pool and by the UKF (default the processors available minus one)")
+    return parser.parse_args(argv)
+
+def report(current, baseline, tolerance, statistic):
+    """
+    Prints the comparison and returns the number of regressions.
+    """
+    rows = harness.compare(current, baseline, tolerance, statistic)
+    print(harness.format_comparison(rows))
+    regressions = [r[0] for r in rows if r[4] == "regression"]
+    if len(regressions) > 0:
+        print("{0} benchmarks are slower than the baseline: {1}".format(len(regressions), ", ".join(regressions)))
+    return len(regressions)
+
+def main(argv = None):
+    args = parse_args(argv)
+    estimationpy_logging.configure_logger(log_level_console = logging.ERROR, log_file = None)
+
+    if args.compare is not None:
+        return 1 if report(harness.load(args.compare[1]), harness.load(args.compare[0]), args.tolerance, args.statistic) > 0 else 0
+
+    suite = harness.BenchmarkSuite(repeat = args.repeat)
+    if not args.no_kernels:
+        import kernels
+        kernels.run(suite, sizes = args.sizes)
+    if not args.kernels_only:
+        import models
+        models.run(suite, cases = args.cases, processes = args.processes, smoother = not args.no_smoother)
+
+    if args.output is not None:
+        suite.save(args.output)
+        print("Results saved in {0}".format(args.output))
+
+    if args.baseline is not None:
+        return 1 if report(suite.to_dict(), harness.load(args.baseline), args.tolerance, args.statistic) > 0 else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -67,12 +67,15 @@ def main():
 
     BXL = pytz.timezone("Europe/Brussels")
     df_data = pd.read_csv(path_monitoring_data, index_col=0, header=0, parse_dates=True)
-    df_data = df_data.resample('900S')
     
     # Link the columns of the CSV file to the inputs
     for n in ["Q_HP1", "Q_HP2", "Q_GB", "TAmb", "I_GloHor_sat", "powEle", "QCon", "prfOcc", "prfVen"]:
         input = m.get_input_by_name(n)
         input.set_data_series(df_data[n])
+    
+    # Resample all the inputs every 15 minutes
+    ratio = m.resample_data(step = 900)
+    print("The compression ratio of the input data is {0:.2f}".format(ratio))
 
     # Initialize the model for the simulation
     m.initialize_simulator()
@@ -11,13 +11,11 @@ import matplotlib.pyplot as plt
 from estimationpy.fmu_utils.fmu_pool import FmuPool
 from estimationpy.fmu_utils.model import Model
 
-import multiprocessing
-
 import logging
 from estimationpy.fmu_utils import estimationpy_logging
 estimationpy_logging.configure_logger(log_level = logging.DEBUG, log_level_console = logging.INFO, log_level_file = logging.DEBUG)
 
-def main(n_proc = multiprocessing.cpu_count()-1):
+def main(n_proc = None):
 
     # Initialize the FMU model empty
     m = Model()
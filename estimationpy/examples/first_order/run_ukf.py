@@ -12,7 +12,7 @@ import matplotlib.pyplot as plt
 
 from estimationpy.fmu_utils.model import Model
 from estimationpy.fmu_utils import csv_reader
-from estimationpy.ukf.ukf_fmu import UkfFmu
+from estimationpy.ukf.ukf_fmu import UkfFmu, print_progress
 
 import logging
 from estimationpy.fmu_utils import estimationpy_logging
@@ -78,6 +78,7 @@ def main():
     
     # instantiate the UKF for the FMU
     ukf_FMU = UkfFmu(m)
+    ukf_FMU.set_progress_callback(print_progress)
     
     # Start the filter
     t0 = pd.to_datetime(0.0, unit = "s", utc = True)
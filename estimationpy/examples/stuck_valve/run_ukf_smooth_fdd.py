@@ -16,7 +16,7 @@ from pylab import figure
 
 from estimationpy.fmu_utils.model import Model
 from estimationpy.fmu_utils import csv_reader
-from estimationpy.ukf.ukf_fmu import UkfFmu
+from estimationpy.ukf.ukf_fmu import UkfFmu, print_progress
 
 import matplotlib.dates as mdates
 
@@ -103,6 +103,7 @@ def main():
     #################################################################
     # Instantiate the UKF for the FMU model
     ukf_FMU = UkfFmu(m)
+    ukf_FMU.set_progress_callback(print_progress)
     
     # Start filter
     t0 = pd.to_datetime(0.0, unit = "s", utc = True)
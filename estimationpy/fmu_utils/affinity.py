@@ -0,0 +1,190 @@
+'''
+@author: Marco Bonvini
+
+This module contains the functions that size the pool of processes according to the
+processors that are actually available, and that configure the processes running the
+simulations:
+
+* :func:`get_available_cpus` returns the number of processors the current process can use,
+  considering both its CPU affinity (see :func:`os.sched_getaffinity`) and the CPU quota of
+  its control group, e.g., when it runs in a Docker container started with ``--cpus``,
+* :func:`get_default_processes` returns the default number of processes of the pool,
+* :func:`configure_worker` pins a process to a processor and limits the number of threads
+  used by the numerical libraries (BLAS, OpenMP) in the process.
+
+The processes of the pool run one simulation each, therefore if the numerical libraries
+start their own threads the processors are oversubscribed. By default the processes of the pool
+use a single thread, while the process that owns the pool is not modified and its linear
+algebra can use multiple threads.
+
+**NOTE**
+    The processes of the pool are copies of the process that owns it, therefore the numerical
+    libraries are already loaded when they start (e.g., the BLAS used by numpy) and the environment
+    variables in :data:`THREADS_VARIABLES` have no effect on them. Their number of threads is limited
+    only if the optional package `threadpoolctl <https://github.com/joblib/threadpoolctl>`_ is installed,
+    e.g., with ``pip install estimationpy[threads]``, otherwise a warning is logged by
+    :func:`check_threadpoolctl`.
+'''
+import math
+import multiprocessing
+import os
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Environment variables that define the number of threads of the numerical libraries
+THREADS_VARIABLES = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                     "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+# Flag that indicates if the warning about threadpoolctl has been logged
+threadpoolctl_warned = False
+
+def get_affinity():
+    """
+    This function returns the processors where the current process can run.
+
+    :return: the sorted list of the indexes of the processors
+    :rtype: list
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(multiprocessing.cpu_count()))
+
+def get_cpu_quota(root = "/sys/fs/cgroup"):
+    """
+    This function returns the CPU quota of the control group of the current process,
+    i.e., the number of processors it can use on average. Both the version 2
+    (file ``cpu.max``) and the version 1 (files ``cpu.cfs_quota_us`` and ``cpu.cfs_period_us``)
+    of the control groups are supported.
+
+    :param string root: the folder where the control groups are mounted
+
+    :return: the number of processors, or None if there is no quota or it can't be read
+    :rtype: float
+    """
+    try:
+        path = os.path.join(root, "cpu.max")
+        if os.path.exists(path):
+            with open(path) as f:
+                quota, period = f.read().split()[:2]
+            if quota == "max":
+                return None
+            return float(quota)/float(period)
+
+        for folder in ["cpu", "cpu,cpuacct", "cpuacct,cpu"]:
+            path = os.path.join(root, folder, "cpu.cfs_quota_us")
+            if os.path.exists(path):
+                with open(path) as f:
+                    quota = float(f.read())
+                with open(os.path.join(root, folder, "cpu.cfs_period_us")) as f:
+                    period = float(f.read())
+                if quota <= 0 or period <= 0:
+                    return None
+                return quota/period
+    except (IOError, OSError, ValueError) as e:
+        logger.warning("Impossible to read the CPU quota: %s", e)
+    return None
+
+def get_available_cpus(root = "/sys/fs/cgroup"):
+    """
+    This function returns the number of processors available to the current process,
+    i.e., the number of processors in its affinity mask limited by the CPU quota of its control group,
+    see :func:`get_affinity` and :func:`get_cpu_quota`. A fractional quota is rounded up.
+
+    :param string root: the folder where the control groups are mounted
+
+    :return: the number of processors, at least 1
+    :rtype: int
+    """
+    n = len(get_affinity())
+    quota = get_cpu_quota(root)
+    if quota is not None:
+        n = min(n, int(math.ceil(quota)))
+    return max(1, n)
+
+def get_default_processes():
+    """
+    This function returns the default number of processes used to run the simulations, that is
+    the number of processors available (see :func:`get_available_cpus`) minus one, that is left to the
+    process that owns the pool.
+
+    :return: the number of processes, at least 1
+    :rtype: int
+    """
+    return max(1, get_available_cpus() - 1)
+
+def limit_threads(threads = 1):
+    """
+    This function limits the number of threads used by the numerical libraries in the
+    current process. The environment variables in :data:`THREADS_VARIABLES` are set, and they're
+    used by the libraries loaded after calling the function and by the processes started by
+    the current one. If the package threadpoolctl is available, the limit is also applied to
+    the libraries already loaded, e.g., the BLAS used by numpy.
+
+    :param int threads: the number of threads
+
+    :rtype: None
+    """
+    for name in THREADS_VARIABLES:
+        os.environ[name] = str(threads)
+
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        logger.debug("threadpoolctl is not available, the number of threads of the libraries already loaded is not modified")
+        return
+    threadpool_limits(limits = threads)
+
+def check_threadpoolctl():
+    """
+    This function checks if the package threadpoolctl is available, otherwise it logs a warning
+    the first time it's called, since the number of threads of the libraries already loaded by the
+    processes that run the simulations can't be limited (see :func:`limit_threads`). The function is
+    called by the process that owns the pool before starting the other processes.
+
+    :return: True if the package is available, False otherwise
+    :rtype: bool
+    """
+    global threadpoolctl_warned
+    try:
+        import threadpoolctl
+    except ImportError:
+        if not threadpoolctl_warned:
+            logger.warning("threadpoolctl is not available, the number of threads of the numerical libraries already " \
+                           "loaded by the processes that run the simulations is not limited. Install it with pip install threadpoolctl")
+            threadpoolctl_warned = True
+        return False
+    return True
+
+def pin_process(cpus):
+    """
+    This function restricts the current process to run on the processors specified.
+    The function does nothing if the platform doesn't support it.
+
+    :param list cpus: the indexes of the processors
+
+    :rtype: None
+    """
+    if not hasattr(os, "sched_setaffinity"):
+        logger.debug("The platform does not support the CPU affinity")
+        return
+    try:
+        os.sched_setaffinity(0, cpus)
+    except (OSError, ValueError) as e:
+        logger.warning("Impossible to pin the process with PID = %s to the processors %s: %s", os.getpid(), cpus, e)
+
+def configure_worker(cpu = None, threads = None):
+    """
+    This function configures a process that runs simulations, it's called by the
+    processes of the pool when they start.
+
+    :param int cpu: the processor where the process runs, if None the affinity is not modified
+    :param int threads: the number of threads of the numerical libraries, if None the number
+      is not modified
+
+    :rtype: None
+    """
+    if cpu is not None:
+        pin_process([cpu])
+    if threads is not None:
+        limit_threads(threads)
@@ -0,0 +1,288 @@
+'''
+@author: Marco Bonvini
+
+This module contains the classes that represent the square root :math:`S` of a
+covariance matrix :math:`C = S S^T` while preserving its structure. The structure is
+used by the filter to avoid operating on dense matrices that are mostly zero.
+The classes are
+
+* :class:`DiagonalCovariance`, the square root is a diagonal matrix stored as a vector,
+* :class:`BlockDiagonalCovariance`, the square root is a block diagonal matrix stored as a list of blocks,
+* :class:`DenseCovariance`, the square root is a full matrix.
+
+All the classes can be converted to a **numpy.ndarray** with :func:`numpy.asarray`.
+
+'''
+import numpy
+
+import logging
+logger = logging.getLogger(__name__)
+
+class Covariance(object):
+    """
+    Base class of the structured square root covariance matrices.
+    The derived classes implement :func:`to_dense`, :func:`scale` and :func:`triangular_rows`.
+    """
+
+    def __init__(self, size):
+        """
+        Constructor of the class.
+
+        :param int size: the number of rows and columns of the matrix
+        """
+        self.size = size
+        self.dense = None
+        self.rows = None
+
+    @property
+    def shape(self):
+        """
+        The shape of the matrix.
+        """
+        return (self.size, self.size)
+
+    def __array__(self, dtype = None, copy = None):
+        """
+        This method converts the object to a **numpy.ndarray**, it is called by
+        numpy functions such as :func:`numpy.asarray` and :func:`numpy.dot`.
+
+        :return: the dense matrix
+        :rtype: numpy.ndarray
+        """
+        dense = self.to_dense()
+        if dtype is not None:
+            return dense.astype(dtype)
+        return dense
+
+    def to_dense(self):
+        """
+        This method returns the square root as a dense matrix. The matrix is read-only
+        and it is computed only once.
+
+        :return: the dense matrix
+        :rtype: numpy.ndarray
+        """
+        if self.dense is None:
+            self.dense = self.__build_dense__()
+            self.dense.flags.writeable = False
+        return self.dense
+
+    def scale(self, factor):
+        """
+        This method returns a new object with the same structure, multiplied by
+        a scalar factor.
+
+        :param float factor: the factor
+
+        :return: the new object
+        :rtype: estimationpy.fmu_utils.covariance.Covariance
+        """
+        raise NotImplementedError
+
+    def triangular_rows(self):
+        """
+        This method returns the non zero rows of an upper triangular matrix :math:`T` such that
+        :math:`T^T T = S S^T`. The rows can be stacked below other rows before a QR factorization,
+        instead of the dense matrix :math:`S^T`. The matrix is read-only and it is computed only once.
+
+        :return: the rows of the triangular matrix, one column for each row of :math:`S`
+        :rtype: numpy.ndarray
+        """
+        if self.rows is None:
+            self.rows = self.__build_rows__()
+            self.rows.flags.writeable = False
+        return self.rows
+
+    def __build_rows__(self):
+        """
+        Internal method that creates the rows of the triangular matrix.
+
+        :return: the rows of the triangular matrix
+        :rtype: numpy.ndarray
+        """
+        raise NotImplementedError
+
+    def __build_dense__(self):
+        """
+        Internal method that creates the dense matrix.
+
+        :return: the dense matrix
+        :rtype: numpy.ndarray
+        """
+        raise NotImplementedError
+
+
+class DiagonalCovariance(Covariance):
+    """
+    This class represents a diagonal square root covariance matrix.
+    """
+
+    def __init__(self, diagonal):
+        """
+        Constructor of the class.
+
+        :param numpy.array diagonal: the elements of the diagonal
+        """
+        self.diagonal = numpy.array(diagonal, dtype = float).ravel()
+        super(DiagonalCovariance, self).__init__(len(self.diagonal))
+
+    def scale(self, factor):
+        """
+        This method returns a new diagonal covariance, multiplied by a scalar factor.
+
+        :param float factor: the factor
+
+        :return: the new object
+        :rtype: estimationpy.fmu_utils.covariance.DiagonalCovariance
+        """
+        return DiagonalCovariance(factor*self.diagonal)
+
+    def __build_rows__(self):
+        # The triangular matrix is the absolute value of the diagonal, and the zero elements
+        # don't contribute to the covariance
+        i = numpy.nonzero(self.diagonal)[0]
+        rows = numpy.zeros((len(i), self.size))
+        rows[numpy.arange(len(i)), i] = numpy.abs(self.diagonal[i])
+        return rows
+
+    def __build_dense__(self):
+        return numpy.diag(self.diagonal)
+
+
+class BlockDiagonalCovariance(Covariance):
+    """
+    This class represents a block diagonal square root covariance matrix.
+    The blocks are square and they are placed along the diagonal in the
+    order they are provided.
+    """
+
+    def __init__(self, blocks):
+        """
+        Constructor of the class.
+
+        :param list blocks: the blocks, each one is a square matrix or a scalar
+
+        :raises ValueError: if one of the blocks is not square
+        """
+        self.blocks = []
+        self.offsets = []
+        size = 0
+        for b in blocks:
+            b = numpy.atleast_2d(numpy.array(b, dtype = float))
+            if b.ndim != 2 or b.shape[0] != b.shape[1]:
+                raise ValueError("The blocks of the covariance matrix must be square, found {0}".format(b.shape))
+            self.blocks.append(b)
+            self.offsets.append(size)
+            size += b.shape[0]
+        super(BlockDiagonalCovariance, self).__init__(size)
+
+    def scale(self, factor):
+        """
+        This method returns a new block diagonal covariance, multiplied by a scalar factor.
+
+        :param float factor: the factor
+
+        :return: the new object
+        :rtype: estimationpy.fmu_utils.covariance.BlockDiagonalCovariance
+        """
+        return BlockDiagonalCovariance([factor*b for b in self.blocks])
+
+    def __build_rows__(self):
+        # Each block is factorized separately, and the blocks equal to zero are skipped
+        rows = []
+        for o, b in zip(self.offsets, self.blocks):
+            if not numpy.any(b):
+                continue
+            n = b.shape[0]
+            r = numpy.zeros((n, self.size))
+            r[:, o:o+n] = numpy.linalg.qr(b.T, mode = "r")
+            rows.append(r)
+        if len(rows) == 0:
+            return numpy.zeros((0, self.size))
+        return numpy.vstack(rows)
+
+    def __build_dense__(self):
+        dense = numpy.zeros((self.size, self.size))
+        for o, b in zip(self.offsets, self.blocks):
+            n = b.shape[0]
+            dense[o:o+n, o:o+n] = b
+        return dense
+
+
+class DenseCovariance(Covariance):
+    """
+    This class represents a full square root covariance matrix.
+    """
+
+    def __init__(self, matrix):
+        """
+        Constructor of the class.
+
+        :param numpy.ndarray matrix: the square root of the covariance matrix
+
+        :raises ValueError: if the matrix is not square
+        """
+        matrix = numpy.array(matrix, dtype = float)
+        if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+            raise ValueError("The covariance matrix must be square, found {0}".format(matrix.shape))
+        super(DenseCovariance, self).__init__(matrix.shape[0])
+        self.matrix = matrix
+
+    def scale(self, factor):
+        """
+        This method returns a new dense covariance, multiplied by a scalar factor.
+
+        :param float factor: the factor
+
+        :return: the new object
+        :rtype: estimationpy.fmu_utils.covariance.DenseCovariance
+        """
+        return DenseCovariance(factor*self.matrix)
+
+    def __build_rows__(self):
+        return numpy.linalg.qr(self.matrix.T, mode = "r")
+
+    def __build_dense__(self):
+        return self.matrix.copy()
+
+
+def as_covariance(value, detect_diagonal = False):
+    """
+    This function converts a value to an object of type :class:`Covariance`.
+    The value can be
+
+    * an object of type :class:`Covariance`, that is returned unchanged,
+    * a vector, that represents the diagonal,
+    * a list of square matrices or scalars, that represent the blocks of a block diagonal matrix,
+      at least one of them must be a matrix,
+    * a square matrix.
+
+    :param value: the value to convert
+    :param bool detect_diagonal: if True a square matrix that is diagonal is converted
+      to a :class:`DiagonalCovariance`.
+
+    :return: the structured covariance
+    :rtype: estimationpy.fmu_utils.covariance.Covariance
+
+    :raises ValueError: if the value can't be converted
+    """
+    if isinstance(value, Covariance):
+        return value
+
+    # The list represents blocks if any of its elements is a matrix, the others can be scalars
+    if isinstance(value, (list, tuple)) and any([numpy.ndim(v) == 2 for v in value]):
+        return BlockDiagonalCovariance(value)
+
+    matrix = numpy.asarray(value, dtype = float)
+    if matrix.ndim == 1:
+        return DiagonalCovariance(matrix)
+    elif matrix.ndim == 2:
+        if detect_diagonal and matrix.shape[0] == matrix.shape[1]:
+            diagonal = numpy.diag(matrix)
+            if numpy.count_nonzero(matrix) == numpy.count_nonzero(diagonal):
+                return DiagonalCovariance(diagonal)
+        return DenseCovariance(matrix)
+    else:
+        msg = "Impossible to convert an array with {0} dimensions to a covariance matrix".format(matrix.ndim)
+        logger.error(msg)
+        raise ValueError(msg)
@@ -4,9 +4,12 @@
 
 import csv
 import numpy
-import pandas as pd
 
 from estimationpy.fmu_utils import strings
+from estimationpy.fmu_utils.lazy_import import LazyModule
+
+# pandas is imported the first time it's used
+pd = LazyModule("pandas")
 
 import logging
 logger = logging.getLogger(__name__)
@@ -84,18 +87,20 @@ class CsvReader():
         string += "\n-Selected: "+str(self.columnSelected)
         return string
     
-    def __open_csv__(self, csv_file):
+    def __open_csv__(self, csv_file, columns = None):
         """
         This private method is used to open a CSV file given a path name specified by the
         parameter ``csv_file``.
         The method uses the function ``pandas.io.parsers.read_csv`` to open
-        the file.
+        the file. If the names of the columns are known, the parameter ``columns`` 
+        can be used to parse only the time and the columns needed.
         
         **NOTE:**
             The method assumes the first column of the CSV file is time, measured in seconds,
             and UTC referenced.
         
         :param str filename: The path that defines the CSV file to open.
+        :param list(str) columns: The names of the columns to read, if None all the columns are read.
         
         :return: The DataFrame object containing the data of the CSV file.
         :rtype: pandas.DataFrame
@@ -109,8 +114,12 @@ class CsvReader():
         # Open the file passed as parameter.
         # Read the csv file and instantiate the data frame
         try:
-            # Load the data frame
-            df = pd.io.parsers.read_csv(self.filename, dialect = self.dialect)
+            # Load the data frame, the first column (i.e., the time) is always needed
+            if columns is not None and len(self.columnNames) > 0:
+                usecols = [0] + [self.columnNames.index(c) + 1 for c in columns]
+                df = pd.io.parsers.read_csv(self.filename, dialect = self.dialect, usecols = usecols)
+            else:
+                df = pd.io.parsers.read_csv(self.filename, dialect = self.dialect)
                 
             # Use the first column as index of the data frame
             df.set_index(df.columns[0], inplace = True, verify_integrity = True)
@@ -138,8 +147,9 @@ class CsvReader():
         """
         This method open a CSV file given a path name specified by the
         parameter ``filename``.
-        The method uses the underlying method :func:`__open_csv__` to open
-        the file.
+        The method reads only the header and the first row of the file to get the names
+        of the columns, the data is parsed by the methods :func:`get_data_series` and
+        :func:`get_data_matrix` with the underlying method :func:`__open_csv__`.
         
         **NOTE:**
             The method assumes the first column of the CSV file is time, measured in seconds,
@@ -159,25 +169,24 @@ class CsvReader():
         # Reinitialize all
         self.__init__(filename)
         
-        # Open the csv and get the Data frame
-        df = self.__open_csv__(filename)
-        
-        # If the data frame is empty there were problems while loading the file
-        if len(df.index) == 0:
-            msg = "ERROR:: The csv file {0} is not correct, please check it...".format(filename)
+        # Read only the header and the first row, the data is parsed when it's requested
+        # by get_data_series or get_data_matrix
+        try:
+            df = pd.io.parsers.read_csv(self.filename, dialect = self.dialect, nrows = 1)
+        except (IOError, ValueError) as e:
+            msg = "ERROR:: The csv file {0} is not correct, please check it: {1}".format(filename, e)
             logger.error(msg)
             return False
         
-        # Get the column names and then delete the data frame
-        try:
-            self.columnNames = df.columns.tolist()
-            del(df)
-            return True
-        except csv.Error:
+        # If there are no rows or data columns there were problems while loading the file
+        if len(df.index) == 0 or len(df.columns) < 2:
             msg = "ERROR:: The csv file {0} is not correct, please check it...".format(filename)
             logger.error(msg)
-            del(df)
             return False
+        
+        # The first column is the time, it's used as index
+        self.columnNames = df.columns.tolist()[1:]
+        return True
     
     def get_file_name(self):
         """
@@ -305,3 +314,59 @@ class CsvReader():
             msg = "Select a file for the CSV before trying to read it!"
             logger.error(msg)
             return dataSeries
+    
+    def get_data_matrix(self, columns = None):
+        """
+        This method returns the data contained in multiple columns of the CSV file.
+        Differently from :func:`get_data_series`, the file is parsed only once
+        for all the columns and the data is returned as a single matrix that shares the
+        same time index. 
+        
+        Before calling this method make sure the path of the CSV file has been specified.
+        
+        :param list(str) columns: The names of the columns to read. If None, all the
+          columns available are read.
+        
+        :return: A tuple containing the time index and a matrix with one column for each
+            of the columns selected, in the same order. In case the file is not specified, or
+            one of the columns is not available, the method returns an empty index and an
+            empty matrix.
+            
+        :rtype: tuple(pandas.DatetimeIndex, numpy.ndarray)
+        
+        """
+        if columns is None:
+            columns = self.get_column_names()
+        
+        # initialize with empty index and data
+        index = pd.DatetimeIndex([])
+        dataMatrix = numpy.zeros((0, len(columns)))
+        
+        # Check if the file name has been selected
+        if self.filename == None or self.filename == "":
+            msg = "Select a file for the CSV before trying to read it!"
+            logger.error(msg)
+            return index, dataMatrix
+        
+        # Check if the columns are part of the available ones
+        missing = [c for c in columns if c not in self.columnNames]
+        if len(missing) > 0:
+            msg = "The columns selected must be present in the csv file!"
+            msg+= "\nColumns missing: {0}".format(missing)
+            msg+= "\nColumns available: {0}".format(self.columnNames)
+            logger.error(msg)
+            return index, dataMatrix
+        
+        # Open the csv and get the Data frame with just the columns needed
+        df = self.__open_csv__(self.filename, columns)
+        
+        # If the data frame is empty there were problems while loading the file
+        if len(df.index) == 0:
+            msg = "ERROR:: The csv file {0} is not correct, please check it...".format(self.filename)
+            logger.error(msg)
+            return index, dataMatrix
+        
+        # Create a single matrix with all the columns, in the order requested
+        dataMatrix = numpy.ascontiguousarray(df[columns].values, dtype = numpy.float64)
+        
+        return df.index, dataMatrix
@@ -0,0 +1,336 @@
+'''
+@author: Marco Bonvini
+'''
+import itertools
+import numpy
+
+from estimationpy.fmu_utils.lazy_import import LazyModule
+
+# pyfmi is imported the first time it's used
+pyfmi = LazyModule("pyfmi")
+
+import logging
+logger = logging.getLogger(__name__)
+
+def array_property(name):
+    """
+    This function returns a property that gives access to the part of an array
+    of the registry that contains the variables, see :class:`EstimationRegistry`.
+
+    :param string name: the name of the array
+
+    :return: the property
+    :rtype: property
+    """
+    def get(self):
+        return self.buffers[name][:self.size]
+    return property(get, doc = "The array {0} of the variables in the registry".format(name))
+
+class EstimationRegistry(object):
+    """
+    This class stores the attributes of a group of
+    :class:`estimationpy.fmu_utils.estimation_variable.EstimationVariable` objects,
+    e.g., the state variables or the parameters to estimate, as contiguous numpy arrays.
+    The registry contains
+
+    * the value references and the data types of the variables,
+    * the initial values, the minimum and maximum values,
+    * the covariances,
+    * the flags that indicate if the lower and upper constraints are active,
+    * the list of **EstimationVariable** objects, that are views over the arrays.
+
+    Each variable refers to a position (slot) of the arrays. The methods that read
+    the attributes of all the variables, e.g., :func:`get_array` and
+    :func:`get_covariance_matrix`, return read-only arrays that are cached and computed
+    again only after an attribute has been modified.
+
+    The arrays are stored in buffers whose capacity doubles when they're full, therefore
+    adding a variable doesn't copy the arrays every time. The attributes with the names of
+    the arrays (e.g., ``init_values``) are views over the part of the buffers that contains
+    the variables.
+
+    """
+
+    # Fields of the registry that can be modified by the variables
+    FIELDS = ("init_values", "min_values", "max_values", "covariances", "constraint_low", "constraint_high")
+
+    # Data types of the arrays of the registry
+    DTYPES = {"value_references": numpy.int64, "types": numpy.int64, "init_values": numpy.float64,
+              "min_values": numpy.float64, "max_values": numpy.float64, "covariances": numpy.float64,
+              "constraint_low": bool, "constraint_high": bool}
+
+    value_references = array_property("value_references")
+    types = array_property("types")
+    init_values = array_property("init_values")
+    min_values = array_property("min_values")
+    max_values = array_property("max_values")
+    covariances = array_property("covariances")
+    constraint_low = array_property("constraint_low")
+    constraint_high = array_property("constraint_high")
+
+    # Counter shared by all the registries, every modification of a registry
+    # assigns a new version that is unique among all the registries
+    version_counter = itertools.count(1)
+
+    def __init__(self):
+        """
+        Constructor of the class, it creates an empty registry.
+        """
+        self.views = []
+        self.size = 0
+        self.buffers = dict([(name, numpy.zeros(0, dtype = dtype)) for name, dtype in EstimationRegistry.DTYPES.items()])
+
+        # Flag that indicates if all the variables are real, in such a case
+        # they can be read and written with a single call to the FMU
+        self.all_real = True
+
+        # Cached read-only arrays, valid for the current version
+        self.version = next(EstimationRegistry.version_counter)
+        self.cache = {}
+
+    def __len__(self):
+        """
+        This method returns the number of variables in the registry.
+
+        :return: the number of variables
+        :rtype: int
+        """
+        return len(self.views)
+
+    def add(self, view, init_value, min_value, max_value, cov = 1.0, constraint_low = True, constraint_high = True):
+        """
+        This method adds a variable to the registry. The variable is appended at the end
+        of the arrays and its attributes ``registry`` and ``slot`` are updated.
+
+        :param estimationpy.fmu_utils.estimation_variable.EstimationVariable view: the variable to add
+        :param float init_value: the initial value of the variable
+        :param float min_value: the minimum value of the variable
+        :param float max_value: the maximum value of the variable
+        :param float cov: the covariance of the variable
+        :param bool constraint_low: flag that indicates if the lower constraint is active
+        :param bool constraint_high: flag that indicates if the upper constraint is active
+
+        :return: the slot assigned to the variable
+        :rtype: int
+        """
+        # Double the capacity of the buffers when they're full
+        capacity = len(self.buffers["types"])
+        if self.size == capacity:
+            for name, buf in self.buffers.items():
+                new = numpy.zeros(max(4, 2*capacity), dtype = buf.dtype)
+                new[:self.size] = buf[:self.size]
+                self.buffers[name] = new
+
+        i = self.size
+        self.buffers["value_references"][i] = view.value_reference
+        self.buffers["types"][i] = view.type_var
+        self.buffers["init_values"][i] = self.__to_float__(init_value)
+        self.buffers["min_values"][i] = self.__to_float__(min_value)
+        self.buffers["max_values"][i] = self.__to_float__(max_value)
+        self.buffers["covariances"][i] = cov
+        self.buffers["constraint_low"][i] = bool(constraint_low)
+        self.buffers["constraint_high"][i] = bool(constraint_high)
+        self.size += 1
+        self.all_real = self.all_real and bool(view.type_var == pyfmi.fmi.FMI_REAL)
+
+        view.registry = self
+        view.slot = len(self.views)
+        self.views.append(view)
+        self.__modified__()
+        return view.slot
+
+    def remove(self, view):
+        """
+        This method removes a variable from the registry. The slots of the
+        variables that follow are updated, while the variable removed is moved in
+        a new registry that only contains it, therefore it keeps its attributes.
+
+        :param estimationpy.fmu_utils.estimation_variable.EstimationVariable view: the variable to remove
+
+        :rtype: None
+        :raises ValueError: if the variable is not part of the registry
+        """
+        if view.registry is not self:
+            raise ValueError("The variable {0} is not part of the registry".format(view.name))
+
+        i = view.slot
+        values = [getattr(self, field)[i] for field in EstimationRegistry.FIELDS]
+
+        # Shift the values of the variables that follow
+        for buf in self.buffers.values():
+            buf[i:self.size - 1] = buf[i + 1:self.size]
+        self.size -= 1
+        self.all_real = bool(numpy.all(self.types == pyfmi.fmi.FMI_REAL))
+
+        self.views.pop(i)
+        for j in range(i, len(self.views)):
+            self.views[j].slot = j
+        self.__modified__()
+
+        EstimationRegistry().add(view, *values)
+
+    def clear(self):
+        """
+        This method removes all the variables from the registry. The list of views
+        is emptied in place, therefore the references to it remain valid.
+
+        :rtype: None
+        """
+        for view in list(self.views):
+            self.remove(view)
+
+    def copy(self):
+        """
+        This method creates a new registry with a copy of the arrays and of the variables.
+        The new variables refer to the new registry, and they share with the variables
+        of this registry the underlying PyFMI objects.
+
+        :return: the new registry
+        :rtype: estimationpy.fmu_utils.estimation_registry.EstimationRegistry
+        """
+        new = EstimationRegistry()
+        new.size = self.size
+        new.buffers = dict([(name, buf[:self.size].copy()) for name, buf in self.buffers.items()])
+        new.all_real = self.all_real
+
+        for view in self.views:
+            v = view.__class__.__new__(view.__class__)
+            v.__dict__.update(view.__dict__)
+            v.registry = new
+            new.views.append(v)
+        return new
+
+    def get_value(self, field, slot):
+        """
+        This method returns the value of an attribute of a variable.
+
+        :param string field: the name of the attribute, one of ``FIELDS``
+        :param int slot: the slot of the variable
+
+        :return: the value of the attribute
+        :rtype: float, bool
+        """
+        value = getattr(self, field)[slot]
+        if field.startswith("constraint"):
+            return bool(value)
+        return float(value)
+
+    def set_value(self, field, slot, value):
+        """
+        This method sets the value of an attribute of a variable and invalidates
+        the cached arrays.
+
+        :param string field: the name of the attribute, one of ``FIELDS``
+        :param int slot: the slot of the variable
+        :param float value: the new value of the attribute
+
+        :rtype: None
+        """
+        if field.startswith("constraint"):
+            value = bool(value)
+        else:
+            value = self.__to_float__(value)
+        getattr(self, field)[slot] = value
+        self.__modified__()
+
+    def get_array(self, field):
+        """
+        This method returns an array containing an attribute of all the variables,
+        in the same order they have been added. The array is read-only and it is
+        cached until one of the attributes is modified. The flags of the constraints
+        are returned as floats (1.0 if the constraint is active, 0.0 otherwise).
+
+        :param string field: the name of the attribute, one of ``FIELDS``
+
+        :return: the values of the attribute
+        :rtype: numpy.ndarray
+        """
+        array = self.cache.get(field)
+        if array is None:
+            array = getattr(self, field).astype(numpy.float64)
+            array.flags.writeable = False
+            self.cache[field] = array
+        return array
+
+    def get_covariance_matrix(self):
+        """
+        This method returns the diagonal covariance matrix of the variables.
+        The matrix is read-only and it is cached until one of the attributes is modified.
+
+        :return: the covariance matrix
+        :rtype: numpy.ndarray
+        """
+        cov = self.cache.get("covariance_matrix")
+        if cov is None:
+            cov = numpy.diag(self.covariances)
+            cov.flags.writeable = False
+            self.cache["covariance_matrix"] = cov
+        return cov
+
+    def read_values(self, fmu):
+        """
+        This method reads the values of the variables in an FMU. When all the variables
+        are real, the values are read with a single call.
+
+        :param FmuModel fmu: an object representing an FMU model in PyFMI.
+
+        :return: the values of the variables
+        :rtype: numpy.ndarray
+        """
+        if len(self.views) == 0:
+            return numpy.zeros(0)
+        if self.all_real:
+            return numpy.array(fmu.get_real(self.value_references), dtype = float)
+        return numpy.array([v.read_value_in_fmu(fmu) for v in self.views], dtype = float)
+
+    def write_values(self, fmu, values):
+        """
+        This method writes the values of the real variables in an FMU
+        with a single call.
+
+        :param FmuModel fmu: an object representing an FMU model in PyFMI.
+        :param numpy.ndarray values: the values to write, one for each variable
+
+        :rtype: None
+        """
+        if len(self.views) > 0:
+            fmu.set_real(self.value_references, numpy.asarray(values, dtype = float))
+
+    def write_initial_values(self, fmu):
+        """
+        This method writes the initial values of the variables in an FMU. When all
+        the variables are real, the values are written with a single call.
+
+        :param FmuModel fmu: an object representing an FMU model in PyFMI.
+
+        :rtype: None
+        """
+        if self.all_real:
+            self.write_values(fmu, self.init_values)
+        else:
+            for v in self.views:
+                v.modify_initial_value_in_fmu(fmu)
+
+    def __modified__(self):
+        """
+        Internal method called after every modification, it assigns a new version
+        to the registry and invalidates the cached arrays.
+
+        :rtype: None
+        """
+        self.version = next(EstimationRegistry.version_counter)
+        self.cache = {}
+
+    def __to_float__(self, value):
+        """
+        Internal method that converts a value to float, missing values are
+        represented by NaN.
+
+        :param value: the value to convert
+
+        :return: the value converted
+        :rtype: float
+        """
+        if value is None:
+            return numpy.nan
+        return float(value)
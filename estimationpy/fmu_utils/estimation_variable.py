@@ -2,7 +2,12 @@
 @author: Marco Bonvini
 '''
 import numpy
-import pyfmi
+
+from estimationpy.fmu_utils.lazy_import import LazyModule
+from estimationpy.fmu_utils.estimation_registry import EstimationRegistry
+
+# pyfmi is imported the first time it's used
+pyfmi = LazyModule("pyfmi")
 
 import logging
 logger = logging.getLogger(__name__)
@@ -39,9 +44,14 @@ class EstimationVariable(object):
       algorithm. This value is usualy set to impose ad-hoc boundaries to the estimation
       algorithm that may be physically not possible or reasonable.
     
+    The values of these attributes are not stored in the object, but in an
+    :class:`estimationpy.fmu_utils.estimation_registry.EstimationRegistry` that
+    keeps the attributes of a group of variables in contiguous arrays. An
+    :class:`EstimationVariable` is a view over one position (``slot``) of the registry.
+    
     '''
 
-    def __init__(self, fmi_var, fmu):
+    def __init__(self, fmi_var, fmu, registry = None):
         '''
         Constructor of the class. This method takes as arguments
         an **FmiVariable** object and an **FmuModel** object and instantiates
@@ -50,6 +60,9 @@ class EstimationVariable(object):
         :param FmiVariable fmi_var: an object representing a variable of an FMU model
           in PyFMI.
         :param FmuModel fmu: an object representing an FMU model in PyFMI.
+        :param estimationpy.fmu_utils.estimation_registry.EstimationRegistry registry: the registry
+          where the attributes of the variable are stored. If None, the variable uses a new
+          registry that only contains it.
         
         :raise TypeError: the method raises a ``TypeError`` if the start value of the
           variable is either missing or equal to ``None``.
@@ -79,19 +92,79 @@ class EstimationVariable(object):
                 logger.info("Start value is different from value read")
                 logger.info("Value read  = {0}".format(value[0]))
                 logger.info("Start value = {0}".format(start))
-                self.initValue = start
-            else:
-                self.initValue = start
         except TypeError:
             logger.exception("Missing start value (equal to None)")
-            self.initValue = start
-        
-        # Set the attributes of the object
-        self.minValue = min
-        self.maxValue = max
-        self.cov = 1.0
-        self.constraintLow = True
-        self.constraintHigh = True
+        
+        # Store the attributes of the object in the registry
+        if registry is None:
+            registry = EstimationRegistry()
+        registry.add(self, start, min, max)
+    
+    @property
+    def initValue(self):
+        """
+        The initial value of the variable, stored in the registry.
+        """
+        return self.registry.get_value("init_values", self.slot)
+    
+    @initValue.setter
+    def initValue(self, value):
+        self.registry.set_value("init_values", self.slot, value)
+    
+    @property
+    def minValue(self):
+        """
+        The minimum value of the variable, stored in the registry.
+        """
+        return self.registry.get_value("min_values", self.slot)
+    
+    @minValue.setter
+    def minValue(self, value):
+        self.registry.set_value("min_values", self.slot, value)
+    
+    @property
+    def maxValue(self):
+        """
+        The maximum value of the variable, stored in the registry.
+        """
+        return self.registry.get_value("max_values", self.slot)
+    
+    @maxValue.setter
+    def maxValue(self, value):
+        self.registry.set_value("max_values", self.slot, value)
+    
+    @property
+    def cov(self):
+        """
+        The covariance of the variable, stored in the registry.
+        """
+        return self.registry.get_value("covariances", self.slot)
+    
+    @cov.setter
+    def cov(self, value):
+        self.registry.set_value("covariances", self.slot, value)
+    
+    @property
+    def constraintLow(self):
+        """
+        The flag that indicates if the lower constraint is active, stored in the registry.
+        """
+        return self.registry.get_value("constraint_low", self.slot)
+    
+    @constraintLow.setter
+    def constraintLow(self, value):
+        self.registry.set_value("constraint_low", self.slot, value)
+    
+    @property
+    def constraintHigh(self):
+        """
+        The flag that indicates if the upper constraint is active, stored in the registry.
+        """
+        return self.registry.get_value("constraint_high", self.slot)
+    
+    @constraintHigh.setter
+    def constraintHigh(self, value):
+        self.registry.set_value("constraint_high", self.slot, value)
     
     def modify_initial_value_in_fmu(self, fmu):
         """
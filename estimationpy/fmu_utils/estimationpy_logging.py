@@ -46,8 +46,8 @@ import logging
 import os
 from logging.config import dictConfig
 
-def configure_logger(log_level = logging.DEBUG, log_level_console = logging.ERROR, \
-                     log_level_file = logging.WARNING):
+def configure_logger(log_level = None, log_level_console = logging.ERROR, \
+                     log_level_file = logging.WARNING, log_file = "estimationpy.log"):
     """
     The functions allows to configure some of the properties of the logging mechanism
     used by estimationpy. In particular the function allows to specify the log levels
@@ -56,7 +56,8 @@ def configure_logger(log_level = logging.DEBUG, log_level_console = logging.ERRO
     The levels can be defined using integers from 0 to 50, but one should used the
     predefined levels provided by the standard logging module.
     By default the console logs in ERROR mode, the file logs in WARNING mode and the overall
-    logger in ERROR mode.
+    logger uses the lowest of the two levels, i.e., WARNING. In this way the messages that none
+    of the handlers would write are discarded immediately, without formatting them.
     See  `Python logging <http://docs.python-guide.org/en/latest/writing/logging/>`_ 
     and `Logging HOWTO <https://docs.python.org/2/howto/logging.html>`_ for more 
     information about the logging module.
@@ -83,10 +84,15 @@ def configure_logger(log_level = logging.DEBUG, log_level_console = logging.ERRO
     implicitly prevent any log message with level lower than ERROR to be displayed or saved
     in the log file.
     
-    :param int log_level: Logging level for the whole package
+    :param int log_level: Logging level for the whole package, if None the lowest level
+      of the handlers is used
     :param int log_level_console: Logging level specific for the messages on the console
     :param int log_level_file: Logging level specific for the messages in the log file
+    :param string log_file: name of the log file, created in the local directory. If None
+      the messages are not written in a file.
     """
+    if log_level is None:
+        log_level = log_level_console if log_file is None else min(log_level_console, log_level_file)
 
     # Dictionary with details about the loggers
     logging_config = dict(
@@ -101,23 +107,27 @@ def configure_logger(log_level = logging.DEBUG, log_level_console = logging.ERRO
                 'formatter': 'f',
                 'level': log_level_console
             },
-            'file': {
-                'class': 'logging.handlers.RotatingFileHandler',
-                'formatter': 'f',
-                'level': log_level_file,
-                'backupCount':0,
-                'maxBytes': 1024*1024*5,
-                'filename': os.path.join(os.path.abspath(os.curdir), "estimationpy.log")
-            }
         },
         loggers = {
             'estimationpy': {
-                'handlers': ['console', 'file'],
+                'handlers': ['console'],
                 'level': log_level
             }
         }
     )
     
+    # Add the handler for the log file
+    if log_file is not None:
+        logging_config['handlers']['file'] = {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'formatter': 'f',
+            'level': log_level_file,
+            'backupCount':0,
+            'maxBytes': 1024*1024*5,
+            'filename': os.path.join(os.path.abspath(os.curdir), log_file)
+        }
+        logging_config['loggers']['estimationpy']['handlers'].append('file')
+    
     # Configure the logger
     dictConfig(logging_config)
 
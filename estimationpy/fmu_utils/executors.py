@@ -0,0 +1,364 @@
+'''
+@author: Marco Bonvini
+
+This module contains the executors used by :class:`estimationpy.fmu_utils.fmu_pool.FmuPool`
+to run the simulations requested by :func:`estimationpy.fmu_utils.fmu_pool.FmuPool.run`:
+
+* :class:`LocalExecutor` runs the simulations with processes on the machine that owns the pool,
+  this is the default,
+* :class:`RemoteExecutor` sends the simulations to remote workers over TCP connections. Each remote
+  worker is a process that holds a preloaded FMU, configured with the same inputs, states and
+  parameters to estimate of the model of the pool, and it receives only the values of the states and
+  parameters and the simulation period of each simulation.
+
+A remote worker is started on each node with :func:`serve`, after configuring the model
+as usual::
+
+    m = Model(fmu_path)
+    # ... associate the data to the inputs, select the states and parameters to estimate
+    m.initialize_simulator()
+    serve(m, address = ("0.0.0.0", 6000), authkey = b"secret")
+
+and the pool uses them with::
+
+    executor = RemoteExecutor([("node1", 6000), ("node2", 6000)], authkey = b"secret")
+    pool = FmuPool(m, executor = executor)
+
+The workers can be executed on the local machine with :func:`start_workers`, e.g., for testing.
+
+**NOTE**
+    The messages are serialized with pickle, therefore the workers must be reachable only by
+    trusted clients. The connections are authenticated with the key ``authkey``, that
+    is mandatory, and they are not encrypted.
+'''
+import os
+import socket
+import time
+
+from multiprocessing import Process, Queue
+from multiprocessing.connection import Listener, Client, wait
+
+import estimationpy.fmu_utils.fmu_pool as fmu_pool
+
+import logging
+logger = logging.getLogger(__name__)
+
+class Executor(object):
+    """
+    This class defines the interface of the executors used by the pool.
+    """
+
+    def run(self, pool, values, start, stop, tolerance_factor, workWithFiles):
+        """
+        This method runs the simulations. The simulations should be started in the
+        order returned by :func:`estimationpy.fmu_utils.fmu_pool.FmuPool.get_dispatch_order`.
+
+        :param estimationpy.fmu_utils.fmu_pool.FmuPool pool: the pool that requests the simulations
+        :param list values: a list of dictionaries that contains the values of the initial states and
+          parameters used in each of the simulations
+        :param datetime.datetime start: the initial time for the simulation
+        :param datetime.datetime stop: the final time for the simulation
+        :param float tolerance_factor: factor that multiplies the tolerances of the solver
+        :param bool workWithFiles: flag that indicates if the model of the pool writes the results
+          to the file system
+
+        :return: a dictionary that contains for the index of each simulation received a list
+          with the results and the statistics, see :func:`estimationpy.fmu_utils.fmu_pool.run_simulation`
+        :rtype: dict
+        """
+        raise NotImplementedError("The method run has to be implemented by the executor")
+
+    def get_slots(self, pool):
+        """
+        This method returns the number of simulations that can run at the same time.
+
+        :param estimationpy.fmu_utils.fmu_pool.FmuPool pool: the pool that uses the executor
+
+        :return: the number of simulations
+        :rtype: int
+        """
+        raise NotImplementedError("The method get_slots has to be implemented by the executor")
+
+    def close(self):
+        """
+        This method releases the resources used by the executor. The executor can still
+        be used after calling this method.
+
+        :rtype: None
+        """
+        pass
+
+class LocalExecutor(Executor):
+    """
+    This class runs the simulations with processes on the machine that owns the pool, either
+    a new process for each simulation or persistent workers, see
+    :func:`estimationpy.fmu_utils.fmu_pool.FmuPool.set_persistent_workers`.
+    """
+
+    def run(self, pool, values, start, stop, tolerance_factor, workWithFiles):
+        """
+        This method runs the simulations, see :func:`Executor.run`.
+        """
+        if pool.persistent and pool.N_MAX_PROCESS > 1:
+            return pool.__run_workers__(values, start, stop, tolerance_factor, workWithFiles)
+        return pool.__run_processes__(values, start, stop, tolerance_factor, workWithFiles)
+
+    def get_slots(self, pool):
+        """
+        This method returns the number of processes of the pool, see :func:`Executor.get_slots`.
+        """
+        return pool.N_MAX_PROCESS
+
+class RemoteExecutor(Executor):
+    """
+    This class sends the simulations to remote workers started with :func:`serve`. Each worker
+    runs one simulation at a time, the simulations are assigned to the workers as soon as they
+    are available. The connections are opened by the first call to :func:`run`, and when a worker
+    can't be reached or the connection is lost it's skipped and the executor tries again to
+    connect at the next call. The simulation that was running on a worker whose connection is lost
+    is reported as missing by the pool. A worker serves one executor at a time, the other
+    executors that connect wait until it's available.
+
+    When the connection is opened the executor checks that the worker estimates the same
+    states and parameters of the model of the pool. The tasks sent to the workers are tuples
+    ``("run", index, state, x0, pars, start, stop, tolerance_factor)``, where ``state`` is the
+    entire state vector of the model of the pool, and the workers send back the results as objects
+    of type :class:`estimationpy.fmu_utils.simulation_results.SimulationResults` together with
+    their statistics, that also contain the name of the host.
+    """
+
+    def __init__(self, addresses, authkey):
+        """
+        Constructor of the class.
+
+        :param list addresses: the addresses of the workers, a list of tuples ``(host, port)``
+        :param bytes authkey: the key used to authenticate the connections
+
+        :raises ValueError: if there are no addresses or the key is not specified
+        """
+        if len(addresses) == 0:
+            raise ValueError("The executor needs the address of at least one worker")
+        if not authkey:
+            raise ValueError("The key used to authenticate the connections with the workers is mandatory")
+        self.addresses = [tuple(a) for a in addresses]
+        self.authkey = authkey
+        self.connections = {}
+
+    def __connect__(self, pool):
+        """
+        Internal method that opens the connections with the workers that are not connected.
+
+        :param estimationpy.fmu_utils.fmu_pool.FmuPool pool: the pool that uses the executor
+
+        :rtype: None
+
+        :raises ValueError: if a worker does not estimate the same states and parameters of the model of the pool
+        """
+        expected = {"variables": pool.model.get_variable_names(), "parameters": pool.model.get_parameter_names()}
+        for address in self.addresses:
+            if address in self.connections:
+                continue
+
+            try:
+                conn = Client(address, authkey = self.authkey)
+                conn.send(("info",))
+                info = conn.recv()
+            except Exception as e:
+                logger.warning("Impossible to connect to the worker at %s: %s", address, e)
+                continue
+
+            for key in ["variables", "parameters"]:
+                if list(info[key]) != list(expected[key]):
+                    conn.close()
+                    raise ValueError("The worker at {0} estimates the {1} {2} instead of {3}".format(address, key, info[key], expected[key]))
+
+            self.connections[address] = conn
+            logger.info("Connected to the worker at %s (host %s, PID %s)", address, info["host"], info["pid"])
+
+        if len(self.connections) == 0:
+            logger.error("None of the %s workers is available", len(self.addresses))
+
+    def __disconnect__(self, address):
+        """
+        Internal method that closes the connection with a worker.
+
+        :param tuple address: the address of the worker
+
+        :rtype: None
+        """
+        conn = self.connections.pop(address, None)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def run(self, pool, values, start, stop, tolerance_factor, workWithFiles):
+        """
+        This method sends the simulations to the workers, see :func:`Executor.run`.
+        The result files of the workers are managed by the workers, therefore
+        the flag ``workWithFiles`` is not used.
+        """
+        self.__connect__(pool)
+
+        # The workers start from the state of the model of the pool
+        state = pool.model.get_state()
+
+        N_SIMULATIONS = len(values)
+        order = pool.get_dispatch_order(N_SIMULATIONS)
+        results = {}
+        busy = {}
+        i = 0
+        while (i < N_SIMULATIONS and len(self.connections) > 0) or len(busy) > 0:
+
+            # Assign the simulations to the workers that are not busy
+            for address, conn in list(self.connections.items()):
+                if i == N_SIMULATIONS:
+                    break
+                if address in busy:
+                    continue
+                k = order[i]
+                try:
+                    conn.send(("run", k, state, values[k]["state"], values[k]["parameters"], start, stop, tolerance_factor))
+                    busy[address] = k
+                    i += 1
+                except Exception as e:
+                    logger.warning("Lost the connection with the worker at %s: %s", address, e)
+                    self.__disconnect__(address)
+
+            # Wait for the results of the workers that are busy
+            ready = wait([self.connections[a] for a in busy], timeout = 1.0)
+            for address in list(busy.keys()):
+                conn = self.connections[address]
+                if conn not in ready:
+                    continue
+                try:
+                    index, res, stats = conn.recv()
+                    results[index] = [res, stats]
+                except Exception as e:
+                    logger.warning("Lost the connection with the worker at %s while running the simulation %s: %s", address, busy[address], e)
+                    self.__disconnect__(address)
+                del busy[address]
+
+        if i < N_SIMULATIONS:
+            logger.error("%s simulations have not been run since no worker is available", N_SIMULATIONS - i)
+        return results
+
+    def get_slots(self, pool):
+        """
+        This method returns the number of workers, see :func:`Executor.get_slots`.
+        """
+        return len(self.addresses)
+
+    def close(self):
+        """
+        This method closes the connections with the workers, the workers wait
+        for new connections.
+
+        :rtype: None
+        """
+        for address in list(self.connections.keys()):
+            self.__disconnect__(address)
+
+    def shutdown(self):
+        """
+        This method stops the workers that are connected.
+
+        :rtype: None
+        """
+        for address, conn in list(self.connections.items()):
+            try:
+                conn.send(("shutdown",))
+            except Exception:
+                pass
+            self.__disconnect__(address)
+
+def serve(model, address = ("127.0.0.1", 0), authkey = None, ready = None):
+    """
+    This function runs a worker that executes the simulations sent by a :class:`RemoteExecutor`.
+    The worker accepts one connection at a time, and it runs until it receives the message
+    ``("shutdown",)``. The model must be configured and initialized, and it has to estimate the
+    same states and parameters of the model of the pool that uses the executor.
+
+    :param estimationpy.fmu_utils.model.Model model: the model simulated by the worker
+    :param tuple address: the address ``(host, port)`` where the worker listens, if the port is 0
+      a free port is selected
+    :param bytes authkey: the key used to authenticate the connections
+    :param multiprocessing.Queue ready: a queue where the address of the worker is put when it is
+      ready to accept connections, e.g., to know the port selected. If None the address is only logged.
+
+    :rtype: None
+
+    :raises ValueError: if the key is not specified
+    """
+    if not authkey:
+        raise ValueError("The key used to authenticate the connections is mandatory")
+
+    listener = Listener(tuple(address), authkey = authkey)
+    logger.info("The worker with PID = %s listens at %s", os.getpid(), listener.address)
+    if ready is not None:
+        ready.put(listener.address)
+
+    info = {"host": socket.gethostname(), "pid": os.getpid(), "fmu": model.get_fmu_name(),
+            "variables": model.get_variable_names(), "parameters": model.get_parameter_names()}
+
+    running = True
+    try:
+        while running:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                logger.warning("Refused a connection: %s", e)
+                continue
+
+            try:
+                while True:
+                    message = conn.recv()
+                    if message[0] == "run":
+                        index, state, x0, pars, start, stop, tolerance_factor = message[1:]
+                        model.set_state(state)
+                        results, stats = fmu_pool.run_simulation(model, x0, pars, start, stop, index, lazy = True, tolerance_factor = tolerance_factor)
+                        stats["host"] = info["host"]
+                        conn.send((index, results, stats))
+                    elif message[0] == "info":
+                        conn.send(info)
+                    elif message[0] == "shutdown":
+                        running = False
+                        break
+                    else:
+                        logger.warning("Unknown message %s", message[0])
+            except (EOFError, IOError, OSError):
+                logger.debug("The client disconnected")
+            finally:
+                conn.close()
+    finally:
+        listener.close()
+        logger.info("The worker with PID = %s stopped", os.getpid())
+
+def start_workers(model, processes, authkey, host = "127.0.0.1", timeout = 30.0):
+    """
+    This function starts workers on the local machine, each of them is a copy of the current
+    process that runs :func:`serve` with the model specified. The workers listen on
+    free ports, and they terminate with the current process.
+
+    :param estimationpy.fmu_utils.model.Model model: the model simulated by the workers
+    :param int processes: the number of workers
+    :param bytes authkey: the key used to authenticate the connections
+    :param string host: the address where the workers listen
+    :param float timeout: the time in seconds available to each worker to start
+
+    :return: a tuple that contains the list of processes and the list of their addresses
+    :rtype: tuple
+    """
+    ready = Queue()
+    workers = []
+    for n in range(processes):
+        p = Process(target = serve, args = (model, (host, 0), authkey, ready))
+        p.daemon = True
+        p.start()
+        workers.append(p)
+
+    T0 = time.time()
+    addresses = [ready.get(timeout = timeout) for p in workers]
+    logger.info("Started %s workers in %s [s]", processes, time.time() - T0)
+    return workers, addresses
@@ -0,0 +1,487 @@
+'''
+@author: Marco Bonvini
+
+This module provides an on-disk cache of extracted FMUs. Loading an FMU with
+PyFMI requires to unzip the archive into a temporary folder every time the
+function **pyfmi.load_fmu** is called. When the same FMU is loaded multiple
+times (e.g., by multiple models, multiple processes or multiple jobs) the cache
+allows to extract it only once.
+
+The entries of the cache are identified by the SHA-1 hash of the content of the FMU,
+therefore an FMU that is modified gets a new entry, while the same FMU copied
+in different paths shares the same entry. Each entry is a folder containing the
+extracted FMU, and a JSON file containing the metadata of the entry, e.g.,
+the name and GUID of the model, the size on disk and the time of the last access.
+When the size of the cache exceeds its limit, the entries that have not been used
+for the longest time are removed.
+
+The cache is disabled by default. It can be enabled by setting the environment variable
+``ESTIMATIONPY_FMU_CACHE`` to the path of the folder used by the cache (optionally the
+environment variable ``ESTIMATIONPY_FMU_CACHE_SIZE`` specifies the maximum size in bytes),
+or by calling the function :func:`enable_cache`.
+
+'''
+import os
+import atexit
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import xml.etree.ElementTree as ET
+
+from estimationpy.fmu_utils.lazy_import import LazyModule
+
+# pyfmi is imported the first time it's used
+pyfmi = LazyModule("pyfmi")
+
+import logging
+logger = logging.getLogger(__name__)
+
+CACHE_DIR_ENV = "ESTIMATIONPY_FMU_CACHE"
+"""Name of the environment variable that specifies the folder used by the cache"""
+
+CACHE_SIZE_ENV = "ESTIMATIONPY_FMU_CACHE_SIZE"
+"""Name of the environment variable that specifies the maximum size of the cache in bytes"""
+
+DEFAULT_MAX_SIZE = 1024**3
+"""Default maximum size of the cache in bytes (1 GB)"""
+
+class FmuCache():
+    """
+    This class manages a folder that contains extracted FMUs and their metadata.
+
+    The class has the following attributes
+
+    * ``cache_dir``, the folder that contains the entries of the cache,
+    * ``max_size``, the maximum size of the cache in bytes,
+    * ``stats``, a dictionary that contains the number of hits and misses, and the
+      time spent loading FMUs when they were already extracted (warm) or not (cold).
+
+    """
+
+    def __init__(self, cache_dir = None, max_size = DEFAULT_MAX_SIZE):
+        """
+        Constructor of the class.
+
+        :param string cache_dir: the folder used by the cache. If None, the folder
+          ``estimationpy_fmu_cache`` in the temporary directory of the system is used.
+        :param int max_size: the maximum size of the cache in bytes.
+
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(tempfile.gettempdir(), "estimationpy_fmu_cache")
+
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size = max_size
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        # Hashes of the files already computed by this process, indexed by (path, size, mtime)
+        self.hashes = {}
+
+        self.stats = {"hits": 0, "misses": 0, "cold_load_time": 0.0, "warm_load_time": 0.0, "last_load_time": 0.0}
+
+    def __str__(self):
+        """
+        This method returns a string representation of the cache.
+
+        :return: a String representation of the instance.
+        :rtype: string
+        """
+        string = "FmuCache Object"
+        string += "\n-Folder: "+str(self.cache_dir)
+        string += "\n-Entries: "+str(len(self.get_entries()))
+        string += "\n-Size: "+str(self.get_size())+" / "+str(self.max_size)+" bytes"
+        string += "\n-Hits: "+str(self.stats["hits"])
+        string += "\n-Misses: "+str(self.stats["misses"])
+        return string
+
+    def __hash_file__(self, fmu_file):
+        """
+        This private method computes the SHA-1 hash of the content of a file.
+        The hash is computed only once for each file, unless the file is modified.
+
+        :param string fmu_file: path of the file
+
+        :return: the hexadecimal representation of the hash
+        :rtype: string
+        """
+        st = os.stat(fmu_file)
+        key = (os.path.abspath(fmu_file), st.st_size, st.st_mtime)
+        if key not in self.hashes:
+            sha1 = hashlib.sha1()
+            with open(fmu_file, "rb") as f:
+                for chunk in iter(lambda: f.read(1024*1024), b""):
+                    sha1.update(chunk)
+            self.hashes[key] = sha1.hexdigest()
+        return self.hashes[key]
+
+    def __metadata_path__(self, key):
+        """
+        This private method returns the path of the JSON file that contains the metadata
+        of an entry.
+
+        :param string key: the key of the entry
+
+        :return: the path of the file
+        :rtype: string
+        """
+        return os.path.join(self.cache_dir, key+".json")
+
+    def __read_metadata__(self, key):
+        """
+        This private method reads the metadata of an entry.
+
+        :param string key: the key of the entry
+
+        :return: the metadata, or None if the entry does not exist or is not valid
+        :rtype: dict, None
+        """
+        try:
+            with open(self.__metadata_path__(key), "r") as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def __write_metadata__(self, key, metadata):
+        """
+        This private method writes the metadata of an entry.
+
+        :param string key: the key of the entry
+        :param dict metadata: the metadata to write
+
+        :rtype: None
+        """
+        path = self.__metadata_path__(key)
+        tmp = path+".{0}.tmp".format(os.getpid())
+        with open(tmp, "w") as f:
+            json.dump(metadata, f)
+        os.rename(tmp, path)
+
+    def __extract__(self, fmu_file, key):
+        """
+        This private method extracts an FMU into a new entry of the cache, and
+        reads the metadata of the model from the file modelDescription.xml.
+        The FMU is extracted in a temporary folder that is renamed once the
+        extraction is completed, therefore processes that share the cache never
+        see an entry that is partially extracted.
+
+        :param string fmu_file: path of the FMU
+        :param string key: the key of the entry
+
+        :return: the metadata of the entry
+        :rtype: dict
+
+        :raises ValueError: if the FMU contains files that would be extracted outside
+          the folder of the entry, i.e., with absolute paths or paths that start with ``..``
+        """
+        entryDir = os.path.join(self.cache_dir, key)
+
+        tmpDir = tempfile.mkdtemp(prefix = ".tmp_", dir = self.cache_dir)
+        try:
+            extract_fmu(fmu_file, tmpDir)
+        except Exception:
+            shutil.rmtree(tmpDir, ignore_errors = True)
+            raise
+
+        try:
+            os.rename(tmpDir, entryDir)
+        except OSError:
+            # An other process already created the entry
+            shutil.rmtree(tmpDir, ignore_errors = True)
+
+        # Read the attributes of the model from the model description
+        root = ET.parse(os.path.join(entryDir, "modelDescription.xml")).getroot()
+
+        size = 0
+        for dirPath, dirNames, fileNames in os.walk(entryDir):
+            for f in fileNames:
+                size += os.path.getsize(os.path.join(dirPath, f))
+
+        metadata = {"key": key,
+                    "source": os.path.abspath(fmu_file),
+                    "model_name": root.get("modelName"),
+                    "guid": root.get("guid"),
+                    "fmi_version": root.get("fmiVersion"),
+                    "size": size,
+                    "created": time.time(),
+                    "last_access": time.time()}
+        self.__write_metadata__(key, metadata)
+
+        return metadata
+
+    def get_extracted_dir(self, fmu_file):
+        """
+        This method returns the folder that contains the extracted FMU. If the FMU
+        is not part of the cache yet, it is extracted and the cache is reduced, if needed,
+        to respect its maximum size.
+
+        :param string fmu_file: path of the FMU
+
+        :return: a tuple with the folder containing the extracted FMU and a flag
+          that is True if the FMU was already in the cache.
+        :rtype: tuple(string, bool)
+        """
+        key = self.__hash_file__(fmu_file)
+        entryDir = os.path.join(self.cache_dir, key)
+        metadata = self.__read_metadata__(key)
+
+        if metadata is not None and os.path.isdir(entryDir):
+            # Update the time of the last access, used by the eviction policy
+            metadata["last_access"] = time.time()
+            self.__write_metadata__(key, metadata)
+            self.stats["hits"] += 1
+            return entryDir, True
+
+        # The entry is missing or not complete, extract the FMU again
+        if os.path.isdir(entryDir):
+            shutil.rmtree(entryDir, ignore_errors = True)
+        self.__extract__(fmu_file, key)
+        self.stats["misses"] += 1
+
+        self.evict(keep = key)
+        return entryDir, False
+
+    def get_metadata(self, fmu_file):
+        """
+        This method returns the metadata of an FMU stored in the cache.
+
+        :param string fmu_file: path of the FMU
+
+        :return: the metadata of the FMU or None if the FMU is not part of the cache.
+        :rtype: dict, None
+        """
+        return self.__read_metadata__(self.__hash_file__(fmu_file))
+
+    def load_fmu(self, fmu_file, **kwargs):
+        """
+        This method loads an FMU with PyFMI using the extracted FMU stored in the cache.
+        If the version of PyFMI does not support loading extracted FMUs, the
+        FMU is loaded from the original file.
+
+        :param string fmu_file: path of the FMU
+        :param kwargs: other parameters passed to the function **pyfmi.load_fmu**.
+
+        :return: the FMU model loaded by PyFMI
+        """
+        T0 = time.time()
+        entryDir, warm = self.get_extracted_dir(fmu_file)
+        fmu = load_extracted_fmu(entryDir, fmu_file, **kwargs)
+
+        dT = time.time() - T0
+        self.stats["last_load_time"] = dT
+        if warm:
+            self.stats["warm_load_time"] += dT
+        else:
+            self.stats["cold_load_time"] += dT
+
+        logger.info("Loaded FMU %s in %.3f s (%s load)", fmu_file, dT, "warm" if warm else "cold")
+        return fmu
+
+    def get_entries(self):
+        """
+        This method returns the metadata of all the entries in the cache.
+
+        :return: a list containing the metadata of the entries
+        :rtype: list(dict)
+        """
+        entries = []
+        for f in os.listdir(self.cache_dir):
+            if f.endswith(".json"):
+                metadata = self.__read_metadata__(f[:-len(".json")])
+                if metadata is not None:
+                    entries.append(metadata)
+        return entries
+
+    def get_size(self):
+        """
+        This method returns the size of the extracted FMUs in the cache.
+
+        :return: the size of the cache in bytes
+        :rtype: int
+        """
+        return sum([e["size"] for e in self.get_entries()])
+
+    def get_statistics(self):
+        """
+        This method returns the statistics about the use of the cache, i.e., the
+        number of hits and misses, the total time spent loading FMUs that were not
+        in the cache (cold) and that were in the cache (warm), and the time spent by
+        the last load.
+
+        :return: a dictionary containing the statistics
+        :rtype: dict
+        """
+        return dict(self.stats)
+
+    def remove(self, key):
+        """
+        This method removes an entry from the cache.
+
+        :param string key: the key of the entry
+
+        :rtype: None
+        """
+        try:
+            os.remove(self.__metadata_path__(key))
+        except OSError:
+            pass
+        shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors = True)
+
+    def evict(self, keep = None):
+        """
+        This method removes the entries that have not been used for the longest time
+        until the size of the cache is below its maximum size.
+
+        :param string keep: the key of an entry that must not be removed, e.g., the one just loaded.
+
+        :return: the number of entries removed
+        :rtype: int
+        """
+        entries = sorted(self.get_entries(), key = lambda e: e["last_access"])
+        size = sum([e["size"] for e in entries])
+
+        n = 0
+        for e in entries:
+            if size <= self.max_size:
+                break
+            if e["key"] == keep:
+                continue
+            self.remove(e["key"])
+            size -= e["size"]
+            n += 1
+            logger.debug("Removed FMU %s from the cache", e["source"])
+
+        return n
+
+    def clear(self):
+        """
+        This method removes all the entries of the cache.
+
+        :rtype: None
+        """
+        for e in self.get_entries():
+            self.remove(e["key"])
+
+def extract_fmu(fmu_file, folder):
+    """
+    This function extracts an FMU in a folder. The paths of the files contained in the FMU
+    are checked before extracting them.
+
+    :param string fmu_file: path of the FMU
+    :param string folder: the folder where the FMU is extracted
+
+    :rtype: None
+
+    :raises ValueError: if the FMU contains files that would be extracted outside
+      of the folder, i.e., with absolute paths or paths that start with ``..``
+    """
+    with zipfile.ZipFile(fmu_file) as z:
+        for name in z.namelist():
+            path = os.path.normpath(name.replace("\\", "/"))
+            if os.path.isabs(path) or os.path.splitdrive(path)[0] != "" or path == ".." or path.startswith(".." + os.sep):
+                msg = "The FMU {0} contains the file {1} that is outside of its folder".format(fmu_file, name)
+                logger.error(msg)
+                raise ValueError(msg)
+        z.extractall(folder)
+
+def load_extracted_fmu(fmu_dir, fmu_file, **kwargs):
+    """
+    This function loads with PyFMI an FMU that has already been extracted. If the version
+    of PyFMI does not support loading extracted FMUs, the FMU is loaded from the original file.
+
+    :param string fmu_dir: the folder that contains the extracted FMU
+    :param string fmu_file: path of the FMU
+    :param kwargs: other parameters passed to the function **pyfmi.load_fmu**.
+
+    :return: the FMU model loaded by PyFMI
+    """
+    try:
+        return pyfmi.load_fmu(fmu_dir, allow_unzipped_fmu = True, **kwargs)
+    except TypeError:
+        logger.warn("The version of PyFMI does not support extracted FMUs, loading %s", fmu_file)
+        return pyfmi.load_fmu(fmu_file, **kwargs)
+
+def get_extracted_dir(fmu_file):
+    """
+    This function returns a folder that contains the extracted FMU, e.g., to load multiple
+    instances of the same FMU with :func:`load_extracted_fmu` without extracting it each time.
+    If the cache is enabled the folder is the entry of the cache, otherwise the FMU is extracted
+    in a temporary folder that is removed when the interpreter exits.
+
+    :param string fmu_file: path of the FMU
+
+    :return: the folder that contains the extracted FMU
+    :rtype: string
+    """
+    cache = get_cache()
+    if cache is not None:
+        return cache.get_extracted_dir(fmu_file)[0]
+
+    folder = tempfile.mkdtemp(prefix = "estimationpy_fmu_")
+    try:
+        extract_fmu(fmu_file, folder)
+    except Exception:
+        shutil.rmtree(folder, ignore_errors = True)
+        raise
+    atexit.register(shutil.rmtree, folder, True)
+    logger.debug("Extracted the FMU %s in %s", fmu_file, folder)
+    return folder
+
+# Cache used by the function load_fmu, see enable_cache and disable_cache
+__cache = None
+
+def enable_cache(cache_dir = None, max_size = DEFAULT_MAX_SIZE):
+    """
+    This function enables the cache used by :func:`load_fmu`.
+
+    :param string cache_dir: the folder used by the cache, see :class:`FmuCache`.
+    :param int max_size: the maximum size of the cache in bytes.
+
+    :return: the cache enabled
+    :rtype: FmuCache
+    """
+    global __cache
+    __cache = FmuCache(cache_dir, max_size)
+    return __cache
+
+def disable_cache():
+    """
+    This function disables the cache used by :func:`load_fmu`.
+
+    :rtype: None
+    """
+    global __cache
+    __cache = None
+
+def get_cache():
+    """
+    This function returns the cache used by :func:`load_fmu`. If the cache
+    has not been enabled, the function checks the environment variable ``ESTIMATIONPY_FMU_CACHE``
+    and, if specified, enables the cache.
+
+    :return: the cache, or None if the cache is disabled
+    :rtype: FmuCache, None
+    """
+    if __cache is None and os.environ.get(CACHE_DIR_ENV):
+        enable_cache(os.environ[CACHE_DIR_ENV], int(os.environ.get(CACHE_SIZE_ENV, DEFAULT_MAX_SIZE)))
+    return __cache
+
+def load_fmu(fmu_file, **kwargs):
+    """
+    This function loads an FMU with PyFMI. If the cache is enabled the FMU is loaded from
+    the cache, otherwise the function uses directly **pyfmi.load_fmu**.
+
+    :param string fmu_file: path of the FMU
+    :param kwargs: other parameters passed to the function **pyfmi.load_fmu**.
+
+    :return: the FMU model loaded by PyFMI
+    """
+    cache = get_cache()
+    if cache is None:
+        return pyfmi.load_fmu(fmu_file, **kwargs)
+    else:
+        return cache.load_fmu(fmu_file, **kwargs)
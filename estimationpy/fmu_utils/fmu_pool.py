@@ -1,19 +1,38 @@
 '''
 @author: Marco Bonvini
 '''
-import multiprocessing
 import os
+import sys
 import time
 import shutil
+import tempfile
 
-from multiprocessing import Process, Queue
-from threading import Thread
+from multiprocessing import Process, Queue, Pipe, connection
+from threading import Thread, Event, Lock
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+try:
+    from multiprocessing import resource_tracker
+except ImportError:
+    # The resource tracker is available from Python 3.8, as shared memory
+    resource_tracker = None
 
 import estimationpy.fmu_utils.strings as fmu_util_strings
+import estimationpy.fmu_utils.executors as executors
+import estimationpy.fmu_utils.affinity as affinity
+from estimationpy.fmu_utils.simulation_results import SimulationResults, SHARED_MEMORY_AVAILABLE
+from estimationpy.fmu_utils.profiling import Profiler
 
 import logging
 logger = logging.getLogger(__name__)
 
+# Lock held by the threads of this process while they start a worker, see :func:`Worker.start`
+start_lock = Lock()
+
 class P(Process):
     """
     This class represents a process running a single simulation of an FMU
@@ -30,10 +49,19 @@ class P(Process):
     * ``result_queue``, a queue of type :class:`multiprocesing.Queue` where all the results of \
       the simulations are stored and can be retrieved after the simulations are terminated,
     * ``index``, an integer that is used to sort the results data by the class that manages a pool of processes,
+    * ``lazy``, a flag that indicates if the results are returned as objects of type
+      :class:`estimationpy.fmu_utils.simulation_results.SimulationResults`,
+    * ``use_shared_memory``, a flag that indicates if the trajectories are written in a block of
+      shared memory and only their description is put in the queue,
+    * ``result_file``, the file where PyFMI writes the results when the model is configured to
+      write them to the file system. The file is assigned by the pool and it is reused by the
+      processes that run in the same slot,
+    * ``tolerance_factor``, the factor that multiplies the tolerances of the solver, see
+      :func:`estimationpy.fmu_utils.model.Model.simulate`.
     
     """
 
-    def __init__(self, model, x0, pars, startTime, stopTime, results_queue, index):
+    def __init__(self, model, x0, pars, startTime, stopTime, results_queue, index, lazy = False, use_shared_memory = False):
         """
         Constructor of the class initialing the process that runs the simulation.
         
@@ -46,6 +74,13 @@ class P(Process):
         :param multiprocesing.Queue result_queue: the queue that stores the results of the simulation,
         :param int index: the index used to save data in the queue, this is used to identify who generated the
           results during the post processing phase.
+        :param bool lazy: flag that indicates if the results are returned as objects of type
+          :class:`estimationpy.fmu_utils.simulation_results.SimulationResults`, see
+          :func:`estimationpy.fmu_utils.model.Model.simulate`.
+        :param bool use_shared_memory: flag that indicates if the trajectories are written in a block
+          of shared memory, see :func:`estimationpy.fmu_utils.simulation_results.SimulationResults.to_shared_memory`.
+          The process that reads the queue has to convert the results with
+          :func:`estimationpy.fmu_utils.simulation_results.SimulationResults.from_shared_memory`.
                 
         """
         super(P, self).__init__()
@@ -56,88 +91,421 @@ class P(Process):
         self.stopTime = stopTime
         self.queue = results_queue
         self.index = index
+        self.lazy = lazy
+        self.use_shared_memory = use_shared_memory
+        self.result_file = None
+        self.tolerance_factor = 1.0
+        self.cpu = None
+        self.threads = None
                 
     def run(self):
         """
         Method that is called when the :func:`start` method of this class is invoked.
-        The method executes the following steps:
-        
-        1. Sets the values of the selected states,
-        2. Sets the values of the parameters selected,
-        3. Creates a folder that will contain the results of the simulation in case PyFMI is configured to write to the file system,
-        4. Run the simulation by calling the method :func:`estimationpy.fmu_utils.model.Model.simulate`
-        5. Saves the results in the queue using the specified index,
-        6. Removes the folder containing the result data if they were written.
+        The method runs the simulation with :func:`run_simulation` and saves the results
+        in the queue using the specified index.
         
         :return: False, is there are problem during the simulation, None otherwise.
         
         """
-        logger.debug("Start simulation in process with PID = {0}".format(os.getpid()))
-        
-        # Assign the initial conditions to the states selected
-        self.model.set_state_selected(self.x0)
-        logger.debug("Initial condition is {0}".format(self.model.get_state_observed_values()))
+        affinity.configure_worker(self.cpu, self.threads)
+        results, stats = run_simulation(self.model, self.x0, self.pars, self.startTime, self.stopTime, self.index, \
+                                        self.lazy, self.use_shared_memory, self.result_file, self.tolerance_factor)
             
-        # Assign the values to the parameters selected
-        self.model.set_parameters_selected(self.pars)
-        logger.debug("Parameter vector is {0}".format(self.model.get_parameter_values()))
+        # Put the results in a queue as
+        # [index, result, stats]
+        # The index will be used to sort the results in the class that manages the processes
+        self.queue.put([self.index, results, stats])
         
-        # Check if the options of the model contains the option for writing results to files
-        opts = self.model.get_simulation_options()
-        workWithFiles = opts[fmu_util_strings.SIMULATION_OPTION_RESHANDLING_STRING] == fmu_util_strings.RESULTS_ON_FILE_STRING
-        if workWithFiles:
-            # Create an hidden folder named as the Process ID (e.g .4354/)
-            dirPath = os.path.join(".","."+str(os.getpid()))
-            if not os.path.exists(dirPath):
-                    os.makedirs(dirPath)
+        return
+
+def run_simulation(model, x0, pars, startTime, stopTime, index, lazy = False, use_shared_memory = False, result_file = None, tolerance_factor = 1.0):
+    """
+    This function runs a simulation of the model on behalf of a process of the pool,
+    either an object of type :class:`P` or a persistent :class:`Worker`.
+    The function executes the following steps:
+    
+    1. Sets the values of the selected states,
+    2. Sets the values of the parameters selected,
+    3. Assigns the result file in case PyFMI is configured to write to the file system,
+    4. Run the simulation by calling the method :func:`estimationpy.fmu_utils.model.Model.simulate`
+    5. If shared memory is used the trajectories are written in a block of
+       shared memory and only their description is returned.
+    
+    If the result file is not assigned by the pool, a temporary file is created and
+    removed after the simulation.
+    
+    :param estimationpy.fmu_utils.model.Model model: The model to simulate
+    :param numpy.array x0: the vector containing the initial state of the model
+    :param numpy.array pars: the values of the parameters that have to be estimated
+    :param datetime.datetime startTime: the initial time of the simulation period
+    :param datetime.datetime stopTime: the end time of the simulation period
+    :param int index: the index of the simulation, used in the messages
+    :param bool lazy: flag that indicates if the results are returned as objects of type
+      :class:`estimationpy.fmu_utils.simulation_results.SimulationResults`
+    :param bool use_shared_memory: flag that indicates if the trajectories are written in a block
+      of shared memory
+    :param string result_file: the file where PyFMI writes the results, if None and the model writes
+      the results to the file system a temporary file is used
+    :param float tolerance_factor: the factor that multiplies the tolerances of the solver
+    
+    :return: a tuple that contains the results, or False if the simulation failed, and a
+      dictionary that contains the PID of the process, the result file, the time spent simulating,
+      the time spent by the process in the file system and the error that caused
+      the simulation to fail (None if the simulation succeeded).
+    :rtype: tuple
+    """
+    logger.debug("Start simulation in process with PID = %s", os.getpid())
+    
+    # Assign the initial conditions to the states selected
+    model.set_state_selected(x0)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Initial condition is %s", model.get_state_observed_values())
         
-            # Define the name of the file that will contain the results (e.g .4354/results.txt)
-            fileName = os.path.join(dirPath,"results.txt")
-            self.model.set_result_file(fileName)
+    # Assign the values to the parameters selected
+    model.set_parameters_selected(pars)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Parameter vector is %s", model.get_parameter_values())
+    
+    # Check if the options of the model contains the option for writing results to files
+    opts = model.get_simulation_options()
+    workWithFiles = opts[fmu_util_strings.SIMULATION_OPTION_RESHANDLING_STRING] == fmu_util_strings.RESULTS_ON_FILE_STRING
+    stats = {"pid": os.getpid(), "result_file": None, "simulation_time": 0.0, "io_time": 0.0, "error": None}
+    if workWithFiles:
+        T0 = time.time()
+        fileName = result_file
+        temporary = fileName is None
+        if temporary:
+            fd, fileName = tempfile.mkstemp(prefix = "estimationpy_", suffix = ".txt")
+            os.close(fd)
+        model.set_result_file(fileName)
+        stats["result_file"] = fileName
+        stats["io_time"] += time.time() - T0
+
+    # Simulate
+    T0 = time.time()
+    try:
+        results = model.simulate(start_time = startTime, final_time = stopTime, lazy = lazy or use_shared_memory, \
+                                 tolerance_factor = tolerance_factor)
+    except Exception as e:
+        logger.warning("Problem while running simulation %s: %s", index, e)
+        stats["error"] = "{0}: {1}".format(e.__class__.__name__, e)
+        results = False
+    stats["simulation_time"] = time.time() - T0
     
-        # Simulate
+    # Move the trajectories to shared memory, if it's not possible
+    # the results are sent through the queue
+    if results is not False and use_shared_memory:
         try:
-            results = self.model.simulate(start_time = self.startTime, final_time = self.stopTime)
+            results = results.to_shared_memory()
         except Exception as e:
-            logger.error("Problem while running simulation: {0}".format(str(e)))
-            results = False
-            
-        # Put the results in a queue as
-        # [index, result]
-        # The index will be used to sort the results in the class that manages the processes
-        self.queue.put([self.index, results])
+            logger.warning("Impossible to write the results in shared memory: %s", e)
+        
+    # Remove the temporary result file, the files assigned by the pool
+    # are reused and they're removed when the pool is closed
+    if workWithFiles and temporary:
+        T0 = time.time()
+        if os.path.exists(fileName):
+            os.remove(fileName)
+        stats["io_time"] += time.time() - T0
+    
+    logger.debug("Simulation %s run in %s [s], time spent in the file system %s [s]", index, stats["simulation_time"], stats["io_time"])
+    return results, stats
+
+def get_memory_usage():
+    """
+    This function returns the resident set size of the current process, i.e., the physical
+    memory that it uses. On Linux the value is read from ``/proc/self/statm``, on the other
+    platforms the peak resident set size is returned since the current one is not available
+    without additional packages.
+    
+    :return: the memory used by the process in bytes, or None if it can't be measured
+    :rtype: int
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        pass
+    
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # The value is in bytes on macOS and in kilobytes on the other platforms
+    return rss if sys.platform == "darwin" else rss*1024
+
+def get_logging_handlers():
+    """
+    This function returns the handlers of all the loggers of the current process.
+    
+    :return: the list of handlers, without duplicates
+    :rtype: list
+    """
+    loggers = [logging.getLogger()] + [l for l in list(logging.Logger.manager.loggerDict.values()) if isinstance(l, logging.Logger)]
+    handlers = []
+    for l in loggers:
+        for h in l.handlers:
+            if h not in handlers:
+                handlers.append(h)
+    return handlers
+
+class Worker(Process):
+    """
+    This class represents a persistent process that runs the simulations of an FMU model
+    assigned by an :class:`FmuPool`, one at a time. The worker is created as a copy of the
+    process that owns the pool (on POSIX systems a fork), therefore it inherits the instance of
+    the FMU already loaded by the model of the pool, with the same configuration, and it doesn't
+    load the FMU again. The worker is reused for all the simulations until it's stopped or recycled.
+    
+    Some FMUs leak memory at each simulation, for this reason the worker counts the simulations
+    it runs and measures its memory (see :func:`get_memory_usage`). After a simulation, if the
+    number of simulations reaches ``max_tasks`` or the memory exceeds ``max_memory`` the worker
+    terminates and the pool replaces it with a new one.
+    
+    The tasks received by the worker are tuples
+    ``(index, state, x0, pars, startTime, stopTime, tolerance_factor, result_file)``, where ``state``
+    is the entire state vector of the model of the pool, that is assigned before setting the values
+    of the selected states and parameters since the previous simulation modified it.
+    The results are sent through the pipe of the worker as ``[index, results, stats]``, see
+    :func:`run_simulation` and :func:`receive`, and the statistics also contain
+    
+    * ``worker_tasks``, the number of simulations run by the worker,
+    * ``worker_memory``, the memory used by the worker in bytes (None if it can't be measured),
+    * ``recycle``, the reason why the worker terminates after the simulation, either ``tasks``
+      or ``memory``, None if it continues.
+    """
     
-        # Delete the results contained in the folder
-        if workWithFiles:
-            shutil.rmtree(dirPath)
+    def __init__(self, model, lazy = False, use_shared_memory = False, max_tasks = None, max_memory = None, \
+                 cpu = None, threads = None):
+        """
+        Constructor of the class.
         
-        return
+        :param estimationpy.fmu_utils.model.Model model: The model to simulate
+        :param bool lazy: flag that indicates if the results are returned as objects of type
+          :class:`estimationpy.fmu_utils.simulation_results.SimulationResults`
+        :param bool use_shared_memory: flag that indicates if the trajectories are written in blocks
+          of shared memory
+        :param int max_tasks: the number of simulations after which the worker terminates, if None
+          there is no limit
+        :param int max_memory: the memory in bytes above which the worker terminates, if None
+          there is no limit
+        :param int cpu: the processor where the worker runs, if None the worker can run on all the
+          processors of the pool
+        :param int threads: the number of threads of the numerical libraries in the worker, if None
+          the number is not limited, see :func:`estimationpy.fmu_utils.affinity.configure_worker`
+        """
+        super(Worker, self).__init__()
+        self.daemon = True
+        self.model = model
+        self.tasks = Queue()
+        self.reader, self.writer = Pipe(duplex = False)
+        self.lazy = lazy
+        self.use_shared_memory = use_shared_memory
+        self.max_tasks = max_tasks
+        self.max_memory = max_memory
+        self.cpu = cpu
+        self.threads = threads
+    
+    def submit(self, task):
+        """
+        This method sends a simulation to the worker.
+        
+        :param tuple task: the description of the simulation
+        
+        :rtype: None
+        """
+        self.tasks.put(task)
+    
+    def stop(self):
+        """
+        This method asks the worker to terminate after the simulations already submitted.
+        
+        :rtype: None
+        """
+        self.tasks.put(None)
+    
+    def start(self):
+        """
+        This method starts the worker. The end of the pipe used by the worker to send the
+        results is closed in the current process, so that the pipe is closed when the worker terminates.
+        
+        The worker is a copy of the current process, whose other threads may be logging while
+        it's created, e.g., the threads of an :class:`estimationpy.fmu_utils.scheduler.AsyncScheduler`.
+        The worker would inherit the stream of a handler locked by another thread, and it would block
+        the first time it logs. For this reason the worker is created while the current thread holds
+        the locks of all the logging handlers (see :func:`get_logging_handlers`) and :data:`start_lock`,
+        so that the workers don't inherit the pipes of the ones started at the same time.
+        
+        :rtype: None
+        """
+        handlers = get_logging_handlers()
+        with start_lock:
+            for h in handlers:
+                h.acquire()
+            try:
+                super(Worker, self).start()
+            finally:
+                for h in reversed(handlers):
+                    h.release()
+            self.writer.close()
+    
+    def receive(self, timeout = 0.0):
+        """
+        This method returns the results of a simulation sent by the worker, if available.
+        
+        :param float timeout: the time in seconds to wait for the results
+        
+        :return: the message sent by the worker, ``[index, results, stats]``, or None if
+          there is no message or the worker terminated
+        :rtype: list
+        """
+        try:
+            if self.reader.poll(timeout):
+                return self.reader.recv()
+        except (EOFError, OSError):
+            # The worker terminated and the pipe has been closed
+            pass
+        return None
+    
+    def execute(self, task):
+        """
+        This method runs a simulation received by the worker, see :func:`run_simulation`.
+        
+        :param tuple task: the description of the simulation
+        
+        :return: a tuple that contains the results and the statistics of the simulation
+        :rtype: tuple
+        """
+        index, state, x0, pars, startTime, stopTime, tolerance_factor, result_file = task
+        self.model.set_state(state)
+        return run_simulation(self.model, x0, pars, startTime, stopTime, index, self.lazy, \
+                              self.use_shared_memory, result_file, tolerance_factor)
+    
+    def run(self):
+        """
+        Method that is called when the :func:`start` method of this class is invoked.
+        The method runs the simulations received until the worker is stopped or one of
+        its limits is exceeded.
+        
+        :rtype: None
+        """
+        affinity.configure_worker(self.cpu, self.threads)
+        n_tasks = 0
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            
+            index = task[0]
+            results, stats = self.execute(task)
+            
+            n_tasks += 1
+            memory = get_memory_usage()
+            stats["worker_tasks"] = n_tasks
+            stats["worker_memory"] = memory
+            stats["recycle"] = None
+            if self.max_tasks is not None and n_tasks >= self.max_tasks:
+                stats["recycle"] = "tasks"
+            elif self.max_memory is not None and memory is not None and memory > self.max_memory:
+                stats["recycle"] = "memory"
+            
+            self.writer.send([index, results, stats])
+            if stats["recycle"] is not None:
+                logger.debug("The worker with PID = %s terminates after %s simulations using %s bytes", os.getpid(), n_tasks, memory)
+                break
 
-def threaded_function(queue, results, N_RESULTS):
+def threaded_function(queue, results, N_RESULTS, stop_event = None, timeout = 0.1):
     """
     This is a function executed in the main thread that reads the values in the queue, 
     and moves them to a dictionary. The function, and thus the thread, terminates when all the
     expected results have been read. The number of expected results is specified by the 
-    parameter ``N_RESULTS``.
+    parameter ``N_RESULTS``. Since a process that dies doesn't send its results, the function
+    also terminates when the queue is empty after the event ``stop_event`` has been set.
     
     :param multiprocesing.Queue queue: the queue containing the results generated by the processes.
     :param dict results: reference to a dictionary where the results enqueued are moved.
     :param int N_RESULTS: the number of results to dequeue and move to the dictionary.
+    :param threading.Event stop_event: event set when no more results will be put in the queue,
+      i.e., when all the processes terminated. If None the function waits for all the results.
+    :param float timeout: the time in seconds waited for a result before checking the event
     """
     n = 0
     while n < N_RESULTS:
-        if not queue.empty():
-            temp_res = queue.get()
-            # remember that
-            # temp_res = [index, results]
-            results[temp_res[0]] = temp_res[1:]
-            n += 1
+        try:
+            temp_res = queue.get(timeout = timeout)
+        except Empty:
+            if stop_event is not None and stop_event.is_set():
+                break
+            continue
+        # remember that
+        # temp_res = [index, results]
+        results[temp_res[0]] = temp_res[1:]
+        n += 1
     
 class FmuPool():
     """
     This class manages a pool of processes that execute parallel simulation
     of an FMU model.
     
+    When the model is configured to write the results to the file system, the pool
+    creates a scratch folder that contains one result file for each of the processes
+    that can run at the same time. The files are reused by the simulations and the folder
+    is removed by :func:`close`. After each call to :func:`run` the attribute ``statistics``
+    contains, for each simulation, a dictionary with the PID of the process, the result
+    file, the time spent simulating, the time spent by the process in the file system and
+    the error that caused the simulation to fail, if any. The time spent by PyFMI writing and
+    reading the result file is part of the time spent simulating.
+    
+    The simulations are run by an executor (see :mod:`estimationpy.fmu_utils.executors`), by default
+    an object of type :class:`estimationpy.fmu_utils.executors.LocalExecutor` that uses processes on the
+    machine that owns the pool. The executor :class:`estimationpy.fmu_utils.executors.RemoteExecutor`
+    distributes the simulations to workers running on other machines.
+    
+    A simulation that fails doesn't stop the others, after each call to :func:`run` the attribute
+    ``failures`` is a dictionary that contains the index and the error of each simulation that failed.
+    
+    By default each simulation is run by a new process. The pool can instead use persistent
+    processes of type :class:`Worker`, one for each process that can run at the same time, that are
+    reused by all the calls to :func:`run` (see :func:`set_persistent_workers`). The workers can be
+    recycled after a number of simulations or when their memory exceeds a limit, to protect long
+    running estimations from FMUs that leak memory. A worker that is recycled, or that terminates
+    unexpectedly, is replaced by a new copy of the process that owns the pool. The copy inherits
+    the FMU already loaded by the model of the pool, with its current configuration, therefore
+    the FMU is not loaded again. Each worker sends its results through its own pipe, so that
+    a worker that terminates unexpectedly doesn't block the others. After each call to :func:`run` the attribute
+    ``restarts`` contains, for each worker replaced, a dictionary with the slot, the PIDs of
+    the old and new process, the reason (``tasks``, ``memory`` or ``terminated``), the number of
+    simulations run and the memory used by the old process, and the time needed to replace it.
+    
+    The pool can record the time spent in its phases using an object of type
+    :class:`estimationpy.fmu_utils.profiling.Profiler`, the phases are
+    
+    * ``pool_dispatch``, the time needed to run all the simulations of a call to :func:`run`,
+    * ``pool_collect``, the time needed to read the results sent by the processes,
+    * ``simulate``, the time spent simulating, measured by the processes,
+    * ``result_file_io``, the time spent by the processes in the file system,
+    * ``worker_restart``, the time spent replacing the workers,
+    
+    the counter ``simulations`` contains the number of simulations run and ``worker_restarts``
+    the number of workers replaced.
+    
+    Within a call to :func:`run` the runtimes of the simulations can be very different, e.g., the
+    simulations of the sigma points that are close to the bounds of the states may take much longer
+    than the others. To avoid that the slowest simulations start last and leave the other processes
+    idle, the pool records the runtime of each simulation and by default it dispatches first the
+    simulations that were the slowest in the previous call to :func:`run` with the same number of
+    simulations (see :func:`get_dispatch_order`). The results are always returned in the order of the
+    values. After each call to :func:`run` the attribute ``latency`` contains the median, the 90th
+    percentile and the maximum runtime of the simulations, and the tail latency, i.e., the time the
+    pool waited for the slowest simulation after the median one completed.
+    
+    By default the number of processes is equal to the number of processors available minus one,
+    considering the CPU affinity of the process and the CPU quota of its container
+    (see :mod:`estimationpy.fmu_utils.affinity`). The processes that run the simulations limit the
+    numerical libraries to a single thread to avoid oversubscribing the processors, and they can be
+    pinned to different processors (see :func:`set_worker_affinity`).
+    
     **NOTE:**
     
         The processes running the simulations, executed in parallel if multiple processors are available,
@@ -146,12 +514,40 @@ class FmuPool():
     
     """
     
-    def __init__(self, model, processes = multiprocessing.cpu_count()-1):
+    def __init__(self, model, processes = None, lazy = False, use_shared_memory = True, scratch_dir = None, profiler = None, \
+                 persistent = False, max_tasks = None, max_memory = None, executor = None, \
+                 slowest_first = True, pin_workers = False, worker_threads = 1):
         """
         Constructor that initializes the pool of processes that runs the simulations.
         
         :param estimationpy.fmu_utils.model.Model model: The model to simulate
-        :param int processes: the number of processes allocated for the job
+        :param int processes: the number of processes allocated for the job, if None the number of
+          processors available minus one, see :func:`estimationpy.fmu_utils.affinity.get_default_processes`
+        :param bool lazy: flag that indicates if the results of each simulation are returned as an
+          object of type :class:`estimationpy.fmu_utils.simulation_results.SimulationResults`
+          instead of a tuple containing the time and a dictionary. The object converts the time
+          to datetime objects only when required.
+        :param bool use_shared_memory: flag that indicates if the processes return the trajectories
+          using blocks of shared memory, one for each simulation, instead of sending them through
+          the queue. The trajectories returned are views of the blocks, therefore they are not copied.
+          The flag is ignored if shared memory is not available, e.g., before Python 3.8.
+        :param string scratch_dir: the folder where the scratch folder containing the result files is
+          created, e.g., a folder on a tmpfs file system. If None the default folder for temporary files
+          is used, see :func:`tempfile.gettempdir`.
+        :param estimationpy.fmu_utils.profiling.Profiler profiler: the profiler that records the time
+          spent in the phases of the pool. If None the pool uses a new profiler that is disabled.
+        :param bool persistent: flag that indicates if the simulations are run by persistent workers,
+          see :func:`set_persistent_workers`
+        :param int max_tasks: the number of simulations after which a persistent worker is recycled
+        :param int max_memory: the memory in bytes above which a persistent worker is recycled
+        :param estimationpy.fmu_utils.executors.Executor executor: the executor that runs the simulations,
+          if None the simulations are run by processes on the local machine
+        :param bool slowest_first: flag that indicates if the simulations that were the slowest
+          in the previous call to :func:`run` are dispatched first
+        :param bool pin_workers: flag that indicates if each process is pinned to a processor,
+          see :func:`set_worker_affinity`
+        :param int worker_threads: the number of threads of the numerical libraries in the processes
+          that run the simulations, if None the number is not limited
           
         **NOTE**
           If the parameter ``processes`` is less or equal to 1, by default the number of 
@@ -162,15 +558,225 @@ class FmuPool():
           process.
         """
         self.model = model
+        self.lazy = lazy
+        self.use_shared_memory = use_shared_memory and SHARED_MEMORY_AVAILABLE
+        self.scratch_dir = scratch_dir
+        self.scratch_path = None
+        self.statistics = []
+        self.failures = {}
+        self.run_time = 0.0
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.workers = {}
+        self.restarts = []
+        self.executor = executor if executor is not None else executors.LocalExecutor()
+        self.slowest_first = slowest_first
+        self.runtimes = {}
+        self.latency = None
 
         # Define the number of processes to be used
-        if processes >= 1:
+        if processes is None:
+            self.N_MAX_PROCESS = affinity.get_default_processes()
+        elif processes >= 1:
             self.N_MAX_PROCESS = processes  # Change to 1 if you want to disable multithreading
         else:
             logger.warn("The number of processes specified in a Pool must be >=1")
             self.N_MAX_PROCESS = 1
+        
+        self.set_persistent_workers(persistent, max_tasks, max_memory)
+        self.set_worker_affinity(pin_workers, worker_threads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
 
-    def run(self, values, start = None, stop = None):
+    def close(self):
+        """
+        This method stops the persistent workers and removes the scratch folder that contains
+        the result files, if they exist. The pool can still be used after calling this method,
+        and new workers and a new folder are created when needed.
+        
+        :rtype: None
+        """
+        self.stop_workers()
+        self.executor.close()
+        if self.scratch_path is not None:
+            shutil.rmtree(self.scratch_path, ignore_errors = True)
+            logger.debug("Removed the scratch folder %s", self.scratch_path)
+            self.scratch_path = None
+
+    def set_persistent_workers(self, enabled = True, max_tasks = None, max_memory = None):
+        """
+        This method configures the pool to run the simulations with persistent workers instead
+        of creating a new process for each simulation. The workers are started by the first call
+        to :func:`run` and they're reused by the following ones. Since the workers are copies of
+        the process that owns the pool, the changes of the model that are not related to the
+        states (e.g., new data associated to the inputs) are seen by the workers only after they
+        have been restarted with :func:`stop_workers`.
+        
+        The workers are recycled after running ``max_tasks`` simulations, or when the memory they
+        use exceeds ``max_memory`` bytes. The option is ignored when the pool runs the simulations
+        in the process that owns it, i.e., when the number of processes is 1.
+        
+        :param bool enabled: flag that indicates if the persistent workers are used
+        :param int max_tasks: the number of simulations after which a worker is recycled,
+          if None there is no limit
+        :param int max_memory: the memory in bytes above which a worker is recycled, if None
+          there is no limit
+        
+        :rtype: None
+        
+        :raises ValueError: if the limits are not positive
+        """
+        if max_tasks is not None and max_tasks < 1:
+            raise ValueError("The number of simulations run by a worker must be at least 1")
+        if max_memory is not None and max_memory <= 0:
+            raise ValueError("The memory available to a worker must be positive")
+        
+        self.stop_workers()
+        self.persistent = enabled
+        self.max_tasks = max_tasks
+        self.max_memory = max_memory
+    
+    def set_worker_affinity(self, pin_workers = False, worker_threads = 1):
+        """
+        This method configures the processes that run the simulations. If ``pin_workers`` is
+        True the process in each slot is pinned to a different processor among the ones available
+        to the process that owns the pool (see :func:`estimationpy.fmu_utils.affinity.get_affinity`),
+        if there are more slots than processors they're assigned in round robin order.
+        The number of threads used by the numerical libraries in the processes is limited to
+        ``worker_threads``, by default 1 since each process runs a single simulation and the
+        processes already use all the processors. The process that owns the pool is never modified,
+        and neither is the process that runs the simulations when the number of processes is 1.
+        The limit requires the package threadpoolctl, see :func:`estimationpy.fmu_utils.affinity.check_threadpoolctl`.
+        
+        :param bool pin_workers: flag that indicates if each process is pinned to a processor
+        :param int worker_threads: the number of threads of the numerical libraries in the processes,
+          if None the number is not limited
+        
+        :rtype: None
+        
+        :raises ValueError: if the number of threads is not positive
+        """
+        if worker_threads is not None and worker_threads < 1:
+            raise ValueError("The number of threads of the processes must be at least 1")
+        
+        if worker_threads is not None:
+            affinity.check_threadpoolctl()
+        self.stop_workers()
+        self.cpus = affinity.get_affinity() if pin_workers else None
+        self.worker_threads = worker_threads
+    
+    def get_worker_cpu(self, slot):
+        """
+        This method returns the processor where the process running in a slot is pinned.
+        
+        :param int slot: the slot
+        
+        :return: the index of the processor, or None if the processes are not pinned
+        :rtype: int
+        """
+        if self.cpus is None or len(self.cpus) == 0:
+            return None
+        return self.cpus[slot % len(self.cpus)]
+    
+    def stop_workers(self):
+        """
+        This method stops the persistent workers, if they're running. New workers that use the
+        current configuration of the model are started by the next call to :func:`run`.
+        
+        :rtype: None
+        """
+        for worker in self.workers.values():
+            if worker.is_alive():
+                worker.stop()
+        for worker in self.workers.values():
+            worker.join(5.0)
+            if worker.is_alive():
+                logger.warning("The worker with PID = %s did not stop, it will be terminated", worker.pid)
+                worker.terminate()
+                worker.join()
+        if len(self.workers) > 0:
+            logger.debug("Stopped %s workers", len(self.workers))
+        self.workers = {}
+    
+    def get_result_file(self, slot):
+        """
+        This method returns the result file used by the processes that run in a given slot.
+        The scratch folder that contains the files is created the first time the method is called.
+        
+        :param int slot: the slot, a number between 0 and the maximum number of processes
+        
+        :return: the path of the result file
+        :rtype: string
+        """
+        if self.scratch_path is None:
+            self.scratch_path = tempfile.mkdtemp(prefix = ".estimationpy_pool_", dir = self.scratch_dir)
+            logger.info("The results of the simulations are written in %s", self.scratch_path)
+        return os.path.join(self.scratch_path, "results_{0}.txt".format(slot))
+
+    def get_utilization(self):
+        """
+        This method returns the utilization of the pool during the last call to :func:`run`,
+        i.e., the time spent by the processes simulating and accessing the file system divided
+        by the time available to the processes that could run in parallel.
+        
+        :return: the utilization, a number between 0 and 1, or None if the pool has not been used
+        :rtype: float
+        """
+        stats = [v for v in self.statistics if v is not None]
+        if len(stats) == 0 or self.run_time <= 0.0:
+            return None
+        busy = sum([v["simulation_time"] + v["io_time"] for v in stats])
+        slots = min(self.executor.get_slots(self), len(self.statistics))
+        return min(1.0, busy/(self.run_time*slots))
+
+    def get_dispatch_order(self, n):
+        """
+        This method returns the order in which the executor dispatches the simulations of
+        a call to :func:`run`. If the option ``slowest_first`` is enabled and the pool already
+        run the same number of simulations, the simulations are sorted by decreasing runtime
+        in the previous run, otherwise they're dispatched in the order of their indexes.
+        
+        :param int n: the number of simulations
+        
+        :return: the indexes of the simulations in the order they're dispatched
+        :rtype: list
+        """
+        if not self.slowest_first or n not in self.runtimes:
+            return list(range(n))
+        runtimes = self.runtimes[n]
+        return sorted(range(n), key = lambda k: -runtimes[k])
+
+    def __update_runtimes__(self):
+        """
+        Internal method that records the runtimes of the simulations of the last call
+        to :func:`run`, and computes the statistics stored in the attribute ``latency``.
+        The simulations whose statistics are missing keep the runtime previously recorded.
+        
+        :rtype: None
+        """
+        N_SIMULATIONS = len(self.statistics)
+        runtimes = self.runtimes.get(N_SIMULATIONS, [0.0]*N_SIMULATIONS)
+        for k, v in enumerate(self.statistics):
+            if v is not None:
+                runtimes[k] = v["simulation_time"] + v["io_time"]
+        self.runtimes[N_SIMULATIONS] = runtimes
+        
+        times = sorted([v["simulation_time"] + v["io_time"] for v in self.statistics if v is not None])
+        if len(times) == 0:
+            self.latency = None
+            return
+        median = times[(len(times) - 1)//2]
+        self.latency = {"median": median, "p90": times[int(0.9*(len(times) - 1))], "max": times[-1],
+                        "tail": times[-1] - median, "run_time": self.run_time}
+        logger.debug("Runtime of the simulations: median %s [s], max %s [s], tail %s [s]", median, times[-1], self.latency["tail"])
+
+    def run(self, values, start = None, stop = None, tolerance_factor = 1.0):
         """
         This method performs the simulation of the model with multiple initial states or
         parameters using multiple processes in parallel.
@@ -192,14 +798,100 @@ class FmuPool():
           of the data series associated to the inputs of the models is used
         :param datetime.datetime stop: the final time for the simulation, if not specified the final time
           of the data series associated to the inputs of the models is used
+        :param float tolerance_factor: factor that multiplies the tolerances of the solver in all the simulations,
+          e.g., to run again with tighter tolerances the simulations that failed
         
-        :return: a dictionary that contains the results of each simulation. The results are indexed with integers that
+        :return: a list that contains the results of each simulation. The results are indexed with integers that
           correspond to the positions of the elements in ``pars``. For example ``results[0]`` contains the
           results of the simulation run with state and parameters specified by ``pars[0]["state"]`` and ``pars[0]["parameters"]``.
-          If a problem occurs when running the simulations, an empty dictionary is returned.
-        :rtype: dict
+          The results of a simulation that failed, or whose results have not been received, are equal to ``[False]``
+          and the error is reported in the attribute ``failures``.
+        :rtype: list
+        
+        """
+        # Check if the results are written to the file system
+        opts = self.model.get_simulation_options()
+        workWithFiles = opts[fmu_util_strings.SIMULATION_OPTION_RESHANDLING_STRING] == fmu_util_strings.RESULTS_ON_FILE_STRING
+
+        # number of simulations to perform
+        N_SIMULATIONS = len(values)
+        self.restarts = []
+        
+        # Start measuring the time
+        T0 = time.time()
+        
+        results = self.executor.run(self, values, start, stop, tolerance_factor, workWithFiles)
+
+        # Stop Measuring the time
+        Tend = time.time()
+
+        logger.debug("The time spent for running the %s simulations is %s [s]", N_SIMULATIONS, Tend - T0)
+        self.run_time = Tend - T0
+        self.profiler.add_time("pool_dispatch", Tend - T0)
+        self.profiler.count("simulations", N_SIMULATIONS)
+
+        # Read the results written in shared memory, this is done for all of them
+        # to release the blocks even if some results are missing. The blocks of the
+        # results that have not been read, e.g., because of an error, are released anyway
+        with self.profiler.timer("pool_collect"):
+            self.statistics = [None]*N_SIMULATIONS
+            try:
+                for k, v in list(results.items()):
+                    r, self.statistics[k] = v
+                    results[k] = [self.__load_results__(r)]
+            finally:
+                for v in results.values():
+                    if isinstance(v[0], dict):
+                        SimulationResults.release_shared_memory(v[0])
+        
+        if self.profiler.is_enabled():
+            for v in self.statistics:
+                if v is not None:
+                    self.profiler.add_time("simulate", v["simulation_time"])
+                    self.profiler.add_time("result_file_io", v["io_time"])
+        self.__update_runtimes__()
+
+        # Put the results in order, the simulations that failed or whose results are
+        # missing (e.g., the process has been killed) are reported as failures
+        self.failures = {}
+        res = []
+        for k in range(N_SIMULATIONS):
+            if k not in results:
+                self.failures[k] = "The results of the simulation have not been received"
+                res.append([False])
+            else:
+                if results[k][0] is False:
+                    self.failures[k] = self.statistics[k]["error"]
+                res.append(results[k])
+        
+        if len(self.failures) > 0:
+            logger.warning("%s of %s simulations failed", len(self.failures), N_SIMULATIONS)
+        
+        # return the list of results
+        return res
+
+    def __run_processes__(self, values, start, stop, tolerance_factor, workWithFiles):
+        """
+        Internal method that runs the simulations creating a new process for each of them,
+        or in the process that owns the pool if the number of processes is 1.
+        
+        :param list values: a list of dictionaries that contains the values of the initial states and
+          parameters used in each of the simulations
+        :param datetime.datetime start: the initial time for the simulation
+        :param datetime.datetime stop: the final time for the simulation
+        :param float tolerance_factor: factor that multiplies the tolerances of the solver
+        :param bool workWithFiles: flag that indicates if the model writes the results to the file system
         
+        :return: a dictionary that contains for the index of each simulation received a list
+          with the results and the statistics
+        :rtype: dict
         """
+        # The blocks of shared memory are used only by the processes, not when the
+        # simulations run in the process that owns the pool
+        use_shared_memory = self.use_shared_memory and self.N_MAX_PROCESS > 1
+        if use_shared_memory:
+            self.__start_resource_tracker__()
+        
         # Define a Queue of results
         results_queue = Queue()
         # Define a list of processes
@@ -214,7 +906,8 @@ class FmuPool():
             # Initialize a process that will perform the simulation
             x0 = v["state"]
             pars = v["parameters"]
-            p = P(self.model, x0, pars, start, stop, results_queue, j)
+            p = P(self.model, x0, pars, start, stop, results_queue, j, self.lazy, use_shared_memory)
+            p.tolerance_factor = tolerance_factor
 
             # Append the process to the list
             processes.append(p)
@@ -232,70 +925,235 @@ class FmuPool():
         # dictionary previously defined.
         # N.B. The Thread will remove elements from the queue right after they have been produced,
         # otherwise the queue will reach the size limit and block the processes running the simulations
-        thread = Thread(target = threaded_function, args = (results_queue, results, N_SIMULATIONS ))
+        stop_event = Event()
+        thread = Thread(target = threaded_function, args = (results_queue, results, N_SIMULATIONS, stop_event))
         thread.daemon = True
         thread.start()
     
         # Start the process in parallel. This loop maintain the number of active processes at a given limit
-        # specified by the 'N_MAX_PROCESS'
+        # specified by the 'N_MAX_PROCESS'. Each process runs in a slot, and the slot is
+        # released when the process terminates. The processes that run in the same slot
+        # reuse the same result file. The processes are started in the order given by the pool.
+        order = self.get_dispatch_order(N_SIMULATIONS)
         i = 0
-        n_active = 0
+        running = {}
+        free_slots = list(range(self.N_MAX_PROCESS - 1, -1, -1))
         finished = False
 
-        # Start measuring the time
-        T0 = time.time()
+        try:
+            # The while loop will end when every process associated to a simulation task have been run
+            # AND they terminated
+            while not finished:
 
-        # The while loop will end when every process associated to a simulation task have been run
-        # AND they terminated
-        while not finished:
-
-            while n_active < self.N_MAX_PROCESS and i < N_SIMULATIONS:
-                # Run the process that simulate
-                if self.N_MAX_PROCESS <= 1:
-                    # Just one process to run, void to do a fork
-                    # NOTE: This is used when the process runs with Celery
-                    processes[i].run()
-                else:
-                    # More than one process that can be run in parallel, spawn a new process
-                    processes[i].start()
-                    
-                i += 1
+                while len(free_slots) > 0 and i < N_SIMULATIONS:
+                    slot = free_slots.pop()
+                    p = processes[order[i]]
+                    running[slot] = p
+                    if workWithFiles:
+                        p.result_file = self.get_result_file(slot)
 
-                msg = 'Process {0} started ({1}/{2})'.format(processes[i-1].pid, i, N_SIMULATIONS)
-                logger.debug(msg)
-            
-                # Check how many active processes have been run
-                n_active = len(multiprocessing.active_children())
+                    # Run the process that simulate
+                    if self.N_MAX_PROCESS <= 1:
+                        # Just one process to run, void to do a fork
+                        # NOTE: This is used when the process runs with Celery
+                        p.run()
+                    else:
+                        # More than one process that can be run in parallel, spawn a new process
+                        p.cpu = self.get_worker_cpu(slot)
+                        p.threads = self.worker_threads
+                        p.start()
+                    
+                    i += 1
 
-                logger.debug('N_process_active {0}'.format(n_active))
-                logger.debug('Queue has size {0}'.format(results_queue.qsize()))
+                    msg = 'Process {0} started ({1}/{2}) in slot {3}'.format(p.pid, i, N_SIMULATIONS, slot)
+                    logger.debug(msg)
+                    logger.debug('N_process_active %s', len(running))
         
-            # Wait the end of the processes to run others otherwise to exit the loop
-            # N.B. 'multiprocessing.active_children()' call a .join() to every children already terminated
-            n_active = len(multiprocessing.active_children())
+                # Wait the end of the processes to run others otherwise to exit the loop,
+                # the slots of the processes terminated are released
+                for slot in list(running.keys()):
+                    if not running[slot].is_alive():
+                        if running[slot].pid is not None:
+                            running[slot].join()
+                        del running[slot]
+                        free_slots.append(slot)
 
-            # This condition ensure that the while loop is left when all the process have been terminated
-            finished = True if n_active==0 and i == N_SIMULATIONS else False 
+                # This condition ensure that the while loop is left when all the process have been terminated
+                finished = True if len(running) == 0 and i == N_SIMULATIONS else False
+        except BaseException:
+            # The thread terminates without waiting for the results
+            stop_event.set()
+            raise
     
-        # Wait for the thread that all the data created by the processes 
-        thread.join(0.5)
+        # All the processes terminated, the thread reads the results left in the queue
+        # and then terminates, even if some of them are missing. The simulations run by this
+        # process always put their results in the queue, therefore the thread waits for all of them
+        if self.N_MAX_PROCESS > 1:
+            stop_event.set()
+        thread.join()
+        return results
 
-        # Stop Measuring the time
-        Tend = time.time()
+    def __run_workers__(self, values, start, stop, tolerance_factor, workWithFiles):
+        """
+        Internal method that runs the simulations with the persistent workers, one for each slot.
+        The workers are started when needed, and they're replaced when they are recycled or
+        terminate unexpectedly. The simulation assigned to a worker that terminates unexpectedly
+        is not run again, therefore its results are missing.
+        
+        :param list values: a list of dictionaries that contains the values of the initial states and
+          parameters used in each of the simulations
+        :param datetime.datetime start: the initial time for the simulation
+        :param datetime.datetime stop: the final time for the simulation
+        :param float tolerance_factor: factor that multiplies the tolerances of the solver
+        :param bool workWithFiles: flag that indicates if the model writes the results to the file system
+        
+        :return: a dictionary that contains for the index of each simulation received a list
+          with the results and the statistics
+        :rtype: dict
+        """
+        if self.use_shared_memory:
+            self.__start_resource_tracker__()
+        # The workers start from the state of the model of the pool, since
+        # the previous simulations modified their state
+        state = self.model.get_state()
+        
+        N_SIMULATIONS = len(values)
+        order = self.get_dispatch_order(N_SIMULATIONS)
+        results = {}
+        busy = {}
+        i = 0
+        while i < N_SIMULATIONS or len(busy) > 0:
+            
+            # Assign the simulations to the workers that are not busy
+            for slot in range(self.N_MAX_PROCESS):
+                if i == N_SIMULATIONS:
+                    break
+                if slot in busy:
+                    continue
+                if slot not in self.workers:
+                    self.__start_worker__(slot)
+                elif not self.workers[slot].is_alive():
+                    logger.warning("The idle worker %s in slot %s terminated with exit code %s", \
+                                   self.workers[slot].pid, slot, self.workers[slot].exitcode)
+                    self.__restart_worker__(slot, "terminated")
+                k = order[i]
+                result_file = self.get_result_file(slot) if workWithFiles else None
+                self.workers[slot].submit((k, state, values[k]["state"], values[k]["parameters"], start, stop, tolerance_factor, result_file))
+                busy[slot] = k
+                logger.debug("Simulation %s (%s/%s) assigned to the worker %s in slot %s", k, i + 1, N_SIMULATIONS, self.workers[slot].pid, slot)
+                i += 1
+            
+            # Wait until a busy worker sends its results or terminates. Each worker has its own pipe,
+            # therefore a worker that terminates while sending its results doesn't block the others
+            workers = [self.workers[slot] for slot in busy]
+            connection.wait([w.reader for w in workers] + [w.sentinel for w in workers], timeout = 1.0)
+            for slot in list(busy):
+                worker = self.workers[slot]
+                # A worker that terminated may have sent its results before, e.g., when it's recycled
+                alive = worker.is_alive()
+                message = worker.receive()
+                if message is None:
+                    if not alive:
+                        logger.warning("The worker %s in slot %s terminated with exit code %s while running the simulation %s", \
+                                       worker.pid, slot, worker.exitcode, busy.pop(slot))
+                        self.__restart_worker__(slot, "terminated")
+                    continue
+                self.__receive__(slot, message, busy, results)
+        return results
+    
+    def __receive__(self, slot, message, busy, results):
+        """
+        Internal method that stores the results sent by a worker, and replaces
+        the worker if it has been recycled.
+        
+        :param int slot: the slot of the worker
+        :param list message: the message sent by the worker, ``[index, results, stats]``
+        :param dict busy: dictionary that contains the slots of the workers that are busy
+          and the indexes of their simulations
+        :param dict results: dictionary that contains the results received
+        
+        :rtype: None
+        """
+        index, res, stats = message
+        if busy.get(slot) != index:
+            logger.warning("Received the results of the simulation %s that is not running in slot %s", index, slot)
+            if isinstance(res, dict):
+                SimulationResults.release_shared_memory(res)
+            return
+        results[index] = [res, stats]
+        del busy[slot]
+        if stats["recycle"] is not None:
+            self.__restart_worker__(slot, stats["recycle"], stats)
+    
+    def __start_resource_tracker__(self):
+        """
+        Internal method that starts the resource tracker of this process before starting the processes
+        that use shared memory. The processes have to share the resource tracker of this process, otherwise
+        each of them starts a new one that removes the blocks of shared memory as soon as the process terminates.
+        
+        :rtype: None
+        """
+        resource_tracker.ensure_running()
+    
+    def __start_worker__(self, slot):
+        """
+        Internal method that starts a persistent worker in a slot.
+        
+        :param int slot: the slot
+        
+        :return: the worker
+        :rtype: estimationpy.fmu_utils.fmu_pool.Worker
+        """
+        worker = Worker(self.model, self.lazy, self.use_shared_memory, self.max_tasks, self.max_memory, \
+                        self.get_worker_cpu(slot), self.worker_threads)
+        worker.start()
+        self.workers[slot] = worker
+        logger.debug("Started the worker %s in slot %s", worker.pid, slot)
+        return worker
+    
+    def __restart_worker__(self, slot, reason, stats = None):
+        """
+        Internal method that replaces the worker in a slot, and records the event in the
+        attribute ``restarts``.
+        
+        :param int slot: the slot
+        :param string reason: the reason why the worker is replaced
+        :param dict stats: the statistics of the last simulation run by the worker, if available
+        
+        :rtype: None
+        """
+        T0 = time.time()
+        old = self.workers.pop(slot)
+        old.join(5.0)
+        if old.is_alive():
+            old.terminate()
+            old.join()
+        new = self.__start_worker__(slot)
+        elapsed = time.time() - T0
+        
+        event = {"slot": slot, "old_pid": old.pid, "pid": new.pid, "reason": reason, "time": elapsed, \
+                 "tasks": stats["worker_tasks"] if stats is not None else None, \
+                 "memory": stats["worker_memory"] if stats is not None else None}
+        self.restarts.append(event)
+        self.profiler.add_time("worker_restart", elapsed)
+        self.profiler.count("worker_restarts")
+        logger.info("Replaced the worker %s in slot %s with %s (reason: %s, simulations: %s, memory: %s bytes) in %s [s]", \
+                    old.pid, slot, new.pid, reason, event["tasks"], event["memory"], elapsed)
 
-        logger.debug("The time spent for running the {0} simulations is {1} [s]".format(N_SIMULATIONS, Tend - T0))
+    def __load_results__(self, results):
+        """
+        Internal method that converts the results put in the queue by a process
+        to the format requested, i.e., an object of type
+        :class:`estimationpy.fmu_utils.simulation_results.SimulationResults` if ``lazy == True``,
+        a tuple containing the time and a dictionary otherwise.
 
-        # Create an empty list of results, and put the elements of the dictionary in order
-        try:
-            res = []
-            for k in range(N_SIMULATIONS):
-                res.insert(k, results[k])
-        except KeyError:
-            msg = "Problems while collecting the results generated by the pool of workers"
-            msg+= "\nnumber of simulations run in the e pool is {0}".format(N_SIMULATIONS)
-            msg+= "\nnumber of available results is {0}".format(len(results))
-            logger.error(msg)
-            res = {}
-        
-        # return the list of results
-        return res
+        :param results: the results of a simulation, the description of the results
+          written in shared memory, or False if the simulation failed.
+
+        :return: the results in the format requested, or False if the simulation failed.
+        """
+        if isinstance(results, dict):
+            results = SimulationResults.from_shared_memory(results)
+        if isinstance(results, SimulationResults) and not self.lazy:
+            return results.get_time_index(), results.to_dict()
+        return results
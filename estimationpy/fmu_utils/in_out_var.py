@@ -2,11 +2,14 @@
 @author: Marco Bonvini
 '''
 import numpy
-import pandas as pd
 
 from estimationpy.fmu_utils.csv_reader import CsvReader
 from estimationpy.fmu_utils import strings
-import pyfmi
+from estimationpy.fmu_utils.lazy_import import LazyModule
+
+# pyfmi and pandas are imported the first time they're used
+pyfmi = LazyModule("pyfmi")
+pd = LazyModule("pandas")
 
 import logging
 logger = logging.getLogger(__name__)
@@ -63,6 +66,13 @@ class InOutVar():
         self.index = 0
         self.cov = 1.0
         self.measOut = False
+        
+        # Threshold used by the adaptive resampling of the data series
+        self.threshold = 0.0
+        
+        # Counter incremented every time the data series or the measured output
+        # flag change, used to invalidate data cached by other objects
+        self.version = 0
     
     def read_value_in_fmu(self, fmu):
         """
@@ -102,6 +112,8 @@ class InOutVar():
         :param bool flag: flag that indicates whether this variable is a measured output
           or not.
         """
+        if flag != self.measOut:
+            self.version += 1
         self.measOut = flag
     
     def is_measured_output(self):
@@ -148,6 +160,44 @@ class InOutVar():
         """
         return self.cov
      
+    def set_threshold(self, threshold):
+        """
+        This method sets the threshold associated to the data series of this
+        variable. The threshold is used by the adaptive resampling performed by
+        :func:`estimationpy.fmu_utils.model.Model.resample_data`. A sample is 
+        discarded when its value differs less than the threshold from the last sample 
+        retained. Typically the threshold is comparable with the amplitude of the 
+        measurement noise.
+        
+        :param float threshold: The value of the threshold, it must not be negative.
+        
+        :return: True if the value has been set corectly.
+        
+        :rtype: bool
+        
+        :raises ValueError: The method raises an exception if the threshold is negative.
+        
+        """
+        if threshold >= 0.0:
+            self.threshold = threshold
+            self.version += 1
+            return True
+        else:
+            msg = "The threshold must not be negative"
+            logger.error(msg)
+            raise ValueError(msg)
+    
+    def get_threshold(self):
+        """
+        This method returns the threshold used by the adaptive resampling of the
+        data series associated to the **InOutVar** object.
+        
+        :return: the threshold of the variable.
+        :rtype: float
+        
+        """
+        return self.threshold
+    
     def set_object(self, pyfmi_var):
         """
         This method sets the variable associated to the object of class
@@ -229,6 +279,7 @@ class InOutVar():
             
             # Read the data from the CSV
             self.dataSeries = self.csvReader.get_data_series()
+            self.version += 1
             if len(self.dataSeries) > 0:
                 return True
             else:
@@ -245,6 +296,18 @@ class InOutVar():
         """
         return self.dataSeries
     
+    def get_version(self):
+        """
+        This method returns the version of the data associated to this input/output variable.
+        The version is an integer that is incremented every time the data series or the flag
+        that indicates if the variable is a measured output change. Other objects can use it
+        to know if data they computed from this variable is still valid.
+        
+        :return: the version of the data associated to the variable.
+        :rtype: int
+        """
+        return self.version
+    
     def set_data_series(self, series):
         """
         This function sets a data series instead of reading it from the CSV file.
@@ -262,6 +325,7 @@ class InOutVar():
         if isinstance(series, pd.Series):
             if isinstance(series.index, pd.DatetimeIndex):
                 self.dataSeries = series
+                self.version += 1
             else:
                 raise TypeError("The index of the Series passed to the method InOutVar.SetDataSeries() is not of type pandas.DatetimeIndex")
         else:
@@ -0,0 +1,61 @@
+'''
+@author: Marco Bonvini
+
+This module provides a way to defer the import of modules that are slow
+to load, such as pyfmi and pandas, until they are used for the first time.
+This reduces the time needed to import the modules of estimationpy, which
+matters for short-lived processes that may not need all of them.
+
+For example::
+
+    from estimationpy.fmu_utils.lazy_import import LazyModule
+    pd = LazyModule("pandas")
+
+defines the name ``pd`` that behaves like the module pandas, but the module
+is imported only when one of its attributes is accessed, e.g., ``pd.Series``.
+
+'''
+import importlib
+import types
+
+class LazyModule(types.ModuleType):
+    """
+    This class represents a module that is imported the first time one of
+    its attributes is accessed. After the import, the attributes of the module
+    are copied in the object, therefore the following accesses are as fast as the
+    ones to the module itself.
+    """
+
+    def __init__(self, name):
+        """
+        Constructor of the class.
+
+        :param string name: the full name of the module to import, e.g., ``pandas``
+          or ``pyfmi.fmi``.
+
+        """
+        super(LazyModule, self).__init__(name)
+
+    def __load__(self):
+        """
+        This method imports the module and copies its attributes.
+
+        :return: the module imported
+        :rtype: module
+        """
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return module
+
+    def __getattr__(self, attr):
+        """
+        This method is called only when an attribute is not found, that is
+        before the module is imported or when the attribute does not exist.
+
+        :param string attr: the name of the attribute
+
+        :return: the attribute of the module
+        :raises AttributeError: if the module does not have the attribute
+        """
+        module = self.__load__()
+        return getattr(module, attr)
@@ -0,0 +1,263 @@
+'''
+@author: Marco Bonvini
+
+This module contains adapters that can be registered as step callbacks of
+:class:`estimationpy.ukf.ukf_fmu.UkfFmu` (see :func:`estimationpy.ukf.ukf_fmu.UkfFmu.add_step_callback`)
+to monitor long running filters and smoothers from outside the process:
+
+* :class:`MetricsCollector` exposes the throughput of the algorithm (steps and simulations per
+  second, estimated time to completion, time spent in the phases, utilization of the pool)
+  as counters and gauges in the Prometheus text format, either through a local HTTP endpoint
+  or a file,
+* :class:`JsonLinesWriter` appends a JSON object for each step to a file.
+
+For example::
+
+    collector = MetricsCollector()
+    collector.start_http_server(port = 9100)
+    ukf.set_profiling()
+    ukf.add_step_callback(collector)
+    ukf.add_step_callback(JsonLinesWriter("steps.jsonl"))
+    ukf.filter_and_smooth(start, stop)
+
+'''
+import json
+import os
+import threading
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+def to_json_value(value):
+    """
+    This function converts the values contained in the information about a step
+    into values that can be represented in JSON, e.g., arrays are converted to lists
+    and time stamps to strings in ISO format.
+
+    :param value: the value to convert
+
+    :return: the converted value
+    """
+    if isinstance(value, dict):
+        return dict((k, to_json_value(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(v) for v in value]
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if hasattr(value, "tolist"):
+        return to_json_value(value.tolist())
+    return value
+
+class MetricsCollector(object):
+    """
+    This class collects the information about the steps of the filter and of the smoother
+    and exposes them as metrics in the Prometheus text format. The object is a callable
+    that can be registered as step callback. All the metrics have the label ``stage``, that is
+    either ``filter`` or ``smooth``, and their names start with a common prefix. The metrics are
+
+    * ``<prefix>_steps_total``, the number of steps completed (counter),
+    * ``<prefix>_simulations_total``, the number of simulations run (counter),
+    * ``<prefix>_step_seconds_total``, the time spent in the steps (counter),
+    * ``<prefix>_phase_seconds_total``, the time spent in each phase, with the additional label
+      ``phase`` (counter, only if the profiler of the filter is enabled),
+    * ``<prefix>_steps_per_second`` and ``<prefix>_simulations_per_second``, the throughput since
+      the beginning of the current execution of the stage (gauge),
+    * ``<prefix>_progress``, the fraction of the stage completed (gauge),
+    * ``<prefix>_eta_seconds``, the estimated time to complete the stage (gauge),
+    * ``<prefix>_normalized_innovation``, the normalized innovation of the last step (gauge, filter only),
+    * ``<prefix>_pool_utilization``, the utilization of the pool in the last step (gauge),
+    * ``<prefix>_pool_tail_latency_seconds``, the time the pool waited for the slowest simulation
+      after the median one completed in the last step (gauge).
+
+    The object can be used by multiple threads, e.g., the one running the filter and the
+    one serving the metrics.
+    """
+
+    def __init__(self, prefix = "estimationpy_ukf"):
+        """
+        Constructor of the class.
+
+        :param string prefix: the prefix of the names of the metrics
+        """
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.server = None
+        self.reset()
+
+    def reset(self):
+        """
+        This method removes all the data collected.
+
+        :rtype: None
+        """
+        with self.lock:
+            self.counters = {}
+            self.gauges = {}
+            self.phases = {}
+
+    def __call__(self, info):
+        """
+        This method updates the metrics with the information about a step, see
+        :func:`estimationpy.ukf.ukf_fmu.UkfFmu.add_step_callback`.
+
+        :param dict info: the information about the step
+
+        :rtype: None
+        """
+        stage = info["stage"]
+        with self.lock:
+            counters = self.counters.setdefault(stage, {"steps_total": 0, "simulations_total": 0, "step_seconds_total": 0.0})
+            counters["steps_total"] += 1
+            counters["simulations_total"] += info.get("simulations", 0)
+            counters["step_seconds_total"] += info.get("step_time", 0.0)
+
+            phases = self.phases.setdefault(stage, {})
+            for phase, seconds in info.get("phases", {}).items():
+                phases[phase] = phases.get(phase, 0.0) + seconds
+
+            elapsed = info.get("elapsed", 0.0)
+            progress = info.get("progress", 0.0)
+            gauges = self.gauges.setdefault(stage, {})
+            gauges["progress"] = progress
+            if elapsed > 0.0:
+                gauges["steps_per_second"] = info.get("completed_steps", 0)/elapsed
+                gauges["simulations_per_second"] = info.get("completed_simulations", 0)/elapsed
+            if progress > 0.0:
+                gauges["eta_seconds"] = elapsed*(1.0 - progress)/progress
+            if info.get("normalized_innovation") is not None:
+                gauges["normalized_innovation"] = info["normalized_innovation"]
+            if info.get("pool_utilization") is not None:
+                gauges["pool_utilization"] = info["pool_utilization"]
+            if info.get("pool_latency") is not None:
+                gauges["pool_tail_latency_seconds"] = info["pool_latency"]["tail"]
+
+    def to_prometheus(self):
+        """
+        This method returns the metrics in the Prometheus text format.
+
+        :return: the metrics
+        :rtype: string
+        """
+        lines = []
+        with self.lock:
+            for name in ["steps_total", "simulations_total", "step_seconds_total"]:
+                lines.append("# TYPE {0}_{1} counter".format(self.prefix, name))
+                for stage in sorted(self.counters):
+                    lines.append('{0}_{1}{{stage="{2}"}} {3}'.format(self.prefix, name, stage, self.counters[stage][name]))
+
+            lines.append("# TYPE {0}_phase_seconds_total counter".format(self.prefix))
+            for stage in sorted(self.phases):
+                for phase in sorted(self.phases[stage]):
+                    lines.append('{0}_phase_seconds_total{{stage="{1}",phase="{2}"}} {3}'.format(self.prefix, stage, phase, self.phases[stage][phase]))
+
+            for name in ["steps_per_second", "simulations_per_second", "progress", "eta_seconds", "normalized_innovation", "pool_utilization", "pool_tail_latency_seconds"]:
+                lines.append("# TYPE {0}_{1} gauge".format(self.prefix, name))
+                for stage in sorted(self.gauges):
+                    if name in self.gauges[stage]:
+                        lines.append('{0}_{1}{{stage="{2}"}} {3}'.format(self.prefix, name, stage, self.gauges[stage][name]))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        This method writes the metrics in a file, e.g., for the textfile collector of the
+        Prometheus node exporter. The file is replaced atomically, therefore it's never read
+        while it's partially written.
+
+        :param string path: the path of the file
+
+        :rtype: None
+        """
+        tmp = "{0}.{1}.tmp".format(path, os.getpid())
+        with open(tmp, "w") as f:
+            f.write(self.to_prometheus())
+        getattr(os, "replace", os.rename)(tmp, path)
+
+    def start_http_server(self, port = 0, address = "127.0.0.1"):
+        """
+        This method starts a thread that serves the metrics over HTTP, at any path.
+        By default the server listens only on the local interface.
+
+        :param int port: the port, if 0 a free port is selected
+        :param string address: the address
+
+        :return: the port used by the server
+        :rtype: int
+        """
+        try:
+            from http.server import HTTPServer, BaseHTTPRequestHandler
+        except ImportError:
+            from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+        collector = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = collector.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+        self.stop_http_server()
+        self.server = HTTPServer((address, port), Handler)
+        thread = threading.Thread(target = self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        logger.info("The metrics are available at http://%s:%s/metrics", address, self.server.server_port)
+        return self.server.server_port
+
+    def stop_http_server(self):
+        """
+        This method stops the HTTP server, if it's running.
+
+        :rtype: None
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+class JsonLinesWriter(object):
+    """
+    This class writes the information about each step of the filter and of the smoother
+    in a file, one JSON object per line. The object is a callable that can be registered
+    as step callback. The file is flushed after each step, therefore it can be followed
+    while the filter runs.
+    """
+
+    def __init__(self, path, append = False):
+        """
+        Constructor of the class.
+
+        :param string path: the path of the file
+        :param bool append: flag that indicates if the lines are appended to an existing file
+        """
+        self.path = path
+        self.f = open(path, "a" if append else "w")
+
+    def __call__(self, info):
+        """
+        This method writes the information about a step.
+
+        :param dict info: the information about the step
+
+        :rtype: None
+        """
+        data = to_json_value(info)
+        data["wall_time"] = time.time()
+        self.f.write(json.dumps(data, sort_keys = True) + "\n")
+        self.f.flush()
+
+    def close(self):
+        """
+        This method closes the file.
+
+        :rtype: None
+        """
+        if not self.f.closed:
+            self.f.close()
@@ -2,19 +2,37 @@
 @author: marco
 '''
 
-import pyfmi
+import copy
+import numbers
 import numpy
-import pandas as pd
 import datetime
 
+from collections import OrderedDict
+
 from estimationpy.fmu_utils.in_out_var import InOutVar
+from estimationpy.fmu_utils.csv_reader import CsvReader
 from estimationpy.fmu_utils.estimation_variable import EstimationVariable
+from estimationpy.fmu_utils.estimation_registry import EstimationRegistry
+from estimationpy.fmu_utils import covariance
+from estimationpy.fmu_utils.variable_catalogue import VariableCatalogue
+from estimationpy.fmu_utils import fmu_cache
+from estimationpy.fmu_utils.simulation_results import SimulationResults
 
 import estimationpy.fmu_utils.strings as fmu_util_strings
+from estimationpy.fmu_utils.lazy_import import LazyModule
+
+# pyfmi and pandas are imported the first time they're used
+pyfmi = LazyModule("pyfmi")
+pd = LazyModule("pandas")
 
 import logging
 logger = logging.getLogger(__name__)
 
+class SimulationError(Exception):
+    """
+    Exception raised by :func:`Model.simulate` when the simulation of the model fails.
+    """
+    pass
 
 class Model:
     """
@@ -58,18 +76,30 @@ class Model:
           the offset date instead of teh start date to compute the time in seconds.
         """
         
-        # Reference to the FMU, that will be loaded using pyfmi
+        # Reference to the FMU, that will be loaded using pyfmi, and the folder that
+        # contains the extracted FMU, used to create clones (see clone)
         self.fmu = None
         self.fmu_file = fmu_file
-        # List of parameters
-        self.parameters = []
-        # List of state variables
-        self.variables = []
+        self.fmu_dir = None
+        # Registries that store the attributes of the parameters and of the state
+        # variables to estimate, and the lists of parameters and state variables
+        self.parameter_registry = EstimationRegistry()
+        self.variable_registry = EstimationRegistry()
+        self.parameters = self.parameter_registry.views
+        self.variables = self.variable_registry.views
         # List of inputs
         self.inputs = []
         # List of outputs
         self.outputs = []
         
+        # Catalogue of the variables of the FMU, indexes of the inputs and outputs
+        # by name, and value references of the parameters and state variables to estimate
+        self.catalogue = VariableCatalogue()
+        self.input_index = {}
+        self.output_index = {}
+        self.parameter_refs = set()
+        self.variable_refs = set()
+        
         # Initialize the properties of the FMU
         self.name = ""
         self.author = ""
@@ -80,8 +110,9 @@ class Model:
         self.tool = ""
         self.numStates = ""
         
-        # Number of maximum tries for a simulation to be successfully run
-        self.SIMULATION_TRIES = 4
+        # Number of maximum tries for a simulation to be successfully run, by default
+        # a simulation that fails is not repeated with the same inputs
+        self.SIMULATION_TRIES = 1
         
         # Empty dictionary that will contain the simulation options
         self.opts = {}
@@ -95,6 +126,46 @@ class Model:
         # An array that contains the value references for every state variable
         self.stateValueReferences = []
         
+        # Time grid shared by the inputs and measured outputs once aligned, expressed
+        # in nanoseconds since the epoch (UTC), and the same grid as a DatetimeIndex
+        self.data_time = numpy.zeros(0, dtype = numpy.int64)
+        self.data_index = pd.DatetimeIndex([])
+        
+        # Matrix with the aligned data, one column for each input followed by
+        # one column for each measured output
+        self.data_matrix = numpy.zeros((0, 0))
+        
+        # Optional master clock used when aligning the data (see set_master_clock)
+        self.master_clock = None
+        
+        # Resampling applied when aligning the data (see resample_data), the step is
+        # expressed in nanoseconds. The compression ratio is the number of points of the
+        # aligned time grid divided by the number of points retained
+        self.resample_step = None
+        self.resample_adaptive = False
+        self.compression_ratio = 1.0
+        
+        # Signature of the inputs and outputs used to compute the aligned data, and
+        # read-only arrays with the time and the measured outputs computed from it
+        self.data_signature = None
+        self.measured_time = numpy.zeros(0, dtype = numpy.int64)
+        self.measured_data = numpy.zeros((0, 0))
+        
+        # Read-only covariance matrix of the state variables and parameters, and the
+        # versions of the registries used to compute it
+        self.cov_state_pars = numpy.zeros((0, 0))
+        self.cov_state_pars_versions = None
+        
+        # Structured covariances of the state variables and parameters, and of the measured
+        # outputs (see set_cov_matrix_state_pars and set_cov_matrix_outputs). When None the
+        # covariances are diagonal and defined by the variables.
+        self.cov_state_pars_custom = None
+        self.cov_outputs_custom = None
+        
+        # Flag that indicates if the outputs of Model Exchange FMUs are evaluated, and the
+        # FMUs initialized, without running the time integrator (see evaluate_outputs)
+        self.direct_evaluation = True
+        
         # See what can be done in catching the exception/propagating it
         if fmu_file is not None:
             self.__set_fmu__(fmu_file, result_handler, solver, atol, rtol, verbose)
@@ -116,14 +187,14 @@ class Model:
 
         """
         if self.is_parameter_present(obj):
-            logger.warn("Parameter: {0} not added, already present".format(obj))
+            logger.warn("Parameter: %s not added, already present", obj)
             return False
         else:
             # the object is not yet part of the list, add it            
-            par = EstimationVariable(obj, self)
-            self.parameters.append(par)
-            logger.info("Added parameter: {0}".format(par.get_fmi_var().name))
-            logger.debug("(... continue) Added parameter: {0} ({1})".format(obj, par))
+            par = EstimationVariable(obj, self, self.parameter_registry)
+            self.parameter_refs.add(par.value_reference)
+            logger.info("Added parameter: %s", par.get_fmi_var().name)
+            logger.debug("(... continue) Added parameter: %s (%s)", obj, par)
             
             return True
     
@@ -144,17 +215,341 @@ class Model:
 
         """
         if self.is_variable_present(obj):
-            logger.warn("Variable: {0} not added, already present".format(obj))
+            logger.warn("Variable: %s not added, already present", obj)
             return False
         else:
             # the object is not yet part of the list, add it
             # but before embed it into an EstimationVariable class
-            var = EstimationVariable(obj, self)
-            self.variables.append(var)
-            logger.info("Added variable: {0}".format(var.get_fmi_var().name))
-            logger.debug("(... continue) Added variable: {0} ({1})".format(obj, var))
+            var = EstimationVariable(obj, self, self.variable_registry)
+            self.variable_refs.add(var.value_reference)
+            logger.info("Added variable: %s", var.get_fmi_var().name)
+            logger.debug("(... continue) Added variable: %s (%s)", obj, var)
             return True
     
+    def align_data(self, master = None):
+        """
+        This method merges the time axes of the data series associated to the inputs and
+        to the measured outputs of the model and linearly interpolates every channel over the
+        same time grid. The result is stored in the model as a contiguous 2-D array
+        (see :func:`get_aligned_data`) and it is used directly by :func:`simulate`,
+        :func:`initialize_simulator` and :func:`get_measured_output_data_series`.
+        
+        The time grid is either the sorted union of the time indexes of all the data series, or
+        the one provided by a master clock. In both cases the grid is restricted to the period
+        where all the data series are defined.
+        
+        :param master: the master clock to use. It can be the name of an input or output variable,
+          a pandas.DatetimeIndex, or None. If None, the master clock specified with 
+          :func:`set_master_clock` is used, if also that is None the sorted union of the time
+          indexes is used.
+
+        :return: True if the data has been aligned, False otherwise.
+        :rtype: bool
+        """
+        # Inputs first, then the measured outputs
+        channels = list(self.inputs)
+        for o in self.outputs:
+            if o.is_measured_output():
+                channels.append(o)
+        
+        dataSeries = []
+        for c in channels:
+            dataSeries.append(c.get_data_series())
+        
+        if master is None:
+            master = self.master_clock
+        
+        try:
+            time = self.__merge_time_axes__(dataSeries, master)
+        except ValueError as e:
+            logger.error("Impossible to align the data series: %s", e)
+            return False
+        
+        # Replace the time grid with a uniform one, if requested
+        Npoints = len(time)
+        if self.resample_step is not None and Npoints > 0:
+            time = numpy.arange(time[0], time[-1] + 1, self.resample_step, dtype = numpy.int64)
+        
+        # Fill the matrix column by column
+        matrix = numpy.empty((len(time), len(dataSeries)))
+        for j, ds in enumerate(dataSeries):
+            matrix[:, j] = self.__interpolate_series__(ds, time)
+        
+        # Remove the points where none of the data series changes more than its threshold
+        if self.resample_adaptive and len(time) > 0:
+            thresholds = numpy.array([c.get_threshold() for c in channels])
+            keep = self.__adaptive_sampling__(matrix, thresholds)
+            time = time[keep]
+            matrix = numpy.ascontiguousarray(matrix[keep, :])
+        
+        self.compression_ratio = float(Npoints)/len(time) if len(time) > 0 else 1.0
+        
+        self.data_time = time
+        self.data_index = pd.to_datetime(time, utc = True)
+        self.data_matrix = matrix
+        self.data_signature = self.__data_signature__()
+        
+        # Cache the measured outputs as read-only arrays that can be shared by multiple filters
+        Ninputs = self.get_num_inputs()
+        self.measured_time = time.view()
+        self.measured_time.flags.writeable = False
+        self.measured_data = numpy.ascontiguousarray(matrix[:, Ninputs:])
+        self.measured_data.flags.writeable = False
+        
+        logger.info("Aligned %s data series over %s points", len(dataSeries), len(time))
+        return True
+    
+    def bind_csv_file(self, filename, mapping):
+        """
+        This method associates the columns of a CSV file to multiple inputs and outputs
+        of the model. The file is parsed only once, and the data series of all the
+        variables share the same time index. For example::
+        
+            m.bind_csv_file("data.csv", {"u": "system.u", "y": "system.y"})
+        
+        associates the column ``system.u`` to the input ``u`` and the column ``system.y``
+        to the output ``y``. The data series are set with the method 
+        :func:`estimationpy.fmu_utils.in_out_var.InOutVar.set_data_series`, the flag
+        that identifies the measured outputs has to be set separately.
+        
+        :param str filename: The path of the CSV file.
+        :param dict mapping: a dictionary that has the names of the input or output
+          variables as keys, and the names of the columns of the CSV file as values.
+        
+        :return: True if the data has been associated to the variables, False if there
+          were problems reading the CSV file.
+        :rtype: bool
+        
+        :raises ValueError: if one of the names is not an input or an output of the model.
+        """
+        # Identify the variables before reading the file
+        variables = []
+        columns = []
+        for name, column in mapping.items():
+            var = self.get_input_by_name(name)
+            if var is None:
+                var = self.get_output_by_name(name)
+            if var is None:
+                msg = "The variable {0} is not an input or an output of the model".format(name)
+                logger.error(msg)
+                raise ValueError(msg)
+            variables.append(var)
+            columns.append(column)
+        
+        # Read all the columns at once
+        reader = CsvReader()
+        if not reader.open_csv(filename):
+            return False
+        
+        index, dataMatrix = reader.get_data_matrix(columns)
+        if len(index) == 0:
+            return False
+        
+        for j, var in enumerate(variables):
+            var.set_data_series(pd.Series(dataMatrix[:, j], index = index, name = columns[j]))
+        
+        logger.info("Associated %s columns of the file %s", len(columns), filename)
+        return True
+    
+    def resample_data(self, step = None, adaptive = False):
+        """
+        This method defines how the data series associated to the inputs and measured outputs
+        are resampled before being used for simulations and estimation. The same time grid
+        is used for all the inputs and measured outputs. The data can be resampled
+        
+        * uniformly, specifying the parameter ``step``. The data series are linearly
+          interpolated over a time grid with constant step that starts at the beginning of
+          the period where all the data series are defined,
+        * adaptively, setting ``adaptive = True``. A point is retained only when at least one
+          of the data series differs from the last point retained more than its threshold 
+          (see :func:`estimationpy.fmu_utils.in_out_var.InOutVar.set_threshold`). When the data 
+          changes after a quiet period, also the last point of the quiet period is retained.
+        
+        The two options can be combined, in that case the adaptive compression is applied to the
+        uniformly resampled data. The settings are stored in the model and are applied every time
+        the data is aligned by :func:`align_data`. Calling the method without parameters
+        disables the resampling.
+        
+        :param step: the step of the uniform time grid. It can be a number of seconds, a 
+          datetime.timedelta, or a string that can be converted into a pandas.Timedelta (e.g. '15min').
+          If None the time grid is not uniformly resampled.
+        :param bool adaptive: flag that enables the adaptive compression of the data.
+        
+        :return: the compression ratio, i.e., the ratio between the number of points of the
+          data before and after the resampling.
+        :rtype: float
+        
+        :raises ValueError: if the step is not positive, or the data can't be aligned.
+        """
+        if step is None:
+            self.resample_step = None
+        else:
+            if isinstance(step, numbers.Number):
+                step = pd.Timedelta(seconds = step)
+            step_ns = int(pd.Timedelta(step).value)
+            if step_ns <= 0:
+                raise ValueError("The step used to resample the data must be positive")
+            self.resample_step = step_ns
+        
+        self.resample_adaptive = adaptive
+        
+        # Align the data with the new settings
+        self.data_signature = None
+        if not self.align_data():
+            raise ValueError("Impossible to resample the data series")
+        
+        logger.info("Data resampled over %s points, compression ratio is %.2f", len(self.data_time), self.compression_ratio)
+        return self.compression_ratio
+    
+    def get_compression_ratio(self):
+        """
+        This method returns the compression ratio obtained by the last alignment of the data.
+        The ratio is computed as the number of points of the time grid before the resampling
+        divided by the number of points retained (see :func:`resample_data`).
+        
+        :return: the compression ratio
+        :rtype: float
+        """
+        return self.compression_ratio
+    
+    def clone(self):
+        """
+        This method creates a new model that uses the same FMU of this model, with
+        a new instance of the FMU. The new model shares with this model the data that does
+        not change, i.e., the catalogue of the variables, the properties of the FMU and the
+        value references of the states. The new model has its own copies of
+        
+        * the inputs and outputs, that are associated to the same data series of this model,
+        * the parameters and state variables to estimate, with their initial values, covariances,
+          bounds and constraints,
+        * the options of the simulation.
+        
+        The data series of the new model can be modified without affecting this model, e.g., with
+        :func:`bind_csv_file` or :func:`estimationpy.fmu_utils.in_out_var.InOutVar.set_data_series`.
+        The structured covariances and the value references of the states are copied as well.
+        
+        Since the metadata of the variables is not read again from the FMU, creating a clone costs
+        about the same as instantiating the FMU. The FMU is extracted once, by the first call to this
+        method, in the folder returned by :func:`estimationpy.fmu_utils.fmu_cache.get_extracted_dir`,
+        and all the clones load it from there with :func:`estimationpy.fmu_utils.fmu_cache.load_extracted_fmu`.
+        
+        **NOTE**
+            The values that have been set directly in the FMU of this model (e.g., with the method
+            **set** of the FMU) are not copied. The new model needs to be initialized with
+            :func:`initialize_simulator` before running simulations.
+        
+        :return: the new model
+        :rtype: estimationpy.fmu_utils.model.Model
+        
+        :raises ValueError: if there is no FMU associated to the model.
+        """
+        if self.fmu is None:
+            raise ValueError("Impossible to clone a model without FMU")
+        
+        # Share all the attributes, then replace the ones that can be modified
+        new = Model.__new__(Model)
+        new.__dict__.update(self.__dict__)
+        
+        # New instance of the FMU, loaded from the folder where it's extracted,
+        # with the same simulation options
+        if self.fmu_dir is None:
+            self.fmu_dir = fmu_cache.get_extracted_dir(self.fmu_file)
+            new.fmu_dir = self.fmu_dir
+        new.fmu = fmu_cache.load_extracted_fmu(self.fmu_dir, self.fmu_file)
+        new.opts = new.fmu.simulate_options()
+        for key in self.opts.keys():
+            value = self.opts[key]
+            new.opts[key] = copy.copy(value) if isinstance(value, dict) else value
+        
+        # Inputs and outputs, associated to the same data series
+        new.inputs = [self.__copy_in_out_var__(v) for v in self.inputs]
+        new.outputs = [self.__copy_in_out_var__(v) for v in self.outputs]
+        new.input_index = dict([(v.get_object().name, v) for v in new.inputs])
+        new.output_index = dict([(v.get_object().name, v) for v in new.outputs])
+        
+        # Parameters and state variables to estimate
+        new.parameter_registry = self.parameter_registry.copy()
+        new.variable_registry = self.variable_registry.copy()
+        new.parameters = new.parameter_registry.views
+        new.variables = new.variable_registry.views
+        new.parameter_refs = set(self.parameter_refs)
+        new.variable_refs = set(self.variable_refs)
+        
+        # Other attributes that can be modified
+        new.stateValueReferences = copy.copy(self.stateValueReferences)
+        new.cov_state_pars_custom = copy.deepcopy(self.cov_state_pars_custom)
+        new.cov_outputs_custom = copy.deepcopy(self.cov_outputs_custom)
+        
+        # The aligned data is shared since its arrays are never modified, it's still valid
+        # if it was valid for this model
+        new.data_signature = new.__data_signature__() if self.is_data_aligned() else None
+        
+        logger.info("Cloned model of the FMU %s", self.fmu_file)
+        return new
+    
+    def evaluate_outputs(self, t = None, x = None, pars = None, u = None):
+        """
+        This method evaluates the outputs of the model at a given time, for given values of
+        the observed states, the estimated parameters and the inputs. The values of the states,
+        parameters and inputs are set in the FMU, the other states keep their current values.
+        
+        When the FMU is a Model Exchange FMU the outputs are computed by the FMU directly,
+        without invoking the time integrator. Otherwise, or if the direct evaluation fails, the
+        outputs are computed with a simulation of length zero.
+        
+        :param datetime.datetime t: the time at which the outputs are evaluated. If None the
+          first point of the aligned data is used.
+        :param numpy.array x: the values of the observed states, if None the current values are used.
+        :param numpy.array pars: the values of the estimated parameters, if None the current values are used.
+        :param numpy.array u: the values of the inputs, if None the inputs are interpolated
+          from the aligned data at time ``t``.
+        
+        :return: a tuple with the values of the measured outputs and the values of all the outputs
+        :rtype: tuple(numpy.array, numpy.array)
+        """
+        if not self.is_data_aligned():
+            self.align_data()
+        if t is None:
+            t = self.data_index[0]
+        if u is None:
+            u = self.__inputs_at__(t)
+        u = numpy.asarray(u, dtype = numpy.float64).ravel()
+        
+        # Set the states and the parameters
+        if x is not None:
+            self.set_state_selected(x)
+        if pars is not None:
+            self.set_parameters_selected(pars)
+        
+        evaluated = False
+        if self.direct_evaluation and self.__is_model_exchange__():
+            try:
+                # Same time of the simulation of length zero used otherwise
+                self.fmu.time = self.__time_to_seconds__(t, t)
+                self.__set_inputs_in_fmu__(u)
+                evaluated = True
+            except Exception as e:
+                logger.warn("Direct evaluation of the outputs failed (%s), use a simulation", e)
+                self.direct_evaluation = False
+        
+        if not evaluated:
+            # Simulate from t to t, the outputs are read from the FMU
+            self.simulate(time = pd.DatetimeIndex([t, t]), input = numpy.vstack((u, u)))
+        
+        return self.get_measured_outputs_values(), self.get_outputs_values()
+    
+    def set_direct_evaluation(self, enabled = True):
+        """
+        This method enables or disables the direct evaluation of the outputs and the
+        direct initialization of Model Exchange FMUs, see :func:`evaluate_outputs` and
+        :func:`initialize_simulator`. When disabled, simulations of length zero are used.
+        
+        :param bool enabled: flag that enables the direct evaluation
+        
+        :rtype: None
+        """
+        self.direct_evaluation = enabled
+    
     def check_input_data(self, align=True):
         """
         This method checks if all the data series associated to the inputs
@@ -178,6 +573,9 @@ class Model:
         """
         This method check if all the data series provided by the dataList are ready to be used or not.
         If not because they are not aligned, this method tries to correct them providing an interpolation.
+        The data series are aligned over the sorted union of their time indexes, restricted to the
+        period where all of them are defined. The values are linearly interpolated and the aligned
+        series replace the original ones.
         
         :param List(InOutVar) dataList: a list that contains object of type :class:`InOutVar`.
         :param bool align: boolean parameter that specifies whether the method should simply check is the
@@ -192,182 +590,203 @@ class Model:
         for inp in dataList:
             dataSeries.append(inp.get_data_series())
         
-        Ninputs = len(dataSeries)
-        Tmin = 0.0
-        Tmax = 0.0
-        Npoints = 0
+        # Compare the indexes directly, without converting them to lists of Timestamps
         match = True
+        for i in range(1, len(dataSeries)):
+            if not dataSeries[i].index.equals(dataSeries[0].index):
+                match = False
+                break
         
-        # Scan all the data series
-        for i in range(Ninputs):
-            
-            if i == 0:
-                Tmin = dataSeries[i].index[0]
-                Tmax = dataSeries[i].index[-1]
-            else:
-                if not dataSeries[i].index.tolist() == dataSeries[i-1].index.tolist():
-                    match = False
-                    Tmin = max(Tmin, dataSeries[i].index[0])
-                    Tmax = min(Tmax, dataSeries[i].index[-1])
-        
-        # Check if they match or not           
-        if match is False and align:
-            
-            # At the end of this loop we know
-            # which data series has the bigger number of points and will
-            # be used as base for the other ones
-            MaxPoints = 0
-            ind = 0
-            for i in range(Ninputs):
-                NumP = len(dataSeries[i].ix[0])
-                if NumP > MaxPoints:
-                    MaxPoints = NumP
-                    ind = i
-            
-            # Select the best index
-            new_index = dataSeries[ind].index
-            
-            # Interpolate using the same datetimeIndex
-            for inp in dataList:
-                inp.get_data_series().reindex(new_index).interpolate(method='linear')
-
-            logger.error("Problems while matching the data series")
-            return False
-        else:
+        if match:
             logger.info("Match between data series is OK")
             return True
+        
+        if not align:
+            logger.error("The data series are not aligned")
+            return False
+        
+        # Compute the common time grid and interpolate all the data series over it
+        try:
+            time = self.__merge_time_axes__(dataSeries, None)
+        except ValueError as e:
+            logger.error("Problems while matching the data series: %s", e)
+            return False
+        
+        index = pd.to_datetime(time, utc = True)
+        for inp, ds in zip(dataList, dataSeries):
+            values = self.__interpolate_series__(ds, time)
+            inp.set_data_series(pd.Series(values, index = index, name = ds.name))
+        
+        logger.info("Data series aligned over %s points", len(time))
+        return True
 
+    def get_aligned_data(self):
+        """
+        This method returns the data aligned by :func:`align_data`. The data is a matrix with
+        one row for each time stamp, the first columns are the inputs (in the same order of
+        :func:`get_input_names`) and the remaining columns are the measured outputs (in the
+        same order of :func:`get_measured_output_names`).
+        
+        :return: a tuple with the time index and the matrix containing the aligned data.
+        :rtype: tuple(pandas.DatetimeIndex, numpy.ndarray)
+        """
+        return self.data_index, self.data_matrix
+    
     def get_constr_obs_states_high(self):
         """
         This method returns a **numpy.array** that contains the upper boundary of the constraints
         over the observed state variables.
         
+        The result is cached and read-only, it's computed again only after the attributes of the
+        variables are modified.
+        
         :return: An array containing the upper bounds of the constraints for the state variables.
         :rtype: numpy.array
 
         """
-        constrHi = numpy.empty(self.get_num_variables())
-        i = 0
-        for v in self.variables:
-            constrHi[i] = v.get_constraint_high()
-            i += 1
-        return constrHi
+        return self.variable_registry.get_array("constraint_high")
     
     def get_constr_obs_states_low(self):
         """
         This method returns a **numpy.array** that contains the lower boundary of the constraints
         over the observed state variables.
         
+        The result is cached and read-only, it's computed again only after the attributes of the
+        variables are modified.
+        
         :return: An array containing the lower bounds of the constraints for the state variables.
         :rtype: numpy.array
 
         """
-        constrLow = numpy.empty(self.get_num_variables())
-        i = 0
-        for v in self.variables:
-            constrLow[i] = v.get_constraint_low()
-            i += 1
-        return constrLow
+        return self.variable_registry.get_array("constraint_low")
     
     def get_constr_pars_high(self):
         """
         This method returns a **numpy.array** that contains the upper boundary of the constraints
         over the estimated parameters.
         
+        The result is cached and read-only, it's computed again only after the attributes of the
+        variables are modified.
+        
         :return: An array containing the upper bounds of the constraints for the estimated parameters.
         :rtype: numpy.array
 
         """
-        constrHi = numpy.empty(self.get_num_parameters())
-        i = 0
-        for p in self.parameters:
-            constrHi[i] = p.get_constraint_high()
-            i += 1
-        return constrHi
+        return self.parameter_registry.get_array("constraint_high")
     
     def get_constr_pars_low(self):
         """
         This method returns a **numpy.array** that contains the lower boundary of the constraints
         over the estimated parameters.
         
+        The result is cached and read-only, it's computed again only after the attributes of the
+        variables are modified.
+        
         :return: An array containing the lower bounds of the constraints for the estimated parameters.
         :rtype: numpy.array
 
         """
-        constrLow = numpy.empty(self.get_num_parameters())
-        i = 0
-        for p in self.parameters:
-            constrLow[i] = p.get_constraint_low()
-            i += 1
-        return constrLow
+        return self.parameter_registry.get_array("constraint_low")
     
     def get_cov_matrix_states(self):
         """
         This method returns a **numpy.ndarray** representing the covariance matrix of the estimated
         state variables. The matrix is diagonal.
         
+        The result is cached and read-only, it's computed again only after the attributes of the
+        variables are modified.
+        
         :return: A matrix that is the covariance matrix of the state variables.
         :rtype: numpy.ndarray
 
         """
-        cov = numpy.diag(numpy.zeros(self.get_num_variables()))
-        i = 0
-        for v in self.variables:
-            cov[i,i] = v.get_covariance()
-            i += 1
-        return cov
+        return self.variable_registry.get_covariance_matrix()
     
     def get_cov_matrix_state_pars(self):
         """
         This method returns a **numpy.ndarray** representing the covariance matrix of the estimated
-        state variables and parameters. The matrix is diagonal.
+        state variables and parameters. The matrix is diagonal, unless a different matrix has been
+        specified with :func:`set_cov_matrix_state_pars`.
+        
+        The result is cached and read-only, it's computed again only after the attributes of the
+        variables are modified.
         
         :return: A matrix that is the covariance matrix of the state variables and parameters.
         :rtype: numpy.ndarray
+        :raises ValueError: if the size of the matrix specified is not equal to the number of state
+          variables and parameters, e.g., because they have been modified after specifying it.
 
         """
-        cov = numpy.diag(numpy.zeros(self.get_num_variables() + self.get_num_parameters()))
-        i = 0
-        for v in self.variables:
-            cov[i,i] = v.get_covariance()
-            i += 1
-        for p in self.parameters:
-            cov[i,i] = p.get_covariance()
-            i += 1
-        return cov
+        if self.cov_state_pars_custom is not None:
+            return self.get_cov_state_pars().to_dense()
+        
+        versions = (self.variable_registry.version, self.parameter_registry.version)
+        if self.cov_state_pars_versions != versions:
+            cov = numpy.diag(numpy.concatenate((self.variable_registry.covariances, self.parameter_registry.covariances)))
+            cov.flags.writeable = False
+            self.cov_state_pars = cov
+            self.cov_state_pars_versions = versions
+        return self.cov_state_pars
     
     def get_cov_matrix_parameters(self):
         """
         This method returns a **numpy.ndarray** representing the covariance matrix of the estimated
         parameters. The matrix is diagonal.
         
+        The result is cached and read-only, it's computed again only after the attributes of the
+        variables are modified.
+        
         :return: A matrix that is the covariance matrix of the estimated parameters.
         :rtype: numpy.ndarray
 
         """
-        cov = numpy.diag(numpy.zeros(self.get_num_parameters()))
-        i = 0
-        for p in self.parameters:
-            cov[i,i] = p.get_covariance()
-            i += 1
-        return cov
+        return self.parameter_registry.get_covariance_matrix()
     
     def get_cov_matrix_outputs(self):
         """
         This method returns a **numpy.ndarray** representing the covariance matrix of the measured
-        output variables. The matrix is diagonal.
+        output variables. The matrix is diagonal, unless a different matrix has been
+        specified with :func:`set_cov_matrix_outputs`.
         
         :return: A matrix that is the covariance matrix of the measured output variables.
         :rtype: numpy.ndarray
+        :raises ValueError: if the size of the matrix specified is not equal to the number of
+          measured outputs.
 
         """
-        cov = numpy.diag(numpy.zeros(self.get_num_measured_outputs()))
-        i = 0
-        for o in self.outputs:
-            if o.is_measured_output():
-                cov[i,i] = o.get_covariance()
-                i += 1
-        return cov
+        return numpy.array(self.get_cov_outputs())
+    
+    def get_cov_outputs(self):
+        """
+        This method returns the covariance matrix of the measured outputs preserving
+        its structure. If no matrix has been specified with :func:`set_cov_matrix_outputs`, the
+        matrix is diagonal and contains the covariances of the measured outputs.
+        
+        :return: the structured covariance matrix of the measured outputs
+        :rtype: estimationpy.fmu_utils.covariance.Covariance
+        :raises ValueError: if the size of the matrix specified is not equal to the number of
+          measured outputs, e.g., because they have been modified after specifying it.
+        """
+        if self.cov_outputs_custom is not None:
+            return self.__check_covariance__(self.cov_outputs_custom, self.get_num_measured_outputs())
+        return covariance.DiagonalCovariance([o.get_covariance() for o in self.outputs if o.is_measured_output()])
+    
+    def get_cov_state_pars(self):
+        """
+        This method returns the covariance matrix of the estimated state variables and
+        parameters preserving its structure. If no matrix has been specified with
+        :func:`set_cov_matrix_state_pars`, the matrix is diagonal and contains the covariances
+        of the state variables followed by the ones of the parameters.
+        
+        :return: the structured covariance matrix of the state variables and parameters
+        :rtype: estimationpy.fmu_utils.covariance.Covariance
+        :raises ValueError: if the size of the matrix specified is not equal to the number of state
+          variables and parameters, e.g., because they have been modified after specifying it.
+        """
+        if self.cov_state_pars_custom is not None:
+            return self.__check_covariance__(self.cov_state_pars_custom, self.get_num_variables() + self.get_num_parameters())
+        return covariance.DiagonalCovariance(numpy.concatenate((self.variable_registry.covariances, \
+                                                                self.parameter_registry.covariances)))
           
     def get_fmu(self):
         """
@@ -420,10 +839,7 @@ class Model:
         :rtype: estimationpy.fmu_utils.in_out_var.InOutVar, None
 
         """
-        for var in self.inputs:
-            if var.get_object().name == name:
-                return var
-        return None
+        return self.input_index.get(self.catalogue.resolve_alias(name))
     
     def get_input_names(self):
         """
@@ -493,36 +909,51 @@ class Model:
           are defined.
         :rtype: numpy.ndarray
         """
-        # Get all the data series from the CSV files (for every input of the model)
-        outDataSeries = []
-        for o in self.outputs:
-            if o.is_measured_output():
-                outDataSeries.append(o)
-
-        assert len(outDataSeries) > 0, 'No measured outputs found'
-
-        # Try to align the measured output data
-        self.check_data_list(outDataSeries, align = True)
+        time, values = self.get_measured_output_matrix()
         
         # Now transform it into a matrix with time as first column and the measured outputs
-        time = outDataSeries[0].get_data_series().index
-        
-        # Create the empty matrix
-        Npoints = len(time)
-        Nouts = self.get_num_measured_outputs()
-        dataMatrix = numpy.zeros(shape=(Npoints, Nouts+1))
+        dataMatrix = numpy.zeros(shape=(len(time), values.shape[1]+1))
         
         # Define the first column as the time
         dataMatrix[:,0] = time
         
-        # Put the other values in the following columns
-        i = 1
-        for o in outDataSeries:
-            dataMatrix[:,i] = o.get_data_series().values
-            i += 1
+        # Put the measured outputs in the following columns
+        dataMatrix[:,1:] = values
 
         return dataMatrix
     
+    def get_measured_output_matrix(self):
+        """
+        This method returns the time and the values of the measured outputs aligned
+        by :func:`align_data`. Differently from :func:`get_measured_output_data_series`
+        the method does not allocate new arrays, it returns read-only views of data that
+        is cached in the model. The data is aligned again only when the inputs, the outputs
+        or their data series change, therefore the method can be called repeatedly, e.g., when
+        running the filter multiple times on the same data.
+        
+        :return: a tuple with the time expressed in nanoseconds since the epoch (UTC) and a
+          matrix containing one column for each measured output.
+        :rtype: tuple(numpy.ndarray, numpy.ndarray)
+        """
+        Nouts = self.get_num_measured_outputs()
+        assert Nouts > 0, 'No measured outputs found'
+        
+        # Align the inputs and the measured outputs if not done yet, or if they changed
+        if not self.is_data_aligned():
+            self.align_data()
+        
+        return self.measured_time, self.measured_data
+    
+    def is_data_aligned(self):
+        """
+        This method checks if the data aligned by :func:`align_data` is still valid, i.e., the
+        inputs, the measured outputs and their data series did not change after the alignment.
+        
+        :return: True if the aligned data is up to date, False otherwise.
+        :rtype: bool
+        """
+        return self.data_signature is not None and self.data_signature == self.__data_signature__()
+    
     def get_num_inputs(self):
         """
         This method returns the total number of input variables of the FMU 
@@ -605,11 +1036,10 @@ class Model:
         :return: The output variable identified by the parameter ``name``
         :rtype: estimationpy.fmu_utils.in_out_var.InOutVar, None
         """
-        for var in self.outputs:
-            if var.get_object().name == name:
-                return var
-        logger.exception("Output variable with name {0} not found".format(name))
-        return None
+        var = self.output_index.get(self.catalogue.resolve_alias(name))
+        if var is None:
+            logger.exception("Output variable with name %s not found", name)
+        return var
     
     def get_output_names(self):
         """
@@ -656,30 +1086,26 @@ class Model:
         This method return an array that contains the minimum values that the selected parameters
         can assume.
         
+        The result is cached and read-only, it's computed again only after the attributes of the
+        variables are modified.
+        
         :return: an array with the min values the parameters can assume.
         :rtype: numpy.array
         """
-        minValues = numpy.zeros(self.get_num_parameters())
-        i = 0
-        for p in self.parameters:
-            minValues[i] = p.get_min_value()
-            i += 1
-        return minValues
+        return self.parameter_registry.get_array("min_values")
     
     def get_parameters_max(self):
         """
         This method return an array that contains the maximum values that the estimated parameters
         can assume.
         
+        The result is cached and read-only, it's computed again only after the attributes of the
+        variables are modified.
+        
         :return: an array with the max values the parameters can assume.
         :rtype: numpy.array
         """
-        maxValues = numpy.zeros(self.get_num_parameters())
-        i = 0
-        for p in self.parameters:
-            maxValues[i] = p.get_max_value()
-            i += 1
-        return maxValues
+        return self.parameter_registry.get_array("max_values")
     
     def get_parameter_names(self):
         """
@@ -705,12 +1131,7 @@ class Model:
         :return: an array containing the values of the parameters selected as read in the FMU model.
         :rtype: numpy.ndarray
         """
-        obsPars = numpy.zeros(self.get_num_parameters())
-        i = 0
-        for p in self.parameters:
-            obsPars[i] = p.read_value_in_fmu(self.fmu)
-            i += 1
-        return obsPars
+        return self.parameter_registry.read_values(self.fmu)
     
     def get_properties(self):
         """
@@ -742,6 +1163,22 @@ class Model:
         """
         return self.fmu.get_real(var.value_reference)[0]
     
+    def set_simulation_tries(self, tries):
+        """
+        This method sets the number of times :func:`simulate` runs a simulation that fails
+        before raising an exception. Since the simulations are repeated with the same inputs
+        and options, multiple tries are useful only when the failures are not deterministic.
+        
+        :param int tries: the number of tries, at least one
+        
+        :rtype: None
+        
+        :raises ValueError: if the number of tries is less than one
+        """
+        if tries < 1:
+            raise ValueError("The number of tries must be at least one")
+        self.SIMULATION_TRIES = int(tries)
+    
     def get_simulation_options(self):
         """
         This method returns the simulation options of the simulator.
@@ -771,40 +1208,31 @@ class Model:
         :return: array containing the observed states in the order they were declared.
         :rtype: numpy.array
         """
-        obsState = numpy.zeros(self.get_num_variables())
-        i = 0
-        for v in self.variables:
-            obsState[i] = v.read_value_in_fmu(self.fmu)
-            i += 1
-        return obsState
+        return self.variable_registry.read_values(self.fmu)
     
     def get_state_observed_min(self):
         """
         This method return an array that contains the minimum values that the observed states can assume.
         
+        The result is cached and read-only, it's computed again only after the attributes of the
+        variables are modified.
+        
         :return: an array with the min values the observed states can assume.
         :rtype: numpy.array
         """
-        minValues = numpy.zeros(self.get_num_variables())
-        i = 0
-        for v in self.variables:
-            minValues[i] = v.get_min_value()
-            i += 1
-        return minValues
+        return self.variable_registry.get_array("min_values")
     
     def get_state_observed_max(self):
         """
         This method return an array that contains the maximum values that the observed states can assume.
         
+        The result is cached and read-only, it's computed again only after the attributes of the
+        variables are modified.
+        
         :return: an array with the max values the observed states can assume.
         :rtype: numpy.array
         """
-        maxValues = numpy.zeros(self.get_num_variables())
-        i = 0
-        for v in self.variables:
-            maxValues[i] = v.get_max_value()
-            i += 1
-        return maxValues
+        return self.variable_registry.get_array("max_values")
         
     def get_variables(self):
         """
@@ -841,7 +1269,9 @@ class Model:
         
         try:
             # Take the data type associated to the variable
-            t = self.fmu.get_variable_data_type(variable_info.name)
+            t = self.catalogue.get_data_type(variable_info.name)
+            if t is None:
+                t = self.fmu.get_variable_data_type(variable_info.name)
 
             # According to the data type read, select one of these methods to get the information
             if t == pyfmi.fmi.FMI_REAL:
@@ -855,7 +1285,7 @@ class Model:
             elif t == pyfmi.fmi.FMI_STRING:
                 value = self.fmu.get_string( variable_info.value_reference )
             else:
-                logger.error("FMU-EXCEPTION, The type {0} is not known".format(t))
+                logger.error("FMU-EXCEPTION, The type %s is not known", t)
                 value = 0.0
  
             # TODO: check the min and max value if the variables are not real or integers
@@ -865,14 +1295,14 @@ class Model:
             try:
                 start = self.fmu.get_variable_start(variable_info.name)
             except pyfmi.fmi.FMUException:
-                logger.warn("Default start value defined as 0.0 for variable {0}".format(variable_info.name))
+                logger.warn("Default start value defined as 0.0 for variable %s", variable_info.name)
                 start = 0.0
             
-            return type, value, start, Min, Max
+            return t, value, start, Min, Max
         
         except pyfmi.fmi.FMUException:
                 # if the real value is not present for this parameter/variable
-                logger.error("FMU-EXCEPTION, No real value to read for variable {0}.".format(variable_info.name))
+                logger.error("FMU-EXCEPTION, No real value to read for variable %s.", variable_info.name)
                 return None, None, None, None, None
     
     def get_variable_info(self, variable_info):
@@ -883,7 +1313,9 @@ class Model:
         
         try:
             # Take the data type associated to the variable
-            t  = self.fmu.get_variable_data_type(variable_info.name)
+            t = self.catalogue.get_data_type(variable_info.name)
+            if t is None:
+                t = self.fmu.get_variable_data_type(variable_info.name)
             
             # According to the data type read, select one of these methods to get the information
             if t == pyfmi.fmi.FMI_REAL:
@@ -902,7 +1334,7 @@ class Model:
                 value = self.fmu.get_string( variable_info.value_reference )
                 strType = "String"
             else:
-                logger.error("FMU-EXCEPTION, The type {0} is not known".format(t))
+                logger.error("FMU-EXCEPTION, The type %s is not known", t)
                 value = [""]
                 strType = "Unknown"
  
@@ -920,16 +1352,16 @@ class Model:
             strVal = str(value[0])
             strMin = str(Min)
             strMax = str(Max)
-            if min < -1.0e+20:
+            if Min < -1.0e+20:
                 strMin = "-Inf"
-            if max > 1.0e+20:
+            if Max > 1.0e+20:
                 strMax = "+Inf"
             
             return strType, strVal, start, strMin, strMax
         
         except pyfmi.fmi.FMUException:
                 # if the real value is not present for this parameter/variable
-                logger.error("FMU-EXCEPTION, No real value to read for variable {0}".format(variable_info.name))
+                logger.error("FMU-EXCEPTION, No real value to read for variable %s", variable_info.name)
                 return "", "", "", "", ""
     
     def get_variable_names(self):
@@ -948,13 +1380,12 @@ class Model:
         """
         if name is not None and name != "":
             if self.fmu is not None:
-                try:
-                    return self.fmu.get_model_variables()[name]
-                except Exception:
-                    logger.error("The variable or parameter: {0} is not available in the list: {1}".format(name, self.fmu.get_model_variables().keys()))
-                    return None
+                var = self.catalogue.get(name)
+                if var is None:
+                    logger.error("The variable or parameter: %s is not available in the FMU", name)
+                return var
             else:
-                logger.error("The FMU model has not yet been set. Impossible return the variable {0}".format(name))
+                logger.error("The FMU model has not yet been set. Impossible return the variable %s", name)
                 return None
         else:
             logger.error("Impossible to look for the name because it is None or empty")
@@ -962,7 +1393,9 @@ class Model:
     
     def initialize_simulator(self, startTime=None):
         """
-        This method performs a simulation of length zero to initialize the model.
+        This method initializes the model. Model Exchange FMUs that have not yet been
+        initialized are initialized directly, without invoking the time integrator. Otherwise,
+        or if the direct initialization fails, the method performs a simulation of length zero.
         The initialization is needed only once before running the first simulation. Simulations
         after the first do not need to execute the initialization again.
         
@@ -984,8 +1417,13 @@ class Model:
         if not self.load_outputs():
             return False
         
-        # Take the time series: the first because now they are all the same (thanks to alignment)
-        time = self.inputs[0].get_data_series().index
+        # Merge the time axes of the inputs and measured outputs, unless they're still aligned
+        if not self.is_data_aligned():
+            if not self.align_data():
+                return False
+        
+        # Take the time grid shared by all the aligned data series
+        time = self.data_index
         
         # Define the initial time for the initialization
         if startTime == None:
@@ -999,12 +1437,7 @@ class Model:
                 
             # Start time specified, start from the closest point
             if (startTime >= time[0]) and (startTime <= time[-1]):
-                index = 0
-                for t in time:
-                    if t < startTime:
-                        index += 1
-                    else:
-                        break
+                index = time.searchsorted(startTime, side = "left")
             else:
                 index = 0
                 raise IndexError("The value selected as initialization start time is outside the time frame")
@@ -1013,59 +1446,35 @@ class Model:
         # If the offset is specified then use it as start time
         start_time = time[index]
         
-        # Take all the data series
+        # The inputs at the start time are a row of the aligned data
         Ninputs = len(self.inputs)
-        start_input = numpy.zeros((1, Ninputs))
-        start_input_1 = numpy.zeros((1, Ninputs))
-        start_input_2 = numpy.zeros((1, Ninputs))
-        i = 0
-        if index == 0:
-            for inp in self.inputs:
-                dataInput = numpy.matrix(inp.get_data_series().values).reshape(-1,1)
-                start_input[0, i] = dataInput[index,0]
-                i += 1
-        else:
-            for inp in self.inputs:
-                dataInput = numpy.matrix(inp.get_data_series().values).reshape(-1,1)
-                start_input_1[0, i] = dataInput[index-1,0]
-                start_input_2[0, i] = dataInput[index,0]
-                
-                # Linear interpolation between the two values
-                dt0 = (time[index] - start_time).total_seconds()
-                dT1 = (start_time  - time[index-1]).total_seconds()
-                DT  = (time[index] - time[index-1]).total_seconds()
-                
-                # Perform the interpolation
-                start_input[0, i] = (dt0*start_input_1[0, i] + dT1*start_input_2[0, i])/DT
-                
-                i += 1
+        start_input = self.data_matrix[index:index+1, :Ninputs]
                
         # Initialize the model for the simulation
         self.opts["initialize"] = True
         
         try:
-            # Simulate from the initial time to initial time + epsilon
-            # thus we have 2 points
-            
-            # Create the input objects for the simulation that initializes
-            input_u = numpy.hstack((start_input, start_input))
-            input_u = input_u.reshape(2, -1)
-            
-            time = pd.DatetimeIndex([start_time, start_time])
-
-            # Run the simulation, remember that
-            # time has to be a dateteTimeIndex and Input has to be a numpy.matrix
-            self.simulate(time=time, input=input_u)
+            if not self.__initialize_model_exchange__(start_time, start_input[0]):
+                # Simulate from the initial time to initial time + epsilon
+                # thus we have 2 points
+                
+                # Create the input objects for the simulation that initializes
+                input_u = numpy.hstack((start_input, start_input))
+                input_u = input_u.reshape(2, -1)
+                
+                time = pd.DatetimeIndex([start_time, start_time])
+    
+                # Run the simulation, remember that
+                # time has to be a dateteTimeIndex and Input has to be a numpy.matrix
+                self.simulate(time=time, input=input_u)
             self.opts["initialize"] = False
             
             # Initialize the selected variables and parameters to the values indicated 
             # Done after very small simulation because there can be some internal parameters that defines
             # the initial value and may override the initialization with the indicated values
             # THIS DOESN'T WORK WITH MODELICA CONSTANTS!
-            for v in self.variables:
-                v.modify_initial_value_in_fmu(self.fmu)
-            for p in self.parameters:
-                p.modify_initial_value_in_fmu(self.fmu)
+            self.variable_registry.write_initial_values(self.fmu)
+            self.parameter_registry.write_initial_values(self.fmu)
             
             return True
         
@@ -1082,11 +1491,10 @@ class Model:
         :rtype: bool
         """
         val_ref = obj.value_reference
-        for p in self.parameters:
-            if p.value_reference == val_ref:
-                # there is already a parameter in the list with the same value_reference
-                logger.error("There is already a parameter in the list with the same value reference: {0}".format(val_ref))
-                return True
+        if val_ref in self.parameter_refs:
+            # there is already a parameter in the list with the same value_reference
+            logger.error("There is already a parameter in the list with the same value reference: %s", val_ref)
+            return True
         return False
     
     def is_variable_present(self, obj):
@@ -1098,11 +1506,10 @@ class Model:
         :rtype: bool
         """
         val_ref = obj.value_reference
-        for v in self.variables:
-            if v.value_reference == val_ref:
-                # there is already a variable in the list with the same value_reference
-                logger.error("There is already a variable in the list with the same value reference: {0}".format(val_ref))
-                return True
+        if val_ref in self.variable_refs:
+            # there is already a variable in the list with the same value_reference
+            logger.error("There is already a variable in the list with the same value reference: %s", val_ref)
+            return True
         return False
     
     def load_input(self, align = True):
@@ -1166,8 +1573,8 @@ class Model:
 
         :rtype: None
         """
-        logger.info("Previous FMU was: {0}".format(self.fmu))
-        logger.info("Reinitialized model with: {0}".format(fmu_file))
+        logger.info("Previous FMU was: %s", self.fmu)
+        logger.info("Reinitialized model with: %s", fmu_file)
         if self.fmu is not None:
             self.fmu = None
         self.__init__(fmu_file, result_handler, solver, atol, rtol, verbose)
@@ -1184,12 +1591,12 @@ class Model:
         :rtype: bool
         """
         try:
-            index = self.parameters.index(obj)
-            self.parameters.pop(index)
+            self.parameter_registry.remove(obj)
+            self.parameter_refs.discard(obj.value_reference)
             return True
         except ValueError:
             # the object cannot be removed because it is not present
-            logger.warn("Parameter {0} not present, can't be remove from the list".format(obj))
+            logger.warn("Parameter %s not present, can't be remove from the list", obj)
             return False
         
     def remove_parameters(self):
@@ -1198,7 +1605,8 @@ class Model:
 
         :rtype: None
         """
-        self.parameters = []
+        self.parameter_registry.clear()
+        self.parameter_refs = set()
     
     def remove_variable(self, obj):
         """
@@ -1212,19 +1620,20 @@ class Model:
         :rtype: bool
         """
         try:
-            index = self.variables.index(obj)
-            self.variables.pop(index)
+            self.variable_registry.remove(obj)
+            self.variable_refs.discard(obj.value_reference)
             return True
         except ValueError:
             # the object cannot be removed because it is not present
-            logger.warn("Variable {0} not present, can't be remove from the list".format(obj))
+            logger.warn("Variable %s not present, can't be remove from the list", obj)
             return False
     
     def remove_variables(self):
         """
         This method removes all the objects from the list of parameters.
         """
-        self.variables = []
+        self.variable_registry.clear()
+        self.variable_refs = set()
     
     def unload_fmu(self):
         """
@@ -1236,6 +1645,237 @@ class Model:
         """
         del self.fmu
     
+    def __adaptive_sampling__(self, matrix, thresholds):
+        """
+        Internal method that selects the rows of a matrix that need to be retained by
+        the adaptive resampling. The first and the last rows are always retained. 
+        The other rows are retained if at least one of their elements differs from the
+        last row retained more than the threshold of its column. When a row is retained
+        after a sequence of rows that were discarded, the row that precedes it is retained too.
+        
+        :param numpy.ndarray matrix: the matrix containing the data, one column for each data series
+        :param numpy.array thresholds: the thresholds associated to each column of the matrix
+        
+        :return: the indexes of the rows to retain
+        :rtype: numpy.array
+        """
+        N = matrix.shape[0]
+        keep = [0]
+        ref = matrix[0, :]
+        skipping = False
+        for i in range(1, N):
+            if numpy.all(numpy.abs(matrix[i, :] - ref) <= thresholds):
+                # There is no variation
+                skipping = True
+            else:
+                # There is a variation, retain also the last point before it
+                if skipping:
+                    keep.append(i-1)
+                keep.append(i)
+                ref = matrix[i, :]
+                skipping = False
+        
+        # The last point is needed to cover the whole period
+        if keep[-1] != N-1:
+            keep.append(N-1)
+        
+        return numpy.array(keep, dtype = numpy.int64)
+    
+    def __check_covariance__(self, cov, size):
+        """
+        Internal method that converts a covariance matrix to a structured one
+        and checks its size.
+        
+        :param cov: the covariance matrix, or None
+        :param int size: the expected number of rows and columns
+        
+        :return: the structured covariance matrix, or None
+        :rtype: estimationpy.fmu_utils.covariance.Covariance, None
+        :raises ValueError: if the size is not correct
+        """
+        if cov is None:
+            return None
+        cov = covariance.as_covariance(cov)
+        if cov.size != size:
+            msg = "The covariance matrix has size {0} instead of {1}".format(cov.size, size)
+            logger.error(msg)
+            raise ValueError(msg)
+        return cov
+    
+    def __copy_in_out_var__(self, var):
+        """
+        Internal method that copies an input or output variable. The copy
+        is associated to the same pyfmi variable and data series, but has its own
+        **CsvReader** object.
+        
+        :param estimationpy.fmu_utils.in_out_var.InOutVar var: the variable to copy
+        
+        :return: the copy of the variable
+        :rtype: estimationpy.fmu_utils.in_out_var.InOutVar
+        """
+        new = copy.copy(var)
+        new.csvReader = copy.copy(var.csvReader)
+        new.csvReader.columnNames = list(var.csvReader.columnNames)
+        return new
+    
+    def __data_signature__(self):
+        """
+        Internal method that computes a signature of the inputs and the outputs of the model.
+        The signature changes every time an input or an output is added, or when their data
+        series or measured output flags are modified.
+        
+        :return: a tuple that identifies the status of the inputs and outputs.
+        :rtype: tuple
+        """
+        signature = []
+        for v in self.inputs + self.outputs:
+            signature.append((id(v), v.get_version(), v.is_measured_output()))
+        return tuple(signature)
+    
+    def __datetime_to_ns__(self, index):
+        """
+        This method converts a pandas.DatetimeIndex into an array of integers
+        that represent the nanoseconds elapsed since the epoch (UTC).
+        
+        :param pandas.DatetimeIndex index: the index to convert.
+        
+        :return: the array of nanoseconds since the epoch
+        :rtype: numpy.array
+        """
+        return numpy.asarray(index.values).astype("datetime64[ns]").astype(numpy.int64)
+    
+    def __initialize_model_exchange__(self, t, u):
+        """
+        Internal method that initializes a Model Exchange FMU without running a simulation.
+        The FMU is initialized only if it has not been initialized before, in such a case the
+        method returns False and the initialization has to be done with a simulation.
+        
+        :param datetime.datetime t: the time of the initialization
+        :param numpy.array u: the values of the inputs at time ``t``
+        
+        :return: True if the FMU has been initialized, False otherwise
+        :rtype: bool
+        """
+        if not self.direct_evaluation or not self.__is_model_exchange__():
+            return False
+        
+        # Same time of the simulation of length zero that initializes the FMU
+        t_sec = self.__time_to_seconds__(t, t)
+        try:
+            if isinstance(self.fmu, pyfmi.fmi.FMUModelME2):
+                self.fmu.setup_experiment(start_time = t_sec)
+                self.__set_inputs_in_fmu__(u)
+                self.fmu.enter_initialization_mode()
+                self.fmu.exit_initialization_mode()
+                self.fmu.event_update()
+                self.fmu.enter_continuous_time_mode()
+            else:
+                self.fmu.time = t_sec
+                self.__set_inputs_in_fmu__(u)
+                self.fmu.initialize()
+        except Exception as e:
+            # E.g., the FMU has already been initialized
+            logger.debug("Direct initialization of the FMU not possible (%s), use a simulation", e)
+            return False
+        
+        logger.debug("FMU initialized at time %s without simulating", t_sec)
+        return True
+    
+    def __inputs_at__(self, t):
+        """
+        Internal method that returns the values of the inputs at a given time, linearly
+        interpolated from the aligned data.
+        
+        :param datetime.datetime t: the time
+        
+        :return: the values of the inputs
+        :rtype: numpy.array
+        """
+        Ninputs = len(self.inputs)
+        t_ns = self.__datetime_to_ns__(pd.DatetimeIndex([t]))[0]
+        i = numpy.searchsorted(self.data_time, t_ns)
+        if i < len(self.data_time) and self.data_time[i] == t_ns:
+            return self.data_matrix[i, :Ninputs].copy()
+        return numpy.array([numpy.interp(t_ns, self.data_time, self.data_matrix[:, j]) for j in range(Ninputs)])
+    
+    def __interpolate_series__(self, series, time):
+        """
+        This method linearly interpolates a pandas.Series over a time grid.
+        
+        :param pandas.Series series: the data series to interpolate, indexed by a pandas.DatetimeIndex
+        :param numpy.array time: the time grid expressed in nanoseconds since the epoch
+        
+        :return: an array with the values of the series at the time instants of the grid
+        :rtype: numpy.array
+        """
+        if not series.index.is_monotonic_increasing:
+            series = series.sort_index()
+        
+        values = numpy.asarray(series.values, dtype = numpy.float64)
+        ns = self.__datetime_to_ns__(series.index)
+        
+        # Nothing to interpolate if the series is already defined over the grid
+        if len(ns) == len(time) and numpy.array_equal(ns, time):
+            return values
+        
+        return numpy.interp(time, ns, values)
+    
+    def __is_model_exchange__(self):
+        """
+        Internal method that checks if the FMU is a Model Exchange FMU.
+        
+        :return: True if the FMU is a Model Exchange FMU (version 1.0 or 2.0), False otherwise
+        :rtype: bool
+        """
+        if self.fmu is None:
+            return False
+        return isinstance(self.fmu, (pyfmi.fmi.FMUModelME1, pyfmi.fmi.FMUModelME2))
+    
+    def __merge_time_axes__(self, dataSeries, master):
+        """
+        This method computes the time grid used to align a list of data series.
+        The grid is the sorted union of the time indexes of the data series or the one specified
+        by the master clock, restricted to the period in which all the data series are defined.
+        
+        :param List(pandas.Series) dataSeries: the data series to align
+        :param master: the master clock, it can be None, the name of an input or output
+          variable, or a pandas.DatetimeIndex.
+        
+        :return: the time grid expressed in nanoseconds since the epoch
+        :rtype: numpy.array
+        
+        :raises ValueError: if one of the data series is empty, the master clock is not valid, or 
+          the data series do not share a common period.
+        """
+        if len(dataSeries) == 0:
+            return numpy.zeros(0, dtype = numpy.int64)
+        
+        axes = []
+        for ds in dataSeries:
+            if len(ds) == 0:
+                raise ValueError("The data series {0} is empty".format(ds.name))
+            axes.append(self.__datetime_to_ns__(ds.index))
+        
+        # Period in which all the data series are defined
+        t_min = max([numpy.min(a) for a in axes])
+        t_max = min([numpy.max(a) for a in axes])
+        if t_min > t_max:
+            raise ValueError("The data series do not have a common period")
+        
+        if master is None:
+            time = numpy.unique(numpy.concatenate(axes))
+        elif isinstance(master, pd.DatetimeIndex):
+            time = numpy.unique(self.__datetime_to_ns__(master))
+        else:
+            var = self.get_input_by_name(master)
+            if var is None:
+                var = self.get_output_by_name(master)
+            if var is None:
+                raise ValueError("The master clock {0} is not an input or an output".format(master))
+            time = numpy.unique(self.__datetime_to_ns__(var.get_data_series().index))
+        
+        return time[(time >= t_min) & (time <= t_max)]
+    
     def __set_fmu__(self, fmu_file, result_handler, solver, atol, rtol, verbose):
         """
         This method associate an FMU to a model. If the model has already an FMU
@@ -1244,7 +1884,7 @@ class Model:
         that are needed to run simulation and handle the FMU in the context 
         os estimationpy:
 
-        1. loading the FMU from a file
+        1. loading the FMU from a file, or from the cache (see :mod:`estimationpy.fmu_utils.fmu_cache`)
         2. get the default options for the simulation and modify them if necessary
         3. identify the number os states and their value references
         4. identify properties of the FMU
@@ -1266,7 +1906,8 @@ class Model:
             
             # TODO:
             # See what can be done in catching the exception/propagating it
-            self.fmu = pyfmi.load_fmu(fmu_file)
+            # The FMU is loaded from the cache of extracted FMUs, if enabled
+            self.fmu = fmu_cache.load_fmu(fmu_file)
                 
             # Get the options for the simulation
             self.opts = self.fmu.simulate_options()
@@ -1283,6 +1924,10 @@ class Model:
             # get the value references of the state variables
             self.stateValueReferences = self.fmu.get_state_value_references()
             
+            # build the catalogue of the variables, this is the only time the
+            # list of variables is read from the FMU
+            self.catalogue = VariableCatalogue(self.fmu)
+            
             # Properties of the FMU
             self.name = str(self.fmu.get_name())
             self.author = str(self.fmu.get_author())
@@ -1301,6 +1946,18 @@ class Model:
         else:
             logger.warn("The FMU has already been assigned to this model")
     
+    def __set_inputs_in_fmu__(self, u):
+        """
+        Internal method that sets the values of the inputs in the FMU.
+        
+        :param numpy.array u: the values of the inputs, in the same order of the inputs of the model
+        
+        :rtype: None
+        """
+        if len(self.inputs) > 0:
+            refs = [inp.get_object().value_reference for inp in self.inputs]
+            self.fmu.set_real(refs, numpy.asarray(u, dtype = numpy.float64))
+    
     def __set_in_out_var__(self, variability, causality):
         """
         This method identifies a subset of the variables that belong to the FMU depending
@@ -1327,7 +1984,7 @@ class Model:
         # the result is a dictionary which has as key the name of the variable with the dot notation
         # and as element a class of type << pyfmi.fmi.ScalarVariable >>
         # Alias variable removed for clarity.
-        dictVariables = self.fmu.get_model_variables(include_alias = False, variability = variability, causality = causality)
+        dictVariables = self.catalogue.get_variables(causality = causality, variability = variability, include_alias = False)
             
         for k in dictVariables.keys():
             # The object attached to each leaf of the tree is << dictParameter[k] >>
@@ -1337,12 +1994,14 @@ class Model:
             var.set_object(dictVariables[k])
             
             
-            if variability is None and causality is 2:
+            if variability is None and causality == 2:
                 # input
                 self.inputs.append(var)
-            if variability is None and causality is 3:
+                self.input_index[k] = var
+            if variability is None and causality == 3:
                 # output
                 self.outputs.append(var)
+                self.output_index[k] = var
 
     def __set_inputs__(self):
         """
@@ -1366,6 +2025,76 @@ class Model:
         """
         self.__set_in_out_var__(None, 3)
     
+    def __time_to_seconds__(self, t, origin):
+        """
+        Internal method that converts a time stamp in the seconds used by the FMU. As in
+        :func:`simulate`, the seconds refer to the offset if specified, otherwise to the first
+        point of the time grid that is simulated.
+        
+        :param datetime.datetime t: the time stamp
+        :param datetime.datetime origin: the first point of the time grid
+        
+        :return: the time in seconds
+        :rtype: float
+        """
+        if self.offset:
+            return (t - self.offset).total_seconds()
+        return (t - origin).total_seconds()
+    
+    def set_cov_matrix_outputs(self, cov):
+        """
+        This method specifies the covariance matrix of the measured outputs, replacing the
+        diagonal matrix defined by the covariances of the outputs. The matrix can be
+        
+        * a vector, that contains the diagonal,
+        * a list of square matrices, that are the blocks of a block diagonal matrix,
+        * a square matrix,
+        * an object of type :class:`estimationpy.fmu_utils.covariance.Covariance`.
+        
+        The structure of the matrix is preserved by the filter.
+        
+        :param cov: the covariance matrix, if None the diagonal matrix defined by the outputs is used.
+        
+        :rtype: None
+        :raises ValueError: if the size of the matrix is not equal to the number of measured outputs.
+        """
+        self.cov_outputs_custom = self.__check_covariance__(cov, self.get_num_measured_outputs())
+    
+    def set_cov_matrix_state_pars(self, cov):
+        """
+        This method specifies the covariance matrix of the estimated state variables and parameters,
+        replacing the diagonal matrix defined by the covariances of the variables. The matrix can be
+        
+        * a vector, that contains the diagonal,
+        * a list of square matrices, that are the blocks of a block diagonal matrix,
+        * a square matrix,
+        * an object of type :class:`estimationpy.fmu_utils.covariance.Covariance`.
+        
+        The rows and the columns refer to the state variables, followed by the parameters.
+        The structure of the matrix is preserved by the filter.
+        
+        :param cov: the covariance matrix, if None the diagonal matrix defined by the variables is used.
+        
+        :rtype: None
+        :raises ValueError: if the size of the matrix is not equal to the number of state
+          variables and parameters.
+        """
+        self.cov_state_pars_custom = self.__check_covariance__(cov, self.get_num_variables() + self.get_num_parameters())
+    
+    def set_master_clock(self, master):
+        """
+        This method selects the master clock used by :func:`align_data`.
+        
+        :param master: the name of an input or output variable whose time index is used as
+          time grid, a pandas.DatetimeIndex, or None to use the sorted union of all the time indexes.
+
+        :rtype: None
+        """
+        self.master_clock = master
+        
+        # The data has to be aligned again over the new time grid
+        self.data_signature = None
+    
     def set_result_file(self, file_name):
         """
         This method modifies the name of the file that stores the simulation results.
@@ -1455,15 +2184,12 @@ class Model:
         """
         if len(v) == len(self.variables):
             # The vector have compatible dimensions
-            i = 0
-            for var in self.variables:
-                self.fmu.set_real(var.value_reference, v[i])
-                i += 1
+            self.variable_registry.write_values(self.fmu, v)
             return True
         else:
             # the vectors are not compatibles
             logger.error("The vector containing the states to set is not compatible with the number of states selected")
-            logger.error("{0} vs {1}".format(len(v), len(self.variables)))
+            logger.error("%s vs %s", len(v), len(self.variables))
             return False
     
     def set_parameters_selected(self, p):
@@ -1477,18 +2203,16 @@ class Model:
         """
         if len(p) == len(self.parameters):
             # The vector have compatible dimensions
-            i = 0
-            for par in self.parameters:
-                self.fmu.set_real(par.value_reference, p[i])
-                i += 1
+            self.parameter_registry.write_values(self.fmu, p)
             return True
         else:
             # the vectors are not compatibles
             logger.error("The vector containing the parameters to set is not compatible with the number of parameters selected")
-            logger.error("{0} vs {1}".format(len(p), len(self.parameters)))
+            logger.error("%s vs %s", len(p), len(self.parameters))
             return False
     
-    def simulate(self, start_time = None, final_time = None, time = pd.DatetimeIndex([]), input = None, complete_res = False):
+    def simulate(self, start_time = None, final_time = None, time = None, input = None, complete_res = False, lazy = False, \
+                 tolerance_factor = 1.0):
         """
         This method simulates the model from the start time to the final time. The simulation is handled
         by PyFMI and its options can be specified with :func:`set_simulation_options`.
@@ -1515,40 +2239,55 @@ class Model:
         To summarize one can either implicitly use the data associated to the input variables
         and thus specify the parameters ``start_time`` and ``final_time``, otherwise one can
         specify the parameter ``time`` and the input matrix ``input``.
-        If none of them are specified the method reads the time index associated to the 
-        input variables and identifies the longest period over which all input variables
-        are defined.
+        If none of them are specified the method uses the time grid and the data aligned
+        by :func:`align_data`, that covers the longest period over which all input variables
+        and measured outputs are defined.
         
         **NOTE**
-        Since it may happen that a simulation fails without apparent reasons, it is better to 
-        simulate the model again before actual an error. The number of tries is specified by the
-        propertiy ``self.SIMULATION_TRIES``.
+        If the simulation fails the method raises an exception of type :class:`SimulationError`.
+        The simulation can be repeated before raising the exception, the number of tries is
+        specified by the property ``self.SIMULATION_TRIES`` (see :func:`set_simulation_tries`), by
+        default the simulation is run only once.
         
         :param datetime.datetime start_time: start date and time of the simulation period.
         :param datetime.datetime final_time: end date and time of the simulation period.
         :param pandas.DatetimeIndex time: date and time index that can be used in conjunction with the 
-          parameter ``input``.
+          parameter ``input``. If None or empty, the time grid of the aligned data is used.
         :param numpy.ndarray input: matrix that contains the inputs for the model stacked in columns.
         :param bool complete_res: this flag indicates in which format the results should be arranged.
           
           - If ``complete_res == True``, then the method returns all the results as provided by PyFMI.
           - Otherwise it only returns the data that belong to the following categories: state variables,\
             observed state variables, estimated parameters, measured outputs, and outputs.
+        :param bool lazy: this flag indicates if the results are returned as an object of type
+          :class:`estimationpy.fmu_utils.simulation_results.SimulationResults`. The object stores
+          the time in seconds and the trajectories in a single matrix, and converts them to
+          datetime objects or pandas objects only when required. The flag is ignored if
+          ``complete_res == True``.
+        :param float tolerance_factor: factor that multiplies the absolute and relative tolerances
+          of the solvers for this simulation only, e.g., 0.1 to simulate again with tighter tolerances
+          a model that failed.
         
         :return: returns a tuple containing as first element the time instants where the solution of the 
           differential equations are computed by the time integrator. The elements of the time
           vector are datetime objects. The second element is a dictionary containing the results.
           The number of results available depends depends on the value of the parameter ``complete_res``.
-        :rtype: tuple
+          If ``lazy == True`` the method returns an object of type
+          :class:`estimationpy.fmu_utils.simulation_results.SimulationResults` instead of the tuple.
+        :rtype: tuple, estimationpy.fmu_utils.simulation_results.SimulationResults
+        
+        :raises SimulationError: if the simulation fails
         """
         
         # Number of input variables needed by the model
         Ninputs = len(self.inputs)
         
         # Check if the parameter time has been provided
-        if len(time) == 0:
-            # Take the time series: the first because now they are all the same
-            time = self.inputs[0].get_data_series().index
+        if time is None or len(time) == 0:
+            # Take the time grid shared by the aligned inputs and measured outputs
+            if not self.is_data_aligned():
+                self.align_data()
+            time = self.data_index
         else:
             # Check that the type of the time vector is of type pd.DatetimeIndex
             if not isinstance(time, pd.DatetimeIndex):
@@ -1597,28 +2336,23 @@ class Model:
         # Transforms to seconds with respect to the first element, again
         # if the offset is defined it needs to be used as reference
         Npoints = len(time)
-        time_sec = numpy.zeros((Npoints,1))
-        for i in range(Npoints):
-            if self.offset:
-                time_sec[i,0] = (time[i] - self.offset).total_seconds()
-            else:
-                time_sec[i,0] = (time[i] - time[0]).total_seconds()
-        
-        # Convert to numpy matrix in case it will be stacked in a matrix
-        time_sec = numpy.matrix(time_sec)
+        if self.offset:
+            time_sec = (time - self.offset).total_seconds()
+        else:
+            time_sec = (time - time[0]).total_seconds()
         
         # Reshape to be consistent
-        time_sec  = time_sec.reshape(-1, 1)
+        time_sec = numpy.asarray(time_sec, dtype = numpy.float64).reshape(-1, 1)
         
         if input is None:
-            # Take all the data series
-            inputMatrix = numpy.matrix(numpy.zeros((Npoints, Ninputs)))
-            
-            i = 0
-            for inp in self.inputs:
-                dataInput = numpy.matrix(inp.get_data_series().values).reshape(-1,1)
-                inputMatrix[:, i] = dataInput[:,:]
-                i += 1
+            if time is self.data_index:
+                # Use directly the aligned data
+                inputMatrix = self.data_matrix[:, :Ninputs]
+            else:
+                # Take all the data series
+                inputMatrix = numpy.zeros((Npoints, Ninputs))
+                for i, inp in enumerate(self.inputs):
+                    inputMatrix[:, i] = inp.get_data_series().values
             # Define the input trajectory
             V = numpy.hstack((time_sec, inputMatrix))
             
@@ -1635,62 +2369,77 @@ class Model:
         names = self.get_input_names()
         input_object = (names, u_traj)
         
+        # Scale the tolerances of the solvers, they're restored after the simulation
+        tolerances = []
+        if tolerance_factor != 1.0:
+            for s in fmu_util_strings.SOLVER_NAMES_OPTIONS:
+                for key in [fmu_util_strings.SOLVER_OPTION_ATOL_STRING, fmu_util_strings.SOLVER_OPTION_RTOL_STRING]:
+                    if key in self.opts[s]:
+                        value = self.opts[s][key]
+                        tolerances.append((s, key, value))
+                        self.opts[s][key] = value*tolerance_factor if isinstance(value, numbers.Number) else numpy.asarray(value)*tolerance_factor
+        
         # Start the simulation
         simulated = False
+        error = None
         i = 0
-        while not simulated and i < self.SIMULATION_TRIES:
-            try:
-                res = self.fmu.simulate(start_time = start_time_sec, input = input_object, final_time = final_time_sec, options = self.opts)
-                simulated = True
-            except ValueError:
-                logger.debug("Simulation of the model from {0} to {1} failed, try again".format(start_time_sec, final_time_sec))
-                i += 1
-            except Exception as e:
-                logger.warn("Exception during simulation: {0}".format(str(e)))
-                logger.warn("Simulation of the model failed between {0} and {1}, try again".format(start_time, final_time))
-                i += 1 
+        try:
+            while not simulated and i < self.SIMULATION_TRIES:
+                try:
+                    res = self.fmu.simulate(start_time = start_time_sec, input = input_object, final_time = final_time_sec, options = self.opts)
+                    simulated = True
+                except Exception as e:
+                    logger.debug("Simulation of the model from %s to %s failed: %s", start_time_sec, final_time_sec, e)
+                    error = e
+                    i += 1
+        finally:
+            for s, key, value in tolerances:
+                self.opts[s][key] = value
         
         # Check if the simulation has been done, if not throw an exception
         if not simulated:
-            logger.error("Not possible to simulate the model, more than {0} unsuccessful tries".format(self.SIMULATION_TRIES))
-            logger.error("Error log from PyFMI: {0}".format(self.fmu.get_log()))
-            raise Exception
+            logger.warn("Simulation of the model between %s and %s failed after %s tries: %s", start_time, final_time, i, error)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Error log from PyFMI: %s", self.fmu.get_log())
+            raise SimulationError("Simulation between {0} and {1} failed after {2} tries: {3}".format(start_time, final_time, i, error))
         
         # Obtain the results
         # TIME in seconds has to be converted to datetime
-        # and it has to maintain the same offset specified by the input time series in t[0]
+        # and it has to maintain the same offset specified by the input time series in t[0].
+        # The reference is the date and time that corresponds to zero seconds
+        time_sec = numpy.asarray(res[fmu_util_strings.TIME_STRING], dtype = numpy.float64)
         if self.offset:
-            offset_res = self.offset - pd.to_datetime(0, unit = 's', utc = True)
-            t = pd.to_datetime(res[fmu_util_strings.TIME_STRING], unit="s", utc = True) + offset_res
+            reference = pd.Timestamp(self.offset)
         else:
-            offset_res = time[0] - pd.to_datetime(res[fmu_util_strings.TIME_STRING][0], utc = True)
-            t = pd.to_datetime(res[fmu_util_strings.TIME_STRING], unit="s", utc = True) + offset_res
+            reference = time[0] - (pd.to_datetime(time_sec[0], utc = True) - pd.to_datetime(0, utc = True))
         
         # Get the results, either all or just the selected ones
         if complete_res is False:
-            # OUTPUTS
-            output_names = self.get_output_names()
-            results = {}
-            for name in output_names:
-                results[name] = res[name]
-            # STATES OBSERVED
-            var_names = self.get_variable_names()
-            for name in var_names:
-                results[name] = res[name]
-            # PARAMETERS
-            par_names = self.get_parameter_names()
-            for name in par_names:
-                results[name] = res[name]
+            # OUTPUTS, STATES OBSERVED and PARAMETERS, one column each
+            names = self.get_output_names() + self.get_variable_names() + self.get_parameter_names()
+            names = list(OrderedDict.fromkeys(names))
+            values = numpy.empty((len(time_sec), len(names)), order = "F")
+            for i, name in enumerate(names):
+                values[:, i] = res[name]
             
             # THE OVERALL STATE
-            results["__ALL_STATE__"]=self.get_state()
-            results["__OBS_STATE__"]=self.get_state_observed_values()
-            results["__PARAMS__"]=self.get_parameter_values()
-            results["__OUTPUTS__"]=self.get_measured_outputs_values()
-            results["__ALL_OUTPUTS__"]=self.get_outputs_values()
+            extra = {}
+            extra["__ALL_STATE__"]=self.get_state()
+            extra["__OBS_STATE__"]=self.get_state_observed_values()
+            extra["__PARAMS__"]=self.get_parameter_values()
+            extra["__OUTPUTS__"]=self.get_measured_outputs_values()
+            extra["__ALL_OUTPUTS__"]=self.get_outputs_values()
+            
+            results = SimulationResults(time_sec, values, names, reference, extra)
+            if lazy:
+                return results
+            
+            t = results.get_time_index()
+            results = results.to_dict()
             
         else:
             # All the results are given back
+            t = reference + pd.to_timedelta(time_sec, unit = "s")
             results = res
             
         # Return the results
@@ -0,0 +1,248 @@
+'''
+@author: Marco Bonvini
+
+This module contains the class :class:`Profiler` that measures the time spent
+in the phases of an algorithm, e.g., the generation of the sigma points or the
+simulations run by the pool, and counts events such as the retries of the simulations.
+The profiler is disabled by default, in such a case its methods do nothing and
+their overhead is negligible.
+
+For example::
+
+    profiler = Profiler(enabled = True)
+    profiler.start_step("step 1")
+    with profiler.timer("sigma_points"):
+        compute_sigma_points()
+    profiler.count("retries")
+    print(profiler.to_json())
+
+'''
+import json
+import time
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Clock used to measure the time, perf_counter is more accurate but it's
+# available from Python 3.3
+clock = getattr(time, "perf_counter", time.time)
+
+class NullTimer(object):
+    """
+    Context manager that does nothing, it is returned by :func:`Profiler.timer`
+    when the profiler is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+NULL_TIMER = NullTimer()
+
+class Timer(object):
+    """
+    Context manager that measures the time spent in a block of code and adds it
+    to a phase of a :class:`Profiler`.
+    """
+
+    def __init__(self, profiler, phase):
+        """
+        Constructor of the class.
+
+        :param estimationpy.fmu_utils.profiling.Profiler profiler: the profiler
+        :param string phase: the name of the phase
+        """
+        self.profiler = profiler
+        self.phase = phase
+        self.t0 = None
+
+    def __enter__(self):
+        self.t0 = clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add_time(self.phase, clock() - self.t0)
+        return False
+
+class Profiler(object):
+    """
+    This class collects the time spent in the phases of an algorithm and
+    the number of times some events happen. For each phase the profiler stores
+    the cumulative time, the number of times the phase has been executed and the
+    maximum time of a single execution. The time is also accumulated for each step,
+    where the steps are defined by calling :func:`start_step`.
+    """
+
+    def __init__(self, enabled = False):
+        """
+        Constructor of the class.
+
+        :param bool enabled: flag that enables the profiler
+        """
+        self.enabled = enabled
+        self.reset()
+
+    def enable(self, enabled = True):
+        """
+        This method enables or disables the profiler. The data collected so far is kept.
+
+        :param bool enabled: flag that enables the profiler
+
+        :rtype: None
+        """
+        self.enabled = enabled
+
+    def is_enabled(self):
+        """
+        This method returns True if the profiler is enabled.
+
+        :return: the flag that indicates if the profiler is enabled
+        :rtype: bool
+        """
+        return self.enabled
+
+    def reset(self):
+        """
+        This method removes all the data collected.
+
+        :rtype: None
+        """
+        self.phases = {}
+        self.counters = {}
+        self.steps = []
+
+    def timer(self, phase):
+        """
+        This method returns a context manager that measures the time spent in a phase::
+
+            with profiler.timer("simulate"):
+                model.simulate()
+
+        :param string phase: the name of the phase
+
+        :return: the context manager, if the profiler is disabled the context manager does nothing
+        """
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, phase)
+
+    def add_time(self, phase, seconds, calls = 1):
+        """
+        This method adds a time measured elsewhere to a phase, e.g., the time spent
+        simulating by the processes of a pool.
+
+        :param string phase: the name of the phase
+        :param float seconds: the time in seconds
+        :param int calls: the number of executions of the phase that took the time
+
+        :rtype: None
+        """
+        if not self.enabled:
+            return
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = {"total": 0.0, "calls": 0, "max": 0.0}
+        stats["total"] += seconds
+        stats["calls"] += calls
+        stats["max"] = max(stats["max"], seconds/calls if calls > 0 else seconds)
+        if len(self.steps) > 0:
+            step = self.steps[-1]["phases"]
+            step[phase] = step.get(phase, 0.0) + seconds
+
+    def count(self, name, n = 1):
+        """
+        This method increments a counter.
+
+        :param string name: the name of the counter
+        :param int n: the increment
+
+        :rtype: None
+        """
+        if not self.enabled:
+            return
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def start_step(self, label):
+        """
+        This method starts a new step, the time of the phases executed after this call
+        is accumulated in the step until the next one is started.
+
+        :param label: the label of the step, e.g., its index or its time
+
+        :rtype: None
+        """
+        if not self.enabled:
+            return
+        self.steps.append({"label": label, "phases": {}})
+
+    def get_total_time(self, phase):
+        """
+        This method returns the cumulative time spent in a phase.
+
+        :param string phase: the name of the phase
+
+        :return: the time in seconds, zero if the phase has never been executed
+        :rtype: float
+        """
+        stats = self.phases.get(phase)
+        return stats["total"] if stats is not None else 0.0
+
+    def get_counter(self, name):
+        """
+        This method returns the value of a counter.
+
+        :param string name: the name of the counter
+
+        :return: the value of the counter, zero if it has never been incremented
+        :rtype: int
+        """
+        return self.counters.get(name, 0)
+
+    def summary(self):
+        """
+        This method returns a summary of the data collected. The summary is a dictionary
+        that contains
+
+        * ``phases``, a dictionary that for each phase contains the total time, the number of
+          calls, the mean and the maximum time of a call,
+        * ``counters``, a dictionary with the values of the counters,
+        * ``steps``, a list that for each step contains its label and the time spent in each phase.
+
+        :return: the summary
+        :rtype: dict
+        """
+        phases = {}
+        for phase, stats in self.phases.items():
+            phases[phase] = dict(stats)
+            phases[phase]["mean"] = stats["total"]/stats["calls"] if stats["calls"] > 0 else 0.0
+        steps = [{"label": s["label"], "phases": dict(s["phases"])} for s in self.steps]
+        return {"phases": phases, "counters": dict(self.counters), "steps": steps}
+
+    def to_json(self, indent = None):
+        """
+        This method returns the summary computed by :func:`summary` as a JSON string.
+        The labels of the steps that can't be represented in JSON, e.g., dates, are converted
+        to strings.
+
+        :param int indent: the indentation of the JSON string, if None the string is compact
+
+        :return: the summary
+        :rtype: string
+        """
+        return json.dumps(self.summary(), indent = indent, sort_keys = True, default = str)
+
+    def log_summary(self, level = logging.INFO):
+        """
+        This method writes the cumulative time of each phase and the counters in the log,
+        sorting the phases by time.
+
+        :param int level: the logging level
+
+        :rtype: None
+        """
+        for phase, stats in sorted(self.phases.items(), key = lambda x: -x[1]["total"]):
+            logger.log(level, "Phase %s: %.6f [s] in %s calls", phase, stats["total"], stats["calls"])
+        for name in sorted(self.counters):
+            logger.log(level, "Counter %s: %s", name, self.counters[name])
@@ -0,0 +1,535 @@
+'''
+@author: Marco Bonvini
+
+This module contains an asyncio front-end that allows a single process, e.g., a service,
+to run many estimations and simulations concurrently. All of them share an
+:class:`AsyncScheduler`, that limits the number of simulations running at the same
+time and serves the clients with fair queueing, i.e., the simulations waiting are
+started in round robin order among the clients. In this way an estimation with many sigma
+points does not delay the others until all its simulations are completed.
+
+The module provides
+
+* :func:`AsyncScheduler.simulate`, an awaitable version of :func:`estimationpy.fmu_utils.model.Model.simulate`,
+* :class:`AsyncFmuPool`, an awaitable version of :func:`estimationpy.fmu_utils.fmu_pool.FmuPool.run`,
+* :class:`ScheduledExecutor`, the executor used by the pools to send their simulations to the scheduler
+  (see :mod:`estimationpy.fmu_utils.executors`).
+
+The awaitable version of the filter is :class:`estimationpy.ukf.async_ukf.AsyncUkfFmu`.
+For example::
+
+    scheduler = AsyncScheduler(slots = 8)
+
+    async def estimate(model, start, stop):
+        ukf = AsyncUkfFmu(UkfFmu(model), scheduler)
+        return await ukf.filter(start, stop)
+
+    results = await asyncio.gather(*[estimate(m, start, stop) for m in models])
+
+The simulations run in persistent workers (see :class:`SchedulerWorker`), at most one for each slot,
+that are copies of the process that owns the scheduler and are reused by all the simulations of the
+same model. The blocking code of the estimations (e.g., the linear algebra of the filter) runs in threads.
+
+**NOTE**
+    The module requires Python 3.7 or later.
+'''
+import asyncio
+import functools
+import os
+import pickle
+import threading
+import time
+
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import estimationpy.fmu_utils.fmu_pool as fmu_pool
+import estimationpy.fmu_utils.affinity as affinity
+from estimationpy.fmu_utils.executors import Executor
+
+import logging
+logger = logging.getLogger(__name__)
+
+def get_running_loop():
+    """
+    This function returns the event loop running in the current thread.
+
+    :return: the event loop, or None if there is no event loop running
+    :rtype: asyncio.AbstractEventLoop
+    """
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+class SchedulerWorker(fmu_pool.Worker):
+    """
+    This class represents a persistent worker of an :class:`AsyncScheduler`, that runs the simulations
+    of a model one at a time, see :class:`estimationpy.fmu_utils.fmu_pool.Worker`. Besides the simulations of a pool, the worker runs the simulations requested
+    by :func:`AsyncScheduler.simulate`, that are tuples ``(index, state, kwargs)`` where ``kwargs`` are the
+    parameters of :func:`estimationpy.fmu_utils.model.Model.simulate`. The results of these simulations
+    are the values returned by the method, and the statistics contain the exception raised, if any.
+    """
+
+    def __init__(self, model, lazy = False, threads = 1):
+        """
+        Constructor of the class.
+
+        :param estimationpy.fmu_utils.model.Model model: The model to simulate
+        :param bool lazy: flag that indicates if the results of the simulations of a pool are returned
+          as objects of type :class:`estimationpy.fmu_utils.simulation_results.SimulationResults`
+        :param int threads: the number of threads of the numerical libraries in the worker, if None
+          the number is not limited
+        """
+        super(SchedulerWorker, self).__init__(model, lazy, threads = threads)
+
+    def execute(self, task):
+        """
+        This method runs a simulation received by the worker, either of a pool or
+        requested by :func:`AsyncScheduler.simulate`.
+
+        :param tuple task: the description of the simulation
+
+        :return: a tuple that contains the results and the statistics of the simulation
+        :rtype: tuple
+        """
+        if len(task) != 3:
+            return super(SchedulerWorker, self).execute(task)
+
+        index, state, kwargs = task
+        stats = {"pid": os.getpid(), "exception": None}
+        self.model.set_state(state)
+        try:
+            return self.model.simulate(**kwargs), stats
+        except Exception as e:
+            # The exception is sent only if it can be pickled
+            try:
+                pickle.dumps(e)
+            except Exception:
+                e = RuntimeError("{0}: {1}".format(e.__class__.__name__, e))
+            stats["exception"] = e
+            return False, stats
+
+    def wait(self, task, timeout = None):
+        """
+        This method sends a simulation to the worker and waits for its results. If the results
+        are not received within the timeout the worker is considered stuck, and it's terminated.
+
+        :param tuple task: the description of the simulation
+        :param float timeout: the time in seconds to wait for the results, if None there is no limit
+
+        :return: the message sent by the worker, ``[index, results, stats]``
+        :rtype: list
+
+        :raises RuntimeError: if the worker terminates without sending the results, or if the
+          results are not received within the timeout
+        """
+        self.submit(task)
+        T0 = time.time()
+        while True:
+            # The results sent before terminating are read anyway
+            alive = self.is_alive()
+            message = self.receive(0.1)
+            if message is not None:
+                return message
+            if not alive:
+                raise RuntimeError("The worker {0} terminated with exit code {1}".format(self.pid, self.exitcode))
+            if timeout is not None and time.time() - T0 > timeout:
+                self.terminate()
+                raise RuntimeError("The worker {0} did not complete the simulation in {1} [s]".format(self.pid, timeout))
+
+class AsyncScheduler(object):
+    """
+    This class schedules the simulations requested by many clients that run in the same event loop.
+    At most ``slots`` simulations run at the same time. The simulations
+    of each client are started in the order they're requested, and the clients are served in round robin
+    order. The blocking code of the clients (e.g., the filter) runs in a pool of threads,
+    see :func:`call`.
+
+    The simulations run in persistent workers of type :class:`SchedulerWorker`. A worker is started
+    the first time a model is simulated and no worker of the model is available, and it's reused by the
+    following simulations of the same model. There are at most ``slots`` workers: when they're all started,
+    the worker of another model that has been idle for the longest time is stopped to start a new one.
+    A worker that terminates, or that doesn't complete a simulation within ``timeout`` seconds, is stopped
+    and never reused.
+    Since the workers are copies of the process that owns the scheduler, created when they're started,
+    the changes of a model that are not related to the states (e.g., new data associated to the inputs)
+    are seen by the workers only after they have been restarted with :func:`stop_workers`.
+
+    The scheduler is bound to the event loop that uses it for the first time, or to a new one
+    when the previous event loop has been closed. The attribute ``statistics``
+    contains the number of simulations submitted and completed, and the total time they waited before
+    being started.
+    """
+
+    def __init__(self, slots = None, max_clients = 256, timeout = 600.0):
+        """
+        Constructor of the class.
+
+        :param int slots: the number of simulations that can run at the same time, if None
+          the number of processors available minus one, see
+          :func:`estimationpy.fmu_utils.affinity.get_default_processes`
+        :param int max_clients: the number of blocking calls that can run at the same time in
+          the threads of the scheduler (see :func:`call`), e.g., the number of filters
+        :param float timeout: the time in seconds after which a simulation that has not completed
+          fails and its worker is terminated, if None there is no limit
+
+        :raises ValueError: if the number of slots or clients is less than 1
+        """
+        if slots is None:
+            slots = affinity.get_default_processes()
+        if slots < 1 or max_clients < 1:
+            raise ValueError("The number of slots and clients of the scheduler must be at least 1")
+        self.slots = slots
+        self.timeout = timeout
+        self.queues = OrderedDict()
+        affinity.check_threadpoolctl()
+        self.running = 0
+        self.loop = None
+        self.simulation_threads = ThreadPoolExecutor(slots)
+        self.client_threads = ThreadPoolExecutor(max_clients)
+        self.statistics = {"submitted": 0, "completed": 0, "wait_time": 0.0, "workers_started": 0}
+
+        # Idle workers of each model, sorted from the least recently used, and
+        # number of workers started
+        self.idle = OrderedDict()
+        self.n_workers = 0
+        self.lock = threading.Lock()
+
+    def __bind__(self):
+        """
+        Internal method that binds the scheduler to the event loop that is running.
+
+        :rtype: None
+
+        :raises RuntimeError: if the scheduler is already used by another event loop
+        """
+        loop = get_running_loop()
+        if self.loop is None or (self.loop.is_closed() and self.running == 0):
+            self.loop = loop
+        elif self.loop is not loop:
+            raise RuntimeError("The scheduler is used by another event loop")
+
+    def get_queue_lengths(self):
+        """
+        This method returns the number of simulations waiting for each client.
+
+        :return: a dictionary with the clients and the number of simulations
+        :rtype: dict
+        """
+        return dict([(client, len(q)) for client, q in self.queues.items()])
+
+    async def submit(self, client, fn, *args):
+        """
+        This method queues a blocking function for the client, and waits for its result.
+        The function is called in a thread of the scheduler when a slot is available, and it
+        should run a simulation, e.g., with :func:`run_task`.
+
+        :param client: the object that identifies the client, e.g., the estimation
+        :param function fn: the function
+        :param args: the arguments of the function
+
+        :return: the value returned by the function
+        """
+        self.__bind__()
+        future = self.loop.create_future()
+        if client not in self.queues:
+            self.queues[client] = deque()
+        self.queues[client].append((fn, args, future, time.time()))
+        self.statistics["submitted"] += 1
+        self.__dispatch__()
+        return await future
+
+    def __dispatch__(self):
+        """
+        Internal method that starts the functions waiting, in round robin order among
+        the clients, until all the slots are busy.
+
+        :rtype: None
+        """
+        while self.running < self.slots and len(self.queues) > 0:
+            client, queue = next(iter(self.queues.items()))
+            fn, args, future, T0 = queue.popleft()
+
+            # The client is moved at the end, or removed if it has nothing else waiting
+            del self.queues[client]
+            if len(queue) > 0:
+                self.queues[client] = queue
+
+            if future.cancelled():
+                continue
+
+            self.running += 1
+            self.statistics["wait_time"] += time.time() - T0
+            task = self.loop.run_in_executor(self.simulation_threads, functools.partial(fn, *args))
+            task.add_done_callback(functools.partial(self.__done__, future))
+
+    def __done__(self, future, task):
+        """
+        Internal method called when a function terminates, it passes the result
+        to the client and starts the next function.
+
+        :param asyncio.Future future: the future awaited by the client
+        :param asyncio.Future task: the future of the function
+
+        :rtype: None
+        """
+        self.running -= 1
+        self.statistics["completed"] += 1
+        if not future.cancelled():
+            if task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+        self.__dispatch__()
+
+    async def call(self, fn, *args, **kwargs):
+        """
+        This method calls a blocking function in a thread of the scheduler and waits for its result,
+        e.g., the filter of a :class:`estimationpy.ukf.ukf_fmu.UkfFmu` whose pool uses the
+        executor returned by :func:`get_executor`.
+
+        :param function fn: the function
+        :param args: the positional arguments of the function
+        :param kwargs: the keyword arguments of the function
+
+        :return: the value returned by the function
+        """
+        self.__bind__()
+        return await self.loop.run_in_executor(self.client_threads, functools.partial(fn, *args, **kwargs))
+
+    async def simulate(self, model, client = None, **kwargs):
+        """
+        This method simulates a model in a worker, see :func:`estimationpy.fmu_utils.model.Model.simulate`.
+        The simulation starts from the current state of the model, and since it runs in another process
+        the state of the FMU of the model is not modified.
+
+        :param estimationpy.fmu_utils.model.Model model: the model
+        :param client: the object that identifies the client, if None the model
+        :param kwargs: the parameters of :func:`estimationpy.fmu_utils.model.Model.simulate`
+
+        :return: the results of the simulation
+        """
+        fn = functools.partial(self.run_task, model, False, (0, model.get_state(), kwargs))
+        results, stats = await self.submit(client if client is not None else model, fn)
+        if stats["exception"] is not None:
+            raise stats["exception"]
+        return results
+
+    def run_task(self, model, lazy, task):
+        """
+        This method runs a simulation of a model in one of its workers, and blocks until
+        the results are received. It's called by the threads of the scheduler.
+
+        :param estimationpy.fmu_utils.model.Model model: the model
+        :param bool lazy: flag that indicates if the results of the simulations of a pool are returned
+          as objects of type :class:`estimationpy.fmu_utils.simulation_results.SimulationResults`
+        :param tuple task: the description of the simulation, see :class:`SchedulerWorker`
+
+        :return: a list with the results and the statistics
+        :rtype: list
+
+        :raises RuntimeError: if the worker terminates without sending the results, or
+          if the simulation doesn't complete within the timeout of the scheduler
+        """
+        key = (model, lazy)
+        worker = self.__acquire_worker__(key)
+        stop = True
+        try:
+            message = worker.wait(task, self.timeout)
+            stop = message[2].get("recycle") is not None
+            return message[1:]
+        finally:
+            self.__release_worker__(key, worker, stop)
+
+    def __acquire_worker__(self, key):
+        """
+        Internal method that returns an idle worker of a model, or starts a new one.
+
+        :param tuple key: the model and the flag that indicates if the results are lazy
+
+        :return: the worker
+        :rtype: estimationpy.fmu_utils.scheduler.SchedulerWorker
+        """
+        old = None
+        with self.lock:
+            workers = self.idle.get(key)
+            if workers:
+                return workers.pop()
+
+            # The workers are at most one for each slot, the simulations running are less than
+            # the slots, therefore there is an idle worker that can be stopped
+            if self.n_workers >= self.slots:
+                for k, workers in self.idle.items():
+                    if len(workers) > 0:
+                        old = workers.pop(0)
+                        self.n_workers -= 1
+                        break
+            self.n_workers += 1
+            self.statistics["workers_started"] += 1
+
+        if old is not None:
+            self.__stop_worker__(old)
+        model, lazy = key
+        worker = SchedulerWorker(model, lazy)
+        worker.start()
+        logger.debug("Started the worker %s", worker.pid)
+        return worker
+
+    def __release_worker__(self, key, worker, stop = False):
+        """
+        Internal method that makes a worker available for the following simulations
+        of its model, or stops it.
+
+        :param tuple key: the model and the flag that indicates if the results are lazy
+        :param estimationpy.fmu_utils.scheduler.SchedulerWorker worker: the worker
+        :param bool stop: flag that indicates if the worker is stopped, e.g., because it
+          has been recycled or it terminated
+
+        :rtype: None
+        """
+        with self.lock:
+            if not stop:
+                self.idle.setdefault(key, []).append(worker)
+                self.idle.move_to_end(key)
+                return
+            self.n_workers -= 1
+        self.__stop_worker__(worker)
+
+    def __stop_worker__(self, worker):
+        """
+        Internal method that stops a worker.
+
+        :param estimationpy.fmu_utils.scheduler.SchedulerWorker worker: the worker
+
+        :rtype: None
+        """
+        if worker.is_alive():
+            worker.stop()
+            worker.join(5.0)
+            if worker.is_alive():
+                worker.terminate()
+        worker.join()
+        logger.debug("Stopped the worker %s", worker.pid)
+
+    def stop_workers(self):
+        """
+        This method stops the workers that are idle, new workers are started when needed.
+
+        :rtype: None
+        """
+        with self.lock:
+            workers = [w for k in self.idle for w in self.idle[k]]
+            self.idle = OrderedDict()
+            self.n_workers -= len(workers)
+        for w in workers:
+            self.__stop_worker__(w)
+
+    def get_executor(self, client):
+        """
+        This method returns an executor that sends the simulations of a pool to the scheduler
+        on behalf of a client.
+
+        :param client: the object that identifies the client
+
+        :return: the executor
+        :rtype: estimationpy.fmu_utils.scheduler.ScheduledExecutor
+        """
+        return ScheduledExecutor(self, client)
+
+    def close(self):
+        """
+        This method stops the threads of the scheduler, after the functions running terminate,
+        and its workers.
+
+        :rtype: None
+        """
+        self.simulation_threads.shutdown()
+        self.client_threads.shutdown()
+        self.stop_workers()
+
+class ScheduledExecutor(Executor):
+    """
+    This class sends the simulations of a pool to an :class:`AsyncScheduler`, that runs them
+    in its workers. The pool must be used by a thread that is not the one running the
+    event loop of the scheduler, e.g., with :func:`AsyncScheduler.call` or :class:`AsyncFmuPool`.
+    """
+
+    def __init__(self, scheduler, client):
+        """
+        Constructor of the class.
+
+        :param estimationpy.fmu_utils.scheduler.AsyncScheduler scheduler: the scheduler
+        :param client: the object that identifies the client
+        """
+        self.scheduler = scheduler
+        self.client = client
+
+    def run(self, pool, values, start, stop, tolerance_factor, workWithFiles):
+        """
+        This method sends the simulations to the scheduler and waits for their results,
+        see :func:`estimationpy.fmu_utils.executors.Executor.run`. The result files are
+        temporary files created by the workers. The results are always sent back through
+        the pipe of the worker instead of shared memory, since the workers are created while other threads
+        may be using the resource tracker that manages the blocks of shared memory, and the lock
+        that protects it would remain locked in the new process.
+
+        :raises RuntimeError: if the scheduler is not bound to an event loop, or if the method
+          is called by the thread that runs the event loop
+        """
+        loop = self.scheduler.loop
+        if loop is None:
+            raise RuntimeError("The scheduler is not bound to an event loop")
+        if get_running_loop() is not None:
+            raise RuntimeError("The pool must not be run by the thread of the event loop, use AsyncFmuPool")
+
+        # The workers start from the state of the model of the pool, since
+        # the previous simulations modified their state
+        state = pool.model.get_state()
+
+        futures = {}
+        for k in pool.get_dispatch_order(len(values)):
+            task = (k, state, values[k]["state"], values[k]["parameters"], start, stop, tolerance_factor, None)
+            fn = functools.partial(self.scheduler.run_task, pool.model, pool.lazy, task)
+            futures[k] = asyncio.run_coroutine_threadsafe(self.scheduler.submit(self.client, fn), loop)
+
+        results = {}
+        for k, f in futures.items():
+            try:
+                results[k] = list(f.result())
+            except Exception as e:
+                logger.warning("The simulation %s has not been run: %s", k, e)
+        return results
+
+    def get_slots(self, pool):
+        """
+        This method returns the number of slots of the scheduler, see
+        :func:`estimationpy.fmu_utils.executors.Executor.get_slots`.
+        """
+        return self.scheduler.slots
+
+class AsyncFmuPool(object):
+    """
+    This class provides an awaitable version of :func:`estimationpy.fmu_utils.fmu_pool.FmuPool.run`,
+    the simulations of the pool are run by an :class:`AsyncScheduler`.
+    """
+
+    def __init__(self, pool, scheduler, client = None):
+        """
+        Constructor of the class, the executor of the pool is replaced by the one of the scheduler.
+
+        :param estimationpy.fmu_utils.fmu_pool.FmuPool pool: the pool
+        :param estimationpy.fmu_utils.scheduler.AsyncScheduler scheduler: the scheduler
+        :param client: the object that identifies the client, if None the pool
+        """
+        self.pool = pool
+        self.scheduler = scheduler
+        self.pool.executor = scheduler.get_executor(client if client is not None else pool)
+
+    async def run(self, values, start = None, stop = None, tolerance_factor = 1.0):
+        """
+        This method runs the simulations, see :func:`estimationpy.fmu_utils.fmu_pool.FmuPool.run`.
+
+        :return: a list that contains the results of each simulation
+        :rtype: list
+        """
+        return await self.scheduler.call(self.pool.run, values, start = start, stop = stop, tolerance_factor = tolerance_factor)
@@ -0,0 +1,326 @@
+'''
+@author: Marco Bonvini
+'''
+import os
+import numpy
+
+from estimationpy.fmu_utils.lazy_import import LazyModule
+
+# pandas is imported the first time it's used
+pd = LazyModule("pandas")
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Shared memory is available from Python 3.8
+    shared_memory = None
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Flag that indicates if the results can be moved between processes using shared memory.
+# On Windows a block of shared memory is released when the process that created it
+# terminates, therefore it can't outlive the worker that runs the simulation.
+SHARED_MEMORY_AVAILABLE = shared_memory is not None and os.name != "nt"
+
+class SharedMemoryBlock(object):
+    """
+    This class owns a block of shared memory attached by the process that reads
+    the results. It exposes the block through the numpy array interface, therefore
+    the arrays created from it keep a reference to this object and the block is
+    closed only after all of them have been released.
+    """
+
+    def __init__(self, shm, size):
+        """
+        Constructor of the class.
+
+        :param multiprocessing.shared_memory.SharedMemory shm: the block of shared memory
+        :param int size: the number of bytes used, it can be smaller than the size of the block
+        """
+        self.shm = shm
+        # The address is read from a temporary array that is released immediately,
+        # this way the block doesn't have exported buffers and it can be closed
+        address = numpy.frombuffer(shm.buf, dtype = numpy.uint8).ctypes.data
+        self.__array_interface__ = {"shape": (size,), "typestr": "|u1", "data": (address, False), "version": 3}
+
+    def __del__(self):
+        """
+        Close the block when it's not used anymore.
+        """
+        try:
+            self.shm.close()
+        except Exception:
+            pass
+
+class SimulationResults(object):
+    """
+    This class represents the results of a simulation. The trajectories are stored
+    in a single matrix that has one column for each variable, the matrix is stored in
+    column-major (Fortran) order, therefore each trajectory is contiguous in memory and
+    it can be accessed without copying it.
+
+    The time is stored as a vector of floats that represent the seconds used by the FMU.
+    The conversion of the time to a **pandas.DatetimeIndex** is done only when required by
+    :func:`get_time_index` and it is computed only once.
+
+    The object can be used as a read-only dictionary, for example::
+
+        y = results["y"]
+        for name in results:
+            print(name, results[name][-1])
+
+    Besides the trajectories, the results can contain additional values that are not
+    trajectories (e.g., the final state of the model), these values are accessible in the
+    same way.
+
+    """
+
+    def __init__(self, time, values, names, reference = None, extra = None):
+        """
+        Constructor of the class.
+
+        :param numpy.array time: the time in seconds, one element for each row of ``values``
+        :param numpy.ndarray values: the matrix that contains the trajectories, one column for
+          each variable. The matrix is not copied if it's already in Fortran order.
+        :param list names: the names of the variables, one for each column of ``values``
+        :param pandas.Timestamp reference: the date and time that correspond to zero seconds,
+          if None the time can't be converted to a **pandas.DatetimeIndex**.
+        :param dict extra: additional values that are not trajectories
+
+        :raises ValueError: if the dimensions of the time, the values and the names
+          are not consistent.
+        """
+        self.time = numpy.asarray(time, dtype = numpy.float64)
+        self.values = numpy.asfortranarray(values, dtype = numpy.float64)
+        if self.values.ndim != 2 or self.values.shape != (len(self.time), len(names)):
+            msg = "The matrix of the values has shape {0}, expected ({1}, {2})".format(self.values.shape, len(self.time), len(names))
+            logger.error(msg)
+            raise ValueError(msg)
+
+        self.names = list(names)
+        self.columns = dict([(n, i) for i, n in enumerate(self.names)])
+        self.reference = reference
+        self.extra = extra if extra is not None else {}
+
+        # The DatetimeIndex is computed when required
+        self.time_index = None
+
+    def __getitem__(self, name):
+        """
+        This method returns the trajectory of a variable, or an additional value.
+        The trajectory is a view of the matrix of the values.
+
+        :param string name: the name of the variable
+
+        :return: the trajectory of the variable, or the additional value
+        :rtype: numpy.array
+        :raises KeyError: if the name is not part of the results
+        """
+        i = self.columns.get(name)
+        if i is not None:
+            return self.values[:, i]
+        return self.extra[name]
+
+    def __contains__(self, name):
+        """
+        This method checks if a variable or an additional value is part of the results.
+
+        :param string name: the name of the variable
+
+        :return: True if the name is part of the results, False otherwise
+        :rtype: bool
+        """
+        return name in self.columns or name in self.extra
+
+    def __iter__(self):
+        """
+        This method iterates over the names of the variables, followed by
+        the names of the additional values.
+        """
+        for name in self.names:
+            yield name
+        for name in self.extra:
+            yield name
+
+    def __len__(self):
+        """
+        This method returns the number of variables and additional values.
+
+        :return: the number of variables and additional values
+        :rtype: int
+        """
+        return len(self.names) + len(self.extra)
+
+    def keys(self):
+        """
+        This method returns the names of the variables, followed by
+        the names of the additional values.
+
+        :return: the names
+        :rtype: list
+        """
+        return list(self)
+
+    def get(self, name, default = None):
+        """
+        This method returns the trajectory of a variable, or an additional value,
+        and a default value if the name is not part of the results.
+
+        :param string name: the name of the variable
+        :param default: the value returned if the name is not part of the results
+
+        :return: the trajectory of the variable, the additional value or the default value
+        """
+        if name in self:
+            return self[name]
+        return default
+
+    def get_time(self):
+        """
+        This method returns the time in seconds, as used by the FMU.
+
+        :return: the time in seconds
+        :rtype: numpy.array
+        """
+        return self.time
+
+    def get_time_index(self):
+        """
+        This method returns the time as a **pandas.DatetimeIndex**. The index is computed
+        the first time the method is called.
+
+        :return: the time as date and time
+        :rtype: pandas.DatetimeIndex
+        :raises ValueError: if the reference date and time is not known
+        """
+        if self.time_index is None:
+            if self.reference is None:
+                raise ValueError("The reference date and time of the results is not known")
+            self.time_index = self.reference + pd.to_timedelta(self.time, unit = "s")
+        return self.time_index
+
+    def get_values(self, names = None):
+        """
+        This method returns the matrix containing the trajectories of a selection of variables.
+        If all the variables are selected the matrix is not copied.
+
+        :param list names: the names of the variables, if None all the variables are selected.
+
+        :return: the matrix containing the trajectories, one column for each variable
+        :rtype: numpy.ndarray
+        :raises KeyError: if one of the names is not a variable
+        """
+        if names is None:
+            return self.values
+        return self.values[:, [self.columns[n] for n in names]]
+
+    def select(self, names):
+        """
+        This method returns a new object that contains a selection of the variables.
+        The new object shares the time and the matrix of the values with this object, therefore
+        no data is copied.
+
+        :param list names: the names of the variables to select
+
+        :return: the results restricted to the variables selected
+        :rtype: estimationpy.fmu_utils.simulation_results.SimulationResults
+        :raises KeyError: if one of the names is not a variable
+        """
+        new = SimulationResults.__new__(SimulationResults)
+        new.__dict__.update(self.__dict__)
+        new.names = list(names)
+        new.columns = dict([(n, self.columns[n]) for n in names])
+        new.extra = {}
+        return new
+
+    def to_dict(self):
+        """
+        This method converts the results to a dictionary. The trajectories in the dictionary are
+        views of the matrix of the values.
+
+        :return: a dictionary with the names as keys
+        :rtype: dict
+        """
+        return dict([(name, self[name]) for name in self])
+
+    def to_dataframe(self, names = None):
+        """
+        This method converts the trajectories to a **pandas.DataFrame** indexed by the time
+        returned by :func:`get_time_index`.
+
+        :param list names: the names of the variables, if None all the variables are selected.
+
+        :return: the data frame, with one column for each variable
+        :rtype: pandas.DataFrame
+        """
+        if names is None:
+            names = self.names
+        return pd.DataFrame(self.get_values(names), index = self.get_time_index(), columns = names)
+
+    def to_shared_memory(self):
+        """
+        This method copies the time and the trajectories in a new block of shared memory,
+        and returns a description of the results that is small and can be sent to another
+        process. The block contains the time followed by the columns of the matrix of
+        the values. The process that receives the description creates the results with
+        :func:`from_shared_memory`, and it is responsible for releasing the block.
+
+        :return: the description of the results, i.e., the name of the block, the number of
+          rows, the names of the variables, the reference date and time and the additional values.
+        :rtype: dict
+        :raises RuntimeError: if shared memory is not available
+        """
+        if not SHARED_MEMORY_AVAILABLE:
+            raise RuntimeError("Shared memory is not available on this platform")
+
+        n, m = self.values.shape
+        shm = shared_memory.SharedMemory(create = True, size = max(8*n*(m + 1), 1))
+        block = numpy.ndarray((n*(m + 1),), dtype = numpy.float64, buffer = shm.buf)
+        block[:n] = self.time
+        block[n:] = self.values.ravel(order = "F")
+        del block
+        shm.close()
+
+        return {"name": shm.name, "rows": n, "names": self.names, "reference": self.reference, "extra": self.extra}
+
+    @staticmethod
+    def release_shared_memory(description):
+        """
+        This method releases a block of shared memory written by :func:`to_shared_memory`
+        whose results are not read with :func:`from_shared_memory`.
+
+        :param dict description: the description returned by :func:`to_shared_memory`
+
+        :rtype: None
+        """
+        try:
+            shm = shared_memory.SharedMemory(name = description["name"])
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+
+    @staticmethod
+    def from_shared_memory(description):
+        """
+        This method creates the results from a block of shared memory written by
+        :func:`to_shared_memory`, possibly in another process. The time and the
+        matrix of the values are views of the block, therefore no data is copied.
+        The name of the block is removed immediately, while the memory is released
+        when the arrays that refer to it are not used anymore.
+
+        :param dict description: the description returned by :func:`to_shared_memory`
+
+        :return: the results
+        :rtype: estimationpy.fmu_utils.simulation_results.SimulationResults
+        """
+        shm = shared_memory.SharedMemory(name = description["name"])
+        shm.unlink()
+
+        n = description["rows"]
+        m = len(description["names"])
+        block = numpy.asarray(SharedMemoryBlock(shm, 8*n*(m + 1))).view(numpy.float64)
+        time = block[:n]
+        values = block[n:].reshape((n, m), order = "F")
+        return SimulationResults(time, values, description["names"], description["reference"], description["extra"])
@@ -0,0 +1,220 @@
+'''
+@author: Marco Bonvini
+'''
+import numpy
+
+from collections import OrderedDict
+
+import logging
+logger = logging.getLogger(__name__)
+
+class VariableCatalogue():
+    """
+    This class represents a catalogue of the variables defined in an FMU.
+    The catalogue is built once, reading the list of variables provided by PyFMI,
+    and provides fast lookups without the need to query the FMU again.
+
+    The catalogue contains
+
+    * the names of the variables, in the same order defined by the FMU,
+    * the **pyfmi.fmi.ScalarVariable** objects associated to each name,
+    * the value references, the data types, the causalities, the variabilities and the
+      alias flags of the variables, stored as numpy arrays,
+    * an index that maps the names of the variables to their position,
+    * an index that maps the value references (and data types) to the position of the
+      variables that are not aliases,
+    * a dictionary that maps the names of the alias variables to the names of the
+      variables they refer to. The negated aliases, whose value is the opposite of the
+      one of the variable they refer to, are not included since using the variable
+      in their place would change the sign of the values.
+
+    """
+
+    def __init__(self, fmu = None):
+        """
+        Constructor of the class. If the FMU is specified the catalogue is built
+        immediately, otherwise the catalogue is empty.
+
+        :param FmuModel fmu: an object representing an FMU model in PyFMI.
+
+        """
+        self.names = []
+        self.variables = []
+        self.value_references = numpy.zeros(0, dtype = numpy.int64)
+        self.types = numpy.zeros(0, dtype = numpy.int64)
+        self.causalities = numpy.zeros(0, dtype = numpy.int64)
+        self.variabilities = numpy.zeros(0, dtype = numpy.int64)
+        self.alias_flags = numpy.zeros(0, dtype = numpy.int64)
+
+        self.name_index = {}
+        self.vr_index = {}
+        self.aliases = {}
+
+        if fmu is not None:
+            self.build(fmu)
+
+    def __len__(self):
+        """
+        This method returns the number of variables in the catalogue, including the aliases.
+
+        :return: the number of variables
+        :rtype: int
+        """
+        return len(self.names)
+
+    def __contains__(self, name):
+        """
+        This method checks if a variable is part of the catalogue.
+
+        :param string name: the name of the variable
+
+        :return: True if the variable is in the catalogue, False otherwise
+        :rtype: bool
+        """
+        return name in self.name_index
+
+    def build(self, fmu):
+        """
+        This method builds the catalogue reading the variables of an FMU.
+        The method queries the list of variables of the FMU only once.
+
+        :param FmuModel fmu: an object representing an FMU model in PyFMI.
+
+        :rtype: None
+        """
+        dictVariables = fmu.get_model_variables(include_alias = True)
+
+        N = len(dictVariables)
+        self.names = list(dictVariables.keys())
+        self.variables = list(dictVariables.values())
+        self.value_references = numpy.zeros(N, dtype = numpy.int64)
+        self.types = numpy.zeros(N, dtype = numpy.int64)
+        self.causalities = numpy.zeros(N, dtype = numpy.int64)
+        self.variabilities = numpy.zeros(N, dtype = numpy.int64)
+        self.alias_flags = numpy.zeros(N, dtype = numpy.int64)
+
+        self.name_index = {}
+        self.vr_index = {}
+        self.aliases = {}
+
+        for i, var in enumerate(self.variables):
+            self.name_index[self.names[i]] = i
+            self.value_references[i] = var.value_reference
+            self.types[i] = var.type
+            self.causalities[i] = var.causality
+            self.variabilities[i] = var.variability
+            self.alias_flags[i] = var.alias
+
+            # The index of the value references only refers to variables that are not aliases
+            if var.alias == 0:
+                self.vr_index[(int(var.type), int(var.value_reference))] = i
+
+        # Resolve the aliases, an alias has the same value reference and data type of the
+        # variable it refers to. The negated aliases (flag equal to -1) are not resolved.
+        for i in numpy.nonzero(self.alias_flags > 0)[0]:
+            j = self.vr_index.get((int(self.types[i]), int(self.value_references[i])))
+            if j is not None:
+                self.aliases[self.names[i]] = self.names[j]
+
+        logger.debug("Catalogue built with {0} variables ({1} aliases)".format(N, len(self.aliases)))
+
+    def get(self, name):
+        """
+        This method returns the variable associated to a name.
+
+        :param string name: the name of the variable
+
+        :return: the variable, or None if the name is not in the catalogue
+        :rtype: pyfmi.fmi.ScalarVariable, None
+        """
+        i = self.name_index.get(name)
+        if i is None:
+            return None
+        return self.variables[i]
+
+    def get_by_value_reference(self, value_reference, data_type = None):
+        """
+        This method returns the variable associated to a value reference. The variables that are aliases
+        are not considered. Since different data types may share the same value references, the
+        data type can be specified.
+
+        :param int value_reference: the value reference of the variable
+        :param int data_type: the data type of the variable (e.g., pyfmi.fmi.FMI_REAL), if None the
+          first variable with the value reference is returned.
+
+        :return: the variable, or None if there is no variable with the value reference
+        :rtype: pyfmi.fmi.ScalarVariable, None
+        """
+        if data_type is not None:
+            i = self.vr_index.get((int(data_type), int(value_reference)))
+        else:
+            i = None
+            candidates = numpy.nonzero((self.value_references == value_reference) & (self.alias_flags == 0))[0]
+            if len(candidates) > 0:
+                i = candidates[0]
+
+        if i is None:
+            return None
+        return self.variables[i]
+
+    def get_data_type(self, name):
+        """
+        This method returns the data type of a variable.
+
+        :param string name: the name of the variable
+
+        :return: the data type of the variable, or None if the name is not in the catalogue
+        :rtype: int, None
+        """
+        i = self.name_index.get(name)
+        if i is None:
+            return None
+        return int(self.types[i])
+
+    def get_names(self, causality = None, variability = None, include_alias = False):
+        """
+        This method returns the names of the variables that have a given causality and variability.
+
+        :param int causality: the causality of the variables, if None all causalities are selected.
+        :param int variability: the variability of the variables, if None all variabilities are selected.
+        :param bool include_alias: flag that indicates if the aliases are included.
+
+        :return: the names of the variables, in the same order defined by the FMU
+        :rtype: list(string)
+        """
+        mask = numpy.ones(len(self.names), dtype = bool)
+        if causality is not None:
+            mask &= self.causalities == causality
+        if variability is not None:
+            mask &= self.variabilities == variability
+        if not include_alias:
+            mask &= self.alias_flags == 0
+        return [self.names[i] for i in numpy.nonzero(mask)[0]]
+
+    def get_variables(self, causality = None, variability = None, include_alias = False):
+        """
+        This method returns the variables that have a given causality and variability,
+        with the same format of the method **get_model_variables** of PyFMI.
+
+        :param int causality: the causality of the variables, if None all causalities are selected.
+        :param int variability: the variability of the variables, if None all variabilities are selected.
+        :param bool include_alias: flag that indicates if the aliases are included.
+
+        :return: an ordered dictionary that has the names of the variables as keys and
+          the variables as values
+        :rtype: collections.OrderedDict
+        """
+        names = self.get_names(causality, variability, include_alias)
+        return OrderedDict([(n, self.variables[self.name_index[n]]) for n in names])
+
+    def resolve_alias(self, name):
+        """
+        This method returns the name of the variable referred by an alias. If the name
+        is not an alias, or it is a negated alias, the name is returned unchanged.
+
+        :param string name: the name of the variable
+
+        :return: the name of the variable referred by the alias
+        :rtype: string
+        """
+        return self.aliases.get(name, name)
@@ -0,0 +1,111 @@
+'''
+@author: marco
+'''
+import unittest
+import os
+import shutil
+import tempfile
+
+from multiprocessing import Process, Queue
+
+from estimationpy.fmu_utils import affinity
+
+import logging
+from estimationpy.fmu_utils import estimationpy_logging
+estimationpy_logging.configure_logger(log_level = logging.DEBUG, log_level_console = logging.INFO, log_level_file = logging.DEBUG)
+
+def configure_and_report(queue, cpu, threads):
+    """
+    Function executed by a process that configures itself as a worker and
+    reports its affinity and the number of threads
+    """
+    affinity.configure_worker(cpu, threads)
+    queue.put((affinity.get_affinity(), os.environ.get("OMP_NUM_THREADS")))
+
+class Test(unittest.TestCase):
+    """
+    This class contains unit tests for checking the functions of the module
+    :mod:`estimationpy.fmu_utils.affinity`.
+    """
+
+    def setUp(self):
+        """
+        Create a folder that contains the files of the control groups
+        """
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, name, content):
+        """
+        Write a file of the control groups
+        """
+        path = os.path.join(self.folder, name)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(content)
+
+    def test_cpu_quota(self):
+        """
+        This function tests that the CPU quota is read from the files of the version 2
+        and of the version 1 of the control groups
+        """
+        self.assertEqual(None, affinity.get_cpu_quota(self.folder), "Without files there is no quota")
+
+        self.write(os.path.join("cpu", "cpu.cfs_quota_us"), "-1\n")
+        self.write(os.path.join("cpu", "cpu.cfs_period_us"), "100000\n")
+        self.assertEqual(None, affinity.get_cpu_quota(self.folder), "A negative quota means no quota")
+        self.write(os.path.join("cpu", "cpu.cfs_quota_us"), "250000\n")
+        self.assertAlmostEqual(2.5, affinity.get_cpu_quota(self.folder), 7, "The quota of the version 1 is not correct")
+
+        # The version 2 is used when available
+        self.write("cpu.max", "max 100000\n")
+        self.assertEqual(None, affinity.get_cpu_quota(self.folder), "The quota should be unlimited")
+        self.write("cpu.max", "50000 100000\n")
+        self.assertAlmostEqual(0.5, affinity.get_cpu_quota(self.folder), 7, "The quota of the version 2 is not correct")
+
+        # A fractional quota is rounded up, and there is always at least one processor
+        self.assertEqual(1, affinity.get_available_cpus(self.folder), "The number of processors is not correct")
+        self.write("cpu.max", "100000000 100000\n")
+        self.assertEqual(len(affinity.get_affinity()), affinity.get_available_cpus(self.folder), \
+                         "The number of processors should be limited by the affinity")
+        self.assertTrue(affinity.get_default_processes() >= 1, "The pool should have at least one process")
+
+    def test_configure_worker(self):
+        """
+        This function tests that a process configured as a worker is pinned to a processor
+        and limits the number of threads, without modifying the current process
+        """
+        cpus = affinity.get_affinity()
+        threads = os.environ.get("OMP_NUM_THREADS")
+
+        queue = Queue()
+        p = Process(target = configure_and_report, args = (queue, cpus[-1], 1))
+        p.start()
+        worker_cpus, worker_threads = queue.get(timeout = 30)
+        p.join()
+
+        if hasattr(os, "sched_setaffinity"):
+            self.assertEqual([cpus[-1]], worker_cpus, "The worker should be pinned to the processor")
+        self.assertEqual("1", worker_threads, "The worker should use a single thread")
+        self.assertEqual(cpus, affinity.get_affinity(), "The affinity of the current process should not change")
+        self.assertEqual(threads, os.environ.get("OMP_NUM_THREADS"), "The threads of the current process should not change")
+
+    def test_check_threadpoolctl(self):
+        """
+        This function tests that a warning is recorded when threadpoolctl is not available
+        """
+        try:
+            import threadpoolctl
+            available = True
+        except ImportError:
+            available = False
+        
+        affinity.threadpoolctl_warned = False
+        self.assertEqual(available, affinity.check_threadpoolctl(), "The availability of threadpoolctl is not correct")
+        self.assertEqual(not available, affinity.threadpoolctl_warned, "The warning should be logged only without threadpoolctl")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+'''
+@author: marco
+'''
+import unittest
+import numpy
+
+from estimationpy.fmu_utils import covariance
+
+import logging
+from estimationpy.fmu_utils import estimationpy_logging
+estimationpy_logging.configure_logger(log_level = logging.DEBUG, log_level_console = logging.INFO, log_level_file = logging.DEBUG)
+
+
+class Test(unittest.TestCase):
+    """
+    This class contains unit tests for checking the behavior of the structured
+    covariance matrices defined in :mod:`estimationpy.fmu_utils.covariance`.
+    """
+
+    def setUp(self):
+        """
+        Define the blocks of the square root covariance matrix used by the tests
+        """
+        self.block_1 = numpy.array([[1.0, 0.0], [0.5, 2.0]])
+        self.block_2 = numpy.array([[3.0]])
+        self.dense = numpy.array([[1.0, 0.0, 0.0], [0.5, 2.0, 0.0], [0.0, 0.0, 3.0]])
+
+    def test_as_covariance(self):
+        """
+        This function tests the conversion of vectors, lists of blocks and matrices
+        to structured covariance matrices
+        """
+        diag = covariance.as_covariance([1.0, 2.0, 3.0])
+        self.assertIsInstance(diag, covariance.DiagonalCovariance, "A vector should represent a diagonal matrix")
+        numpy.testing.assert_almost_equal(numpy.diag([1.0, 2.0, 3.0]), numpy.asarray(diag), 7, "The dense matrix is not correct")
+
+        blocks = covariance.as_covariance([self.block_1, self.block_2])
+        self.assertIsInstance(blocks, covariance.BlockDiagonalCovariance, "A list of matrices should represent a block diagonal matrix")
+        self.assertEqual((3, 3), blocks.shape, "The shape of the matrix is not correct")
+        numpy.testing.assert_almost_equal(self.dense, blocks.to_dense(), 7, "The dense matrix is not correct")
+
+        # The first block can be a scalar
+        blocks = covariance.as_covariance([3.0, self.block_1])
+        self.assertIsInstance(blocks, covariance.BlockDiagonalCovariance, "A scalar and a matrix should represent a block diagonal matrix")
+        numpy.testing.assert_almost_equal(self.dense[[2, 0, 1]][:, [2, 0, 1]], blocks.to_dense(), 7, "The dense matrix is not correct")
+
+        dense = covariance.as_covariance(self.dense)
+        self.assertIsInstance(dense, covariance.DenseCovariance, "A matrix should represent a dense matrix")
+        self.assertIs(dense, covariance.as_covariance(dense), "A covariance should be returned unchanged")
+
+        # Diagonal matrices are detected only if required
+        self.assertIsInstance(covariance.as_covariance(numpy.diag([1.0, 2.0]), detect_diagonal = True), \
+                              covariance.DiagonalCovariance, "The diagonal matrix should be detected")
+        self.assertIsInstance(covariance.as_covariance(numpy.diag([1.0, 2.0])), \
+                              covariance.DenseCovariance, "The diagonal matrix should not be detected")
+
+        # Matrices that are not square are not valid
+        self.assertRaises(ValueError, covariance.as_covariance, numpy.ones((2, 3)))
+        self.assertRaises(ValueError, covariance.as_covariance, [numpy.ones((2, 3))])
+        self.assertRaises(ValueError, covariance.as_covariance, numpy.ones((2, 2, 2)))
+
+    def test_triangular_rows_and_scale(self):
+        """
+        This function tests that the triangular rows have the same product of the square root
+        with its transpose, and that the scaling preserves the structure and is equal to the dense computation
+        """
+        for cov in [covariance.DiagonalCovariance([1.0, -2.0, 3.0]), covariance.BlockDiagonalCovariance([self.block_1, self.block_2]), \
+                    covariance.DenseCovariance(self.dense)]:
+            S = cov.to_dense()
+            self.assertFalse(S.flags.writeable, "The dense matrix should be read only")
+
+            T = cov.triangular_rows()
+            self.assertFalse(T.flags.writeable, "The rows should be read only")
+            numpy.testing.assert_almost_equal(numpy.dot(S, S.T), numpy.dot(T.T, T), 7, "The product is not correct")
+
+            scaled = cov.scale(2.0)
+            self.assertIsInstance(scaled, cov.__class__, "The structure should be preserved")
+            numpy.testing.assert_almost_equal(2.0*S, scaled.to_dense(), 7, "The scaled matrix is not correct")
+
+        # The zero elements and blocks are not stacked
+        self.assertEqual((1, 3), covariance.DiagonalCovariance([0.0, 2.0, 0.0]).triangular_rows().shape, \
+                         "The zero elements should be skipped")
+        self.assertEqual((2, 3), covariance.BlockDiagonalCovariance([self.block_1, numpy.zeros((1, 1))]).triangular_rows().shape, \
+                         "The zero blocks should be skipped")
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
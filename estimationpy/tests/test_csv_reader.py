@@ -101,6 +101,54 @@ class Test(unittest.TestCase):
         self.assertTrue(numpy.allclose(data.values, self.r.get_data_series().values), "The pandas Series get is not equal to %s" % str(data.values))
         self.assertListEqual(data.index.tolist(), self.r.get_data_series().index.tolist(), "The index of the pandas Series get is not equal to %s" % str(data.index))
         
+    def test_load_data_matrix(self):
+        
+        # Try to get the data before assigning the file
+        index, data = self.r.get_data_matrix(self.colNames)
+        self.assertEqual(0, len(index), "The reader has not a CSV file assigned, the index should be empty")
+        self.assertEqual((0, 3), data.shape, "The reader has not a CSV file assigned, the matrix should be empty")
+        
+        # Open an existing Csv file
+        self.r.open_csv(self.csvOK)
+        
+        # Columns that are not available can't be read
+        index, data = self.r.get_data_matrix(["system.u", "system.z"])
+        self.assertEqual(0, len(index), "The column system.z is not available, the index should be empty")
+        
+        # Read two columns, in an order different from the one of the file
+        index, data = self.r.get_data_matrix(["system.y", "system.u"])
+        self.assertListEqual(pd.to_datetime(self.t, unit = "s", utc = True).tolist(), index.tolist(), "The index is not equal to %s" % str(self.t))
+        self.assertEqual((8, 2), data.shape, "The matrix should have one column for each column selected")
+        self.assertTrue(numpy.allclose(self.y, data[:,0]), "The first column is not equal to %s" % str(self.y))
+        self.assertTrue(numpy.allclose(self.u, data[:,1]), "The second column is not equal to %s" % str(self.u))
+        
+        # Read all the columns
+        index, data = self.r.get_data_matrix()
+        self.assertEqual((8, 3), data.shape, "The matrix should contain all the columns")
+        self.assertTrue(numpy.allclose(self.x, data[:,1]), "The second column is not equal to %s" % str(self.x))
+        
+    def test_single_parse(self):
+        """
+        This function tests that opening the file and reading multiple columns
+        parses the data of the file only once
+        """
+        read_csv = pd.io.parsers.read_csv
+        calls = []
+        def spy(*args, **kwargs):
+            calls.append(kwargs.get("nrows"))
+            return read_csv(*args, **kwargs)
+        
+        pd.io.parsers.read_csv = spy
+        try:
+            self.r.open_csv(self.csvOK)
+            index, data = self.r.get_data_matrix(["system.y", "system.u"])
+        finally:
+            pd.io.parsers.read_csv = read_csv
+        
+        self.assertEqual((8, 2), data.shape, "The matrix should have one column for each column selected")
+        self.assertEqual(1, len([n for n in calls if n is None]), "The data should be parsed only once")
+        self.assertEqual(self.colNames, self.r.get_column_names(), "The column names are not correct")
+        
     def test_repeated_data_series(self):
         # Open an existing Csv file
         self.r.open_csv(self.csvRepeated)
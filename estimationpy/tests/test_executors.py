@@ -0,0 +1,112 @@
+'''
+@author: marco
+'''
+import unittest
+import platform
+import os
+import pytz
+import pandas as pd
+import numpy as np
+
+from estimationpy.fmu_utils import model
+from estimationpy.fmu_utils import fmu_pool
+from estimationpy.fmu_utils import executors
+
+import logging
+from estimationpy.fmu_utils import estimationpy_logging
+estimationpy_logging.configure_logger(log_level = logging.DEBUG, log_level_console = logging.INFO, log_level_file = logging.DEBUG)
+
+
+class Test(unittest.TestCase):
+
+
+    def setUp(self):
+        """
+        Initialize the class for testing the executors
+        """
+        dir_path = os.path.dirname(__file__)
+        
+        # Define the path of the FMU file
+        if platform.architecture()[0]=="32bit":
+            self.filePath = os.path.join(dir_path, "..", "modelica", "FmuExamples", "Resources", "FMUs", "FirstOrder.fmu")
+        else:
+            self.filePath = os.path.join(dir_path, "..", "modelica", "FmuExamples", "Resources", "FMUs", "FirstOrder_64bit.fmu")
+        
+        self.authkey = os.urandom(16)
+
+    def tearDown(self):
+        pass
+    
+    def get_model(self):
+        """
+        This method returns the model used by the tests, with the state x to estimate
+        """
+        m = model.Model(self.filePath)
+        ind = pd.date_range('2000-1-1', periods = 31, freq='s', tz = pytz.utc)
+        m.get_input_by_name("u").set_data_series(pd.Series(np.ones(31), index = ind))
+        m.add_variable(m.get_variable_object("x"))
+        m.initialize_simulator()
+        return m
+
+    def test_remote_executor(self):
+        """
+        This function tests that the simulations run by workers listening on the local
+        machine give the same results of the local processes
+        """
+        m = self.get_model()
+        values = [{"state":np.array([v]), "parameters":[]} for v in np.linspace(1.0, 5.0, 7)]
+        expected = fmu_pool.FmuPool(m, processes = 2).run(values)
+        
+        workers, addresses = executors.start_workers(m, 3, self.authkey)
+        executor = executors.RemoteExecutor(addresses, self.authkey)
+        with fmu_pool.FmuPool(m, executor = executor) as pool:
+            pool_results = pool.run(values)
+            self.assertEqual({}, pool.failures, "No simulation should fail")
+            self.assertEqual(len(values), len(pool_results), "The number of simulation results is not correct")
+            for r_expected, res in zip(expected, pool_results):
+                np.testing.assert_almost_equal(r_expected[0][1]["x"], res[0][1]["x"], 7, "The results of the workers are not correct")
+            
+            # The simulations are distributed to all the workers
+            pids = set([stats["pid"] for stats in pool.statistics])
+            self.assertEqual(set([w.pid for w in workers]), pids, "All the workers should run simulations")
+            
+            executor.shutdown()
+        
+        for w in workers:
+            w.join(5.0)
+            self.assertFalse(w.is_alive(), "The workers should be stopped")
+    
+    def test_remote_executor_model_mismatch(self):
+        """
+        This function tests that the executor refuses the workers that do not estimate
+        the same states and parameters of the model of the pool
+        """
+        m = self.get_model()
+        workers, addresses = executors.start_workers(m, 1, self.authkey)
+        
+        other = self.get_model()
+        other.remove_variables()
+        other.add_parameter(other.get_variable_object("a"))
+        executor = executors.RemoteExecutor(addresses, self.authkey)
+        pool = fmu_pool.FmuPool(other, executor = executor)
+        self.assertRaises(ValueError, pool.run, [{"state":[], "parameters":[-1.0]}])
+        
+        # The worker is still available
+        executor = executors.RemoteExecutor(addresses, self.authkey)
+        pool = fmu_pool.FmuPool(m, executor = executor)
+        pool.run([{"state":np.array([1.0]), "parameters":[]}])
+        self.assertEqual({}, pool.failures, "No simulation should fail")
+        executor.shutdown()
+    
+    def test_remote_executor_parameters(self):
+        """
+        This function tests that the executor requires the addresses of the workers
+        and the key used to authenticate the connections
+        """
+        self.assertRaises(ValueError, executors.RemoteExecutor, [], self.authkey)
+        self.assertRaises(ValueError, executors.RemoteExecutor, [("127.0.0.1", 6000)], None)
+        self.assertRaises(ValueError, executors.serve, None, ("127.0.0.1", 0), None)
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
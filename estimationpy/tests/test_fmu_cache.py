@@ -0,0 +1,144 @@
+'''
+@author: marco
+'''
+import unittest
+import platform
+import tempfile
+import shutil
+import os
+import zipfile
+
+from estimationpy.fmu_utils import fmu_cache
+from estimationpy.fmu_utils import model
+
+import logging
+from estimationpy.fmu_utils import estimationpy_logging
+estimationpy_logging.configure_logger(log_level = logging.DEBUG, log_level_console = logging.INFO, log_level_file = logging.DEBUG)
+
+
+class Test(unittest.TestCase):
+    """
+    This class contains unit tests for checking the behavior of the cache
+    of extracted FMUs.
+    """
+
+    def setUp(self):
+        """
+        Create an empty folder for the cache
+        """
+        # Assign an existing FMU to the model, depending on the platform identified
+        dir_path = os.path.dirname(__file__)
+        
+        # Define the path of the FMU file
+        if platform.architecture()[0]=="32bit":
+            self.filePath = os.path.join(dir_path, "..", "modelica", "FmuExamples", "Resources", "FMUs", "FirstOrder.fmu")
+        else:
+            self.filePath = os.path.join(dir_path, "..", "modelica", "FmuExamples", "Resources", "FMUs", "FirstOrder_64bit.fmu")
+        
+        self.cacheDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        fmu_cache.disable_cache()
+        shutil.rmtree(self.cacheDir, ignore_errors = True)
+
+    def test_cold_and_warm_load(self):
+        """
+        This function tests that an FMU is extracted only the first time it is loaded
+        """
+        cache = fmu_cache.FmuCache(self.cacheDir)
+        
+        # Cold load, the FMU is extracted
+        fmu = cache.load_fmu(self.filePath)
+        self.assertEqual("FmuExamples.FirstOrder", fmu.get_name(), "The name of the FMU is not correct")
+        stats = cache.get_statistics()
+        self.assertEqual(0, stats["hits"], "The first load should not be a hit")
+        self.assertEqual(1, stats["misses"], "The first load should be a miss")
+        
+        # Warm load, the FMU is already extracted
+        fmu = cache.load_fmu(self.filePath)
+        self.assertEqual("FmuExamples.FirstOrder", fmu.get_name(), "The name of the FMU is not correct")
+        stats = cache.get_statistics()
+        self.assertEqual(1, stats["hits"], "The second load should be a hit")
+        self.assertEqual(1, stats["misses"], "The second load should not be a miss")
+        self.assertTrue(stats["warm_load_time"] > 0.0, "The time of the warm load should be measured")
+        
+        # Metadata of the FMU
+        metadata = cache.get_metadata(self.filePath)
+        self.assertEqual("FmuExamples.FirstOrder", metadata["model_name"], "The name of the model is not correct")
+        self.assertTrue(metadata["size"] > 0, "The size of the extracted FMU should be positive")
+        self.assertEqual(metadata["size"], cache.get_size(), "The size of the cache should be equal to the one of the FMU")
+        
+        # Clear the cache
+        cache.clear()
+        self.assertEqual(0, len(cache.get_entries()), "The cache should be empty")
+        self.assertIsNone(cache.get_metadata(self.filePath), "The cache should be empty")
+
+    def test_eviction(self):
+        """
+        This function tests that the entries are removed when the cache exceeds its size
+        """
+        cache = fmu_cache.FmuCache(self.cacheDir, max_size = 1)
+        
+        # A copy of the FMU with different content has a different entry
+        otherFmu = os.path.join(self.cacheDir, "other.fmu")
+        shutil.copy(self.filePath, otherFmu)
+        with open(otherFmu, "ab") as f:
+            f.write(b"\0")
+        
+        cache.get_extracted_dir(self.filePath)
+        self.assertEqual(1, len(cache.get_entries()), "The entry just extracted should not be removed")
+        
+        cache.get_extracted_dir(otherFmu)
+        entries = cache.get_entries()
+        self.assertEqual(1, len(entries), "The least recently used entry should be removed")
+        self.assertEqual(os.path.abspath(otherFmu), entries[0]["source"], "The entry just extracted should not be removed")
+
+    def test_unsafe_paths(self):
+        """
+        This function tests that an FMU containing files outside of its folder
+        is not extracted
+        """
+        cache = fmu_cache.FmuCache(self.cacheDir)
+        
+        for name in ["../evil.txt", "resources/../../evil.txt", "/tmp/evil.txt"]:
+            fmuFile = os.path.join(self.cacheDir, "unsafe.fmu")
+            with zipfile.ZipFile(fmuFile, "w") as z:
+                z.writestr("modelDescription.xml", "<fmiModelDescription/>")
+                z.writestr(name, "evil")
+            
+            self.assertRaises(ValueError, cache.get_extracted_dir, fmuFile)
+            self.assertEqual(0, len(cache.get_entries()), "The FMU should not be extracted")
+            self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.cacheDir), "evil.txt")), "The file should not be extracted")
+            self.assertEqual(["unsafe.fmu"], os.listdir(self.cacheDir), "The temporary folder should not be created")
+    
+    def test_extracted_dir(self):
+        """
+        This function tests that the FMU is extracted in a temporary folder when the
+        cache is disabled, and in the cache when it's enabled
+        """
+        folder = fmu_cache.get_extracted_dir(self.filePath)
+        self.assertTrue(os.path.exists(os.path.join(folder, "modelDescription.xml")), "The FMU should be extracted")
+        self.assertNotEqual(self.cacheDir, os.path.dirname(folder), "The cache is disabled")
+        
+        cache = fmu_cache.enable_cache(self.cacheDir)
+        folder = fmu_cache.get_extracted_dir(self.filePath)
+        self.assertEqual(self.cacheDir, os.path.dirname(folder), "The FMU should be extracted in the cache")
+        self.assertEqual(1, len(cache.get_entries()), "The cache should contain the FMU")
+    
+    def test_model_uses_cache(self):
+        """
+        This function tests that the model loads the FMU from the cache when enabled
+        """
+        cache = fmu_cache.enable_cache(self.cacheDir)
+        
+        m = model.Model(self.filePath)
+        m_2 = model.Model(self.filePath)
+        self.assertEqual(m.get_fmu_name(), m_2.get_fmu_name(), "The models should load the same FMU")
+        
+        stats = cache.get_statistics()
+        self.assertEqual(1, stats["misses"], "The FMU should be extracted only once")
+        self.assertEqual(1, stats["hits"], "The second model should load the FMU from the cache")
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
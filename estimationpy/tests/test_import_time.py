@@ -0,0 +1,81 @@
+'''
+@author: marco
+'''
+import unittest
+import subprocess
+import sys
+import os
+
+# Modules that are slow to import and that have to be imported only when used
+HEAVY_MODULES = ["pyfmi", "pandas", "scipy", "matplotlib"]
+
+# Modules of estimationpy that are checked
+MODULES = ["estimationpy.fmu_utils.model", "estimationpy.fmu_utils.fmu_pool", "estimationpy.ukf.ukf_fmu"]
+
+# Time in seconds available to import the modules of estimationpy, excluding numpy
+IMPORT_TIME_BUDGET = 1.0
+
+# Root folder of the package, used to run the python interpreter
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+
+def run_python(args):
+    """
+    This function runs a new python interpreter and returns what it writes to
+    the standard output and standard error.
+    """
+    p = subprocess.Popen([sys.executable] + args, cwd = ROOT, stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+    out, err = p.communicate()
+    return out.decode("utf-8"), err.decode("utf-8")
+
+class Test(unittest.TestCase):
+    """
+    This class contains tests that check the time needed to import estimationpy.
+    """
+
+    def test_heavy_modules_not_imported(self):
+        """
+        This function tests that importing the modules of estimationpy does not
+        import modules that are slow to load.
+        """
+        code = "import sys\n"
+        code += "".join(["import {0}\n".format(m) for m in MODULES])
+        code += "print(','.join([m for m in {0} if m in sys.modules]))".format(HEAVY_MODULES)
+        out, err = run_python(["-c", code])
+        self.assertEqual("", out.strip(), "The modules {0} should not be imported".format(out.strip()))
+
+    @unittest.skipIf(sys.version_info < (3, 7), "The option -X importtime requires Python 3.7")
+    def test_import_time(self):
+        """
+        This function measures the time needed to import the modules of estimationpy
+        with the option ``-X importtime`` of the python interpreter, and checks that
+        the heavy modules are not part of the modules imported and that the time spent
+        importing the modules, excluding numpy, is within the budget.
+        """
+        code = "".join(["import {0}\n".format(m) for m in MODULES])
+        out, err = run_python(["-X", "importtime", "-c", code])
+        
+        # Each line has the format "import time: self [us] | cumulative | imported package"
+        times = {}
+        for line in err.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            fields = line[len("import time:"):].split("|")
+            try:
+                times[fields[2].strip()] = int(fields[1])
+            except (IndexError, ValueError):
+                continue
+        
+        for m in MODULES:
+            self.assertTrue(m in times, "The module {0} should be imported".format(m))
+        
+        for m in HEAVY_MODULES:
+            self.assertFalse(m in times, "The module {0} should not be imported".format(m))
+        
+        # The times are cumulative and measured in microseconds
+        total = (sum([times[m] for m in MODULES]) - times.get("numpy", 0))/1e6
+        self.assertTrue(total < IMPORT_TIME_BUDGET, \
+                        "Importing the modules took {0:.3f} [s], more than {1} [s]".format(total, IMPORT_TIME_BUDGET))
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
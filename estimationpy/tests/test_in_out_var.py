@@ -77,6 +77,20 @@ class Test(unittest.TestCase):
         self.assertTrue(self.io_var.set_covariance(cov), "The covariance should be set to the value")
         self.assertEqual(cov, self.io_var.get_covariance(), "The covariance should be set to the value")
     
+    def test_set_threshold(self):
+        """
+        This function tests the method set_threshold
+        """
+        self.assertEqual(0.0, self.io_var.get_threshold(), "The default threshold should be zero")
+        
+        th = -1.0
+        self.assertRaises(ValueError, self.io_var.set_threshold, th)
+        self.assertNotEqual(th, self.io_var.get_threshold(), "The threshold shouldn't be set to the negative value")
+        
+        th = 0.5
+        self.assertTrue(self.io_var.set_threshold(th), "The threshold should be set to the value")
+        self.assertEqual(th, self.io_var.get_threshold(), "The threshold should be set to the value")
+    
     def test_set_object(self):
         """
         This function tests the method that associate a PyFmiVariable object to the object that is 
@@ -0,0 +1,109 @@
+'''
+@author: marco
+'''
+import unittest
+import os
+import json
+import shutil
+import tempfile
+
+import numpy
+
+try:
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import urlopen
+
+from estimationpy.fmu_utils.metrics import MetricsCollector, JsonLinesWriter
+
+import logging
+from estimationpy.fmu_utils import estimationpy_logging
+estimationpy_logging.configure_logger(log_level = logging.DEBUG, log_level_console = logging.INFO, log_level_file = logging.DEBUG)
+
+
+class Test(unittest.TestCase):
+    """
+    This class contains unit tests for checking the behavior of the classes
+    :class:`estimationpy.fmu_utils.metrics.MetricsCollector` and
+    :class:`estimationpy.fmu_utils.metrics.JsonLinesWriter`.
+    """
+
+    def setUp(self):
+        """
+        Create the information about two steps of the filter and one of the smoother
+        """
+        self.folder = tempfile.mkdtemp()
+        self.steps = []
+        for k in range(2):
+            self.steps.append({"stage": "filter", "step": k + 1, "time": numpy.datetime64("2000-01-01T00:00:0{0}".format(k + 1)),
+                               "progress": 0.25*(k + 1), "elapsed": 2.0*(k + 1), "step_time": 2.0, "completed_steps": k + 1,
+                               "completed_simulations": 3*(k + 1), "simulations": 3, "merged_steps": 1,
+                               "innovation": numpy.array([0.5]), "normalized_innovation": 0.5,
+                               "phases": {"projection": 1.5}, "pool_utilization": 0.75,
+                               "pool_latency": {"median": 0.5, "p90": 1.5, "max": 2.0, "tail": 1.5, "run_time": 2.0}})
+        self.steps.append({"stage": "smooth", "step": 0, "time": None, "progress": 1.0, "elapsed": 1.0, "step_time": 1.0,
+                           "completed_steps": 1, "completed_simulations": 3, "simulations": 3, "merged_steps": 1,
+                           "innovation": None, "normalized_innovation": None, "phases": {}, "pool_utilization": None})
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_prometheus(self):
+        """
+        This function tests the counters and the gauges in the Prometheus text format
+        """
+        collector = MetricsCollector(prefix = "test")
+        for info in self.steps:
+            collector(info)
+
+        lines = collector.to_prometheus().splitlines()
+        self.assertTrue('test_steps_total{stage="filter"} 2' in lines, "The number of steps is not correct")
+        self.assertTrue('test_simulations_total{stage="filter"} 6' in lines, "The number of simulations is not correct")
+        self.assertTrue('test_steps_total{stage="smooth"} 1' in lines, "The number of steps is not correct")
+        self.assertTrue('test_phase_seconds_total{stage="filter",phase="projection"} 3.0' in lines, "The time of the phase is not correct")
+        self.assertTrue('test_steps_per_second{stage="filter"} 0.5' in lines, "The throughput is not correct")
+        self.assertTrue('test_eta_seconds{stage="filter"} 4.0' in lines, "The estimated time to completion is not correct")
+        self.assertTrue('test_pool_utilization{stage="filter"} 0.75' in lines, "The utilization of the pool is not correct")
+        self.assertTrue('test_pool_tail_latency_seconds{stage="filter"} 1.5' in lines, "The tail latency of the pool is not correct")
+        self.assertFalse(any(l.startswith('test_normalized_innovation{stage="smooth"}') for l in lines), \
+                         "The smoother doesn't have an innovation")
+
+        # The file contains the same metrics
+        path = os.path.join(self.folder, "metrics.prom")
+        collector.write_prometheus(path)
+        with open(path) as f:
+            self.assertEqual(collector.to_prometheus(), f.read(), "The file is not correct")
+
+        # The metrics are served over HTTP
+        port = collector.start_http_server()
+        try:
+            body = urlopen("http://127.0.0.1:{0}/metrics".format(port)).read().decode("utf-8")
+        finally:
+            collector.stop_http_server()
+        self.assertEqual(collector.to_prometheus(), body, "The metrics served are not correct")
+
+        collector.reset()
+        self.assertFalse("test_steps_total{stage=\"filter\"} 2" in collector.to_prometheus(), "The metrics should be removed")
+
+    def test_json_lines(self):
+        """
+        This function tests that a JSON object is written for each step
+        """
+        path = os.path.join(self.folder, "steps.jsonl")
+        writer = JsonLinesWriter(path)
+        for info in self.steps:
+            writer(info)
+        writer.close()
+
+        with open(path) as f:
+            data = [json.loads(l) for l in f]
+        self.assertEqual(3, len(data), "There should be a line for each step")
+        self.assertEqual(["filter", "filter", "smooth"], [d["stage"] for d in data], "The stages are not correct")
+        self.assertEqual([0.5], data[0]["innovation"], "The arrays should be converted to lists")
+        self.assertEqual("2000-01-01T00:00:01", data[0]["time"], "The time stamps should be converted to strings")
+        self.assertTrue(data[2]["wall_time"] >= data[0]["wall_time"], "The wall time is not correct")
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
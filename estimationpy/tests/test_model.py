@@ -12,6 +12,7 @@ import numpy as np
 
 from datetime import datetime, timedelta
 from estimationpy.fmu_utils import model
+from estimationpy.fmu_utils import covariance
 
 import logging
 from estimationpy.fmu_utils import estimationpy_logging
@@ -192,6 +193,42 @@ class Test(unittest.TestCase):
         self.assertAlmostEqual(15.2, results["y"][-1], 2, "The steady state value of \
         the output variable y is not 15.2 but %.8f" % (results["y"][-1]))
         
+    def test_bind_csv_file(self):
+        """
+        This function tests the association of multiple variables to
+        the columns of a CSV file with a single call.
+        """
+        # Initialize the FMU model empty
+        m = model.Model()
+    
+        # ReInit the model with the new FMU
+        m.re_init(self.filePath)
+        
+        # Variables that are not inputs or outputs can't be associated
+        self.assertRaises(ValueError, m.bind_csv_file, self.csv_inputPath, {"z": "system.u"})
+        
+        # Columns that are not in the file can't be read
+        self.assertFalse(m.bind_csv_file(self.csv_inputPath, {"u": "system.z"}), "The column system.z is not in the file")
+        
+        # Associate the input and the output
+        self.assertTrue(m.bind_csv_file(self.csv_inputPath, {"u": "system.u", "y": "system.y"}), "The columns should be associated")
+        ds_u = m.get_input_by_name("u").get_data_series()
+        ds_y = m.get_output_by_name("y").get_data_series()
+        self.assertEqual("system.u", ds_u.name, "The name of the data series should be the column name")
+        self.assertEqual("system.y", ds_y.name, "The name of the data series should be the column name")
+        self.assertTrue(ds_u.index.equals(ds_y.index), "The data series should share the same index")
+        
+        # Compare with the data read from the CSV file
+        df = pd.read_csv(self.csv_inputPath, index_col = 0)
+        np.testing.assert_almost_equal(df["system.u"].values, ds_u.values, 7, "The input data is not correct")
+        np.testing.assert_almost_equal(df["system.y"].values, ds_y.values, 7, "The output data is not correct")
+        
+        # The model can be simulated with the data
+        m.initialize_simulator()
+        time, results = m.simulate()
+        self.assertEqual(ds_u.index[0], time[0], "The initial time does not correspond")
+        self.assertEqual(ds_u.index[-1], time[-1], "The final time does not correspond")
+    
     def test_run_model_data_series(self):
         """
         This function tests if the model can be run when loading data form a pandas
@@ -332,7 +369,339 @@ class Test(unittest.TestCase):
         frame for which all the data are available. Also, the number of point selected within the time frame
         is selected in order to keep the highest sampling frequency
         """
-        pass 
+        # Initialize the FMU model empty
+        m = model.Model()
+    
+        # ReInit the model with the new FMU
+        m.re_init(self.filePath)
+        
+        # The input u = t is sampled every second for 30 seconds
+        ind_u = pd.date_range('2000-1-1', periods = 31, freq='s', tz = pytz.utc)
+        inp = m.get_input_by_name("u")
+        inp.set_data_series(pd.Series(np.arange(31.0), index = ind_u))
+        
+        # The output y = 0.8*(t - 5) is sampled every 2.5 seconds starting from t = 5
+        ind_y = pd.date_range('2000-1-1 00:00:05', periods = 11, freq='2500ms', tz = pytz.utc)
+        out = m.get_output_by_name("y")
+        out.set_data_series(pd.Series(2.0*np.arange(11), index = ind_y))
+        out.set_measured_output()
+        
+        # Align the data series
+        self.assertTrue(m.align_data(), "The data series should be aligned")
+        index, data = m.get_aligned_data()
+        
+        # The time grid is the union of the two indexes in the common period [5, 30] s
+        self.assertListEqual(list(ind_u[5:].union(ind_y)), list(index), "The aligned time grid is not correct")
+        self.assertEqual((len(index), 2), data.shape, "The aligned data must have one column for each channel")
+        self.assertTrue(data.flags["C_CONTIGUOUS"], "The aligned data must be a contiguous array")
+        
+        # Both channels are linearly interpolated over the grid
+        t = np.array([(ix - ind_u[0]).total_seconds() for ix in index])
+        np.testing.assert_almost_equal(t, data[:, 0], 7, "The input is not correctly interpolated")
+        np.testing.assert_almost_equal(0.8*(t - 5.0), data[:, 1], 7, "The output is not correctly interpolated")
+        
+        # The measured outputs are read from the aligned data
+        measured = m.get_measured_output_data_series()
+        np.testing.assert_almost_equal(data[:, 1], measured[:, 1], 7, "The measured output does not use the aligned data")
+        
+        # The simulation uses the aligned time grid
+        m.initialize_simulator()
+        time, results = m.simulate()
+        self.assertEqual(ind_y[0], time[0], "The initial time does not correspond")
+        self.assertEqual(ind_y[-1], time[-1], "The final time does not correspond")
+    
+    def test_measured_output_matrix_cache(self):
+        """
+        This function tests that the matrix of the measured outputs is cached by the model
+        and that it's computed again only when the data series change.
+        """
+        # Initialize the FMU model empty
+        m = model.Model()
+    
+        # ReInit the model with the new FMU
+        m.re_init(self.filePath)
+        
+        ind = pd.date_range('2000-1-1', periods = 11, freq='s', tz = pytz.utc)
+        inp = m.get_input_by_name("u")
+        inp.set_data_series(pd.Series(np.arange(11.0), index = ind))
+        out = m.get_output_by_name("y")
+        out.set_data_series(pd.Series(2.0*np.arange(11.0), index = ind))
+        out.set_measured_output()
+        
+        # Read the measured outputs two times, the second time the cached arrays are returned
+        time, values = m.get_measured_output_matrix()
+        time_2, values_2 = m.get_measured_output_matrix()
+        self.assertIs(time, time_2, "The time array should be cached")
+        self.assertIs(values, values_2, "The measured outputs should be cached")
+        self.assertEqual(np.int64, time.dtype, "The time has to be expressed with integers")
+        self.assertEqual((11, 1), values.shape, "The matrix should have one column for each measured output")
+        np.testing.assert_almost_equal(2.0*np.arange(11.0), values[:, 0], 7, "The measured output is not correct")
+        
+        # The cached arrays are read only
+        self.assertFalse(time.flags.writeable, "The time array should be read only")
+        self.assertFalse(values.flags.writeable, "The measured outputs should be read only")
+        
+        # Changing the data series invalidates the cache
+        out.set_data_series(pd.Series(3.0*np.arange(11.0), index = ind))
+        self.assertFalse(m.is_data_aligned(), "The data should not be aligned after changing a data series")
+        time_3, values_3 = m.get_measured_output_matrix()
+        self.assertIsNot(values, values_3, "The measured outputs should be computed again")
+        np.testing.assert_almost_equal(3.0*np.arange(11.0), values_3[:, 0], 7, "The measured output is not correct")
+        self.assertTrue(m.is_data_aligned(), "The data should be aligned")
+    
+    def test_resample_data(self):
+        """
+        This function tests the uniform and adaptive resampling of the data
+        associated to the inputs and the measured outputs.
+        """
+        # Initialize the FMU model empty
+        m = model.Model()
+    
+        # ReInit the model with the new FMU
+        m.re_init(self.filePath)
+        
+        # The input is constant, then it has a step and then it increases linearly
+        ind = pd.date_range('2000-1-1', periods = 61, freq='s', tz = pytz.utc)
+        u = np.zeros(61)
+        u[20:40] = 1.0
+        u[40:] = np.arange(21.0)
+        inp = m.get_input_by_name("u")
+        inp.set_data_series(pd.Series(u, index = ind))
+        out = m.get_output_by_name("y")
+        out.set_data_series(pd.Series(np.ones(61), index = ind))
+        out.set_measured_output()
+        
+        # Uniform resampling
+        ratio = m.resample_data(step = 5)
+        index, data = m.get_aligned_data()
+        self.assertEqual(13, len(index), "The data should be resampled every 5 seconds")
+        self.assertAlmostEqual(61.0/13.0, ratio, 7, "The compression ratio is not correct")
+        self.assertEqual(ratio, m.get_compression_ratio(), "The compression ratio is not correct")
+        t = np.array([(ix - ind[0]).total_seconds() for ix in index])
+        np.testing.assert_almost_equal(np.arange(0.0, 61.0, 5.0), t, 7, "The time grid should be uniform")
+        
+        # Adaptive resampling with zero thresholds, only constant periods are compressed
+        ratio = m.resample_data(adaptive = True)
+        index, data = m.get_aligned_data()
+        t = np.array([(ix - ind[0]).total_seconds() for ix in index])
+        expected = np.concatenate(([0.0, 19.0, 20.0, 39.0], np.arange(40.0, 61.0)))
+        np.testing.assert_almost_equal(expected, t, 7, "The points retained are not correct")
+        self.assertAlmostEqual(61.0/len(expected), ratio, 7, "The compression ratio is not correct")
+        
+        # Changing the threshold is applied when the data is aligned again
+        inp.set_threshold(1.5)
+        time, values = m.get_measured_output_matrix()
+        self.assertLess(len(time), len(expected), "The threshold should reduce the number of points")
+        self.assertEqual(ind[0], m.get_aligned_data()[0][0], "The first point should be retained")
+        self.assertEqual(ind[-1], m.get_aligned_data()[0][-1], "The last point should be retained")
+        
+        # Disable the resampling
+        ratio = m.resample_data()
+        self.assertEqual(61, len(m.get_aligned_data()[0]), "The resampling should be disabled")
+        self.assertEqual(1.0, ratio, "The compression ratio should be one")
+    
+    def test_clone(self):
+        """
+        This function tests that a cloned model shares the metadata of the original
+        model, but has its own FMU, inputs, outputs and parameters.
+        """
+        # Models without an FMU can't be cloned
+        self.assertRaises(ValueError, model.Model().clone)
+        
+        # Initialize the model and associate the data
+        m = model.Model(self.filePath)
+        self.assertTrue(m.bind_csv_file(self.csv_inputPath, {"u": "system.u", "y": "system.y"}), "The columns should be associated")
+        m.add_parameter(m.get_variable_object("a"))
+        m.get_parameters()[0].set_initial_value(-2.0)
+        m.set_cov_matrix_state_pars([2.0])
+        
+        c = m.clone()
+        
+        # Metadata is shared, the FMU and the variables are not
+        self.assertIs(m.catalogue, c.catalogue, "The catalogue should be shared")
+        self.assertIsNot(m.get_fmu(), c.get_fmu(), "The FMU should be a new instance")
+        self.assertEqual(m.get_properties(), c.get_properties(), "The properties should be the same")
+        self.assertListEqual(m.get_input_names(), c.get_input_names(), "The inputs should be the same")
+        self.assertListEqual(m.get_output_names(), c.get_output_names(), "The outputs should be the same")
+        self.assertIsNot(m.get_input_by_name("u"), c.get_input_by_name("u"), "The inputs should be copied")
+        self.assertIsNot(m.get_output_by_name("y"), c.get_output_by_name("y"), "The outputs should be copied")
+        self.assertListEqual(m.get_parameter_names(), c.get_parameter_names(), "The parameters should be the same")
+        self.assertEqual(-2.0, c.get_parameters()[0].get_initial_value(), "The initial value should be copied")
+        self.assertIsNot(m.cov_state_pars_custom, c.cov_state_pars_custom, "The covariance should be copied")
+        np.testing.assert_almost_equal(m.get_cov_matrix_state_pars(), c.get_cov_matrix_state_pars(), 7, "The covariance should be the same")
+        
+        # The FMU is extracted only once for all the clones
+        self.assertIsNotNone(m.fmu_dir, "The folder of the extracted FMU should be stored")
+        self.assertEqual(m.fmu_dir, m.clone().fmu_dir, "The clones should load the same extracted FMU")
+        
+        # Modifying the clone does not modify the original model
+        c.get_parameters()[0].set_initial_value(-3.0)
+        c.get_output_by_name("y").set_measured_output()
+        self.assertEqual(-2.0, m.get_parameters()[0].get_initial_value(), "The original parameter should not change")
+        self.assertEqual(0, m.get_num_measured_outputs(), "The original outputs should not change")
+        self.assertEqual(1, c.get_num_measured_outputs(), "The outputs of the clone should change")
+        
+        # The two models produce the same results
+        m.initialize_simulator()
+        c.initialize_simulator()
+        time, results = m.simulate()
+        time_c, results_c = c.simulate()
+        self.assertTrue(time.equals(time_c), "The time vectors should be the same")
+        np.testing.assert_almost_equal(results["y"], results_c["y"], 7, "The results of the clone are not correct")
+    
+    def test_estimation_registry(self):
+        """
+        This function tests that the attributes of the parameters and state variables
+        to estimate are stored in the registries of the model, and that the arrays
+        returned by the model are cached.
+        """
+        m = model.Model(self.filePath)
+        m.add_variable(m.get_variable_object("x"))
+        m.add_parameter(m.get_variable_object("a"))
+        m.add_parameter(m.get_variable_object("b"))
+        par_a, par_b = m.get_parameters()
+        par_a.set_covariance(2.0)
+        par_b.set_covariance(3.0)
+        par_b.set_constraint_low(False)
+        
+        # The arrays contain the attributes of the variables, in the same order
+        np.testing.assert_almost_equal([par_a.get_min_value(), par_b.get_min_value()], m.get_parameters_min(), 7, \
+                                       "The minimum values of the parameters are not correct")
+        np.testing.assert_equal([1.0, 0.0], m.get_constr_pars_low(), "The constraints are not correct")
+        self.assertEqual(np.float64, m.get_constr_pars_low().dtype, "The flags of the constraints should be floats")
+        np.testing.assert_almost_equal(np.diag([1.0, 2.0, 3.0]), m.get_cov_matrix_state_pars(), 7, \
+                                       "The covariance matrix is not correct")
+        
+        # The arrays are cached and read only
+        cov = m.get_cov_matrix_state_pars()
+        self.assertIs(cov, m.get_cov_matrix_state_pars(), "The covariance matrix should be cached")
+        self.assertIs(m.get_parameters_max(), m.get_parameters_max(), "The max values should be cached")
+        self.assertFalse(cov.flags.writeable, "The covariance matrix should be read only")
+        
+        # Modifying a variable invalidates the cache
+        m.get_variables()[0].set_covariance(5.0)
+        self.assertIsNot(cov, m.get_cov_matrix_state_pars(), "The covariance matrix should be computed again")
+        self.assertEqual(5.0, m.get_cov_matrix_state_pars()[0, 0], "The covariance matrix is not correct")
+        
+        # Removing a parameter moves the following ones, the parameter removed keeps its attributes
+        self.assertTrue(m.remove_parameter(par_a), "The parameter should be removed")
+        self.assertEqual(0, par_b.slot, "The slot of the parameter is not correct")
+        self.assertEqual(2.0, par_a.get_covariance(), "The parameter removed should keep its covariance")
+        np.testing.assert_almost_equal(np.diag([5.0, 3.0]), m.get_cov_matrix_state_pars(), 7, \
+                                       "The covariance matrix is not correct")
+        
+        # Removing all the parameters empties the list in place
+        parameters = m.get_parameters()
+        m.remove_parameters()
+        self.assertIs(parameters, m.get_parameters(), "The list of parameters should be the same")
+        self.assertEqual(0, m.get_num_parameters(), "There should be no parameters")
+        self.assertEqual(0, len(m.get_parameters_min()), "There should be no parameters")
+    
+    def test_structured_covariance(self):
+        """
+        This function tests the covariance matrices of the state variables and parameters
+        specified with a structure different from the diagonal one.
+        """
+        m = model.Model(self.filePath)
+        m.add_variable(m.get_variable_object("x"))
+        m.add_parameter(m.get_variable_object("a"))
+        m.add_parameter(m.get_variable_object("b"))
+        m.get_output_by_name("y").set_measured_output()
+        
+        # By default the covariances are diagonal
+        self.assertIsInstance(m.get_cov_state_pars(), covariance.DiagonalCovariance, "The covariance should be diagonal")
+        np.testing.assert_almost_equal(np.eye(3), m.get_cov_state_pars().to_dense(), 7, "The covariance is not correct")
+        self.assertIsInstance(m.get_cov_outputs(), covariance.DiagonalCovariance, "The covariance should be diagonal")
+        
+        # Block diagonal covariance of states and parameters
+        block = np.array([[1.0, 0.0], [0.5, 2.0]])
+        m.set_cov_matrix_state_pars([np.array([[3.0]]), block])
+        self.assertIsInstance(m.get_cov_state_pars(), covariance.BlockDiagonalCovariance, "The structure should be preserved")
+        np.testing.assert_almost_equal(block, m.get_cov_matrix_state_pars()[1:, 1:], 7, "The covariance is not correct")
+        self.assertRaises(ValueError, m.set_cov_matrix_state_pars, np.eye(2))
+        
+        # The size is checked again when the parameters are modified
+        m.remove_parameter(m.get_parameters()[-1])
+        self.assertRaises(ValueError, m.get_cov_state_pars)
+        self.assertRaises(ValueError, m.get_cov_matrix_state_pars)
+        m.add_parameter(m.get_variable_object("b"))
+        
+        # Reset the default covariance
+        m.set_cov_matrix_state_pars(None)
+        np.testing.assert_almost_equal(np.eye(3), m.get_cov_matrix_state_pars(), 7, "The covariance is not correct")
+        
+        # Covariance of the outputs specified by the diagonal
+        m.set_cov_matrix_outputs([4.0])
+        np.testing.assert_almost_equal([[4.0]], m.get_cov_matrix_outputs(), 7, "The covariance is not correct")
+        self.assertRaises(ValueError, m.set_cov_matrix_outputs, [1.0, 2.0])
+    
+    def test_evaluate_outputs(self):
+        """
+        This function tests the evaluation of the outputs for given values of the
+        states and inputs, without running a simulation.
+        """
+        m = model.Model(self.filePath)
+        ind = pd.date_range('2000-1-1', periods = 11, freq='s', tz = pytz.utc)
+        m.get_input_by_name("u").set_data_series(pd.Series(np.ones(11), index = ind))
+        m.add_variable(m.get_variable_object("x"))
+        self.assertTrue(m.initialize_simulator(), "The model should be initialized")
+        
+        # The outputs are the same read from the FMU after the initialization
+        measured, outputs = m.evaluate_outputs()
+        self.assertEqual(0, len(measured), "There are no measured outputs")
+        np.testing.assert_almost_equal(m.get_outputs_values(), outputs, 7, "The outputs are not correct")
+        
+        # The output x is equal to the state
+        measured, outputs = m.evaluate_outputs(ind[5], x = [2.0])
+        self.assertAlmostEqual(2.0, outputs[1], 7, "The output x should be equal to the state")
+        self.assertAlmostEqual(2.0, m.get_state_observed_values()[0], 7, "The state should be set in the FMU")
+        
+        # The same result is obtained with a simulation of length zero
+        m.set_direct_evaluation(False)
+        measured, outputs_sim = m.evaluate_outputs(ind[5], x = [2.0])
+        np.testing.assert_almost_equal(outputs, outputs_sim, 7, "The outputs are not correct")
+    
+    def test_simulate_lazy(self):
+        """
+        This function tests that the results of a simulation returned as an object
+        of type SimulationResults are the same returned as a dictionary.
+        """
+        m = model.Model(self.filePath)
+        ind = pd.date_range('2000-1-1', periods = 31, freq='s', tz = pytz.utc)
+        m.get_input_by_name("u").set_data_series(pd.Series(np.ones(31), index = ind))
+        m.initialize_simulator()
+        
+        time, results = m.simulate()
+        m.initialize_simulator()
+        res = m.simulate(lazy = True)
+        
+        self.assertTrue(time.equals(res.get_time_index()), "The time vectors should be the same")
+        self.assertEqual(sorted(results.keys()), sorted(res.keys()), "The results should contain the same variables")
+        for name in m.get_output_names():
+            np.testing.assert_almost_equal(results[name], res[name], 7, "The results of {0} are not correct".format(name))
+    
+    def test_simulate_tolerance_factor(self):
+        """
+        This function tests that the tolerances of the solver can be scaled for a single
+        simulation, and that the original ones are restored after it.
+        """
+        m = model.Model(self.filePath, atol = 1e-6, rtol = 1e-4)
+        ind = pd.date_range('2000-1-1', periods = 31, freq='s', tz = pytz.utc)
+        m.get_input_by_name("u").set_data_series(pd.Series(np.ones(31), index = ind))
+        m.initialize_simulator()
+        
+        self.assertEqual(1, m.SIMULATION_TRIES, "The simulations should not be repeated by default")
+        self.assertRaises(ValueError, m.set_simulation_tries, 0)
+        
+        time, results = m.simulate()
+        m.initialize_simulator()
+        time_tight, results_tight = m.simulate(tolerance_factor = 0.01)
+        for name in m.get_output_names():
+            np.testing.assert_almost_equal(results[name][-1], results_tight[name][-1], 3, "The results of {0} are not correct".format(name))
+        
+        opts = m.get_simulation_options()
+        self.assertAlmostEqual(1e-6, opts["CVode_options"]["atol"], 12, "The absolute tolerance should be restored")
+        self.assertAlmostEqual(1e-4, opts["CVode_options"]["rtol"], 12, "The relative tolerance should be restored")
         
         
 if __name__ == "__main__":
@@ -11,9 +11,12 @@ import pandas as pd
 import numpy as np
 
 from datetime import datetime
+from multiprocessing import Queue
+from threading import Thread, Event
 
 from estimationpy.fmu_utils import model
 from estimationpy.fmu_utils import fmu_pool
+from estimationpy.fmu_utils import affinity
 
 import logging
 from estimationpy.fmu_utils import estimationpy_logging
@@ -40,12 +43,26 @@ class Test(unittest.TestCase):
             
         # Path of the CSV data
         self.csv_inputPath = os.path.join(dir_path, "..", "modelica", "FmuExamples", "Resources", "data", "SimulationData_FirstOrder.csv")
+        
+        # Time index of the data series associated to the input
+        self.ind = pd.date_range('2000-1-1', periods = 31, freq='s', tz = pytz.utc)
 
 
     def tearDown(self):
         pass
 
 
+    def build_model(self, **kwargs):
+        """
+        This method loads the FMU, associates a data series of ones to the input,
+        selects the state to estimate and initializes the simulator
+        """
+        m = model.Model(self.filePath, **kwargs)
+        m.get_input_by_name("u").set_data_series(pd.Series(np.ones(31), index = self.ind))
+        m.add_variable(m.get_variable_object("x"))
+        m.initialize_simulator()
+        return m
+    
     def test_run_model_pool_data_series(self):
         """
         This function tests if the model can be run using a pool of processes when loading data form a pandas
@@ -132,6 +149,264 @@ class Test(unittest.TestCase):
             
             i += 1
 
+    def test_run_model_pool_shared_memory(self):
+        """
+        This function tests that the results of the pool are the same when they are
+        moved using shared memory and when they are sent through the queue
+        """
+        m = self.build_model()
+
+        values = [{"state":np.array([v]), "parameters":[]} for v in np.linspace(1.0, 5.0, 4)]
+        queue_results = fmu_pool.FmuPool(m, processes = 2, use_shared_memory = False).run(values)
+        shared_results = fmu_pool.FmuPool(m, processes = 2, use_shared_memory = True).run(values)
+        lazy_results = fmu_pool.FmuPool(m, processes = 2, lazy = True).run(values)
+
+        self.assertEqual(len(values), len(shared_results), "The number of simulation results is not correct")
+        for r_queue, r_shared, r_lazy in zip(queue_results, shared_results, lazy_results):
+            time, results = r_queue[0]
+            self.assertTrue(time.equals(r_shared[0][0]), "The time vectors should be the same")
+            self.assertTrue(time.equals(r_lazy[0].get_time_index()), "The time vectors should be the same")
+            for name in ["x", "y"]:
+                np.testing.assert_almost_equal(results[name], r_shared[0][1][name], 7, "The results of {0} are not correct".format(name))
+                np.testing.assert_almost_equal(results[name], r_lazy[0][name], 7, "The results of {0} are not correct".format(name))
+
+    def test_run_model_pool_result_files(self):
+        """
+        This function tests that the pool reuses the result files in the scratch
+        folder when the results are written to the file system, and that the folder
+        is removed when the pool is closed
+        """
+        m = self.build_model(result_handler = "file")
+
+        values = [{"state":np.array([v]), "parameters":[]} for v in np.linspace(1.0, 5.0, 6)]
+        with fmu_pool.FmuPool(m, processes = 2) as pool:
+            pool_results = pool.run(values)
+            scratch_path = pool.scratch_path
+            
+            self.assertEqual(len(values), len(pool_results), "The number of simulation results is not correct")
+            for v, res in zip(values, pool_results):
+                time, results = res[0]
+                self.assertAlmostEqual(v["state"][0], results["x"][0], 7, "The initial condition is not correct")
+            
+            # Only one file for each process that can run at the same time
+            files = set([s["result_file"] for s in pool.statistics])
+            self.assertEqual(2, len(files), "The result files should be reused")
+            for f in files:
+                self.assertEqual(scratch_path, os.path.dirname(f), "The result file is not in the scratch folder")
+            
+            # The processes were busy for part of the time of the run
+            utilization = pool.get_utilization()
+            self.assertTrue(utilization > 0.0 and utilization <= 1.0, "The utilization of the pool is not correct")
+        
+        self.assertFalse(os.path.exists(scratch_path), "The scratch folder should be removed")
+
+    def test_run_model_pool_failures(self):
+        """
+        This function tests that the simulations that fail are reported by the pool
+        without stopping the others
+        """
+        m = self.build_model()
+        
+        values = [{"state":np.array([v]), "parameters":[]} for v in np.linspace(1.0, 5.0, 4)]
+        pool = fmu_pool.FmuPool(m, processes = 2)
+        
+        # The final time is before the initial time, all the simulations fail
+        pool_results = pool.run(values, start = self.ind[10], stop = self.ind[5])
+        self.assertEqual(len(values), len(pool_results), "There should be an element for each simulation")
+        self.assertEqual(list(range(len(values))), sorted(pool.failures.keys()), "All the simulations should fail")
+        for res, stats in zip(pool_results, pool.statistics):
+            self.assertFalse(res[0], "The results of a simulation that failed should be False")
+            self.assertTrue(stats["error"].startswith("IndexError"), "The error is not correct")
+        
+        # The failures are reset by the following run
+        pool_results = pool.run(values, start = self.ind[0], stop = self.ind[5])
+        self.assertEqual({}, pool.failures, "No simulation should fail")
+        for v, res in zip(values, pool_results):
+            time, results = res[0]
+            self.assertAlmostEqual(v["state"][0], results["x"][0], 7, "The initial condition is not correct")
+
+    def test_run_model_pool_persistent_workers(self):
+        """
+        This function tests that the persistent workers of the pool give the same results
+        of the processes created for each simulation, and that they are recycled after
+        the number of simulations specified
+        """
+        m = self.build_model()
+        
+        values = [{"state":np.array([v]), "parameters":[]} for v in np.linspace(1.0, 5.0, 5)]
+        expected = fmu_pool.FmuPool(m, processes = 2).run(values)
+        
+        with fmu_pool.FmuPool(m, processes = 2, persistent = True, max_tasks = 2) as pool:
+            for i in range(2):
+                pool_results = pool.run(values)
+                self.assertEqual({}, pool.failures, "No simulation should fail")
+                for r_expected, res in zip(expected, pool_results):
+                    np.testing.assert_almost_equal(r_expected[0][1]["x"], res[0][1]["x"], 7, "The results of the workers are not correct")
+                
+                # Each worker runs at most two simulations before being replaced
+                for stats in pool.statistics:
+                    self.assertTrue(stats["worker_tasks"] <= 2, "The worker should have been recycled")
+                self.assertTrue(len(pool.restarts) > 0, "Some workers should have been replaced")
+                for event in pool.restarts:
+                    self.assertEqual("tasks", event["reason"], "The reason of the restart is not correct")
+                    self.assertEqual(2, event["tasks"], "The number of simulations run by the worker is not correct")
+            
+            workers = list(pool.workers.values())
+        
+        for w in workers:
+            self.assertFalse(w.is_alive(), "The workers should be stopped when the pool is closed")
+        
+        self.assertRaises(ValueError, fmu_pool.FmuPool, m, persistent = True, max_tasks = 0)
+        self.assertRaises(ValueError, fmu_pool.FmuPool, m, persistent = True, max_memory = -1)
+    
+    def test_run_model_pool_worker_memory(self):
+        """
+        This function tests that the persistent workers are recycled when their
+        memory exceeds the limit
+        """
+        if fmu_pool.get_memory_usage() is None:
+            self.skipTest("The memory of the processes can't be measured")
+        
+        m = self.build_model()
+        
+        # Every worker exceeds the limit of one byte after its first simulation
+        values = [{"state":np.array([v]), "parameters":[]} for v in np.linspace(1.0, 5.0, 4)]
+        with fmu_pool.FmuPool(m, processes = 2, persistent = True, max_memory = 1) as pool:
+            pool_results = pool.run(values)
+            self.assertEqual({}, pool.failures, "No simulation should fail")
+            for v, res in zip(values, pool_results):
+                time, results = res[0]
+                self.assertAlmostEqual(v["state"][0], results["x"][0], 7, "The initial condition is not correct")
+            
+            self.assertEqual(len(values), len(pool.restarts), "A worker should be replaced after each simulation")
+            for stats, event in zip(pool.statistics, pool.restarts):
+                self.assertEqual("memory", stats["recycle"], "The worker should be recycled because of its memory")
+                self.assertEqual("memory", event["reason"], "The reason of the restart is not correct")
+                self.assertEqual(1, event["tasks"], "The number of simulations run by the worker is not correct")
+                self.assertTrue(event["memory"] > 1, "The memory used by the worker is not correct")
+    
+    def test_run_model_pool_worker_terminated(self):
+        """
+        This function tests that a persistent worker that terminates unexpectedly is replaced,
+        and that the simulation it was running is reported as a failure without stopping the others
+        """
+        m = self.build_model()
+        
+        values = [{"state":np.array([v]), "parameters":[]} for v in np.linspace(1.0, 5.0, 5)]
+        
+        # The workers are copies of this process, therefore they terminate
+        # when they receive the third simulation
+        execute = fmu_pool.Worker.execute
+        def execute_or_exit(worker, task):
+            if task[0] == 2:
+                os._exit(3)
+            return execute(worker, task)
+        
+        with fmu_pool.FmuPool(m, processes = 2, persistent = True) as pool:
+            fmu_pool.Worker.execute = execute_or_exit
+            try:
+                pool_results = pool.run(values)
+            finally:
+                fmu_pool.Worker.execute = execute
+            
+            self.assertEqual([2], list(pool.failures.keys()), "The simulation run by the worker that terminated should fail")
+            self.assertFalse(pool_results[2][0], "The results of the simulation that failed should be False")
+            for k in [0, 1, 3, 4]:
+                time, results = pool_results[k][0]
+                self.assertAlmostEqual(values[k]["state"][0], results["x"][0], 7, "The other simulations should not fail")
+            self.assertEqual(1, len(pool.restarts), "The worker that terminated should be replaced")
+            self.assertEqual("terminated", pool.restarts[0]["reason"], "The reason of the restart is not correct")
+            
+            # A worker killed while it's idle is replaced before receiving a simulation
+            pool.stop_workers()
+            pool.run(values)
+            pool.workers[0].terminate()
+            pool.workers[0].join()
+            pool_results = pool.run(values)
+            self.assertEqual({}, pool.failures, "No simulation should fail")
+            self.assertEqual(["terminated"], [e["reason"] for e in pool.restarts], "The worker killed should be replaced")
+    
+    def test_run_model_pool_slowest_first(self):
+        """
+        This function tests that the pool dispatches first the simulations that were
+        the slowest in the previous run, and that the results are returned in order
+        """
+        m = self.build_model()
+        
+        values = [{"state":np.array([v]), "parameters":[]} for v in np.linspace(1.0, 5.0, 5)]
+        pool = fmu_pool.FmuPool(m, processes = 2)
+        self.assertEqual(list(range(5)), pool.get_dispatch_order(5), "Without runtimes the order should be the one of the indexes")
+        
+        pool.run(values)
+        self.assertEqual(5, len(pool.runtimes[5]), "The runtimes of the simulations should be recorded")
+        latency = pool.latency
+        self.assertTrue(latency["median"] <= latency["p90"] <= latency["max"], "The statistics of the runtimes are not consistent")
+        self.assertAlmostEqual(latency["max"] - latency["median"], latency["tail"], 7, "The tail latency is not correct")
+        
+        # The slowest simulation of the previous run is dispatched first
+        pool.runtimes[5] = [1.0, 5.0, 2.0, 4.0, 3.0]
+        self.assertEqual([1, 3, 4, 2, 0], pool.get_dispatch_order(5), "The simulations should be sorted by decreasing runtime")
+        self.assertEqual(list(range(3)), pool.get_dispatch_order(3), "The runtimes of a different number of simulations should not be used")
+        
+        pool_results = pool.run(values)
+        self.assertEqual({}, pool.failures, "No simulation should fail")
+        for v, res in zip(values, pool_results):
+            time, results = res[0]
+            self.assertAlmostEqual(v["state"][0], results["x"][0], 7, "The results should be in the order of the values")
+        
+        pool.slowest_first = False
+        self.assertEqual(list(range(5)), pool.get_dispatch_order(5), "The order should be the one of the indexes")
+    
+    def test_run_model_pool_affinity(self):
+        """
+        This function tests that the size of the pool depends on the processors available,
+        and that the processes pinned to the processors give the same results
+        """
+        m = self.build_model()
+        
+        self.assertEqual(affinity.get_default_processes(), fmu_pool.FmuPool(m).N_MAX_PROCESS, "The default number of processes is not correct")
+        
+        values = [{"state":np.array([v]), "parameters":[]} for v in np.linspace(1.0, 5.0, 4)]
+        expected = fmu_pool.FmuPool(m, processes = 2).run(values)
+        for persistent in [False, True]:
+            with fmu_pool.FmuPool(m, processes = 2, persistent = persistent, pin_workers = True) as pool:
+                self.assertEqual(affinity.get_affinity()[0], pool.get_worker_cpu(0), "The process in the first slot should use the first processor")
+                pool_results = pool.run(values)
+                self.assertEqual({}, pool.failures, "No simulation should fail")
+                for r_expected, res in zip(expected, pool_results):
+                    np.testing.assert_almost_equal(r_expected[0][1]["x"], res[0][1]["x"], 7, "The results of the pinned processes are not correct")
+        
+        self.assertEqual(None, fmu_pool.FmuPool(m, processes = 2).get_worker_cpu(0), "The processes should not be pinned by default")
+        self.assertRaises(ValueError, fmu_pool.FmuPool, m, worker_threads = 0)
+    
+    def test_reader_thread(self):
+        """
+        This function tests that the thread that reads the results terminates when
+        the processes terminated, even if some results are missing
+        """
+        queue = Queue()
+        queue.put([1, "results", {}])
+        results = {}
+        stop_event = Event()
+        thread = Thread(target = fmu_pool.threaded_function, args = (queue, results, 2, stop_event))
+        thread.start()
+        
+        stop_event.set()
+        thread.join(10.0)
+        self.assertFalse(thread.is_alive(), "The thread should terminate")
+        self.assertEqual({1: ["results", {}]}, results, "The results received are not correct")
+    
+    def test_memory_usage(self):
+        """
+        This function tests that the memory used by the process increases when
+        memory is allocated
+        """
+        before = fmu_pool.get_memory_usage()
+        self.assertTrue(before > 0, "The memory used by the process should be positive")
+        data = np.ones(50*1024*1024//8)
+        self.assertTrue(fmu_pool.get_memory_usage() >= before, "The memory used by the process should not decrease")
+        del data
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
@@ -0,0 +1,70 @@
+'''
+@author: marco
+'''
+import unittest
+import json
+
+from estimationpy.fmu_utils.profiling import Profiler
+
+import logging
+from estimationpy.fmu_utils import estimationpy_logging
+estimationpy_logging.configure_logger(log_level = logging.DEBUG, log_level_console = logging.INFO, log_level_file = logging.DEBUG)
+
+
+class Test(unittest.TestCase):
+    """
+    This class contains unit tests for checking the behavior of the class
+    :class:`estimationpy.fmu_utils.profiling.Profiler`.
+    """
+
+    def test_disabled(self):
+        """
+        This function tests that a disabled profiler doesn't collect data
+        """
+        p = Profiler()
+        self.assertFalse(p.is_enabled(), "The profiler should be disabled by default")
+        p.start_step(0)
+        with p.timer("phase"):
+            pass
+        p.add_time("other", 1.0)
+        p.count("counter")
+        self.assertEqual({"phases": {}, "counters": {}, "steps": []}, p.summary(), "No data should be collected")
+
+    def test_phases_and_steps(self):
+        """
+        This function tests the times and the counters collected by an enabled profiler
+        """
+        p = Profiler(enabled = True)
+        p.add_time("simulate", 1.0)
+        p.start_step("a")
+        p.add_time("simulate", 3.0)
+        with p.timer("gain"):
+            pass
+        p.start_step("b")
+        p.add_time("simulate", 2.0, calls = 4)
+        p.count("retries")
+        p.count("retries", 2)
+
+        s = p.summary()
+        self.assertAlmostEqual(6.0, s["phases"]["simulate"]["total"], 7, "The total time is not correct")
+        self.assertEqual(6, s["phases"]["simulate"]["calls"], "The number of calls is not correct")
+        self.assertAlmostEqual(1.0, s["phases"]["simulate"]["mean"], 7, "The mean time is not correct")
+        self.assertAlmostEqual(3.0, s["phases"]["simulate"]["max"], 7, "The maximum time is not correct")
+        self.assertEqual(1, s["phases"]["gain"]["calls"], "The timer should be measured")
+        self.assertEqual(3, p.get_counter("retries"), "The counter is not correct")
+        self.assertEqual(0, p.get_counter("missing"), "The counter should be zero")
+
+        self.assertEqual(["a", "b"], [step["label"] for step in s["steps"]], "The steps are not correct")
+        self.assertAlmostEqual(3.0, s["steps"][0]["phases"]["simulate"], 7, "The time of the step is not correct")
+        self.assertAlmostEqual(2.0, s["steps"][1]["phases"]["simulate"], 7, "The time of the step is not correct")
+
+        # The summary can be exported as JSON
+        self.assertEqual(s["counters"], json.loads(p.to_json())["counters"], "The JSON summary is not correct")
+
+        p.reset()
+        self.assertEqual(0.0, p.get_total_time("simulate"), "The data should be removed")
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,276 @@
+'''
+@author: marco
+'''
+import unittest
+import platform
+import os
+import time
+import asyncio
+import threading
+import pytz
+import pandas as pd
+import numpy as np
+
+from estimationpy.fmu_utils import model
+from estimationpy.fmu_utils import fmu_pool
+from estimationpy.fmu_utils import scheduler
+from estimationpy.ukf.ukf_fmu import UkfFmu
+from estimationpy.ukf.async_ukf import AsyncUkfFmu
+
+import logging
+from estimationpy.fmu_utils import estimationpy_logging
+estimationpy_logging.configure_logger(log_level = logging.DEBUG, log_level_console = logging.INFO, log_level_file = logging.DEBUG)
+
+class FakeModel(object):
+    """
+    Model whose simulations return the PID of the process that runs them
+    """
+    def get_state(self):
+        return np.zeros(1)
+    
+    def set_state(self, state):
+        pass
+    
+    def simulate(self, fail = False, exit_code = None, sleep = None):
+        if sleep is not None:
+            time.sleep(sleep)
+        if exit_code is not None:
+            os._exit(exit_code)
+        if fail:
+            raise ValueError("failure")
+        return os.getpid()
+
+class FakeUkf(object):
+    """
+    Filter that records the number of calls running at the same time
+    """
+    def __init__(self):
+        self.pool = fmu_pool.FmuPool(None, processes = 1)
+        self.active = [0, 0]
+        self.lock = threading.Lock()
+    
+    def filter(self, start, stop, **kwargs):
+        with self.lock:
+            self.active[0] += 1
+            self.active[1] = max(self.active)
+        time.sleep(0.02)
+        with self.lock:
+            self.active[0] -= 1
+        return start, stop, threading.get_ident()
+
+class Test(unittest.TestCase):
+
+
+    def setUp(self):
+        """
+        Initialize the class for testing the scheduler
+        """
+        dir_path = os.path.dirname(__file__)
+        
+        # Define the path of the FMU file
+        if platform.architecture()[0]=="32bit":
+            self.filePath = os.path.join(dir_path, "..", "modelica", "FmuExamples", "Resources", "FMUs", "FirstOrder.fmu")
+        else:
+            self.filePath = os.path.join(dir_path, "..", "modelica", "FmuExamples", "Resources", "FMUs", "FirstOrder_64bit.fmu")
+        
+        # Path of the CSV data
+        self.csvPath = os.path.join(dir_path, "..", "modelica", "FmuExamples", "Resources", "data", "SimulationData_FirstOrder.csv")
+        
+        # Time index of the data series associated to the input
+        self.ind = pd.date_range('2000-1-1', periods = 31, freq='s', tz = pytz.utc)
+
+    def tearDown(self):
+        pass
+    
+    def build_model(self, **kwargs):
+        """
+        This method loads the FMU, associates a data series of ones to the input,
+        selects the state to estimate and initializes the simulator
+        """
+        m = model.Model(self.filePath, **kwargs)
+        m.get_input_by_name("u").set_data_series(pd.Series(np.ones(31), index = self.ind))
+        m.add_variable(m.get_variable_object("x"))
+        m.initialize_simulator()
+        return m
+    
+    def run_loop(self, coroutine, timeout = None):
+        """
+        This method runs a coroutine in a new event loop, if the timeout
+        expires the coroutine is cancelled and asyncio.TimeoutError is raised
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            if timeout is not None:
+                coroutine = asyncio.wait_for(coroutine, timeout)
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_fair_queueing(self):
+        """
+        This function tests that the scheduler serves the clients in round robin order,
+        and that it doesn't run more functions than its slots at the same time
+        """
+        s = scheduler.AsyncScheduler(slots = 2)
+        order = []
+        active = [0, 0]
+        lock = threading.Lock()
+        
+        def task(client, n):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.02)
+            with lock:
+                order.append((client, n))
+                active[0] -= 1
+            return n
+        
+        async def client(name, n):
+            return await asyncio.gather(*[s.submit(name, task, name, i) for i in range(n)])
+        
+        async def main():
+            return await asyncio.gather(client("a", 6), client("b", 2), client("c", 2))
+        
+        results = self.run_loop(main())
+        self.assertEqual([list(range(6)), [0, 1], [0, 1]], [list(r) for r in results], "The results are not correct")
+        self.assertTrue(active[1] <= 2, "The number of functions running at the same time exceeds the slots")
+        
+        # The clients b and c are served before the second half of the functions of a
+        last = max([order.index((name, 1)) for name in ["b", "c"]])
+        self.assertTrue(last < order.index(("a", 4)), "The clients are not served in round robin order")
+        self.assertEqual(10, s.statistics["completed"], "The number of functions completed is not correct")
+        self.assertEqual({}, s.get_queue_lengths(), "No function should be waiting")
+        s.close()
+    
+    def test_workers(self):
+        """
+        This function tests that the simulations run in workers that are reused, at most one
+        for each slot, that the exceptions raised by the simulations are propagated, and that
+        the workers that terminate or are stuck are not reused
+        """
+        s = scheduler.AsyncScheduler(slots = 2, timeout = 30.0)
+        models = [FakeModel(), FakeModel(), FakeModel()]
+        
+        async def main():
+            first = await asyncio.gather(*[s.simulate(models[0]) for i in range(4)])
+            second = await asyncio.gather(*[s.simulate(models[0]) for i in range(4)])
+            return first + second
+        
+        pids = set(self.run_loop(main(), 60.0))
+        self.assertNotIn(os.getpid(), pids, "The simulations should run in other processes")
+        self.assertTrue(len(pids) <= 2, "The workers should be reused")
+        self.assertEqual(len(pids), s.statistics["workers_started"], "The number of workers started is not correct")
+        
+        # The workers of the other models replace the ones that are idle
+        async def others():
+            return await asyncio.gather(s.simulate(models[1]), s.simulate(models[2]))
+        self.run_loop(others(), 60.0)
+        self.assertTrue(s.n_workers <= 2, "There should be at most a worker for each slot")
+        
+        self.assertRaises(ValueError, self.run_loop, s.simulate(models[0], fail = True), 60.0)
+        
+        # The workers that terminate or don't complete the simulation in time are removed
+        s.timeout = 0.5
+        for kwargs in [{"exit_code": 3}, {"sleep": 10.0}]:
+            self.assertRaises(RuntimeError, self.run_loop, s.simulate(models[0], **kwargs), 60.0)
+            idle = [w for k in s.idle for w in s.idle[k]]
+            self.assertEqual(len(idle), s.n_workers, "Only the idle workers should be counted")
+            for w in idle:
+                self.assertTrue(w.is_alive(), "A worker that terminated should not be reused")
+        
+        pid = self.run_loop(s.simulate(models[0]), 60.0)
+        self.assertIn(pid, [w.pid for w in s.idle[(models[0], False)]], "The simulation should run in a worker that is alive")
+        self.assertRaises(ValueError, scheduler.AsyncScheduler, 0)
+        s.close()
+        self.assertEqual(0, s.n_workers, "The workers should be stopped when the scheduler is closed")
+    
+    def test_async_ukf_calls(self):
+        """
+        This function tests that the calls of an awaitable filter run in threads of the scheduler,
+        one at a time, and that its simulations are sent to the scheduler
+        """
+        s = scheduler.AsyncScheduler(slots = 2)
+        ukf = FakeUkf()
+        async_ukf = AsyncUkfFmu(ukf, s)
+        self.assertIsInstance(ukf.pool.executor, scheduler.ScheduledExecutor, "The simulations should be sent to the scheduler")
+        self.assertIs(async_ukf, ukf.pool.executor.client, "The client should be the filter")
+        
+        async def main():
+            return await asyncio.gather(*[async_ukf.filter(i, i + 1) for i in range(3)])
+        
+        results = self.run_loop(main())
+        self.assertEqual([(i, i + 1) for i in range(3)], [r[:2] for r in results], "The results are not correct")
+        self.assertNotIn(threading.get_ident(), [r[2] for r in results], "The filter should run in another thread")
+        self.assertEqual(1, ukf.active[1], "The calls should run one at a time")
+        s.close()
+    
+    def test_async_ukf(self):
+        """
+        This function tests that the awaitable filters that share the scheduler give the same
+        results of the filter
+        """
+        m = model.Model(self.filePath)
+        input_u = m.get_input_by_name("u")
+        input_u.get_csv_reader().open_csv(self.csvPath)
+        input_u.get_csv_reader().set_selected_column("system.u")
+        output = m.get_output_by_name("y")
+        output.get_csv_reader().open_csv(self.csvPath)
+        output.get_csv_reader().set_selected_column("system.y")
+        output.set_measured_output()
+        output.set_covariance(2.0)
+        m.add_variable(m.get_variable_object("x"))
+        m.get_variables()[0].set_initial_value(1.5)
+        m.get_variables()[0].set_covariance(0.5)
+        m.initialize_simulator()
+        
+        t0 = pd.to_datetime(0.0, unit = "s", utc = True)
+        t1 = pd.to_datetime(5.0, unit = "s", utc = True)
+        x_expected = np.array(UkfFmu(m).filter(start = t0, stop = t1)[1])
+        
+        s = scheduler.AsyncScheduler(slots = 2)
+        filters = [AsyncUkfFmu(UkfFmu(m.clone()), s) for i in range(2)]
+        for f in filters:
+            f.ukf.model.initialize_simulator()
+        
+        async def main():
+            return await asyncio.gather(*[f.filter(t0, t1) for f in filters])
+        
+        for res in self.run_loop(main()):
+            np.testing.assert_almost_equal(x_expected, np.array(res[1]), 7, "The states estimated are not correct")
+        s.close()
+    
+    def test_async_pool(self):
+        """
+        This function tests that pools and simulations that share the scheduler give the
+        same results of the pools running their own processes
+        """
+        m = self.build_model()
+        
+        values = [{"state":np.array([v]), "parameters":[]} for v in np.linspace(1.0, 5.0, 5)]
+        expected = fmu_pool.FmuPool(m, processes = 2).run(values)
+        time_sim, results_sim = m.simulate()
+        
+        s = scheduler.AsyncScheduler(slots = 2)
+        pools = [scheduler.AsyncFmuPool(fmu_pool.FmuPool(m), s) for i in range(3)]
+        
+        async def main():
+            runs = asyncio.gather(*[p.run(values) for p in pools])
+            return await runs, await s.simulate(m)
+        
+        pool_results, (time_async, results_async) = self.run_loop(main())
+        for res in pool_results:
+            for r_expected, r in zip(expected, res):
+                np.testing.assert_almost_equal(r_expected[0][1]["x"], r[0][1]["x"], 7, "The results of the pool are not correct")
+        np.testing.assert_almost_equal(results_sim["y"], results_async["y"], 7, "The results of the simulation are not correct")
+        self.assertEqual(16, s.statistics["completed"], "The number of simulations is not correct")
+        
+        # A pool that uses the scheduler must not be run by the event loop
+        async def blocking():
+            return pools[0].pool.run(values)
+        self.assertRaises(RuntimeError, self.run_loop, blocking())
+        s.close()
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
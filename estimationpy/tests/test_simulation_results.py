@@ -0,0 +1,112 @@
+'''
+@author: marco
+'''
+import unittest
+import numpy
+import pytz
+import pandas as pd
+
+from estimationpy.fmu_utils import simulation_results
+from estimationpy.fmu_utils.simulation_results import SimulationResults
+
+import logging
+from estimationpy.fmu_utils import estimationpy_logging
+estimationpy_logging.configure_logger(log_level = logging.DEBUG, log_level_console = logging.INFO, log_level_file = logging.DEBUG)
+
+
+class Test(unittest.TestCase):
+    """
+    This class contains unit tests for checking the behavior of the class
+    :class:`estimationpy.fmu_utils.simulation_results.SimulationResults`.
+    """
+
+    def setUp(self):
+        """
+        Create results with three variables and an additional value
+        """
+        self.time = numpy.linspace(0.0, 10.0, 11)
+        self.values = numpy.vstack((self.time, 2.0*self.time, 3.0*self.time)).T
+        self.reference = pd.Timestamp("2000-01-01", tz = pytz.utc)
+        self.results = SimulationResults(self.time, self.values, ["x", "y", "z"], self.reference, {"__PARAMS__": numpy.array([1.0])})
+
+    def test_mapping(self):
+        """
+        This function tests the access to the trajectories and to the additional values
+        """
+        r = self.results
+        self.assertEqual(["x", "y", "z", "__PARAMS__"], r.keys(), "The names are not correct")
+        self.assertEqual(4, len(r), "The number of elements is not correct")
+        self.assertTrue("y" in r, "The variable y should be in the results")
+        self.assertFalse("w" in r, "The variable w should not be in the results")
+        self.assertIsNone(r.get("w"), "The default value should be returned")
+        self.assertRaises(KeyError, r.__getitem__, "w")
+        numpy.testing.assert_almost_equal(2.0*self.time, r["y"], 7, "The trajectory of y is not correct")
+        numpy.testing.assert_almost_equal([1.0], r["__PARAMS__"], 7, "The additional value is not correct")
+
+        # The trajectories are views of the matrix
+        self.assertTrue(r.values.flags.f_contiguous, "The matrix should be in Fortran order")
+        self.assertTrue(numpy.shares_memory(r["z"], r.values), "The trajectory should not be copied")
+        self.assertTrue(numpy.shares_memory(r.to_dict()["x"], r.values), "The trajectory should not be copied")
+
+        # The dimensions must be consistent
+        self.assertRaises(ValueError, SimulationResults, self.time, self.values, ["x", "y"])
+
+    def test_time_conversion(self):
+        """
+        This function tests that the time is converted to date and time when required
+        """
+        r = self.results
+        self.assertIsNone(r.time_index, "The time should not be converted")
+        index = r.get_time_index()
+        self.assertIs(index, r.get_time_index(), "The time should be converted only once")
+        self.assertEqual(self.reference, index[0], "The initial time is not correct")
+        self.assertEqual(self.reference + pd.Timedelta(seconds = 10), index[-1], "The final time is not correct")
+
+        # The time can't be converted without the reference
+        self.assertRaises(ValueError, SimulationResults(self.time, self.values, ["x", "y", "z"]).get_time_index)
+
+    def test_selection(self):
+        """
+        This function tests the selection of the variables without copying the data
+        """
+        s = self.results.select(["z", "x"])
+        self.assertEqual(["z", "x"], s.keys(), "The names are not correct")
+        self.assertIs(self.results.values, s.values, "The matrix should be shared")
+        numpy.testing.assert_almost_equal(3.0*self.time, s["z"], 7, "The trajectory of z is not correct")
+        numpy.testing.assert_almost_equal(numpy.vstack((3.0*self.time, self.time)).T, s.get_values(["z", "x"]), 7, \
+                                          "The matrix of the values is not correct")
+
+        df = s.to_dataframe()
+        self.assertEqual(["z", "x"], list(df.columns), "The columns are not correct")
+        self.assertEqual(self.reference, df.index[0], "The index of the data frame is not correct")
+        numpy.testing.assert_almost_equal(self.time, df["x"].values, 7, "The data frame is not correct")
+
+    @unittest.skipIf(not simulation_results.SHARED_MEMORY_AVAILABLE, "Shared memory is not available")
+    def test_shared_memory(self):
+        """
+        This function tests that the results can be moved to a block of shared memory
+        and read back without copying them
+        """
+        description = self.results.to_shared_memory()
+        r = SimulationResults.from_shared_memory(description)
+        self.assertEqual(self.results.keys(), r.keys(), "The names are not correct")
+        self.assertEqual(self.reference, r.get_time_index()[0], "The initial time is not correct")
+        numpy.testing.assert_almost_equal(self.values, r.values, 7, "The trajectories are not correct")
+        numpy.testing.assert_almost_equal([1.0], r["__PARAMS__"], 7, "The additional value is not correct")
+        self.assertTrue(r.values.flags.f_contiguous, "The matrix should be in Fortran order")
+        self.assertFalse(r.values.flags.owndata, "The trajectories should not be copied")
+        self.assertEqual(r.time.ctypes.data + r.time.nbytes, r.values.ctypes.data, "The trajectories should follow the time in the block")
+
+        # The block can't be attached again because its name has been removed
+        self.assertRaises(OSError, SimulationResults.from_shared_memory, description)
+        
+        # The blocks that are not read are released, even more than once
+        description = self.results.to_shared_memory()
+        SimulationResults.release_shared_memory(description)
+        self.assertRaises(OSError, SimulationResults.from_shared_memory, description)
+        SimulationResults.release_shared_memory(description)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -10,7 +10,7 @@ import pytz
 from datetime import datetime
 import numpy as np
 import pandas as pd
-from estimationpy.ukf.ukf_fmu import UkfFmu
+from estimationpy.ukf.ukf_fmu import UkfFmu, UkfException
 from estimationpy.fmu_utils.model import Model
 
 import logging
@@ -308,8 +308,8 @@ class Test(unittest.TestCase):
         notUsed, N = Xtrue.shape
         Xpoints = np.zeros((n,N))
         for i in range(n):
-        noise = np.random.uniform(-2.0,2.0,(1,N)) 
-	    Xpoints[i,:] = Xtrue + noise
+            noise = np.random.uniform(-2.0,2.0,(1,N)) 
+            Xpoints[i,:] = Xtrue + noise
 
         # default covariance to be added
         Q = 2.0*np.eye(N)
@@ -317,19 +317,19 @@ class Test(unittest.TestCase):
         # definition of the weights
         Weights = np.zeros(n)
         for i in range(n):
-	    if i==0:
-		Weights[i] = 0.5
-	    else:
-		Weights[i] = (1.0 - Weights[0])/np.float(n-1)
+            if i==0:
+                Weights[i] = 0.5
+            else:
+                Weights[i] = (1.0 - Weights[0])/float(n-1)
 
         #---------------------------------------------------
         # Standard method based on Cholesky
         i = 0
         P = Q
         for x in Xpoints:
-	    error = x - Xtrue 
-	    P     = P + Weights[i]*np.dot(error.T,error)
-	    i    += 1
+            error = x - Xtrue 
+            P     = P + Weights[i]*np.dot(error.T,error)
+            i    += 1
         S = ukf_FMU.square_root(P)
         
         np.testing.assert_almost_equal(P, np.dot(S, S.T), 8, \
@@ -493,6 +493,261 @@ class Test(unittest.TestCase):
 
         return
 
+    def test_ukf_filter_adaptive_step_first_order(self):
+        """
+        This method tests the adaptive time stepping of the filter
+        when estimating the state of the first order system.
+        """
+        # Initialize the first order model
+        self.set_first_order_model()
+
+        # Associate inputs and outputs
+        self.set_first_order_model_input_outputs()
+
+        # Define the variables to estimate
+        self.set_state_to_estimate_first_order()
+
+        # Initialize the simulator
+        self.m.initialize_simulator()
+
+        # The thresholds are large enough to merge every interval
+        self.m.get_input_by_name("u").set_threshold(1e6)
+        self.m.get_output_by_name("y").set_threshold(1e6)
+
+        # Instantiate the filter and enable the adaptive time stepping
+        ukf_FMU = UkfFmu(self.m)
+        self.assertEqual(0, ukf_FMU.get_num_skipped_steps(), "No steps should be skipped before filtering")
+        self.assertRaises(ValueError, ukf_FMU.set_adaptive_step, True, -1.0)
+        self.assertRaises(ValueError, ukf_FMU.set_adaptive_step, True, 1.0, 0)
+        ukf_FMU.set_adaptive_step(innovation_threshold = 1e6, max_steps = 3)
+
+        # Start the filter
+        t0 = pd.to_datetime(0.0, unit = "s", utc = True)
+        t1 = pd.to_datetime(30.0, unit = "s", utc = True)
+        time, x, sqrtP, y, Sy, y_full = ukf_FMU.filter(start = t0, stop = t1)
+
+        # Number of intervals in the data
+        t_data, y_data = self.m.get_measured_output_matrix()
+        ix_start, ix_stop = ukf_FMU.find_closest_matches(t0, t1, pd.to_datetime(t_data, utc = True))
+        n_intervals = ix_stop - ix_start - 1
+
+        # Every step after the first one merges up to three intervals
+        n_skipped = ukf_FMU.get_num_skipped_steps()
+        self.assertTrue(n_skipped > 0, "The adaptive time stepping should skip some steps")
+        self.assertEqual(n_intervals, len(time) - 1 + n_skipped, "The steps processed and skipped must cover all the intervals")
+        self.assertEqual(len(time), len(x), "There must be one estimation for each time step processed")
+        self.assertEqual(t0, time[0], "The first time step must be the initial time")
+
+        return
+
+    def test_ukf_filter_profiling(self):
+        """
+        This method tests that the profiler measures the time spent
+        in the phases of the filter.
+        """
+        # Initialize the first order model
+        self.set_first_order_model()
+        self.set_first_order_model_input_outputs()
+        self.set_state_to_estimate_first_order()
+        self.m.initialize_simulator()
+
+        # The profiler is disabled by default
+        ukf_FMU = UkfFmu(self.m)
+        t0 = pd.to_datetime(0.0, unit = "s", utc = True)
+        t1 = pd.to_datetime(5.0, unit = "s", utc = True)
+        ukf_FMU.filter(start = t0, stop = t1)
+        self.assertEqual({}, ukf_FMU.get_profiling_summary()["phases"], "No phase should be measured")
+
+        # Enable the profiler and run the filter again
+        ukf_FMU.set_profiling()
+        time, x, sqrtP, y, Sy, y_full = ukf_FMU.filter(start = t0, stop = t1)
+        summary = ukf_FMU.get_profiling_summary()
+
+        for phase in ["measurements", "sigma_points", "projection", "pool_dispatch", "simulate", "result_unpacking", "square_root", "gain"]:
+            self.assertTrue(phase in summary["phases"], "The phase {0} should be measured".format(phase))
+        self.assertEqual(len(time) - 1, summary["phases"]["sigma_points"]["calls"], "The sigma points are computed once per step")
+        self.assertEqual(len(time) - 1, len(summary["steps"]), "Each step of the filter should be recorded")
+        self.assertEqual(ukf_FMU.n_points*(len(time) - 1), summary["counters"]["simulations"], "The number of simulations is not correct")
+        self.assertTrue(summary["phases"]["pool_dispatch"]["total"] <= summary["phases"]["projection"]["total"], \
+                        "The time of the pool is part of the projection")
+
+        return
+
+    def test_ukf_failure_budget(self):
+        """
+        This method tests the configuration of the budget for the sigma points that fail,
+        and the renormalization of the weights when some of them are dropped.
+        """
+        # Initialize the valve model, it has a state and a parameter to estimate
+        self.set_valve_model()
+        self.set_valve_model_input_outputs()
+        self.set_state_and_param_to_estimate_valve()
+        self.m.initialize_simulator()
+        
+        ukf_FMU = UkfFmu(self.m)
+        self.assertRaises(ValueError, ukf_FMU.set_failure_budget, -1)
+        self.assertRaises(ValueError, ukf_FMU.set_failure_budget, 0, -1)
+        self.assertRaises(ValueError, ukf_FMU.set_failure_budget, 0, 1, 0.0)
+        self.assertRaises(ValueError, ukf_FMU.set_failure_budget, 0, 1, 0.1, "ignore")
+        
+        # Drop the first sigma point, its symmetric point is dropped too
+        W_m, W_c = ukf_FMU.get_weights()
+        ukf_FMU.__drop_sigma_points__([1])
+        new_W_m, new_W_c = ukf_FMU.get_weights()
+        self.assertEqual(0.0, new_W_m[1,0], "The weight of the sigma point should be zero")
+        self.assertEqual(0.0, new_W_m[1 + ukf_FMU.N,0], "The weight of the symmetric sigma point should be zero")
+        self.assertAlmostEqual(np.sum(W_m), np.sum(new_W_m), 10, "The sum of the weights should not change")
+        self.assertAlmostEqual(np.sum(W_c), np.sum(new_W_c), 10, "The sum of the weights should not change")
+        self.assertEqual(W_m[0,0], new_W_m[0,0], "The weight of the central point should not change")
+        
+        # Dropping all the sigma points is not possible
+        self.assertRaises(UkfException, ukf_FMU.__drop_sigma_points__, list(range(1, ukf_FMU.n_points)))
+        
+        # The simulations of some sigma points fail, and the retries fail unless they
+        # use tighter tolerances
+        run = ukf_FMU.pool.run
+        calls = []
+        def failing_run(values, start = None, stop = None, tolerance_factor = 1.0):
+            results = run(values, start, stop, tolerance_factor)
+            calls.append((len(values), tolerance_factor))
+            if len(calls) == 1:
+                bad.extend([id(values[k]) for k in failing])
+            for k, v in enumerate(values):
+                if id(v) in bad and (len(calls) == 1 or not fixed_by_retry):
+                    results[k] = [False]
+                    ukf_FMU.pool.failures[k] = "Simulation failed"
+            return results
+        ukf_FMU.pool.run = failing_run
+        
+        x = self.m.get_state_observed_values()
+        pars = self.m.get_parameter_values()
+        sigma_points = ukf_FMU.compute_sigma_points(x, pars, 0.01*np.eye(2))
+        t0 = pd.to_datetime(0.0, unit = "s", utc = True)
+        t1 = pd.to_datetime(1.0, unit = "s", utc = True)
+        
+        # The retry with tighter tolerances succeeds
+        bad, failing, fixed_by_retry = [], [1], True
+        ukf_FMU.set_failure_budget(0, 1, 0.1)
+        X_proj = ukf_FMU.sigma_point_proj(sigma_points, t0, t1)[0]
+        self.assertEqual([(5, 1.0), (1, 0.1)], calls, "The sigma point should be simulated again with tighter tolerances")
+        np.testing.assert_almost_equal(W_m, ukf_FMU.get_weights()[0], 10, "The weights should not change")
+        self.assertFalse(np.array_equal(X_proj[0], X_proj[1]), "The sigma point should be projected")
+        
+        # The sigma points that fail after the retries are dropped
+        bad, failing, fixed_by_retry = [], [2], False
+        del calls[:]
+        ukf_FMU.set_failure_budget(1, 2, 0.1, "drop")
+        ukf_FMU.sigma_point_proj(sigma_points, t0, t1)
+        self.assertEqual([(5, 1.0), (1, 0.1), (1, 0.1**2)], calls, "The tolerances should be reduced at each retry")
+        new_W_m = ukf_FMU.get_weights()[0]
+        self.assertEqual(0.0, new_W_m[2,0], "The weight of the sigma point should be zero")
+        self.assertEqual(0.0, new_W_m[2 + ukf_FMU.N,0], "The weight of the symmetric sigma point should be zero")
+        
+        # The sigma points that fail are clamped to the central one
+        bad = []
+        del calls[:]
+        ukf_FMU.set_failure_budget(1, 0, policy = "clamp")
+        X_proj = ukf_FMU.sigma_point_proj(sigma_points, t0, t1)[0]
+        self.assertEqual([(5, 1.0)], calls, "The sigma point should not be simulated again")
+        np.testing.assert_almost_equal(X_proj[0], X_proj[2], 10, "The sigma point should be replaced by the central one")
+        np.testing.assert_almost_equal(W_m, ukf_FMU.get_weights()[0], 10, "The weights should not change")
+        
+        # The step fails when the budget is exceeded or the central sigma point fails
+        for failing in [[1, 2], [0]]:
+            bad = []
+            del calls[:]
+            self.assertRaises(UkfException, ukf_FMU.sigma_point_proj, sigma_points, t0, t1)
+        
+        return
+
+    def test_ukf_filter_progress(self):
+        """
+        This method tests that the progress of the filter is reported
+        by the callback, and only by it.
+        """
+        # Initialize the first order model
+        self.set_first_order_model()
+        self.set_first_order_model_input_outputs()
+        self.set_state_to_estimate_first_order()
+        self.m.initialize_simulator()
+
+        ukf_FMU = UkfFmu(self.m)
+        self.assertRaises(TypeError, ukf_FMU.set_progress_callback, "not callable")
+
+        progress = []
+        ukf_FMU.set_progress_callback(lambda stage, step, t, p: progress.append((stage, step, t, p)))
+        t0 = pd.to_datetime(0.0, unit = "s", utc = True)
+        t1 = pd.to_datetime(5.0, unit = "s", utc = True)
+        time, x, sqrtP, y, Sy, y_full = ukf_FMU.filter(start = t0, stop = t1)
+
+        self.assertEqual(len(time) - 1, len(progress), "The progress should be reported once per step")
+        self.assertEqual(["filter"], list(set([p[0] for p in progress])), "The stage is not correct")
+        self.assertEqual(list(time[1:]), [p[2] for p in progress], "The times of the steps are not correct")
+        self.assertAlmostEqual(1.0, progress[-1][3], 7, "The filter should be completed")
+        self.assertTrue(all(np.diff([p[3] for p in progress]) > 0), "The progress should increase")
+
+        return
+
+    def test_ukf_filter_step_callbacks(self):
+        """
+        This method tests that the step callbacks receive the information
+        about each step of the filter and of the smoother.
+        """
+        # Initialize the first order model
+        self.set_first_order_model()
+        self.set_first_order_model_input_outputs()
+        self.set_state_to_estimate_first_order()
+        self.m.initialize_simulator()
+
+        ukf_FMU = UkfFmu(self.m)
+        ukf_FMU.set_profiling()
+        steps = []
+        ukf_FMU.add_step_callback(steps.append)
+        t0 = pd.to_datetime(0.0, unit = "s", utc = True)
+        t1 = pd.to_datetime(5.0, unit = "s", utc = True)
+        time, x, sqrtP, y, Sy, y_full, Xsmooth, Ssmooth, Yfull_smooth = ukf_FMU.filter_and_smooth(start = t0, stop = t1)
+
+        filter_steps = [s for s in steps if s["stage"] == "filter"]
+        smooth_steps = [s for s in steps if s["stage"] == "smooth"]
+        self.assertEqual(len(time) - 1, len(filter_steps), "The callbacks should be called once per step of the filter")
+        self.assertEqual(len(time) - 1, len(smooth_steps), "The callbacks should be called once per step of the smoother")
+        for k, info in enumerate(filter_steps):
+            self.assertEqual(time[k + 1], info["time"], "The time of the step is not correct")
+            self.assertEqual(k + 1, info["completed_steps"], "The number of steps completed is not correct")
+            self.assertEqual(ukf_FMU.n_points*(k + 1), info["completed_simulations"], "The number of simulations is not correct")
+            self.assertTrue(info["normalized_innovation"] >= 0.0, "The innovation should be available")
+            self.assertTrue("projection" in info["phases"], "The time of the phases should be available")
+            self.assertTrue(info["step_time"] <= info["elapsed"], "The time of the step is not correct")
+            self.assertTrue(0.0 < info["pool_utilization"] <= 1.0, "The utilization of the pool is not correct")
+        self.assertIsNone(smooth_steps[0]["innovation"], "The smoother doesn't have an innovation")
+        self.assertAlmostEqual(1.0, smooth_steps[-1]["progress"], 7, "The smoother should be completed")
+
+        # The callbacks can be removed
+        ukf_FMU.remove_step_callback(steps.append)
+        self.assertRaises(ValueError, ukf_FMU.remove_step_callback, steps.append)
+        self.assertRaises(TypeError, ukf_FMU.add_step_callback, None)
+
+        return
+
+    def test_smoother_evaluate_outputs(self):
+        """
+        This method tests that the outputs evaluated by the smoother for the smoothed states
+        don't modify the states and the parameters of the model.
+        """
+        self.set_first_order_model()
+        self.set_first_order_model_input_outputs()
+        self.set_state_to_estimate_first_order()
+        self.m.initialize_simulator()
+        
+        ukf_FMU = UkfFmu(self.m)
+        state = self.m.get_state()
+        x = self.m.get_state_observed_values()
+        
+        outputs = ukf_FMU.__evaluate_outputs__(self.m.data_index[5], x + 1.0, [])
+        self.assertAlmostEqual(x[0] + 1.0, outputs[1], 7, "The output x should be equal to the smoothed state")
+        np.testing.assert_almost_equal(state, self.m.get_state(), 7, "The state of the model should not be modified")
+        np.testing.assert_almost_equal(x, self.m.get_state_observed_values(), 7, "The state of the model should not be modified")
+    
     def test_ukf_smoother_valve(self):
         """
         This method tests the state and parameter estimation on the valve example performed
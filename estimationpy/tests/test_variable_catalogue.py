@@ -0,0 +1,113 @@
+'''
+@author: marco
+'''
+import unittest
+import platform
+import os
+import pyfmi
+
+from collections import OrderedDict
+
+from estimationpy.fmu_utils.variable_catalogue import VariableCatalogue
+
+import logging
+from estimationpy.fmu_utils import estimationpy_logging
+estimationpy_logging.configure_logger(log_level = logging.DEBUG, log_level_console = logging.INFO, log_level_file = logging.DEBUG)
+
+
+class Test(unittest.TestCase):
+    """
+    This class contains unit tests for checking the behavior of the class
+    :class:`estimationpy.fmu_utils.variable_catalogue.VariableCatalogue`.
+    """
+
+    def setUp(self):
+        """
+        Load the FMU used to build the catalogue
+        """
+        # Assign an existing FMU to the model, depending on the platform identified
+        dir_path = os.path.dirname(__file__)
+        
+        # Define the path of the FMU file
+        if platform.architecture()[0]=="32bit":
+            filePath = os.path.join(dir_path, "..", "modelica", "FmuExamples", "Resources", "FMUs", "FirstOrder.fmu")
+        else:
+            filePath = os.path.join(dir_path, "..", "modelica", "FmuExamples", "Resources", "FMUs", "FirstOrder_64bit.fmu")
+        
+        self.fmu = pyfmi.load_fmu(filePath)
+
+    def test_empty_catalogue(self):
+        """
+        This function tests the catalogue when no FMU is specified
+        """
+        c = VariableCatalogue()
+        self.assertEqual(0, len(c), "The catalogue should be empty")
+        self.assertFalse("x" in c, "The catalogue should be empty")
+        self.assertIsNone(c.get("x"), "The catalogue should be empty")
+        self.assertIsNone(c.get_by_value_reference(0), "The catalogue should be empty")
+        self.assertEqual("x", c.resolve_alias("x"), "A name that is not an alias should not be modified")
+
+    def test_build_catalogue(self):
+        """
+        This function tests that the catalogue contains the same variables of the FMU
+        """
+        c = VariableCatalogue(self.fmu)
+        variables = self.fmu.get_model_variables(include_alias = True)
+        self.assertEqual(len(variables), len(c), "The catalogue should contain all the variables of the FMU")
+        
+        for name in variables.keys():
+            var = c.get(name)
+            self.assertTrue(name in c, "The variable {0} should be in the catalogue".format(name))
+            self.assertEqual(name, var.name, "The name of the variable {0} is not correct".format(name))
+            self.assertEqual(self.fmu.get_variable_data_type(name), c.get_data_type(name), "The data type of the variable {0} is not correct".format(name))
+        
+        self.assertIsNone(c.get("not_a_variable"), "The variable should not be in the catalogue")
+        self.assertIsNone(c.get_data_type("not_a_variable"), "The variable should not be in the catalogue")
+
+    def test_lookups(self):
+        """
+        This function tests the lookups by value reference, causality and variability
+        """
+        c = VariableCatalogue(self.fmu)
+        
+        # Lookup by value reference
+        x = c.get("x")
+        self.assertEqual("x", c.get_by_value_reference(x.value_reference, x.type).name, "The lookup by value reference is not correct")
+        
+        # Lookup by causality
+        self.assertListEqual(["u"], c.get_names(causality = 2), "The only input should be u")
+        self.assertListEqual(["y"], c.get_names(causality = 3), "The only output should be y")
+        inputs = c.get_variables(causality = 2)
+        self.assertListEqual(list(self.fmu.get_model_variables(include_alias = False, causality = 2).keys()), list(inputs.keys()), "The inputs are not correct")
+        
+        # Resolve the aliases
+        for name in c.get_names(include_alias = True):
+            base = c.get(c.resolve_alias(name))
+            var = c.get(name)
+            self.assertEqual(var.value_reference, base.value_reference, "The alias {0} should have the same value reference".format(name))
+
+    def test_negated_alias(self):
+        """
+        This function tests that the negated aliases are not resolved, since
+        their values have the opposite sign of the variable they refer to
+        """
+        class Variable(object):
+            def __init__(self, name, alias):
+                self.name = name
+                self.value_reference = 7
+                self.type = 0
+                self.causality = 2
+                self.variability = 3
+                self.alias = alias
+
+        class Fmu(object):
+            def get_model_variables(self, include_alias = True):
+                return OrderedDict([(v.name, v) for v in [Variable("x", 0), Variable("x_alias", 1), Variable("minus_x", -1)]])
+
+        c = VariableCatalogue(Fmu())
+        self.assertEqual("x", c.resolve_alias("x_alias"), "The alias should refer to x")
+        self.assertEqual("minus_x", c.resolve_alias("minus_x"), "The negated alias should not be resolved")
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,65 @@
+'''
+@author: Marco Bonvini
+
+This module contains an awaitable version of :class:`estimationpy.ukf.ukf_fmu.UkfFmu`, whose
+simulations are run by an :class:`estimationpy.fmu_utils.scheduler.AsyncScheduler` shared by
+all the estimations that run in the same event loop.
+
+**NOTE**
+    The module requires Python 3.7 or later.
+'''
+import asyncio
+
+import logging
+logger = logging.getLogger(__name__)
+
+class AsyncUkfFmu(object):
+    """
+    This class wraps an object of type :class:`estimationpy.ukf.ukf_fmu.UkfFmu` and provides awaitable
+    versions of its methods :func:`estimationpy.ukf.ukf_fmu.UkfFmu.filter`,
+    :func:`estimationpy.ukf.ukf_fmu.UkfFmu.filter_and_smooth` and :func:`estimationpy.ukf.ukf_fmu.UkfFmu.ukf_step`.
+    The methods run in a thread of the scheduler, and the simulations of the sigma points are
+    sent to the scheduler on behalf of this object. The calls are executed one at a time, since
+    they share the model of the filter.
+    """
+
+    def __init__(self, ukf, scheduler):
+        """
+        Constructor of the class, the executor of the pool of the filter is replaced
+        by the one of the scheduler.
+
+        :param estimationpy.ukf.ukf_fmu.UkfFmu ukf: the filter
+        :param estimationpy.fmu_utils.scheduler.AsyncScheduler scheduler: the scheduler
+        """
+        self.ukf = ukf
+        self.scheduler = scheduler
+        self.ukf.pool.executor = scheduler.get_executor(self)
+        self.lock = None
+
+    async def __call__(self, fn, *args, **kwargs):
+        """
+        Internal method that calls a method of the filter in a thread of the scheduler,
+        after the previous calls terminated.
+        """
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            return await self.scheduler.call(fn, *args, **kwargs)
+
+    async def filter(self, start, stop, sqrt_P = None, sqrt_Q = None, sqrt_R = None, for_smoothing = False):
+        """
+        This method runs the filter, see :func:`estimationpy.ukf.ukf_fmu.UkfFmu.filter`.
+        """
+        return await self(self.ukf.filter, start, stop, sqrt_P = sqrt_P, sqrt_Q = sqrt_Q, sqrt_R = sqrt_R, for_smoothing = for_smoothing)
+
+    async def filter_and_smooth(self, start, stop):
+        """
+        This method runs the filter and the smoother, see :func:`estimationpy.ukf.ukf_fmu.UkfFmu.filter_and_smooth`.
+        """
+        return await self(self.ukf.filter_and_smooth, start, stop)
+
+    async def ukf_step(self, x, sqrtP, sqrtQ, sqrtR, t_old, t, z = None):
+        """
+        This method runs a step of the filter, see :func:`estimationpy.ukf.ukf_fmu.UkfFmu.ukf_step`.
+        """
+        return await self(self.ukf.ukf_step, x, sqrtP, sqrtQ, sqrtR, t_old, t, z = z)
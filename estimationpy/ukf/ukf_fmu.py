@@ -1,10 +1,14 @@
 import os
 import numpy as np
-import pandas as pd
-import multiprocessing
 import calendar
 
 from estimationpy.fmu_utils.fmu_pool import FmuPool
+from estimationpy.fmu_utils import covariance
+from estimationpy.fmu_utils.profiling import Profiler, clock
+from estimationpy.fmu_utils.lazy_import import LazyModule
+
+# pandas is imported the first time it's used
+pd = LazyModule("pandas")
 
 import logging
 logger = logging.getLogger(__name__)
@@ -12,6 +16,21 @@ logger = logging.getLogger(__name__)
 class UkfException(Exception):
     pass
 
+def print_progress(stage, step, time, progress):
+    """
+    Function that can be used as progress callback of :class:`UkfFmu`
+    (see :func:`UkfFmu.set_progress_callback`), it prints a line for each step
+    of the filter and of the smoother.
+
+    :param string stage: the stage of the algorithm, ``filter`` or ``smooth``
+    :param int step: the index of the time step
+    :param datetime.datetime time: the time of the step
+    :param float progress: the fraction of the stage completed, between 0 and 1
+
+    :rtype: None
+    """
+    print("[UKF] {0} step {1}, time = {2} ({3:.1f}%)".format(stage.capitalize(), step, time, 100.0*progress))
+
 
 class UkfFmu:
     """
@@ -29,10 +48,14 @@ class UkfFmu:
     The class internally uses an :class:`estimationpy.fmu_utils.fmu_pool.FmuPool` to 
     run simulations in parallel over multiple processors. Please have a look to
     :mod:`estimationpy.fmu_utils.fmu_pool` for more information.
+    
+    The time spent in the phases of the filter and of the smoother can be measured
+    by enabling the profiler with :func:`set_profiling`, see :func:`get_profiling_summary`
+    for the phases and the counters available.
 
     """
     
-    def __init__(self, model, n_proc = multiprocessing.cpu_count() - 1):
+    def __init__(self, model, n_proc = None):
         """
         Constructor of the class that initializes an object that can be used to solve
         state and parameter estimation problems by using the UKF and smoothing algorithms.
@@ -54,7 +77,8 @@ class UkfFmu:
         :param int n_proc: a positive integer that defines the number of processes that are created
           when the simulations are run. Make sure this value is equal to 1 if the filtering or smoothing
           are executed as part of a Celery task. By default this value is equal to the number of 
-          available processors minus one.
+          available processors minus one, considering the CPU affinity and the CPU quota of the
+          container (see :func:`estimationpy.fmu_utils.affinity.get_default_processes`).
                 
         :raises ValueError: The method raises an exception if the model associated to the filter
           does not have state or parameters to be estimated.
@@ -68,8 +92,11 @@ class UkfFmu:
         # Set the model
         self.model = model
         
+        # Profiler shared with the pool, disabled by default
+        self.profiler = Profiler()
+        
         # Instantiate the pool that will run the simulation in parallel
-        self.pool = FmuPool(self.model, processes = n_proc)
+        self.pool = FmuPool(self.model, processes = n_proc, lazy = True, profiler = self.profiler)
         
         # Set the number of states variables (total and observed), parameters estimated and outputs
         self.n_state = self.model.get_num_states()
@@ -99,17 +126,27 @@ class UkfFmu:
         # define UKF parameters with default values
         self.set_ukf_params()
         
+        # adaptive time stepping (not active by default)
+        self.set_adaptive_step(enabled = False)
+        
+        # the simulations that fail are retried once, no failure is tolerated
+        self.set_failure_budget()
+        
+        # no progress reporting by default
+        self.set_progress_callback(None)
+        self.step_callbacks = []
+        
         # set the default constraints for the observed state variables (not active by default)
-        self.constrStateHigh = self.model.get_constr_obs_states_high()
-        self.constrStateLow = self.model.get_constr_obs_states_low()
+        self.constrStateHigh = self.model.get_constr_obs_states_high().astype(bool)
+        self.constrStateLow = self.model.get_constr_obs_states_low().astype(bool)
         
         # Max and Min Value of the states constraints
         self.constrStateValueHigh = self.model.get_state_observed_max()
         self.constrStateValueLow  = self.model.get_state_observed_min()
         
         # set the default constraints for the estimated parameters (not active by default)
-        self.constrParsHigh = self.model.get_constr_pars_high()
-        self.constrParsLow = self.model.get_constr_pars_low()
+        self.constrParsHigh = self.model.get_constr_pars_high().astype(bool)
+        self.constrParsLow = self.model.get_constr_pars_low().astype(bool)
         
         # Max and Min Value of the parameters constraints
         self.constrParsValueHigh = self.model.get_parameters_max()
@@ -225,6 +262,227 @@ class UkfFmu:
 
         return (self.alpha, self.beta, self.k, self.lambd, self.sqrtC, self.N)
         
+    def set_adaptive_step(self, enabled = True, innovation_threshold = 1.0, max_steps = None):
+        """
+        This method configures the adaptive time stepping of the filter. When the adaptive
+        time stepping is enabled, the method :func:`filter` merges consecutive time intervals
+        into a single projection while
+        
+        * the innovation of the last step, normalized by the square root of the output
+          covariance matrix, is below the threshold ``innovation_threshold`` for all the measured
+          outputs, and
+        * the inputs and the measured outputs do not change more than their thresholds with respect to the
+          beginning of the merged interval (see :func:`estimationpy.fmu_utils.in_out_var.InOutVar.set_threshold`).
+        
+        The process noise is accumulated over the merged intervals, therefore when :math:`n` intervals are
+        merged the square root of the process covariance matrix is multiplied by :math:`\\sqrt{n}`.
+        
+        :param bool enabled: flag that enables the adaptive time stepping.
+        :param float innovation_threshold: threshold for the normalized innovation, expressed as
+          number of standard deviations.
+        :param int max_steps: maximum number of intervals that can be merged. If None there is no limit.
+        
+        :raises ValueError: if the threshold is negative or the maximum number of steps is less than one.
+        """
+        if innovation_threshold < 0.0:
+            raise ValueError("The innovation threshold must not be negative")
+        if max_steps is not None and max_steps < 1:
+            raise ValueError("The maximum number of steps to merge must be at least one")
+        
+        self.adaptive_step = enabled
+        self.innovation_threshold = innovation_threshold
+        self.max_merged_steps = max_steps
+        
+        # Number of time steps skipped by the last run of the filter, and the number
+        # of intervals merged in each of its steps
+        self.n_skipped_steps = 0
+        self.merged_steps = []
+    
+    def set_failure_budget(self, max_failed_points = 0, retries = 1, tolerance_factor = 0.1, policy = "drop"):
+        """
+        This method configures how the filter and the smoother handle the simulations of the
+        sigma points that fail. The simulations that fail are run again, only for the sigma points
+        that failed, up to ``retries`` times. At each retry the tolerances of the solver are multiplied
+        by ``tolerance_factor``. If some of the simulations still fail, the sigma points are
+        
+        * dropped (``policy = "drop"``), i.e., the weights of the sigma point and of its symmetric point
+          are set to zero and the weights of the remaining points are renormalized so that the mean
+          and the covariance are computed with weights that have the same sum,
+        * clamped (``policy = "clamp"``), i.e., the projection of the sigma point is replaced by the
+          projection of the central sigma point, therefore the point does not contribute to the covariance.
+        
+        The step raises an exception of type :class:`UkfException` if more than ``max_failed_points``
+        sigma points fail, or if the central sigma point fails.
+        
+        :param int max_failed_points: the maximum number of sigma points that can fail in a step
+        :param int retries: the maximum number of times the simulations that failed are run again
+        :param float tolerance_factor: factor that multiplies the tolerances of the solver at each retry,
+          1.0 to retry with the same tolerances
+        :param string policy: the policy used for the sigma points that failed, either ``drop`` or ``clamp``
+        
+        :raises ValueError: if the parameters are not valid
+        """
+        if max_failed_points < 0:
+            raise ValueError("The number of sigma points that can fail must not be negative")
+        if retries < 0:
+            raise ValueError("The number of retries must not be negative")
+        if tolerance_factor <= 0.0:
+            raise ValueError("The factor that multiplies the tolerances must be positive")
+        if policy not in ["drop", "clamp"]:
+            raise ValueError("The policy for the sigma points that fail must be either drop or clamp")
+        
+        self.max_failed_points = max_failed_points
+        self.simulation_retries = retries
+        self.retry_tolerance_factor = tolerance_factor
+        self.failure_policy = policy
+    
+    def set_progress_callback(self, callback = None):
+        """
+        This method sets a function that is called at each step of the filter and of the
+        smoother to report the progress. The function is called as::
+        
+            callback(stage, step, time, progress)
+        
+        where ``stage`` is either ``filter`` or ``smooth``, ``step`` is the index of
+        the time step, ``time`` is its time stamp and ``progress`` is the fraction of
+        the stage completed, between 0 and 1. The function :func:`print_progress` prints
+        the progress on the console. If the callback raises an exception, the filter
+        or the smoother are interrupted.
+        
+        :param function callback: the function, if None the progress is not reported
+        
+        :rtype: None
+        """
+        if callback is not None and not callable(callback):
+            raise TypeError("The progress callback must be callable")
+        self.progress_callback = callback
+    
+    def __report_progress__(self, stage, step, t, progress):
+        """
+        This method calls the progress callback, if any.
+        """
+        logger.debug("%s step %s, time = %s", stage, step, t)
+        if self.progress_callback is not None:
+            self.progress_callback(stage, step, t, progress)
+    
+    def add_step_callback(self, callback):
+        """
+        This method registers a function that is called at the end of each step of the
+        filter and of the smoother, e.g., to monitor the throughput of long runs
+        (see :mod:`estimationpy.fmu_utils.metrics`). The function is called as ``callback(info)``,
+        where ``info`` is a dictionary that contains
+        
+        * ``stage``, either ``filter`` or ``smooth``,
+        * ``step``, the index of the time step,
+        * ``time``, the time stamp of the step,
+        * ``progress``, the fraction of the stage completed, between 0 and 1,
+        * ``elapsed``, the time in seconds since the beginning of the stage,
+        * ``step_time``, the time in seconds spent in the step,
+        * ``completed_steps`` and ``completed_simulations``, the number of steps and
+          simulations completed since the beginning of the stage,
+        * ``simulations``, the number of simulations run in the step,
+        * ``merged_steps``, the number of time intervals merged by the adaptive time stepping,
+        * ``innovation``, the difference between the measured outputs and their estimation,
+          None for the smoother,
+        * ``normalized_innovation``, the maximum absolute value of the innovation normalized by
+          the square root of the output covariance matrix, None for the smoother,
+        * ``phases``, the time in seconds spent in each phase of the step, empty if the profiler
+          is not enabled (see :func:`set_profiling`),
+        * ``pool_utilization``, the utilization of the pool in the step
+          (see :func:`estimationpy.fmu_utils.fmu_pool.FmuPool.get_utilization`),
+        * ``pool_latency``, the statistics of the runtimes of the simulations run by the pool in the
+          step, including the tail latency (see the attribute ``latency`` of
+          :class:`estimationpy.fmu_utils.fmu_pool.FmuPool`).
+        
+        If a callback raises an exception, the filter or the smoother are interrupted.
+        
+        :param function callback: the function
+        
+        :rtype: None
+        """
+        if not callable(callback):
+            raise TypeError("The step callback must be callable")
+        self.step_callbacks.append(callback)
+    
+    def remove_step_callback(self, callback):
+        """
+        This method removes a function registered with :func:`add_step_callback`.
+        
+        :param function callback: the function
+        
+        :rtype: None
+        
+        :raises ValueError: if the function is not registered
+        """
+        self.step_callbacks.remove(callback)
+    
+    def __notify_step__(self, stage, step, t, progress, t_stage, t_step, completed, simulations, \
+                        merged_steps = 1, innovation = None, normalized_innovation = None):
+        """
+        This method calls the step callbacks, see :func:`add_step_callback`.
+        """
+        now = clock()
+        phases = dict(self.profiler.steps[-1]["phases"]) if self.profiler.is_enabled() else {}
+        info = {"stage": stage, "step": step, "time": t, "progress": progress, "elapsed": now - t_stage,
+                "step_time": now - t_step, "completed_steps": completed, "completed_simulations": simulations,
+                "simulations": self.n_points, "merged_steps": merged_steps, "innovation": innovation,
+                "normalized_innovation": normalized_innovation, "phases": phases,
+                "pool_utilization": self.pool.get_utilization(), "pool_latency": self.pool.latency}
+        for callback in self.step_callbacks:
+            callback(info)
+    
+    def set_profiling(self, enabled = True, reset = True):
+        """
+        This method enables or disables the measurement of the time spent in the
+        phases of the filter and of the smoother. The profiler is shared with the pool
+        that runs the simulations.
+        
+        :param bool enabled: flag that enables the profiler
+        :param bool reset: flag that indicates if the data collected so far has to be removed
+        
+        :rtype: None
+        """
+        if reset:
+            self.profiler.reset()
+        self.profiler.enable(enabled)
+    
+    def get_profiling_summary(self):
+        """
+        This method returns the time spent in the phases of the filter and of the smoother,
+        see :func:`estimationpy.fmu_utils.profiling.Profiler.summary`. The phases are
+        
+        * ``measurements``, reading the measured outputs,
+        * ``sigma_points``, generating the sigma points,
+        * ``projection``, propagating the sigma points, it includes the phases of the pool
+          ``pool_dispatch`` and ``pool_collect`` (see :class:`estimationpy.fmu_utils.fmu_pool.FmuPool`),
+          and ``result_unpacking``,
+        * ``simulate``, the time spent simulating by the processes of the pool,
+        * ``square_root``, the QR/Cholesky factorizations and updates of the square root covariance matrices,
+        * ``covariance``, computing the averages and the cross covariance matrices,
+        * ``gain``, computing the gain and correcting the state,
+        * ``evaluate_outputs``, evaluating the outputs of the smoothed states.
+        
+        The counters are ``simulations``, ``simulation_retries`` (the number of simulations run again because
+        they failed), ``failed_sigma_points`` (the sigma points whose simulations failed after the retries),
+        and ``chol_update_fallbacks``
+        (the Cholesky update produced invalid values and the matrix has not been updated).
+        Each step of the filter and of the smoother is recorded separately.
+        
+        :return: the summary
+        :rtype: dict
+        """
+        return self.profiler.summary()
+    
+    def get_num_skipped_steps(self):
+        """
+        This method returns the number of time steps that have been skipped by the last
+        execution of the method :func:`filter` because of the adaptive time stepping.
+        
+        :return: the number of time steps skipped
+        :rtype: int
+        """
+        return self.n_skipped_steps
+    
     def compute_weights(self):
         """
         This method computes the vector of weights used by the UKF filter.
@@ -259,6 +517,10 @@ class UkfFmu:
         for i in range(2*n):
             self.W_m[i+1,0] = 1.0/(2.0*(n + self.lambd))
             self.W_c[i+1,0] = 1.0/(2.0*(n + self.lambd))
+        
+        # The weights can be modified in a step when some sigma points are dropped,
+        # the nominal ones are restored at the beginning of the following step
+        self.nominal_weights = (self.W_m, self.W_c)
 
         return
     
@@ -306,27 +568,21 @@ class UkfFmu:
         if len(x_A) != self.n_state_obs + self.n_pars:
             raise ValueError("The vector provided as input is not correct, desired length is {0}, provided is {1}".format(self.N, len(x_A)))
         
-        # Check for every observed state
-        for i in range(self.n_state_obs):
+        # Views of the observed states and of the parameters
+        x_s = x_A[:self.n_state_obs]
+        x_p = x_A[self.n_state_obs:]
         
-            # if the constraint is active and the threshold is violated
-            if self.constrStateHigh[i] and x_A[i] > self.constrStateValueHigh[i]:
-                x_A[i] = self.constrStateValueHigh[i]
-                
-            # if the constraint is active and the threshold is violated    
-            if self.constrStateLow[i] and x_A[i] < self.constrStateValueLow[i]:
-                x_A[i] = self.constrStateValueLow[i]
-                
-        # Check for every observed state
-        for i in range(self.n_pars):
+        # Observed states where the constraint is active and the threshold is violated
+        violated = self.constrStateHigh & (x_s > self.constrStateValueHigh)
+        x_s[violated] = self.constrStateValueHigh[violated]
+        violated = self.constrStateLow & (x_s < self.constrStateValueLow)
+        x_s[violated] = self.constrStateValueLow[violated]
         
-            # if the constraint is active and the threshold is violated
-            if self.constrParsHigh[i] and x_A[self.n_state_obs+i] > self.constrParsValueHigh[i]:
-                x_A[self.n_state_obs+i] = self.constrParsValueHigh[i]
-                
-            # if the constraint is active and the threshold is violated    
-            if self.constrParsLow[i] and x_A[self.n_state_obs+i] < self.constrParsValueLow[i]:
-                x_A[self.n_state_obs+i] = self.constrParsValueLow[i]
+        # Parameters where the constraint is active and the threshold is violated
+        violated = self.constrParsHigh & (x_p > self.constrParsValueHigh)
+        x_p[violated] = self.constrParsValueHigh[violated]
+        violated = self.constrParsLow & (x_p < self.constrParsValueLow)
+        x_p[violated] = self.constrParsValueLow[violated]
         
         return x_A
                 
@@ -371,7 +627,7 @@ class UkfFmu:
             # reshape the state vector
             x = np.squeeze(x)
             x = x.reshape(1, self.n_state_obs)
-            logger.debug('State vector x reshaped to {}'.format(x.shape))
+            logger.debug('State vector x reshaped to %s', x.shape)
         except ValueError:
             msg = "The vector of state variables has a wrong size"
             msg += "{0} instead of {1}".format(x.shape, self.n_state_obs)
@@ -382,7 +638,7 @@ class UkfFmu:
             # reshape the parameter vector
             pars = np.squeeze(pars)
             pars = pars.reshape(1, self.n_pars)
-            logger.debug('Parameter vector pars reshaped to {}'.format(pars.shape))
+            logger.debug('Parameter vector pars reshaped to %s', pars.shape)
         except ValueError:
             msg = "The vector of parameters has a wrong size"
             msg += "{0} instead of {1}".format(pars.shape, self.n_pars)
@@ -464,10 +720,11 @@ class UkfFmu:
         :rtype: tuple
         
         **Note:**
-        If for any reason the results of the simulation pool is an empty dictionary,
-        the method tries again to run the simulations up to the maximum number
-        of simulations allowed ``MAX_RUN``. By default ``MAX_RUN = 2``.
-                
+        The simulations that fail are handled as specified by :func:`set_failure_budget`,
+        when some sigma points are dropped the weights used to compute the mean and the covariance
+        in the current step are modified.
+        
+        :raises UkfException: if the number of sigma points that fail exceeds the budget.
         """
         row, col = np.shape(x_A)
         
@@ -485,33 +742,87 @@ class UkfFmu:
             temp = {"state":x, "parameters":pars}
             values.append(temp)
 
-        # Run simulations in parallel, if the results are not provided run again until the
-        # maximum number of run is reached
-        MAX_RUN = 2
-        runs = 0
+        # The nominal weights are used unless some sigma points are dropped
+        self.W_m, self.W_c = self.nominal_weights
+        
+        # Run simulations in parallel, then run again only the ones that failed
         poolResults = self.pool.run(values, start = t_old, stop = t)
-        while poolResults == {} and runs < MAX_RUN:
-            poolResults = self.pool.run(values, start = t_old, stop = t)
+        failed = sorted(self.pool.failures.keys())
+        retry = 0
+        while len(failed) > 0 and retry < self.simulation_retries:
+            retry += 1
+            self.profiler.count("simulation_retries", len(failed))
+            logger.warning("Simulation of %s sigma points failed between %s and %s, retry %s", len(failed), t_old, t, retry)
+            retried = self.pool.run([values[k] for k in failed], start = t_old, stop = t, \
+                                    tolerance_factor = self.retry_tolerance_factor**retry)
+            for k, r in zip(failed, retried):
+                poolResults[k] = r
+            failed = [k for k, r in zip(failed, retried) if r[0] is False]
+        
+        if len(failed) > 0:
+            self.profiler.count("failed_sigma_points", len(failed))
+            if len(failed) > self.max_failed_points or 0 in failed:
+                msg = "The simulations of the sigma points {0} failed between {1} and {2}".format(failed, t_old, t)
+                logger.error(msg)
+                raise UkfException(msg)
+        
+        with self.profiler.timer("result_unpacking"):
+            i = 0
+            for r in poolResults:
+                # The results are objects of type SimulationResults, the time is not needed
+                results = r[0]
+                
+                # The sigma points that failed are replaced by the central one
+                if results is False:
+                    results = poolResults[0][0]
+                
+                X  = results["__ALL_STATE__"]
+                Xo = results["__OBS_STATE__"]
+                p  = results["__PARAMS__"]
+                o  = results["__OUTPUTS__"]
+                o_all = results["__ALL_OUTPUTS__"]
+                
+                Xfull_proj[i,:] = X
+                X_proj[i,0:self.n_state_obs] = Xo
+                X_proj[i,self.n_state_obs:self.n_state_obs+self.n_pars] = p
+                Z_proj[i,:] = o
+                Zfull_proj[i,:] = o_all
+                
+                i += 1
         
-        i = 0
-        for r in poolResults:
-            time, results = r[0]
-            
-            X  = results["__ALL_STATE__"]
-            Xo = results["__OBS_STATE__"]
-            p  = results["__PARAMS__"]
-            o  = results["__OUTPUTS__"]
-            o_all = results["__ALL_OUTPUTS__"]
-            
-            Xfull_proj[i,:] = X
-            X_proj[i,0:self.n_state_obs] = Xo
-            X_proj[i,self.n_state_obs:self.n_state_obs+self.n_pars] = p
-            Z_proj[i,:] = o
-            Zfull_proj[i,:] = o_all
-            
-            i += 1
+        if len(failed) > 0 and self.failure_policy == "drop":
+            self.__drop_sigma_points__(failed)
             
         return X_proj, Z_proj, Xfull_proj, Zfull_proj
+    
+    def __drop_sigma_points__(self, failed):
+        """
+        This method sets to zero the weights of the sigma points that failed and of
+        their symmetric points, and renormalizes the weights of the remaining ones.
+        The central sigma point can't be dropped.
+        
+        :param list failed: the indexes of the sigma points that failed
+        
+        :rtype: None
+        
+        :raises UkfException: if all the sigma points except the central one are dropped
+        """
+        keep = np.ones(self.n_points, dtype = bool)
+        for k in failed:
+            keep[k] = False
+            keep[k + self.N if k <= self.N else k - self.N] = False
+        
+        W_m, W_c = self.nominal_weights
+        remaining = np.sum(W_m[1:,0][keep[1:]])
+        if remaining <= 0.0:
+            raise UkfException("All the sigma points failed")
+        
+        # The weights of the remaining points are scaled, the central point is not modified
+        scale = np.where(keep, (1.0 - W_m[0,0])/remaining, 0.0)[:, np.newaxis]
+        scale[0] = 1.0
+        self.W_m = W_m*scale
+        self.W_c = W_c*scale
+        logger.warning("Dropped %s sigma points, the weights have been renormalized", np.sum(~keep))
 
     def average_proj(self, x):
         """
@@ -703,13 +1014,14 @@ class UkfFmu:
     
     def compute_S(self, x_proj, x_ave, sqrt_Q, w = None):
         """
-        This method computes the squared root covariance matrix using the QR decomposition
-        combined with a Cholesky update.
+        This method computes the squared root covariance matrix using a Cholesky
+        factorization combined with a Cholesky update.
         The matrix returned by this method is upper triangular.
         
         :param numpy.array x_proj: projected full state vector
         :param numpy.array x_avg: average of the full state vector
-        :param numpy.ndarray sqrt_Q: square root process covariance matrix
+        :param numpy.ndarray, estimationpy.fmu_utils.covariance.Covariance sqrt_Q: square root process
+          covariance matrix. The structure of the matrix (e.g., diagonal) is exploited.
         :param numpy.array w: vector that contains the weights to use during the
           update. If not specified the method uses the weights automatically computed
           by the filter.
@@ -719,50 +1031,34 @@ class UkfFmu:
         :rtype: nunmpy.ndarray
 
         """
-        x_proj_obs = x_proj
-        x_ave_obs = x_ave
-        
         # Matrix of weights and signs of the weights
-        if w == None:
-            weights = np.sqrt(np.abs(self.W_c[:,0]))
-            signs   = np.sign(self.W_c[:,0])
-        else:
-            weights = np.sqrt(np.abs(w))
-            signs   = np.sign(w)
-        
-        # create matrix A that contains the error between the sigma points and the average
-        A     = np.array([[]])
-        i     = 0
-        for x in x_proj_obs:
-            error = signs[i]*weights[i]*(x - x_ave_obs)
-            
-            # ignore when i==0, this will be done in the update
-            if i == 1:
-                A = error.T
-            elif i > 1:
-                A = np.hstack((A, error.T))
-            i += 1
-
-        # Put on the side the matrix sqrt_Q, that have to be modified to fit the dimension of the augmenets state    
-        A = np.hstack((A, sqrt_Q))
+        if w is None:
+            w = self.W_c[:,0]
+        weights = np.sqrt(np.abs(w))
+        signs   = np.sign(w)
         
-        # QR factorization
-        q, L = np.linalg.qr(A.T)
+        # Errors between the sigma points and the average, one row for each sigma point
+        E = (signs*weights)[:, np.newaxis]*(np.asarray(x_proj) - np.asarray(x_ave))
+        
+        # Square root of the covariance, ignoring the first sigma point that is
+        # considered in the update
+        L = self.__sqrt_covariance__(E[1:], sqrt_Q)
         
         # Execute Cholesky update
-        x = signs[0]*weights[0]*(x_proj_obs[0,] - x_ave_obs)
+        x = E[0:1]
         L = self.chol_update(L, x.T, self.W_c[:,0])
         
         return L
         
     def compute_S_y(self, y_proj, y_ave, sqrt_R):
         """
-        This method computes the squared root covariance matrix using the QR decomposition
-        combined with a Cholesky update.
+        This method computes the squared root covariance matrix using a Cholesky
+        factorization combined with a Cholesky update.
         
         :param numpy.array y_proj: projected measured output vector
         :param numpy.array y_avg: average of the measured output vector
-        :param numpy.ndarray sqrt_R: square root process covariance matrix
+        :param numpy.ndarray, estimationpy.fmu_utils.covariance.Covariance sqrt_R: square root
+          measurement covariance matrix. The structure of the matrix (e.g., diagonal) is exploited.
         
         :return: the square root of the updated output covariance matrix
         :rtype: nunmpy.ndarray
@@ -772,29 +1068,56 @@ class UkfFmu:
         weights = np.sqrt( np.abs(self.W_c[:,0]) )
         signs   = np.sign( self.W_c[:,0] )
         
-        # create matrix A that contains the error between the sigma points outputs and the average
-        A     = np.array([[]])
-        i     = 0
-        for y in y_proj:
-            error = signs[i]*weights[i]*(y - y_ave)
-            if i == 1:
-                A = error.T
-            elif i > 1:
-                A = np.hstack((A, error.T))
-            i    += 1
-            
-        # put the square root R matrix on the side
-        A = np.hstack((A, sqrt_R))
+        # Errors between the sigma points outputs and the average, one row for each sigma point
+        E = (signs*weights)[:, np.newaxis]*(np.asarray(y_proj) - np.asarray(y_ave))
         
-        # QR factorization
-        q, L = np.linalg.qr(A.T)
+        # Square root of the covariance, ignoring the first sigma point that is
+        # considered in the update
+        L = self.__sqrt_covariance__(E[1:], sqrt_R)
 
         # Execute the Cholesky update
-        y = signs[0]*weights[0]*(y_proj[0,] - y_ave)
+        y = E[0:1]
         L = self.chol_update(L, y.T, self.W_c[:,0])
         
         return L
     
+    def __sqrt_covariance__(self, E, sqrt_C):
+        """
+        This method computes the upper triangular square root :math:`L` of the matrix
+        
+        .. math::
+        
+            L^T L = E^T E + S S^T
+        
+        where :math:`S` is ``sqrt_C``. The matrix is the triangular factor of the QR factorization
+        of the matrix :math:`[E; S^T]`, that is never squared. The rows of :math:`S^T` are replaced by
+        the rows of a triangular matrix with the same product (see
+        :func:`estimationpy.fmu_utils.covariance.Covariance.triangular_rows`), that exploits the
+        structure of :math:`S`: the zero elements of a diagonal matrix are not stacked, and the
+        blocks of a block diagonal matrix are factorized separately.
+        
+        :param numpy.ndarray E: weighted errors, one row for each sigma point
+        :param numpy.ndarray, estimationpy.fmu_utils.covariance.Covariance sqrt_C: square root
+          covariance matrix
+        
+        :return: the upper triangular square root
+        :rtype: numpy.ndarray
+        """
+        sqrt_C = covariance.as_covariance(sqrt_C)
+        n = sqrt_C.size
+        A = np.vstack((np.reshape(E, (-1, n)), sqrt_C.triangular_rows()))
+        R = np.linalg.qr(A, mode = "r")
+        
+        # With less rows than columns the factor is not square
+        L = np.zeros((n, n))
+        L[:R.shape[0], :] = R
+        
+        # The QR factorization is unique up to the signs of the rows, the diagonal
+        # must be positive for the Cholesky update
+        signs = np.sign(np.diag(L))
+        signs[signs == 0] = 1.0
+        return signs[:, np.newaxis]*L
+    
     def chol_update(self, L, X, W):
         """
         This method computes the Cholesky update of a matrix.
@@ -832,11 +1155,9 @@ class UkfFmu:
                 Lc[k,k+1:] = (Lc[k,k+1:] + signs[0]*s*x[k+1:])/c
                 x[k+1:]   = c*x[k+1:]  - s*Lc[k, k+1:]
         
-        # Check for the presence of any NaN
-        if np.any(np.isnan(Lc)):
-            return L
-        # Check for the presence of any +/- inf
-        elif np.any(np.isinf(Lc)):
+        # Check for the presence of any NaN or +/- inf
+        if not np.all(np.isfinite(Lc)):
+            self.profiler.count("chol_update_fallbacks")
             return L
         else:
             return Lc
@@ -869,7 +1190,7 @@ class UkfFmu:
         
         :rtype: tuple
         """
-        logger.debug("Start UKF startup from {0} to {1}".format(t_old, t))
+        logger.debug("Start UKF startup from %s to %s", t_old, t)
         
         # Get the parameters and the states to observe
         pars = x[self.n_state_obs:]
@@ -877,26 +1198,30 @@ class UkfFmu:
         
         # the list of sigma points (each sigma point can be an array, containing the state variables)
         # x, pars, sqrtP, sqrtQ = None, sqrtR = None
-        Xs      = self.compute_sigma_points(x, pars, sqrtP)
+        with self.profiler.timer("sigma_points"):
+            Xs      = self.compute_sigma_points(x, pars, sqrtP)
 
-        logger.debug("Sigma point Xs = {0}".format(Xs))
+        logger.debug("Sigma point Xs = %s", Xs)
     
         # compute the projected (state) points (each sigma point is propagated through the state transition function)
-        X_proj, Z_proj, Xfull_proj, Zfull_proj = self.sigma_point_proj(Xs,t_old,t)
+        with self.profiler.timer("projection"):
+            X_proj, Z_proj, Xfull_proj, Zfull_proj = self.sigma_point_proj(Xs,t_old,t)
 
-        logger.debug("Projected sigma points Xs_proj = {0}".format(X_proj))
+        logger.debug("Projected sigma points Xs_proj = %s", X_proj)
     
         # compute the average
-        x_ave = self.average_proj(X_proj)
-        Xfull_ave = self.average_proj(Xfull_proj)
+        with self.profiler.timer("covariance"):
+            x_ave = self.average_proj(X_proj)
+            Xfull_ave = self.average_proj(Xfull_proj)
 
-        logger.debug("Averaged projected sigma points is x_ave = {0}".format(x_ave))
-        logger.debug("Averaged projected full state is Xfull_ave = {0}".format(Xfull_ave))
+        logger.debug("Averaged projected sigma points is x_ave = %s", x_ave)
+        logger.debug("Averaged projected full state is Xfull_ave = %s", Xfull_ave)
         
         # compute the new squared covariance matrix S
-        Snew = self.compute_S(X_proj,x_ave,sqrtQ)
+        with self.profiler.timer("square_root"):
+            Snew = self.compute_S(X_proj,x_ave,sqrtQ)
 
-        logger.debug("New squares S matrix is = {0}".format(Snew))
+        logger.debug("New squares S matrix is = %s", Snew)
         
         # redraw the sigma points, given the new covariance matrix
         # K. ARENDT: THIS STEP SEEMS TO BE UNNECESSARY
@@ -907,7 +1232,7 @@ class UkfFmu:
         # Merge the real full state and the new ones
         self.model.set_state(Xfull_ave[0])
 
-        logger.debug("New sigma point is = {0}".format(Xs))
+        logger.debug("New sigma point is = %s", Xs)
 
         # compute the projected (outputs) points (each sigma points is propagated through the state transition function)
         # K. ARENDT: THIS STEP SEEMS TO BE UNNECESSARY. IN ADDITION THERE WAS LIKELY A BUG (SEE BELOW)
@@ -916,58 +1241,66 @@ class UkfFmu:
         # X_proj, Z_proj, Xfull_proj, Zfull_proj = self.sigma_point_proj(Xs,t,t) # Original code
         # X_proj, Z_proj, Xfull_proj, Zfull_proj = self.sigma_point_proj(Xs,t_old,t) # Corrected code
 
-        logger.debug("Output projection of new sigma point is Z_proj = {0}".format(Z_proj))
-        logger.debug("State re-projection is X_proj = {0}".format(X_proj))
+        logger.debug("Output projection of new sigma point is Z_proj = %s", Z_proj)
+        logger.debug("State re-projection is X_proj = %s", X_proj)
         
         # compute the average output
-        Zave = self.average_proj(Z_proj)
-        Zfull_ave = self.average_proj(Zfull_proj)
+        with self.profiler.timer("covariance"):
+            Zave = self.average_proj(Z_proj)
+            Zfull_ave = self.average_proj(Zfull_proj)
 
-        logger.debug("Averaged output projection of new sigma points is Zave = {0}".format(Zave))
+        logger.debug("Averaged output projection of new sigma points is Zave = %s", Zave)
 
         # compute the innovation covariance (relative to the output)
-        Sy = self.compute_S_y(Z_proj,Zave,sqrtR)
+        with self.profiler.timer("square_root"):
+            Sy = self.compute_S_y(Z_proj,Zave,sqrtR)
 
-        logger.debug("Output squared covariance matrix is Sy = {0}".format(Sy))           
+        logger.debug("Output squared covariance matrix is Sy = %s", Sy)           
         
         # compute the cross covariance matrix
-        CovXZ = self.compute_cov_x_y(X_proj, x_ave, Z_proj, Zave)
+        with self.profiler.timer("covariance"):
+            CovXZ = self.compute_cov_x_y(X_proj, x_ave, Z_proj, Zave)
 
-        logger.debug("State output covariance matrix is Cxy = {0}".format(CovXZ))
+        logger.debug("State output covariance matrix is Cxy = %s", CovXZ)
     
         # Data assimilation step
         # The information obtained in the prediction step are corrected with the information
         # obtained by the measurement of the outputs
         # In other terms, the Kalman Gain (for the correction) is computed
-        firstDivision = np.linalg.lstsq(Sy.T,CovXZ.T)[0]
-        K             = np.linalg.lstsq(Sy, firstDivision)[0]
-        K             = K.T
+        with self.profiler.timer("gain"):
+            firstDivision = np.linalg.lstsq(Sy.T,CovXZ.T)[0]
+            K             = np.linalg.lstsq(Sy, firstDivision)[0]
+            K             = K.T
         
         # Read the output value
         if z is None:
-            z = self.model.get_measured_data_ouputs(t)
+            with self.profiler.timer("measurements"):
+                z = self.model.get_measured_data_ouputs(t)
 
-        logger.debug("Measured output data to be compared agains simulations Z = {0}".format(z))
-        logger.debug("Error Z - Zave = {0}".format(z.reshape(self.n_outputs,1)-Zave.T))
-        logger.debug("Gain K = {0}".format(K))
+        logger.debug("Measured output data to be compared agains simulations Z = %s", z)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Error Z - Zave = %s", z.reshape(self.n_outputs,1)-Zave.T)
+        logger.debug("Gain K = %s", K)
         
         # State correction using the measurements
-        X_corr = x_ave + np.dot(K,z.reshape(self.n_outputs,1)-Zave.T).T
-        
-        # If constraints are active, they are imposed in order to avoid the corrected value to fall outside
-        X_corr[0,:] = self.constrained_state(X_corr[0,:])
+        with self.profiler.timer("gain"):
+            X_corr = x_ave + np.dot(K,z.reshape(self.n_outputs,1)-Zave.T).T
+            
+            # If constraints are active, they are imposed in order to avoid the corrected value to fall outside
+            X_corr[0,:] = self.constrained_state(X_corr[0,:])
 
-        logger.debug("New state corrected X_corr = {0}".format(X_corr) )
+        logger.debug("New state corrected X_corr = %s", X_corr)
         
         # The covariance matrix is corrected too
-        U      = np.dot(K,Sy)
+        with self.profiler.timer("square_root"):
+            U      = np.dot(K,Sy)
 
-        logger.debug("Matrix U = {0}".format(U))
-        logger.debug("Updated covariance matrix Snew = {0}".format(Snew))
-        
-        S_corr = self.chol_update(Snew,U,-1*np.ones(self.n_state))
+            logger.debug("Matrix U = %s", U)
+            logger.debug("Updated covariance matrix Snew = %s", Snew)
+            
+            S_corr = self.chol_update(Snew,U,-1*np.ones(self.n_state))
 
-        logger.debug("New covariance matrix corrected is S_corr = {0}".format(S_corr))
+        logger.debug("New covariance matrix corrected is S_corr = %s", S_corr)
         
         # Apply the corrections to the model and then returns
         # Set observed states and parameters
@@ -1005,6 +1338,10 @@ class UkfFmu:
           This matrix is in square root form and is kept constant while the algorithm runs.
           If equal to None, the method uses a diagonal matrix that contains the standard deviation
           of the measured outputs as elements.
+          The matrices ``sqrt_Q`` and ``sqrt_R`` can also be specified as vectors (the diagonal), lists of blocks
+          or objects of type :class:`estimationpy.fmu_utils.covariance.Covariance`, see
+          :func:`estimationpy.fmu_utils.covariance.as_covariance`. Their structure is preserved
+          when computing the square root covariance matrices.
         :param bool for_smoothing: Boolean flag that indicates if the data computed by this method
           will be used by a smoother. If True, the function returns more data so the smoother
           can use them.
@@ -1023,7 +1360,9 @@ class UkfFmu:
         
           * the full states of the model,
           * the square root of the process covariance matrix,
-          * the square root of the measurements covariance matrix
+          * the square root of the measurements covariance matrix,
+          
+          the last two are objects of type :class:`estimationpy.fmu_utils.covariance.Covariance`.
         
           **Note:** please note that every vector and matrix returned by this method is a list that
           contains the vector/matrices for each time stamp of the filtering process.
@@ -1035,11 +1374,17 @@ class UkfFmu:
         """
         logger.info("*** Start filtering process...")
         
-        # Read the output measured data
-        measuredOuts = self.model.get_measured_output_data_series()
-
-        # Get the time vector 
-        time = pd.to_datetime(measuredOuts[:,0], utc = True)
+        # The persistent workers of the pool, if any, are started again to use
+        # the current configuration of the model
+        self.pool.stop_workers()
+        
+        # Read the output measured data, the arrays are cached by the model and they're
+        # reused when the filter runs multiple times over the same data
+        with self.profiler.timer("measurements"):
+            timeNs, measuredOuts = self.model.get_measured_output_matrix()
+    
+            # Get the time vector 
+            time = pd.to_datetime(timeNs, utc = True)
         
         # find the index of the closest matches for start and stop time
         ix_start, ix_stop = self.find_closest_matches(start, stop, time)
@@ -1048,41 +1393,79 @@ class UkfFmu:
         x     = [np.hstack((self.model.get_state_observed_values(), self.model.get_parameter_values()))]
         x_full= [self.model.get_state()]
 
-        if sqrt_P == None:
-            sqrt_P = self.model.get_cov_matrix_state_pars()
-        sqrt_Ps = [sqrt_P]
+        # Square root covariance matrices, the structure of Q and R is preserved
+        if sqrt_P is None:
+            sqrt_P = self.model.get_cov_state_pars()
+        sqrt_Ps = [np.array(sqrt_P)]
         
-        if sqrt_Q == None:
-            sqrt_Q = self.model.get_cov_matrix_state_pars()
-        if sqrt_R == None:
-            sqrt_R = self.model.get_cov_matrix_outputs()
+        if sqrt_Q is None:
+            sqrt_Q = self.model.get_cov_state_pars()
+        if sqrt_R is None:
+            sqrt_R = self.model.get_cov_outputs()
+        sqrt_Q = covariance.as_covariance(sqrt_Q, detect_diagonal = True)
+        sqrt_R = covariance.as_covariance(sqrt_R, detect_diagonal = True)
 
-        y     = [measuredOuts[0,1:]]
-        y_full= [measuredOuts[0,1:]]
-        Sy    = [sqrt_R]
+        y     = [measuredOuts[0,:]]
+        y_full= [measuredOuts[0,:]]
+        Sy    = [np.array(sqrt_R)]
 
         start_ts = calendar.timegm(time[ix_start].timetuple())
         final_ts = calendar.timegm(time[ix_stop-1].timetuple())
+        
+        # Data and thresholds used by the adaptive time stepping, the aligned data
+        # contains the inputs followed by the measured outputs
+        if self.adaptive_step:
+            alignedData = self.model.get_aligned_data()[1]
+            thresholds = [inp.get_threshold() for inp in self.model.get_inputs()]
+            thresholds += [o.get_threshold() for o in self.model.get_outputs() if o.is_measured_output()]
+            thresholds = np.array(thresholds)
+        
+        # Indexes of the time steps processed by the filter
+        steps = [ix_start]
+        self.merged_steps = []
+        self.n_skipped_steps = 0
+        
+        # Normalized innovation of the last step, the first step is never merged
+        innovation = np.inf
+        
+        # Time and number of simulations, used by the step callbacks
+        t_stage = clock()
+        n_simulations = 0
+        
+        i = ix_start
+        while i < ix_stop-1:
+            
+            # Identify the end of the interval, merging the following ones if the data is quiet
+            j = i + 1
+            if self.adaptive_step and innovation <= self.innovation_threshold:
+                while j + 1 < ix_stop and (self.max_merged_steps is None or j + 1 - i <= self.max_merged_steps):
+                    if np.any(np.abs(alignedData[j+1,:] - alignedData[i,:]) > thresholds):
+                        break
+                    j += 1
+            
+            t_old = time[i]
+            t = time[j]
+            z = measuredOuts[j,:]
+            
+            # The process noise is accumulated over all the intervals merged
+            n_merged = j - i
+            sqrt_Q_step = sqrt_Q if n_merged == 1 else sqrt_Q.scale(np.sqrt(n_merged))
 
-        for i in range(ix_start+1, ix_stop):
-            t_old = time[i-1]
-            t = time[i]
-            z = measuredOuts[i,1:]
-
-            # Print progress
+            # Report the progress
             current_ts = calendar.timegm(t.timetuple())
-            print('[UKF] Step {0}, time = {1} s ({2:.1f}%)'.format(i, current_ts,
-                                                                   100 * float(current_ts-start_ts)
-                                                                   /float(final_ts-start_ts)))
+            progress = float(current_ts - start_ts)/max(final_ts - start_ts, 1)
+            self.__report_progress__("filter", j, t, progress)
+            t_step = clock()
 
             # Execute a filtering step
+            self.profiler.start_step("filter {0}".format(t))
             try:
-                X_corr, sP, Zave, S_y, Zfull_ave, X_full = self.ukf_step(x[i-1-ix_start], sqrt_Ps[i-1-ix_start], sqrt_Q, sqrt_R, t_old, t, z)
+                X_corr, sP, Zave, S_y, Zfull_ave, X_full = self.ukf_step(x[-1], sqrt_Ps[-1], sqrt_Q_step, sqrt_R, t_old, t, z)
             except Exception as e:
-                logger.exception("Exception while running UKF step from {0} to {1}".format(t_old, t))
+                logger.exception("Exception while running UKF step from %s to %s", t_old, t)
                 logger.exception(str(e))
-                logger.exception("The state is X = {0}".format(x[i-1-ix_start]))
-                logger.exception("The sqrtP matrix is".format(sqrt_Ps[i-1-ix_start]))
+                logger.exception("The state is X = %s", x[-1])
+                logger.exception("The sqrtP matrix is %s", sqrt_Ps[-1])
                 raise UkfException("Problem while performing a UKF step")
                 
             # Add data to the list    
@@ -1092,14 +1475,37 @@ class UkfFmu:
             y_full.append(Zfull_ave)
             Sy.append(S_y)
             x_full.append(X_full)
+            
+            # Innovation normalized by the output covariance
+            if self.adaptive_step or len(self.step_callbacks) > 0:
+                innovation = np.max(np.abs(np.linalg.lstsq(S_y.T, z - Zave)[0]))
+            
+            steps.append(j)
+            self.merged_steps.append(n_merged)
+            self.n_skipped_steps += n_merged - 1
+            i = j
+            
+            n_simulations += self.n_points
+            if len(self.step_callbacks) > 0:
+                self.__notify_step__("filter", j, t, progress, t_stage, t_step, len(steps) - 1, n_simulations, \
+                                     n_merged, z - Zave, innovation)
+        
+        if self.n_skipped_steps > 0:
+            logger.info("The adaptive time stepping skipped %s time steps", self.n_skipped_steps)
+        
+        # Restore the weights, they may have been modified by the last step
+        self.W_m, self.W_c = self.nominal_weights
+        
+        if self.profiler.is_enabled() and not for_smoothing:
+            self.profiler.log_summary()
         
         # The first of the overall output vector is missing, copy from the second element
         y_full[0] = y_full[1]
         
         if for_smoothing:
-            return time[ix_start:ix_stop], x, sqrt_Ps, y, Sy, y_full, x_full, sqrt_Q, sqrt_R
+            return time[steps], x, sqrt_Ps, y, Sy, y_full, x_full, sqrt_Q, sqrt_R
         else:
-            return time[ix_start:ix_stop], x, sqrt_Ps, y, Sy, y_full
+            return time[steps], x, sqrt_Ps, y, Sy, y_full
     
     def filter_and_smooth(self, start, stop):
         """
@@ -1133,6 +1539,7 @@ class UkfFmu:
         time, X, sqrtP, y, Sy, y_full, x_full, sqrtQ, sqrtR = self.filter(start, stop, for_smoothing = True)
 
         logger.info("*** Start smoothing process...")
+        t_stage = clock()
         
         # Get the number of time steps        
         s = time.shape
@@ -1155,7 +1562,10 @@ class UkfFmu:
         # thus the difference between these two states is back-propagated to the state at time i
         for i in range(nTimeStep-2,-1,-1):
 
-            print("[UKF] Smoothing step {}".format(i))
+            progress = float(nTimeStep - 1 - i)/(nTimeStep - 1)
+            self.__report_progress__("smooth", i, time[i], progress)
+            t_step = clock()
+            self.profiler.start_step("smooth {0}".format(time[i]))
 
             # reset the full state of the model
             self.model.set_state(x_full[i])
@@ -1169,61 +1579,77 @@ class UkfFmu:
             pars = x_i[self.n_state_obs:]
             
             # define the sigma points
-            Xs_i      = self.compute_sigma_points(x, pars, S_i)
+            with self.profiler.timer("sigma_points"):
+                Xs_i      = self.compute_sigma_points(x, pars, S_i)
 
-            logger.debug("Sigma point is Xs = {0}".format(Xs_i))
+            logger.debug("Sigma point is Xs = %s", Xs_i)
             
             # mean of the sigma points
             Xs_i_ave    = x_i
 
-            logger.debug("Mean value of the sigma point is Xs_i_ave = {0}".format(Xs_i_ave))
-            logger.debug("Simulate from {0} to {1}".format(time[i], time[i+1]))
+            logger.debug("Mean value of the sigma point is Xs_i_ave = %s", Xs_i_ave)
+            logger.debug("Simulate from %s to %s", time[i], time[i+1])
                 
             # compute the projected (state) points (each sigma points is propagated through the state transition function)
-            X_plus_1, Z_plus_1, Xfull_plus_1, Zfull_plus_1 = self.sigma_point_proj(Xs_i, time[i], time[i+1])
+            with self.profiler.timer("projection"):
+                X_plus_1, Z_plus_1, Xfull_plus_1, Zfull_plus_1 = self.sigma_point_proj(Xs_i, time[i], time[i+1])
 
-            logger.debug("Propagated sigma points X_plus_1 = {0}".format(X_plus_1))
+            logger.debug("Propagated sigma points X_plus_1 = %s", X_plus_1)
             
             # average of the sigma points
-            x_ave_plus_1 = self.average_proj(X_plus_1)
+            with self.profiler.timer("covariance"):
+                x_ave_plus_1 = self.average_proj(X_plus_1)
 
-            logger.debug("Averaged propagated sigma points x_ave_plus_1 = {0}".format(x_ave_plus_1))
+            logger.debug("Averaged propagated sigma points x_ave_plus_1 = %s", x_ave_plus_1)
             
-            # compute the new covariance matrix
-            Snew = self.compute_S(X_plus_1, x_ave_plus_1, sqrtQ)
+            # compute the new covariance matrix, accounting for the intervals merged by the filter
+            n_merged = self.merged_steps[i]
+            with self.profiler.timer("square_root"):
+                Snew = self.compute_S(X_plus_1, x_ave_plus_1, sqrtQ if n_merged == 1 else sqrtQ.scale(np.sqrt(n_merged)))
 
-            logger.debug("Former S matrix is = {0}".format(S_i))
-            logger.debug("New matrix is Snew = {0}".format(Snew))
+            logger.debug("Former S matrix is = %s", S_i)
+            logger.debug("New matrix is Snew = %s", Snew)
             
             # compute the cross covariance matrix of the two states
             # (new state already corrected, coming from the "future", and the new just computed through the projection)
-            Cxx  = self.compute_cov_x_x(X_plus_1, x_ave_plus_1, Xs_i, Xs_i_ave)
+            with self.profiler.timer("covariance"):
+                Cxx  = self.compute_cov_x_x(X_plus_1, x_ave_plus_1, Xs_i, Xs_i_ave)
 
-            logger.debug("Cross state-state covariance Cxx = {0}".format(Cxx))
+            logger.debug("Cross state-state covariance Cxx = %s", Cxx)
             
             # gain for the back propagation
-            firstDivision = np.linalg.lstsq(Snew.T, Cxx.T)[0]
-            D             = np.linalg.lstsq(Snew, firstDivision)[0]
-            
-            correction = np.dot(np.matrix(Xsmooth[i+1]) - x_ave_plus_1, D)
-            logger.debug("Old state is X = {0}".format(X[i]))
-            logger.debug("Error is err = {0}".format(Xsmooth[i+1] - x_ave_plus_1))
-            logger.debug("Correction = {0}".format(correction))
-            
-            # correction (i.e. smoothing, of the state estimation and covariance matrix)
-            Xsmooth[i]  = X[i] + np.squeeze(np.array(correction[0,:]))
-            
-            # How to introduce constrained estimation
-            Xsmooth[i]  = self.constrained_state(Xsmooth[i])
+            with self.profiler.timer("gain"):
+                firstDivision = np.linalg.lstsq(Snew.T, Cxx.T)[0]
+                D             = np.linalg.lstsq(Snew, firstDivision)[0]
+                
+                correction = np.dot(np.matrix(Xsmooth[i+1]) - x_ave_plus_1, D)
+                logger.debug("Old state is X = %s", X[i])
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Error is err = %s", Xsmooth[i+1] - x_ave_plus_1)
+                logger.debug("Correction = %s", correction)
+                
+                # correction (i.e. smoothing, of the state estimation and covariance matrix)
+                Xsmooth[i]  = X[i] + np.squeeze(np.array(correction[0,:]))
+                
+                # How to introduce constrained estimation
+                Xsmooth[i]  = self.constrained_state(Xsmooth[i])
             
-            X_proj, Z_proj, Xfull_proj, Zfull_proj = self.sigma_point_proj([Xsmooth[i]],time[i], time[i])
-            Yfull_smooth[i] = Zfull_proj[0]
+            # Evaluate the outputs for the smoothed state, the other states are the ones of the filter
+            with self.profiler.timer("evaluate_outputs"):
+                Yfull_smooth[i] = self.__evaluate_outputs__(time[i], Xsmooth[i][:self.n_state_obs], Xsmooth[i][self.n_state_obs:])
             
-            V          = np.dot(D.T, Ssmooth[i+1] - Snew)
-            Ssmooth[i] = self.chol_update(sqrtP[i], V, -1*np.ones(self.n_state_obs + self.n_pars))
+            with self.profiler.timer("square_root"):
+                V          = np.dot(D.T, Ssmooth[i+1] - Snew)
+                Ssmooth[i] = self.chol_update(sqrtP[i], V, -1*np.ones(self.n_state_obs + self.n_pars))
 
-            logger.debug("New smoothed state Xsmooth = {0}".format(Xsmooth[i]))
-            logger.debug("Ssmooth difference is = {0}".format(sqrtP[i] - Ssmooth[i]))
+            logger.debug("New smoothed state Xsmooth = %s", Xsmooth[i])
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Ssmooth difference is = %s", sqrtP[i] - Ssmooth[i])
+            
+            if len(self.step_callbacks) > 0:
+                completed = nTimeStep - 1 - i
+                self.__notify_step__("smooth", i, time[i], progress, t_stage, t_step, completed, completed*self.n_points, \
+                                     self.merged_steps[i])
         
         # correct the shape of the last element that has not been smoothed
         # Yfull_smooth[-1] = Yfull_smooth[-1][0]    # Krzysztof: This line is likely a bug. This code
@@ -1235,9 +1661,39 @@ class UkfFmu:
                                                     #  [x(m-1)1, x(m-1)2, ..., x(m-1)n],
                                                     #  xm1]
 
+        # Restore the weights, they may have been modified by the last step
+        self.W_m, self.W_c = self.nominal_weights
+        
+        if self.profiler.is_enabled():
+            self.profiler.log_summary()
+        
         # Return the results of the filtering and smoothing
         return time, X, sqrtP, y, Sy, y_full, Xsmooth, Ssmooth, Yfull_smooth
     
+    def __evaluate_outputs__(self, t, x, pars):
+        """
+        Internal method that evaluates the outputs of the model for given values of the observed
+        states and of the estimated parameters, see
+        :func:`estimationpy.fmu_utils.model.Model.evaluate_outputs`. The states and the parameters
+        of the model are restored after the evaluation, therefore the FMU of the model is not modified.
+        
+        :param datetime.datetime t: the time at which the outputs are evaluated
+        :param numpy.array x: the values of the observed states
+        :param numpy.array pars: the values of the estimated parameters
+        
+        :return: the values of all the outputs
+        :rtype: numpy.array
+        """
+        state = self.model.get_state()
+        x_old = self.model.get_state_observed_values()
+        pars_old = self.model.get_parameter_values()
+        try:
+            return self.model.evaluate_outputs(t, x, pars)[1]
+        finally:
+            self.model.set_state(state)
+            self.model.set_state_selected(x_old)
+            self.model.set_parameters_selected(pars_old)
+    
     @staticmethod
     def find_closest_matches(start, stop, time):
         """
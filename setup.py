@@ -30,5 +30,9 @@ compliant with the Functional Mockup Interface standard',
         'Programming Language :: Python :: 2.7',
         'Topic :: Scientific/Engineering :: Mathematics',
     ],
+    extras_require = {
+        # Limits the threads of the numerical libraries in the processes that run the simulations
+        'threads': ['threadpoolctl'],
+    },
     test_suite = 'estimationpy.tests',
 )